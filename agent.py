@@ -4,15 +4,38 @@ import datetime
 from google.adk.agents import LlmAgent, SequentialAgent
 from google.adk.sessions import InMemorySessionService
 from google.adk.runners import Runner
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.genai import types as genai_types # Para crear el Content del usuario
 from .tools import herramientas_produccion_agroasesoria
 from .prompt import INSTRUCTION, pain_point, product_interaction, user_profile
+from .fast_path import FastPathRouter
+from .streaming_json import StreamingJSONError, StreamingJSONParser
+from .sub_agents import (
+    ParallelTurnOrchestrator,
+    background_snapshot_callback,
+    pain_point_agent,
+    user_profile_agent,
+)
+from .shared_libraries import (
+    CategoryTreeCache,
+    ProductDetailView,
+    SharedCatalog,
+    UploadError,
+    default_upload_manager,
+    firestore_category_loader,
+)
+from .constants import MEDIA_UPLOAD_BASE_URL
 
 # --- Constantes (ajusta según necesites) ---
 APP_NAME = "sales_funnel_app"
 USER_ID = "test_user_01"
 SESSION_ID_BASE = "funnel_session"
 GEMINI_MODEL = "gemini-2.0-flash"
+# Perfilado y puntos de dolor en paralelo, fuera del camino crítico del turno
+PARALLEL_SUB_AGENTS = True
+# Respuesta en streaming: los campos del JSON se procesan según se completan
+STREAMING_RESPONSES = True
+STREAMED_FIELDS = ["template_id", "next_funnel_step", "data", "message"]
 
 # --- Estado del Embudo (claves para session.state) ---
 STATE_FUNNEL_STEP = "funnel_step"
@@ -25,6 +48,10 @@ TEMPLATE_SHOW_PRODUCTS_IN_CATEGORY = "SHOW_PRODUCTS_IN_CATEGORY"
 TEMPLATE_SHOW_PRODUCT_DETAILS = "SHOW_PRODUCT_DETAILS"
 TEMPLATE_ASK_CLARIFICATION = "ASK_CLARIFICATION"
 TEMPLATE_ERROR = "SHOW_ERROR"
+
+# --- Pasos del embudo ---
+FUNNEL_STEP_PRODUCT_LIST = "PRODUCT_LIST"
+FUNNEL_STEP_PRODUCT_DETAILS = "PRODUCT_DETAILS"
 initial_state = "welcom"
 
 # --- Herramientas Simuladas (reemplazar con llamadas reales a Firestore) ---
@@ -35,87 +62,259 @@ def get_initial_categories_tool() -> str:
     Devuelve una lista de categorías en formato JSON string.
     """
     print("  [Tool Call] get_initial_categories_tool")
-    # En la vida real: db.collection("Categoria").where("show", "==", True).order_by("order").stream()
+    # En la vida real:
+    # db.collection("Categoria").where("show", "==", True).order_by("order").stream()
     categories = [
-        {"id": "cat_tractors", "name": "Tractores", "description": "Potencia y eficiencia para tu campo.", "image_url": "https://example.com/tractor.jpg"},
-        {"id": "cat_harvesters", "name": "Cosechadoras", "description": "Maximiza tu rendimiento en la cosecha.", "image_url": "https://example.com/harvester.jpg"},
-        {"id": "cat_implements", "name": "Implementos", "description": "Herramientas versátiles para toda labor.", "image_url": "https://example.com/implement.jpg"},
+        {
+            "id": "cat_tractors",
+            "name": "Tractores",
+            "description": "Potencia y eficiencia para tu campo.",
+            "image_url": "https://example.com/tractor.jpg",
+        },
+        {
+            "id": "cat_harvesters",
+            "name": "Cosechadoras",
+            "description": "Maximiza tu rendimiento en la cosecha.",
+            "image_url": "https://example.com/harvester.jpg",
+        },
+        {
+            "id": "cat_implements",
+            "name": "Implementos",
+            "description": "Herramientas versátiles para toda labor.",
+            "image_url": "https://example.com/implement.jpg",
+        },
     ]
     return json.dumps(categories)
 
+# Catálogo publicado en memoria compartida por el cargador (make catalog-loader)
+shared_catalog = SharedCatalog()
+
 def get_products_for_category_tool(category_id: str) -> str:
     """
     Simula la obtención de productos para una categoría específica desde Firestore.
     Devuelve una lista de productos en formato JSON string.
     """
     print(f"  [Tool Call] get_products_for_category_tool, category_id: {category_id}")
-    # En la vida real: db.collection("Tractor").where("categoria", "==", category_id).where("show", "==", True).stream()
+    # Con el cargador en marcha se lee del catálogo compartido, sin Firestore
+    if shared_catalog.available():
+        products = [
+            {
+                "id": row["id"],
+                "name": row["name"],
+                "image_url": row["image_url"],
+                "price": f"€{row['price']:,.0f}" if row["price"] is not None else None,
+            }
+            for row in shared_catalog.where_equals("categoria", category_id)
+            if row["show"]
+        ]
+        return json.dumps(products, ensure_ascii=False)
+    # En la vida real: db.collection("Tractor").where("categoria", "==", category_id)
+    #     .where("show", "==", True).stream()
     products = []
     if category_id == "cat_tractors":
         products = [
-            {"id": "prod_trac_001", "name": "SuperTractor X1000", "short_description": "El más vendido, ideal para grandes extensiones.", "image_url": "https://example.com/tractor_x1000.jpg", "price": "€75,000"},
-            {"id": "prod_trac_002", "name": "CompactFarm 300", "short_description": "Ágil y potente para terrenos medianos.", "image_url": "https://example.com/tractor_cf300.jpg", "price": "€45,000"},
+            {
+                "id": "prod_trac_001",
+                "name": "SuperTractor X1000",
+                "short_description": "El más vendido, ideal para grandes extensiones.",
+                "image_url": "https://example.com/tractor_x1000.jpg",
+                "price": "€75,000",
+            },
+            {
+                "id": "prod_trac_002",
+                "name": "CompactFarm 300",
+                "short_description": "Ágil y potente para terrenos medianos.",
+                "image_url": "https://example.com/tractor_cf300.jpg",
+                "price": "€45,000",
+            },
         ]
     elif category_id == "cat_harvesters":
         products = [
-            {"id": "prod_harv_001", "name": "MegaHarvester Pro", "short_description": "Alta capacidad y tecnología de punta.", "image_url": "https://example.com/harvester_pro.jpg", "price": "€250,000"},
+            {
+                "id": "prod_harv_001",
+                "name": "MegaHarvester Pro",
+                "short_description": "Alta capacidad y tecnología de punta.",
+                "image_url": "https://example.com/harvester_pro.jpg",
+                "price": "€250,000",
+            },
         ]
     return json.dumps(products)
 
+# --- Detalle de producto desde la vista desnormalizada (una lectura como mucho) ---
+
+product_views = ProductDetailView()
+
 def get_product_details_tool(product_id: str) -> str:
     """
-    Simula la obtención de detalles de un producto específico y sus argumentos de venta.
+    Obtiene los detalles de un producto específico junto con sus argumentos de venta.
     Devuelve un objeto de producto con detalles en formato JSON string.
     """
     print(f"  [Tool Call] get_product_details_tool, product_id: {product_id}")
-    # En la vida real:
-    # 1. db.collection("Tractor").document(product_id).get()
-    # 2. db.collection("argumentosDeVenta").document(product_id).get()
-    # ... y luego combinar los datos.
-    details = {}
-    if product_id == "prod_trac_001":
+    # Producto y argumentosDeVenta ya combinados en vistaDetalleProducto
+    try:
+        details = product_views.get(product_id)
+    except Exception as e:
+        print(f"  [Tool Error] get_product_details_tool: {e}")
+        details = None
+    if details is None and product_id == "prod_trac_001":
+        # Detalle de ejemplo para la demo sin Firestore
         details = {
             "id": "prod_trac_001",
             "name": "SuperTractor X1000",
-            "description_larga": "El SuperTractor X1000 combina un motor de última generación con una cabina confortable y tecnología de agricultura de precisión. Sus 200 caballos de fuerza y bajo consumo lo hacen imparable.",
-            "images": ["https://example.com/tractor_x1000_1.jpg", "https://example.com/tractor_x1000_2.jpg"],
+            "description_larga": (
+                "El SuperTractor X1000 combina un motor de última generación con una cabina "
+                "confortable y tecnología de agricultura de precisión. Sus 200 caballos de "
+                "fuerza y bajo consumo lo hacen imparable."
+            ),
+            "images": [
+                "https://example.com/tractor_x1000_1.jpg",
+                "https://example.com/tractor_x1000_2.jpg",
+            ],
             "price": "€75,000",
             "caracteristicasTecnicas": [
                 {"clave": "Potencia", "valor": "200 HP"},
-                {"clave": "Transmisión", "valor": "Automática Powershift"},
+                {"clave": "Transmisión", "valor": "Automática Powershift"}
             ],
             "argumentosDeVenta": {
-                "propuestaUnicaDeValor": "El equilibrio perfecto entre potencia, tecnología y confort para el agricultor moderno.",
-                "beneficiosPrincipales": ["Ahorro de combustible del 15%", "Mayor productividad por hectárea", "Mantenimiento reducido"],
+                "propuestaUnicaDeValor": (
+                    "El equilibrio perfecto entre potencia, tecnología y confort para el "
+                    "agricultor moderno."
+                ),
+                "beneficiosPrincipales": [
+                    "Ahorro de combustible del 15%",
+                    "Mayor productividad por hectárea",
+                    "Mantenimiento reducido",
+                ]
             }
         }
-    return json.dumps(details)
+    return json.dumps(details or {}, ensure_ascii=False)
+
+# --- Navegación del catálogo sobre el árbol de categorías en memoria ---
+
+category_tree = CategoryTreeCache(firestore_category_loader())
+
+def get_catalog_level_options_tool(selected_id: str = "") -> str:
+    """
+    Devuelve las opciones del siguiente nivel del catálogo tras seleccionar
+    `selected_id` (vacío para el primer nivel). Los niveles con una sola opción
+    se seleccionan automáticamente. Devuelve JSON con breadcrumb, level,
+    options (id, name, product_count), is_leaf y state_updates, que son las
+    claves de sesión de los niveles ya seleccionados.
+    """
+    print(f"  [Tool Call] get_catalog_level_options_tool, selected_id: {selected_id}")
+    return json.dumps(category_tree.get().options(selected_id or None))
+
+# --- Subida reanudable de vídeos de clientes ---
+
+def request_video_upload_link_tool(
+    filename: str,
+    size_bytes: int,
+    content_type: str = "video/mp4",
+    customer_id: str = ""
+) -> str:
+    """
+    Abre una subida reanudable para que el cliente envíe un vídeo de su
+    maquinaria. Devuelve JSON con upload_id, upload_url, chunk_size y
+    chunk_count: el frontend envía cada trozo con PUT a
+    upload_url/chunks/{índice} (cabecera X-Chunk-SHA256), consulta upload_url
+    con GET para saber qué trozos faltan tras un corte y termina con POST a
+    upload_url/complete.
+    """
+    print(
+        f"  [Tool Call] request_video_upload_link_tool, filename: {filename}, "
+        f"size_bytes: {size_bytes}"
+    )
+    try:
+        session = default_upload_manager().create_session(
+            filename, size_bytes, content_type, customer_id or None
+        )
+    except UploadError as e:
+        return json.dumps({"error": str(e)}, ensure_ascii=False)
+    return json.dumps({
+        "upload_id": session.upload_id,
+        "upload_url": f"{MEDIA_UPLOAD_BASE_URL}/{session.upload_id}",
+        "chunk_size": session.chunk_size,
+        "chunk_count": session.chunk_count,
+        "expires_at": datetime.datetime.fromtimestamp(session.expires_at).isoformat(),
+    })
+
+# --- Atajos sin modelo para selecciones explícitas del frontend ---
+
+def _fast_path_category(category_id: str):
+    products = json.loads(get_products_for_category_tool(category_id))
+    if not products:
+        return None  # ID desconocido: que lo resuelva el modelo
+    response = {
+        "template_id": TEMPLATE_SHOW_PRODUCTS_IN_CATEGORY,
+        "message": "Estos son los productos disponibles en esta categoría. ¿Cuál te interesa?",
+        "data": {"selected_category_id": category_id, "products": products},
+        "next_funnel_step": FUNNEL_STEP_PRODUCT_LIST,
+    }
+    state_updates = {
+        STATE_SELECTED_CATEGORY: category_id,
+        STATE_FUNNEL_STEP: FUNNEL_STEP_PRODUCT_LIST,
+    }
+    return response, state_updates
+
+def _fast_path_product(product_id: str):
+    details = json.loads(get_product_details_tool(product_id))
+    if not details:
+        return None
+    response = {
+        "template_id": TEMPLATE_SHOW_PRODUCT_DETAILS,
+        "message": f"Aquí tienes todos los detalles del {details.get('name', 'producto')}.",
+        "data": {"selected_product_id": product_id, "product": details},
+        "next_funnel_step": FUNNEL_STEP_PRODUCT_DETAILS,
+    }
+    state_updates = {
+        STATE_SELECTED_PRODUCT: product_id,
+        STATE_FUNNEL_STEP: FUNNEL_STEP_PRODUCT_DETAILS,
+    }
+    return response, state_updates
+
+fast_path_router = FastPathRouter({
+    "category": _fast_path_category,
+    "product": _fast_path_product,
+})
 
 # --- Agente Principal del Embudo ---
 # Este agente es el "cerebro". Decide qué hacer en cada paso del embudo.
 # Su instrucción es clave para que devuelva JSON estructurado.
 
+funnel_tools = [
+    herramientas_produccion_agroasesoria.ask_contact_name_tool,
+    get_catalog_level_options_tool,
+    herramientas_produccion_agroasesoria.get_products_final_list_tool,
+    herramientas_produccion_agroasesoria.get_detailed_product_info_tool,
+    herramientas_produccion_agroasesoria.get_current_datetime_tool,
+    herramientas_produccion_agroasesoria.search_internal_products_by_embedding_tool,
+    herramientas_produccion_agroasesoria.search_external_products_tool,
+    herramientas_produccion_agroasesoria.add_to_products_a_repasar_in_firestore_tool,
+    request_video_upload_link_tool,
+    herramientas_produccion_agroasesoria.prepare_selection_update_for_session_state,
+    herramientas_produccion_agroasesoria.get_alternative_products_tool,
+]
+# Perfilado y puntos de dolor: en modo paralelo los hacen los sub-agentes de
+# segundo plano y FunnelAgent solo lee su último resultado ya fusionado
+profile_tools = [
+    herramientas_produccion_agroasesoria.get_or_create_user_profile_from_firestore_tool,
+    herramientas_produccion_agroasesoria.update_user_profile_in_firestore_tool,
+    herramientas_produccion_agroasesoria.determine_next_profile_question_tool,
+    herramientas_produccion_agroasesoria.ask_pain_points_questions_tool,
+]
+background_agents = [user_profile_agent, pain_point_agent]
+
 funnel_agent = LlmAgent(
     name="FunnelAgent",
     model=GEMINI_MODEL,
     instruction= INSTRUCTION,
-    tools=[
-        herramientas_produccion_agroasesoria.ask_contact_name_tool,
-        herramientas_produccion_agroasesoria.get_or_create_user_profile_from_firestore_tool,
-        herramientas_produccion_agroasesoria.update_user_profile_in_firestore_tool,
-        herramientas_produccion_agroasesoria.determine_next_profile_question_tool,
-        herramientas_produccion_agroasesoria.get_catalog_level_options_tool,
-        herramientas_produccion_agroasesoria.get_products_final_list_tool,
-        herramientas_produccion_agroasesoria.get_detailed_product_info_tool,
-        herramientas_produccion_agroasesoria.get_current_datetime_tool,
-        herramientas_produccion_agroasesoria.ask_pain_points_questions_tool,
-        herramientas_produccion_agroasesoria.search_internal_products_by_embedding_tool,
-        herramientas_produccion_agroasesoria.search_external_products_tool,
-        herramientas_produccion_agroasesoria.add_to_products_a_repasar_in_firestore_tool,
-        herramientas_produccion_agroasesoria.request_video_upload_link_tool,
-        herramientas_produccion_agroasesoria.prepare_selection_update_for_session_state,
-        herramientas_produccion_agroasesoria.get_alternative_products_tool,
-    ]
+    tools=funnel_tools if PARALLEL_SUB_AGENTS else funnel_tools + profile_tools,
+    # Las selecciones con ID explícito se resuelven sin llamar a Gemini; el
+    # resto de llamadas reciben el último perfil fusionado en la instrucción
+    before_model_callback=(
+        [fast_path_router.before_model_callback, background_snapshot_callback(background_agents)]
+        if PARALLEL_SUB_AGENTS else fast_path_router.before_model_callback
+    ),
 )
 
 # Para ADK, el agente raíz debe llamarse `root_agent` si usas `adk run` o `adk web`.
@@ -140,6 +339,16 @@ async def run_conversation():
         session_service=session_service
         # No se necesita `model` aquí si ya está definido en el LlmAgent
     )
+    # En modo paralelo, FunnelAgent responde mientras los sub-agentes de perfil y
+    # puntos de dolor procesan el mismo mensaje; su estado se fusiona al terminar.
+    orchestrator = None
+    if PARALLEL_SUB_AGENTS:
+        orchestrator = ParallelTurnOrchestrator(
+            foreground=root_agent,
+            background=background_agents,
+            app_name=APP_NAME,
+            session_service=session_service,
+        )
 
     # Crear una nueva sesión o resumir una existente
     session_id = f"{SESSION_ID_BASE}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
@@ -160,7 +369,8 @@ async def run_conversation():
     user_inputs = [
         "Hola, estoy buscando maquinaria.",
         "Me interesan los tractores. ID: cat_tractors", # Usuario selecciona categoría
-        "Quiero más detalles del SuperTractor X1000. ID: prod_trac_001", # Usuario selecciona producto
+        # Usuario selecciona producto
+        "Quiero más detalles del SuperTractor X1000. ID: prod_trac_001",
         "Gracias, eso es todo por ahora."
     ]
 
@@ -172,42 +382,86 @@ async def run_conversation():
 
         # Ejecutar el agente
         # El runner.run() devuelve un generador de eventos.
-        # Necesitamos iterar para obtener la respuesta final del agente.
+        # Con streaming, los eventos parciales traen el JSON troceado: cada campo
+        # (template_id, next_funnel_step, data...) se procesa en cuanto se completa.
+        run_config = RunConfig(streaming_mode=StreamingMode.SSE) if STREAMING_RESPONSES else None
+        parser = StreamingJSONParser(STREAMED_FIELDS)
+        parse_error = None
+        streamed = False
+
+        def feed(text):
+            nonlocal parse_error
+            if parse_error is not None:
+                return
+            try:
+                for field, value in parser.feed(text):
+                    print(f"  [Stream] {field}: {json.dumps(value, ensure_ascii=False)[:100]}")
+            except StreamingJSONError as e:
+                # Se detecta en cuanto llega el carácter inválido, sin esperar al final
+                parse_error = e
+                print(f"  [Stream] Respuesta no válida: {e}")
+
         final_agent_response_json_str = None
-        async for event in runner.run_async(
-            session_id=current_session.id,
-            user_id=USER_ID, # ADK Runner espera user_id aquí también
-            new_message=user_content
-        ):
-            if event.is_final_response() and event.content and event.content.parts:
+        if orchestrator:
+            events = orchestrator.run_turn(
+                user_id=USER_ID, session_id=current_session.id, new_message=user_content,
+                run_config=run_config
+            )
+        else:
+            events = runner.run_async(
+                session_id=current_session.id,
+                user_id=USER_ID, # ADK Runner espera user_id aquí también
+                new_message=user_content,
+                **({"run_config": run_config} if run_config else {})
+            )
+        async for event in events:
+            # No se corta el bucle: el orquestador necesita cerrar el turno
+            text = event.content.parts[0].text if event.content and event.content.parts else None
+            if event.partial:
+                if text:
+                    streamed = True
+                    feed(text)
+                continue
+            if event.is_final_response() and text and not final_agent_response_json_str:
                 # Asumimos que la instrucción al LLM de devolver JSON se ha cumplido.
-                final_agent_response_json_str = event.content.parts[0].text
-                break
-            # Aquí podrías manejar otros tipos de eventos si es necesario (tool calls, etc.)
-            # print(f"    Evento intermedio: {event.type}, Autor: {event.author}")
+                final_agent_response_json_str = text
+                if not streamed:
+                    # Sin streaming (o atajo sin modelo): el texto completo de una vez
+                    feed(text)
+            elif not event.is_final_response():
+                # Lo emitido antes de una llamada a herramienta no es la respuesta final
+                parser = StreamingJSONParser(STREAMED_FIELDS)
+                parse_error = None
+                streamed = False
 
         if final_agent_response_json_str:
             print(f" Respuesta Estructurada del Agente:\n{final_agent_response_json_str}")
             try:
-                structured_response = json.loads(final_agent_response_json_str)
+                if parse_error is not None:
+                    raise parse_error
+                structured_response = parser.close()
                 # Actualizar el estado del embudo en la sesión para el próximo turno
                 # La instrucción del LLM le indica que sugiera el "next_funnel_step".
-                # La aplicación (este script en este caso) es responsable de actualizar el session.state.
-                # Una alternativa más avanzada es que el LLM use una herramienta para actualizar el estado.
+                # La aplicación (este script en este caso) es responsable de actualizar el
+                # session.state. Una alternativa más avanzada es que el LLM use una
+                # herramienta para actualizar el estado.
                 if "next_funnel_step" in structured_response:
                     new_funnel_step = structured_response.get("next_funnel_step")
                     # También podrías querer guardar otros datos que el LLM haya procesado
-                    # Por ejemplo, si el LLM identifica un selected_category_id de la entrada del usuario
-                    # antes de llamar al tool, podría devolverlo en el JSON para que lo guardes aquí.
-                    # Para simplificar, asumimos que la instrucción del LLM es lo suficientemente buena
-                    # como para usar los tools correctamente y que los IDs se manejan internamente por ahora.
+                    # Por ejemplo, si el LLM identifica un selected_category_id de la entrada
+                    # del usuario antes de llamar al tool, podría devolverlo en el JSON para
+                    # que lo guardes aquí. Para simplificar, asumimos que la instrucción del
+                    # LLM es lo suficientemente buena como para usar los tools correctamente
+                    # y que los IDs se manejan internamente por ahora.
 
                     # Para una lógica más robusta, el LLM podría devolver los IDs seleccionados
                     # y aquí actualizaríamos session.state.{STATE_SELECTED_CATEGORY}, etc.
                     # Por ejemplo:
 
                     if "selected_category_id" in structured_response.get("data", {}):
-                      current_session.state[STATE_SELECTED_CATEGORY] = structured_response["data"]["selected_category_id"]
+                      current_session.state[STATE_SELECTED_CATEGORY] = (
+                          structured_response["data"]["selected_category_id"]
+                      )
 
                     if new_funnel_step:
                         print(f"  Actualizando estado del embudo a: {new_funnel_step}")
@@ -223,11 +477,13 @@ async def run_conversation():
                 print(f"  Estado actual de la sesión: {current_session.state}")
 
 
-            except json.JSONDecodeError:
-                print("Error: La respuesta del agente no es un JSON válido.")
+            except StreamingJSONError as e:
+                print(f"Error: La respuesta del agente no es un JSON válido: {e}")
         else:
             print("El agente no devolvió una respuesta final estructurada.")
 
+    if orchestrator:
+        await orchestrator.wait_for_background(current_session.id)
     print("\nFin de la conversación.")
 
 # if __name__ == "__main__":
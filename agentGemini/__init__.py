@@ -1,6 +1,11 @@
 """AgentGemini - Agente inteligente para ventas de maquinaria agrícola."""
 
-from .agent import root_agent
-
 __version__ = "1.0.0"
-__all__ = ["root_agent"]
\ No newline at end of file
+__all__ = ["root_agent"]
+
+def __getattr__(name):
+    # El agente (y con él google.adk) se carga al pedirlo, no al importar el paquete
+    if name == "root_agent":
+        from .agent import root_agent
+        return root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -8,7 +8,6 @@ import os
 import logging
 from typing import Dict, Any, Optional
 from google.genai.adk import Agent
-from dotenv import load_dotenv
 
 from .config import Config
 from .models import SessionState
@@ -25,14 +24,89 @@ from .tools import (
     schedule_service,
     generate_discount_code
 )
-from .prompts import MAIN_INSTRUCTION
+from .tools.customer_tools import flush_profile_writes
+from .tool_declarations import compact_tools_before_model
+from .prompts import DEGRADED_MODE_NOTICE, MAIN_INSTRUCTION
+from .services.circuit_breaker import reset_stale_reads, stale_collections
+from .services.firestore_service import FirestoreService
+from .services.hedged_reads import end_turn_budget, start_turn_budget
+from .services.response_cache import SemanticResponseCache
+from .services.session_recorder import BackendTap, SessionRecorder
+from .toolsets import (
+    request_additional_tools,
+    filter_tools_before_model,
+    track_stage_after_tool
+)
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# logging y .env los configura el proceso que arranca el agente (`adk run`,
+# `adk web` o el bloque __main__), no la importación del módulo
 logger = logging.getLogger(__name__)
 
-# Cargar variables de entorno
-load_dotenv()
+response_cache = SemanticResponseCache()
+
+# Grabación de sesiones (desactivada por defecto)
+session_recorder = None
+if Config.SESSION_RECORDING_ENABLED:
+    session_recorder = SessionRecorder()
+    BackendTap(FirestoreService, "firestore").install()
+
+def before_agent(callback_context):
+    """Inicio del turno: abre el presupuesto de latencia de las lecturas."""
+    start_turn_budget()
+    reset_stale_reads()
+    if session_recorder is not None:
+        session_recorder.before_agent(callback_context)
+    return None
+
+def after_agent(callback_context):
+    """Fin del turno: una sola escritura del perfil y cierre de la grabación."""
+    flush_profile_writes(callback_context)
+    end_turn_budget()
+    if session_recorder is not None:
+        session_recorder.after_agent(callback_context)
+    return None
+
+def before_model(callback_context, llm_request):
+    """
+    Sirve desde la caché semántica o reduce las herramientas a la etapa (con
+    sus declaraciones compactas), y avisa al modelo si el turno usa datos
+    locales por un fallo de Firestore.
+    """
+    cached = None
+    if Config.SEMANTIC_CACHE_ENABLED:
+        cached = response_cache.before_model_callback(callback_context, llm_request)
+    if cached is None:
+        filter_tools_before_model(callback_context, llm_request)
+        compact_tools_before_model(callback_context, llm_request)
+        stale = stale_collections()
+        if stale:
+            llm_request.append_instructions(
+                [DEGRADED_MODE_NOTICE.format(collections=", ".join(stale))]
+            )
+    if session_recorder is not None:
+        session_recorder.before_model(callback_context, llm_request, cached)
+    return cached
+
+def after_model(callback_context, llm_response):
+    """Guarda en la caché semántica las respuestas reutilizables."""
+    # Las respuestas con datos desactualizados no se reutilizan
+    if Config.SEMANTIC_CACHE_ENABLED and not stale_collections():
+        response_cache.after_model_callback(callback_context, llm_response)
+    if session_recorder is not None:
+        session_recorder.after_model(callback_context, llm_response)
+    return None
+
+def before_tool(tool, args, tool_context):
+    if session_recorder is not None:
+        session_recorder.before_tool(tool, args, tool_context)
+    return None
+
+def after_tool(tool, args, tool_context, tool_response):
+    """Avanza la etapa del embudo tras cada herramienta."""
+    track_stage_after_tool(tool, args, tool_context, tool_response)
+    if session_recorder is not None:
+        session_recorder.after_tool(tool, args, tool_context, tool_response)
+    return None
 
 # Crear el agente principal
 root_agent = Agent(
@@ -58,8 +132,19 @@ root_agent = Agent(
         # Herramientas de conversión
         process_checkout,
         schedule_service,
-        generate_discount_code
+        generate_discount_code,
+        
+        # Escalado cuando la etapa no expone la herramienta necesaria
+        request_additional_tools
     ],
+    # Caché semántica, herramientas de la etapa del embudo, escritura del
+    # perfil al final del turno y grabación de sesiones
+    before_agent_callback=before_agent,
+    after_agent_callback=after_agent,
+    before_model_callback=before_model,
+    after_model_callback=after_model,
+    before_tool_callback=before_tool,
+    after_tool_callback=after_tool,
     initial_state=SessionState().to_dict()
 )
 
@@ -76,4 +161,8 @@ def log_response(response: str):
 
 if __name__ == "__main__":
     # Para testing local
+    from dotenv import load_dotenv
+    
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
     print("AgentGemini está listo para ejecutarse con 'adk run' o 'adk web'")
\ No newline at end of file
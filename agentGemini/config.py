@@ -10,6 +10,8 @@ class Config:
     
     # Modelo
     MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.0-flash")
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")  # sin Vertex AI
+    MODEL_METRICS_WINDOW = 500  # llamadas recientes para los percentiles de latencia
     
     # Google Cloud
     GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
@@ -23,18 +25,94 @@ class Config:
     MAX_CART_ITEMS = 50
     DEFAULT_CURRENCY = "EUR"
     DEFAULT_LANGUAGE = "es"
+    DYNAMIC_TOOLSETS_ENABLED = os.getenv("DYNAMIC_TOOLSETS_ENABLED", "True").lower() == "true"
+    COMPACT_TOOL_DECLARATIONS_ENABLED = (
+        os.getenv("COMPACT_TOOL_DECLARATIONS_ENABLED", "True").lower() == "true"
+    )
     
     # Descuentos
     LOYALTY_DISCOUNT_THRESHOLD = 1000  # EUR
     LOYALTY_DISCOUNT_PERCENTAGE = 10
+    LOYALTY_POINTS_PER_EUR = 0.1  # 1 punto por cada 10 EUR comprados
+    ANALYTICS_DRIFT_TOLERANCE = 0.01  # EUR de diferencia que el job corrige
     NEW_CUSTOMER_DISCOUNT_PERCENTAGE = 5
+    DISCOUNT_CODE_VALIDITY_DAYS = 30
+    DISCOUNT_INDEX_REFRESH_SECONDS = 300  # 5 minutos
+    
+    # Precios
+    FINANCING_SURCHARGE_PERCENTAGE = 3
+    TAX_PERCENTAGE = 21  # IVA incluido en los precios de catálogo
     
     # Servicios
     SERVICE_BOOKING_DAYS_AHEAD = 30
     SERVICE_DURATION_MINUTES = 60
+    SERVICE_WORKDAY_START_HOUR = 8
+    SERVICE_WORKDAY_END_HOUR = 18
+    SERVICE_CALENDAR_RETRY_SECONDS = 60  # reintento de carga si no hay técnicos
+    SERVICE_CALENDAR_REFRESH_SECONDS = 300  # recarga para ver reservas de otros workers
+    
+    # Identificación de clientes por email/teléfono
+    DEFAULT_PHONE_COUNTRY_CODE = "34"  # para teléfonos sin prefijo internacional
+    IDENTITY_INDEX_MAX_ENTRIES = 50000
+    IDENTITY_INDEX_TTL_SECONDS = 6 * 3600
+    IDENTITY_NEGATIVE_TTL_SECONDS = 120  # un cliente puede darse de alta en otro worker
+    
+    # Escrituras del perfil de cliente (se acumulan y se escriben al final del turno)
+    PROFILE_WRITE_MAX_FIELDS = 20
+    PROFILE_WRITE_MAX_DELAY_SECONDS = 30.0
+    
+    # Grabación de sesiones para reproducir turnos lentos (scripts/replay_session.py)
+    SESSION_RECORDING_ENABLED = os.getenv("SESSION_RECORDING_ENABLED", "False").lower() == "true"
+    SESSION_RECORDING_DIR = os.getenv("SESSION_RECORDING_DIR", "recordings")
+    SESSION_RECORDING_SAMPLE_RATE = float(os.getenv("SESSION_RECORDING_SAMPLE_RATE", "1.0"))
+    # Campos con datos personales que se graban como seudónimo
+    SESSION_RECORDING_REDACTED_FIELDS = (
+        "name", "email", "email_normalized", "phone", "phone_e164", "location",
+        "address", "delivery_address", "billing_info", "tax_id", "company_name",
+    )
+    SESSION_RECORDING_REDACTION_KEY = os.getenv("SESSION_RECORDING_REDACTION_KEY", "")
+    
+    # Plazos de lectura de Firestore y lecturas duplicadas (hedging)
+    FIRESTORE_TURN_BUDGET_SECONDS = 6.0  # tiempo total de lecturas por turno (sin contar el modelo)
+    FIRESTORE_READ_TIMEOUT_SECONDS = 2.0  # plazo máximo de cada lectura
+    FIRESTORE_HEDGE_ENABLED = os.getenv("FIRESTORE_HEDGE_ENABLED", "True").lower() == "true"
+    FIRESTORE_HEDGE_INITIAL_DELAY_SECONDS = 0.1  # hasta tener latencias suficientes
+    FIRESTORE_HEDGE_MIN_DELAY_SECONDS = 0.02
+    FIRESTORE_HEDGE_MIN_SAMPLES = 20
+    FIRESTORE_HEDGE_WINDOW = 500  # latencias recientes por operación para el p95
+    FIRESTORE_HEDGE_MAX_RATIO = 0.1  # fracción máxima de lecturas duplicadas
+    FIRESTORE_HEDGE_WORKERS = 32
+    
+    # Circuit breaker por colección de Firestore y modo degradado
+    CIRCUIT_WINDOW_SECONDS = 30.0
+    CIRCUIT_MIN_CALLS = 10  # llamadas en la ventana antes de poder abrir
+    CIRCUIT_FAILURE_RATIO = 0.5
+    CIRCUIT_SLOW_CALL_SECONDS = 1.0
+    CIRCUIT_SLOW_RATIO = 0.5
+    CIRCUIT_OPEN_SECONDS = 15.0  # tiempo abierto antes de la llamada de prueba
+    DEGRADED_CACHE_MAX_ENTRIES = 20000  # últimas lecturas buenas que se conservan
+    DEGRADED_WRITE_QUEUE_MAX = 5000  # escrituras aplazadas en memoria
     
     # Cache
     CACHE_TTL_SECONDS = 3600  # 1 hora
+    PRODUCT_CACHE_TTL_SECONDS = 60  # productos: el stock cambia sin pasar por este servicio
+    CACHE_EARLY_REFRESH_BETA = 1.0  # >1 refresca antes, <1 más cerca del TTL
+    
+    # Caché semántica de respuestas
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD = 0.9  # similitud coseno mínima
+    SEMANTIC_CACHE_TTL_SECONDS = 6 * 3600
+    SEMANTIC_CACHE_MAX_ENTRIES = 2000
+    
+    # Gateway de streaming (SSE / WebSocket)
+    GATEWAY_MAX_CONCURRENT_RUNS = int(os.getenv("GATEWAY_MAX_CONCURRENT_RUNS", "64"))  # por worker
+    GATEWAY_ACQUIRE_TIMEOUT_SECONDS = 2.0  # espera máxima por un hueco antes de responder 503
+    GATEWAY_QUEUE_SIZE = 64  # mensajes pendientes por conexión
+    GATEWAY_SEND_TIMEOUT_SECONDS = 30.0  # cliente que no consume en este tiempo se desconecta
+    GATEWAY_HEARTBEAT_SECONDS = 15.0
+    # Sesiones compartidas entre workers (DatabaseSessionService); sin URL, en memoria
+    # y un solo worker
+    SESSION_DB_URL = os.getenv("SESSION_DB_URL")
     
     @classmethod
     def validate(cls) -> bool:
@@ -0,0 +1,480 @@
+"""
+Gateway ASGI de streaming para AgentGemini (SSE y WebSocket).
+
+Cada turno de conversación se ejecuta en una tarea que recorre
+`runner.run_async` y convierte los eventos en mensajes para el cliente:
+
+- ``token``: texto parcial de la respuesta
+- ``tool_call`` / ``tool_result``: el agente está usando una herramienta
+- ``final``: respuesta completa del turno
+- ``error`` / ``done``: fin del turno
+
+Los mensajes pasan por una cola acotada por conexión. Si el cliente lee
+despacio, los tokens pendientes se fusionan en un solo mensaje y el resto de
+mensajes esperan (la generación se detiene); si el cliente no consume en
+`GATEWAY_SEND_TIMEOUT_SECONDS`, se cancela el turno. Al desconectarse el
+cliente se cancela la ejecución del agente. Cada worker limita los turnos
+simultáneos y responde 503 cuando no hay hueco.
+
+Cada petición se autentica con un token de ID de Firebase (cabecera
+``Authorization: Bearer <token>``; en WebSocket también ``?token=``) y la
+sesión se asocia al UID del token, nunca a un ``user_id`` enviado por el
+cliente. Con varios workers las sesiones deben estar en un servicio
+compartido (``SESSION_DB_URL``); sin él se guardan en memoria y el gateway
+debe ejecutarse con un solo worker.
+
+Uso:
+    SESSION_DB_URL=postgresql://... uvicorn agentGemini.gateway:app --workers 4
+    uvicorn agentGemini.gateway:app --workers 1
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from fastapi import FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+APP_NAME = "agentGemini"
+
+class GatewayBusyError(Exception):
+    """No hay hueco para otro turno en este worker."""
+
+class SlowConsumerError(Exception):
+    """El cliente no consume los mensajes a tiempo."""
+
+class AuthError(Exception):
+    """Token ausente o no válido."""
+
+class ChatRequest(BaseModel):
+    """Mensaje de un turno; el usuario sale del token, no del cuerpo."""
+    session_id: str
+    message: str
+
+def bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """Token de una cabecera ``Authorization: Bearer <token>``."""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    return token.strip() or None
+
+def firebase_principal(token: Optional[str]) -> str:
+    """
+    UID del usuario de un token de ID de Firebase.
+
+    Raises:
+        AuthError: Si falta el token o no es válido
+    """
+    if not token:
+        raise AuthError("Falta el token de autenticación")
+    from firebase_admin import auth
+
+    from .services.firestore_service import ensure_firebase_app
+
+    ensure_firebase_app()
+    try:
+        return auth.verify_id_token(token)["uid"]
+    except Exception as e:
+        raise AuthError(f"Token no válido: {e}")
+
+def event_to_messages(event: Any) -> List[Dict[str, Any]]:
+    """Convierte un evento de ADK en mensajes para el cliente."""
+    content = getattr(event, "content", None)
+    parts = content.parts if content and content.parts else []
+
+    if getattr(event, "partial", False):
+        text = "".join(part.text or "" for part in parts)
+        return [{"type": "token", "text": text}] if text else []
+
+    messages = []
+    for part in parts:
+        if getattr(part, "function_call", None):
+            call = part.function_call
+            messages.append({"type": "tool_call", "name": call.name, "args": dict(call.args or {})})
+        elif getattr(part, "function_response", None):
+            messages.append({"type": "tool_result", "name": part.function_response.name})
+    if event.is_final_response():
+        text = "".join(part.text or "" for part in parts)
+        messages.append({"type": "final", "text": text})
+    return messages
+
+def format_sse(message: Dict[str, Any]) -> str:
+    if message["type"] == "ping":
+        return ": ping\n\n"
+    data = json.dumps(message, ensure_ascii=False, default=str)
+    return f"event: {message['type']}\ndata: {data}\n\n"
+
+class TurnStream:
+    """
+    Un turno en curso: el agente produce en una tarea y el cliente consume
+    de una cola acotada.
+    """
+
+    def __init__(self, gateway: "StreamingGateway", user_id: str, session_id: str, text: str):
+        self.gateway = gateway
+        self.user_id = user_id
+        self.session_id = session_id
+        self.text = text
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=gateway.queue_size)
+        self.task: Optional[asyncio.Task] = None
+        self.started_at = time.monotonic()
+        self._pending_tokens: List[str] = []
+        self._running = False
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._produce())
+        # El hueco se libera al terminar la tarea, aunque se cancele antes
+        # de empezar a ejecutarse (entonces `_produce` no llega a correr)
+        self.task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self.gateway.release()
+        if task.cancelled() and not self._running:
+            self.gateway.stats["cancelled"] += 1
+            self._put_last({"type": "error", "message": "cancelled"})
+
+    async def _put(self, message: Dict[str, Any]) -> None:
+        try:
+            await asyncio.wait_for(self.queue.put(message), self.gateway.send_timeout)
+        except asyncio.TimeoutError:
+            raise SlowConsumerError(f"Cliente sin consumir durante {self.gateway.send_timeout}s")
+
+    def _put_last(self, message: Dict[str, Any]) -> None:
+        """Sustituye lo pendiente por un mensaje de cierre."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def _flush_tokens(self) -> None:
+        if self._pending_tokens:
+            text = "".join(self._pending_tokens)
+            self._pending_tokens.clear()
+            await self._put({"type": "token", "text": text})
+
+    async def _emit(self, message: Dict[str, Any]) -> None:
+        if message["type"] == "token":
+            self._pending_tokens.append(message["text"])
+            if self.queue.full():
+                # Cliente lento: los tokens se acumulan y se envían juntos
+                self.gateway.stats["coalesced_tokens"] += 1
+                return
+            await self._flush_tokens()
+            return
+        await self._flush_tokens()
+        await self._put(message)
+
+    async def _produce(self) -> None:
+        gateway = self.gateway
+        self._running = True
+        try:
+            await gateway.ensure_session(self.user_id, self.session_id)
+            kwargs = {"run_config": gateway.run_config} if gateway.run_config is not None else {}
+            async for event in gateway.runner.run_async(
+                user_id=self.user_id,
+                session_id=self.session_id,
+                new_message=gateway.new_message(self.text),
+                **kwargs
+            ):
+                for message in event_to_messages(event):
+                    await self._emit(message)
+            await self._flush_tokens()
+            await self._put({"type": "done"})
+            gateway.stats["completed"] += 1
+        except asyncio.CancelledError:
+            gateway.stats["cancelled"] += 1
+            self._put_last({"type": "error", "message": "cancelled"})
+            raise
+        except SlowConsumerError as e:
+            gateway.stats["slow_consumers"] += 1
+            logger.warning(f"Turno cancelado en {self.session_id}: {e}")
+            self._put_last({"type": "error", "message": "slow_consumer"})
+        except Exception as e:
+            gateway.stats["errors"] += 1
+            logger.error(f"Error en el turno de {self.session_id}: {e}")
+            self._put_last({"type": "error", "message": str(e)})
+
+    async def messages(self) -> AsyncIterator[Dict[str, Any]]:
+        """Mensajes del turno, con latidos mientras no hay nada que enviar."""
+        while True:
+            try:
+                message = await asyncio.wait_for(self.queue.get(), self.gateway.heartbeat)
+            except asyncio.TimeoutError:
+                yield {"type": "ping"}
+                continue
+            yield message
+            if message["type"] in ("done", "error"):
+                return
+
+    async def cancel(self) -> None:
+        """Cancela la ejecución del agente si sigue en curso."""
+        if self.task and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+class StreamingGateway:
+    """
+    Turnos concurrentes de un worker sobre un `Runner` de ADK.
+
+    Args:
+        runner: Runner con `run_async(user_id, session_id, new_message, ...)`
+        session_service: Servicio de sesiones del runner
+        new_message: Convierte el texto del usuario en el mensaje del runner
+        run_config: Configuración de ejecución (streaming de tokens)
+        on_session_end: Recibe el estado de la sesión al cerrarse
+    """
+
+    def __init__(
+        self,
+        runner,
+        session_service,
+        new_message: Callable[[str], Any],
+        run_config: Any = None,
+        app_name: str = APP_NAME,
+        max_concurrent_runs: int = Config.GATEWAY_MAX_CONCURRENT_RUNS,
+        acquire_timeout: float = Config.GATEWAY_ACQUIRE_TIMEOUT_SECONDS,
+        queue_size: int = Config.GATEWAY_QUEUE_SIZE,
+        send_timeout: float = Config.GATEWAY_SEND_TIMEOUT_SECONDS,
+        heartbeat: float = Config.GATEWAY_HEARTBEAT_SECONDS,
+        on_session_end: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.runner = runner
+        self.session_service = session_service
+        self.new_message = new_message
+        self.run_config = run_config
+        self.app_name = app_name
+        self.max_concurrent_runs = max_concurrent_runs
+        self.acquire_timeout = acquire_timeout
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.heartbeat = heartbeat
+        self.on_session_end = on_session_end
+        self._semaphore = asyncio.Semaphore(max_concurrent_runs)
+        self.active = 0
+        self.stats: Dict[str, int] = {
+            "accepted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "slow_consumers": 0,
+            "errors": 0,
+            "coalesced_tokens": 0,
+        }
+
+    # El servicio de sesiones es síncrono (SQL con SESSION_DB_URL): sus
+    # llamadas van a un hilo para no bloquear el resto de conexiones
+
+    def _ensure_session(self, user_id: str, session_id: str) -> None:
+        session = self.session_service.get_session(
+            app_name=self.app_name, user_id=user_id, session_id=session_id
+        )
+        if session is None:
+            self.session_service.create_session(
+                app_name=self.app_name, user_id=user_id, session_id=session_id
+            )
+
+    async def ensure_session(self, user_id: str, session_id: str) -> None:
+        await asyncio.to_thread(self._ensure_session, user_id, session_id)
+
+    def _end_session(self, user_id: str, session_id: str) -> None:
+        session = self.session_service.get_session(
+            app_name=self.app_name, user_id=user_id, session_id=session_id
+        )
+        if session is not None:
+            self.on_session_end(session.state)
+
+    async def end_session(self, user_id: str, session_id: str) -> None:
+        """Cierre de la sesión (el cliente se ha desconectado)."""
+        if self.on_session_end is not None:
+            await asyncio.to_thread(self._end_session, user_id, session_id)
+
+    async def start_turn(self, user_id: str, session_id: str, text: str) -> TurnStream:
+        """
+        Reserva un hueco y arranca el turno.
+
+        Raises:
+            GatewayBusyError: Si no hay hueco en `acquire_timeout` segundos
+        """
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise GatewayBusyError("Demasiados turnos simultáneos")
+        self.active += 1
+        self.stats["accepted"] += 1
+        turn = TurnStream(self, user_id, session_id, text)
+        turn.start()
+        return turn
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "max_concurrent_runs": self.max_concurrent_runs,
+            **self.stats,
+        }
+
+def _session_service():
+    """Sesiones en base de datos si hay `SESSION_DB_URL`; si no, en memoria (un solo worker)."""
+    if Config.SESSION_DB_URL:
+        from google.adk.sessions import DatabaseSessionService
+        return DatabaseSessionService(db_url=Config.SESSION_DB_URL)
+
+    from google.adk.sessions import InMemorySessionService
+    logger.warning(
+        "Sesiones en memoria: ejecuta el gateway con un solo worker o define SESSION_DB_URL"
+    )
+    return InMemorySessionService()
+
+def _default_gateway() -> StreamingGateway:
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    from google.adk.runners import Runner
+    from google.genai import types as genai_types
+
+    from .agent import root_agent
+    from .tools.customer_tools import end_profile_session
+
+    session_service = _session_service()
+    return StreamingGateway(
+        runner=Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service),
+        session_service=session_service,
+        new_message=lambda text: genai_types.Content(
+            role="user", parts=[genai_types.Part(text=text)]
+        ),
+        run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+        on_session_end=end_profile_session,
+    )
+
+def create_app(
+    gateway: Optional[StreamingGateway] = None,
+    authenticate: Callable[[Optional[str]], str] = firebase_principal
+) -> FastAPI:
+    """
+    Crea la app ASGI; sin gateway explícito usa el agente principal.
+
+    Args:
+        gateway: Gateway de turnos
+        authenticate: Convierte el token del cliente en el ID del usuario;
+            lanza `AuthError` si no es válido
+    """
+    app = FastAPI(title="AgentGemini Gateway")
+    state: Dict[str, StreamingGateway] = {}
+
+    async def principal(token: Optional[str]) -> str:
+        # La verificación puede descargar las claves públicas: fuera del bucle
+        return await asyncio.to_thread(authenticate, token)
+
+    def get_gateway() -> StreamingGateway:
+        # Se crea en el primer uso, dentro del bucle de eventos del worker
+        if "gateway" not in state:
+            state["gateway"] = gateway or _default_gateway()
+        return state["gateway"]
+
+    @app.get("/healthz")
+    async def healthz() -> Dict[str, Any]:
+        return get_gateway().get_stats()
+
+    @app.post("/v1/chat/sse")
+    async def chat_sse(
+        request: ChatRequest,
+        authorization: Optional[str] = Header(None)
+    ) -> StreamingResponse:
+        try:
+            user_id = await principal(bearer_token(authorization))
+        except AuthError as e:
+            raise HTTPException(
+                status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"}
+            )
+        try:
+            turn = await get_gateway().start_turn(user_id, request.session_id, request.message)
+        except GatewayBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+        async def body() -> AsyncIterator[str]:
+            try:
+                async for message in turn.messages():
+                    yield format_sse(message)
+            finally:
+                # Desconexión del cliente o fin del turno
+                await turn.cancel()
+
+        return StreamingResponse(
+            body(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    @app.websocket("/v1/chat/ws")
+    async def chat_ws(websocket: WebSocket) -> None:
+        # Los navegadores no envían cabeceras en WebSocket: se admite ?token=
+        token = (
+            bearer_token(websocket.headers.get("authorization"))
+            or websocket.query_params.get("token")
+        )
+        try:
+            user_id = await principal(token)
+        except AuthError:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        await websocket.accept()
+        turn: Optional[TurnStream] = None
+        sender: Optional[asyncio.Task] = None
+        session_ids = set()
+
+        async def pump(current: TurnStream) -> None:
+            async for message in current.messages():
+                await websocket.send_json(message)
+
+        try:
+            while True:
+                request = await websocket.receive_json()
+                if request.get("type") == "cancel":
+                    if turn:
+                        # El turno cerrará su stream con un error "cancelled"
+                        await turn.cancel()
+                    continue
+                if sender and not sender.done():
+                    await websocket.send_json({"type": "error", "message": "turn_in_progress"})
+                    continue
+                try:
+                    chat = ChatRequest(**request)
+                    turn = await get_gateway().start_turn(user_id, chat.session_id, chat.message)
+                except GatewayBusyError:
+                    await websocket.send_json({"type": "error", "message": "busy"})
+                    continue
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "message": str(e)})
+                    continue
+                session_ids.add(chat.session_id)
+                sender = asyncio.create_task(pump(turn))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if sender:
+                sender.cancel()
+            if turn:
+                await turn.cancel()
+            # La conexión es la sesión: se cierran las que se han usado
+            for session_id in session_ids:
+                try:
+                    await get_gateway().end_session(user_id, session_id)
+                except Exception as e:
+                    logger.error(f"Error cerrando la sesión {session_id}: {e}")
+
+    return app
+
+app = create_app()
@@ -7,6 +7,72 @@ from datetime import datetime
 from pydantic import BaseModel, Field
 from enum import Enum
 
+# Versión del esquema de los modelos. Se incrementa al cambiar cualquier campo
+# para que los datos marcados con una versión anterior se validen de nuevo.
+SCHEMA_VERSION = 1
+
+class _TrustedDict(dict):
+    """
+    Diccionario ya validado. La marca (modelo, versión del esquema) no forma
+    parte de los datos: JSON y Firestore ven un dict normal.
+    """
+    __slots__ = ("_trusted_as",)
+    
+    def copy(self) -> "_TrustedDict":
+        result = _TrustedDict(self)
+        result._trusted_as = self._trusted_as
+        return result
+    
+    __copy__ = copy
+    
+    def __reduce__(self):
+        # Fuera del proceso (pickle, deepcopy) los datos vuelven a ser no validados
+        return (dict, (dict(self),))
+
+def is_trusted(data: Any, model: type) -> bool:
+    """Indica si `data` se validó como `model` con el esquema actual."""
+    return (
+        isinstance(data, _TrustedDict)
+        and data._trusted_as == (model.__qualname__, SCHEMA_VERSION)
+    )
+
+class TrustedModel(BaseModel):
+    """
+    Modelo que se valida una sola vez en la frontera del sistema.
+    
+    `ensure_valid` valida los datos que no lo estaban y devuelve el mismo
+    documento (campos extra y fechas incluidos, sin valores por defecto
+    añadidos) marcado con el modelo y la versión del esquema; los datos ya
+    marcados se devuelven tal cual. Los datos marcados son de solo lectura:
+    los cambios se hacen sobre un dict nuevo (`{**data, ...}`), que se vuelve
+    a validar.
+    """
+    
+    @classmethod
+    def trusted(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Marca como validados datos que acaban de pasar la validación del modelo."""
+        result = _TrustedDict(data)
+        result._trusted_as = (cls.__qualname__, SCHEMA_VERSION)
+        return result
+    
+    def to_trusted_dict(self, **kwargs) -> Dict[str, Any]:
+        """Serializa el modelo (JSON-compatible) marcándolo como ya validado."""
+        kwargs.setdefault("mode", "json")
+        return self.trusted(self.model_dump(**kwargs))
+    
+    @classmethod
+    def ensure_valid(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Datos validados y marcados; solo valida si no lo estaban ya.
+        
+        Raises:
+            ValidationError: Si los datos sin marcar no cumplen el modelo
+        """
+        if is_trusted(data, cls):
+            return data
+        cls.model_validate(data)
+        return cls.trusted(data)
+
 class CustomerType(str, Enum):
     """Tipos de cliente."""
     PARTICULAR = "particular"
@@ -25,7 +91,7 @@ class ProductCategory(str, Enum):
     RECAMBIOS = "recambios"
     SERVICIOS = "servicios"
 
-class Customer(BaseModel):
+class Customer(TrustedModel):
     """Modelo de cliente."""
     id: str
     name: str
@@ -48,7 +114,7 @@ class Customer(BaseModel):
         """Determina si es un cliente leal basado en compras totales."""
         return self.total_purchases >= 10000  # EUR
 
-class Product(BaseModel):
+class Product(TrustedModel):
     """Modelo de producto."""
     id: str
     name: str
@@ -71,7 +137,7 @@ class Product(BaseModel):
         """Verifica si el producto está disponible."""
         return self.stock > 0 or self.lead_time_days is not None
 
-class CartItem(BaseModel):
+class CartItem(TrustedModel):
     """Item en el carrito."""
     product: Product
     quantity: int = 1
@@ -82,7 +148,7 @@ class CartItem(BaseModel):
         """Calcula el subtotal del item."""
         return self.product.price * self.quantity
 
-class Cart(BaseModel):
+class Cart(TrustedModel):
     """Carrito de compras."""
     items: List[CartItem] = Field(default_factory=list)
     discount_codes: List[str] = Field(default_factory=list)
@@ -116,7 +182,28 @@ class Cart(BaseModel):
                 return True
         return False
 
-class ServiceBooking(BaseModel):
+class QuoteLine(TrustedModel):
+    """Línea de un presupuesto."""
+    product_id: str
+    name: str
+    quantity: int
+    unit_price: float
+    subtotal: float
+
+class PriceQuote(TrustedModel):
+    """Presupuesto calculado para un carrito."""
+    lines: List[QuoteLine] = Field(default_factory=list)
+    subtotal: float = 0.0
+    discount_amount: float = 0.0
+    discount_reason: Optional[str] = None
+    applied_discount_code: Optional[str] = None
+    financing_surcharge: float = 0.0
+    tax_amount: float = 0.0
+    total: float = 0.0
+    currency: str = "EUR"
+    customer_tier: str = "standard"
+
+class ServiceBooking(TrustedModel):
     """Reserva de servicio."""
     id: str
     customer_id: str
@@ -125,10 +212,12 @@ class ServiceBooking(BaseModel):
     scheduled_date: datetime
     duration_minutes: int = 60
     location: str
+    region: Optional[str] = None
+    technician_id: Optional[str] = None
     notes: Optional[str] = None
     status: str = "scheduled"
 
-class SessionState(BaseModel):
+class SessionState(TrustedModel):
     """Estado de la sesión del agente."""
     customer: Optional[Customer] = None
     cart: Cart = Field(default_factory=Cart)
@@ -139,10 +228,10 @@ class SessionState(BaseModel):
     language: str = "es"
     
     def to_dict(self) -> Dict[str, Any]:
-        """Convierte el estado a diccionario."""
-        return self.model_dump(exclude_none=True)
+        """Convierte el estado a diccionario (marcado como ya validado)."""
+        return self.to_trusted_dict(exclude_none=True)
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> "SessionState":
         """Crea una instancia desde un diccionario."""
-        return cls(**data)
\ No newline at end of file
+        return cls.model_validate(data)
\ No newline at end of file
@@ -42,6 +42,10 @@ vehículos industriales y soluciones integrales para el campo.
 - Agenda servicios con `schedule_service`
 - Ofrece descuentos con `generate_discount_code` para clientes leales
 
+### Herramientas por Etapa
+- En cada etapa solo verás las herramientas relevantes
+- Si necesitas una que no está disponible, llama a `request_additional_tools`
+
 ## Estilo de Comunicación
 
 - **Tono**: Profesional pero cercano, como un asesor de confianza
@@ -118,4 +122,13 @@ PROMPTS = {
     mantenimiento preventivo. Incluye {service_details} y te asegura máxima 
     disponibilidad durante las campañas críticas.
     """
-}
\ No newline at end of file
+}
+
+# Se añade a la instrucción cuando Firestore no responde y el turno usa datos locales
+DEGRADED_MODE_NOTICE = """
+Aviso del sistema: la base de datos no responde ({collections}). Los datos de
+este turno salen de la última copia local y pueden estar desactualizados:
+no garantices precios ni disponibilidad, y si el cliente hace cambios o un
+pedido, dile que quedan registrados y se confirmarán en cuanto el sistema se
+recupere.
+"""
@@ -1,13 +1,36 @@
 """
 Servicios backend para AgentGemini.
+
+Cada servicio se importa al usarlo por primera vez, para que importar el
+paquete no cargue Firestore, numpy ni google.adk.
 """
 
-from .firestore_service import FirestoreService
-from .email_service import EmailService
-from .recommendation_service import RecommendationService
+import importlib
+
+_SERVICE_MODULES = {
+    "FirestoreService": ".firestore_service",
+    "EmailService": ".email_service",
+    "RecommendationService": ".recommendation_service",
+    "DiscountService": ".discount_service",
+    "PricingService": ".pricing_service",
+    "BookingCalendar": ".booking_calendar",
+    "SemanticResponseCache": ".response_cache",
+}
 
 __all__ = [
     "FirestoreService",
     "EmailService",
-    "RecommendationService"
-]
\ No newline at end of file
+    "RecommendationService",
+    "DiscountService",
+    "PricingService",
+    "BookingCalendar",
+    "SemanticResponseCache"
+]
+
+def __getattr__(name):
+    module = _SERVICE_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
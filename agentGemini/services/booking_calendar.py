@@ -0,0 +1,363 @@
+"""
+Calendario de reservas de servicio técnico por técnico y región.
+"""
+
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, Any, List, Optional
+from datetime import datetime, date, timedelta
+
+from ..config import Config
+from .firestore_service import FirestoreService, SlotTakenError
+
+logger = logging.getLogger(__name__)
+
+def normalize_region(value: Optional[str]) -> str:
+    """Normaliza una región o ubicación para usarla como clave."""
+    if not value:
+        return ""
+    text = unicodedata.normalize("NFKD", value.strip().lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+def _padded_words(value: str) -> str:
+    # " finca en jaen andalucia " para buscar regiones como palabras completas
+    return " " + " ".join(re.findall(r"\w+", value)) + " "
+
+class BookingCalendar:
+    """
+    Índice de ocupación de técnicos sobre el horizonte de reservas.
+    
+    Cada técnico tiene un bitmap (un `int` de Python) con un bit por hueco
+    de `SERVICE_DURATION_MINUTES` dentro del horario laboral de los próximos
+    `SERVICE_BOOKING_DAYS_AHEAD` días; un bit a 1 significa ocupado. Los fines
+    de semana forman parte de una máscara de cierre común. Comprobar conflictos
+    y buscar los primeros huecos libres se resuelve con operaciones de bits
+    sobre ese entero, sin recorrer reservas.
+    
+    Las reservas se cargan en bloque desde `service_bookings` la primera vez
+    que se usa el calendario, cada vez que cambia el día base del horizonte y
+    cada `SERVICE_CALENDAR_REFRESH_SECONDS`, para ver las reservas hechas en
+    otros workers. Una carga sin técnicos (colección vacía o lectura fallida) no se guarda:
+    se reintenta pasados `SERVICE_CALENDAR_RETRY_SECONDS` y, mientras tanto,
+    el calendario no tiene técnicos y las reservas se crean sin asignar.
+    """
+    
+    def __init__(self, db_service: FirestoreService, days_ahead: Optional[int] = None):
+        self.db_service = db_service
+        self.days_ahead = days_ahead or Config.SERVICE_BOOKING_DAYS_AHEAD
+        self.slot_minutes = Config.SERVICE_DURATION_MINUTES
+        self.day_start = Config.SERVICE_WORKDAY_START_HOUR
+        self.slots_per_day = (
+            (Config.SERVICE_WORKDAY_END_HOUR - Config.SERVICE_WORKDAY_START_HOUR) * 60
+            // self.slot_minutes
+        )
+        self.total_slots = (self.days_ahead + 1) * self.slots_per_day
+        
+        self._lock = threading.RLock()
+        self._base_date: Optional[date] = None
+        self._closed_mask = 0
+        self._busy: Dict[str, int] = {}
+        self._technicians: Dict[str, Dict[str, Any]] = {}
+        self._regions: Dict[str, List[str]] = {}
+        self._retry_at = 0.0
+        self._refresh_at = 0.0
+    
+    # Carga
+    
+    def load(self) -> bool:
+        """
+        Carga técnicos y reservas del horizonte en una sola pasada.
+        
+        Returns:
+            False si no se obtuvo ningún técnico; en ese caso el calendario
+            queda vacío y se vuelve a cargar en el siguiente reintento
+        """
+        base = date.today()
+        start = datetime.combine(base, datetime.min.time())
+        end = start + timedelta(days=self.days_ahead + 1)
+        
+        technicians = self.db_service.get_technicians()
+        if not technicians:
+            logger.warning(
+                "Calendario de servicios sin técnicos: las reservas se crean sin asignar"
+            )
+            with self._lock:
+                self._base_date = None
+                self._technicians = {}
+                self._busy = {}
+                self._regions = {}
+                self._retry_at = time.monotonic() + Config.SERVICE_CALENDAR_RETRY_SECONDS
+            return False
+        bookings = self.db_service.get_service_bookings(start, end)
+        
+        with self._lock:
+            self._base_date = base
+            self._refresh_at = time.monotonic() + Config.SERVICE_CALENDAR_REFRESH_SECONDS
+            self._closed_mask = self._build_closed_mask(base)
+            self._technicians = {t["id"]: t for t in technicians}
+            self._busy = {t["id"]: 0 for t in technicians}
+            self._regions = {}
+            for tech in technicians:
+                for region in tech.get("regions") or [tech.get("region")]:
+                    key = normalize_region(region)
+                    if key:
+                        self._regions.setdefault(key, []).append(tech["id"])
+            
+            for booking in bookings:
+                tech_id = booking.get("technician_id")
+                scheduled = booking.get("scheduled_date")
+                if tech_id not in self._busy or not scheduled:
+                    continue
+                if isinstance(scheduled, str):
+                    scheduled = datetime.fromisoformat(scheduled)
+                if scheduled.tzinfo is not None:
+                    scheduled = scheduled.astimezone().replace(tzinfo=None)
+                first = self.slot_index(scheduled)
+                if first is None:
+                    continue
+                count = self._slot_count(booking.get("duration_minutes", self.slot_minutes))
+                self._busy[tech_id] |= self._range_mask(first, count)
+        
+        logger.info(
+            f"Calendario de servicios cargado: {len(technicians)} técnicos, "
+            f"{len(bookings)} reservas"
+        )
+        return True
+    
+    def _ensure_loaded(self) -> bool:
+        """Carga el calendario si hace falta; False si no hay técnicos cargados."""
+        if self._base_date == date.today() and time.monotonic() < self._refresh_at:
+            return True
+        if self._base_date is None and time.monotonic() < self._retry_at:
+            return False
+        return self.load()
+    
+    def _build_closed_mask(self, base: date) -> int:
+        mask = 0
+        day_mask = (1 << self.slots_per_day) - 1
+        for offset in range(self.days_ahead + 1):
+            if (base + timedelta(days=offset)).weekday() >= 5:
+                mask |= day_mask << (offset * self.slots_per_day)
+        return mask
+    
+    # Conversión hueco <-> fecha
+    
+    def slot_index(self, when: datetime) -> Optional[int]:
+        """Índice de hueco para una fecha/hora, o None si cae fuera del horario."""
+        offset = (when.date() - self._base_date).days
+        minutes = (when.hour - self.day_start) * 60 + when.minute
+        if offset < 0 or offset > self.days_ahead or minutes < 0:
+            return None
+        slot = minutes // self.slot_minutes
+        if slot >= self.slots_per_day:
+            return None
+        return offset * self.slots_per_day + slot
+    
+    def slot_start(self, index: int) -> datetime:
+        """Fecha/hora de inicio de un hueco."""
+        offset, slot = divmod(index, self.slots_per_day)
+        day = datetime.combine(self._base_date + timedelta(days=offset), datetime.min.time())
+        return day + timedelta(hours=self.day_start, minutes=slot * self.slot_minutes)
+    
+    def slot_key(self, technician_id: str, index: int) -> str:
+        """Clave estable de un hueco, usada como ID del documento de bloqueo."""
+        return f"{technician_id}_{self.slot_start(index).strftime('%Y%m%d%H%M')}"
+    
+    def _slot_count(self, duration_minutes: Optional[int]) -> int:
+        return max(1, math.ceil((duration_minutes or self.slot_minutes) / self.slot_minutes))
+    
+    @staticmethod
+    def _range_mask(first: int, count: int) -> int:
+        return ((1 << count) - 1) << first
+    
+    # Consultas
+    
+    def technicians_for(self, region: Optional[str]) -> List[str]:
+        """
+        Técnicos que cubren una región o una ubicación en texto libre.
+        
+        Una ubicación como "Finca en Jaén, Andalucía" cubre las regiones que
+        aparecen en ella como palabras completas. Sin coincidencia devuelve
+        una lista vacía: nunca se asigna un técnico de otra región.
+        """
+        if not self._ensure_loaded():
+            return []
+        return self._region_technicians(region)
+    
+    def _region_technicians(self, region: Optional[str]) -> List[str]:
+        key = normalize_region(region)
+        with self._lock:
+            if key in self._regions:
+                return list(self._regions[key])
+            location = _padded_words(key)
+            ids: List[str] = []
+            for region_key, region_ids in self._regions.items():
+                if _padded_words(region_key) in location:
+                    ids.extend(i for i in region_ids if i not in ids)
+            return ids
+    
+    def technician_name(self, technician_id: Optional[str]) -> Optional[str]:
+        """Nombre de un técnico, si existe."""
+        with self._lock:
+            return self._technicians.get(technician_id, {}).get("name")
+    
+    def is_free(
+        self,
+        technician_id: str,
+        start: datetime,
+        duration_minutes: Optional[int] = None
+    ) -> bool:
+        """Comprueba si un técnico está libre en un intervalo."""
+        if not self._ensure_loaded():
+            return False
+        return self._is_free(technician_id, start, duration_minutes)
+    
+    def _is_free(
+        self,
+        technician_id: str,
+        start: datetime,
+        duration_minutes: Optional[int]
+    ) -> bool:
+        with self._lock:
+            first = self.slot_index(start)
+            if first is None or technician_id not in self._busy:
+                return False
+            count = self._slot_count(duration_minutes)
+            if first % self.slots_per_day + count > self.slots_per_day:
+                return False
+            mask = self._range_mask(first, count)
+            return not (self._busy[technician_id] | self._closed_mask) & mask
+    
+    def _free_mask(self, technician_id: str, count: int) -> int:
+        """Bits de inicio de hueco donde caben `count` huecos libres seguidos."""
+        full = (1 << self.total_slots) - 1
+        free = ~(self._busy[technician_id] | self._closed_mask) & full
+        fits = free
+        for shift in range(1, count):
+            fits &= free >> shift
+        # Un servicio no puede cruzar el fin de la jornada
+        if count > 1:
+            day_starts = 0
+            valid = (1 << (self.slots_per_day - count + 1)) - 1
+            for offset in range(self.days_ahead + 1):
+                day_starts |= valid << (offset * self.slots_per_day)
+            fits &= day_starts
+        return fits
+    
+    def find_free_slots(
+        self,
+        region: Optional[str] = None,
+        start: Optional[datetime] = None,
+        limit: int = 5,
+        duration_minutes: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Devuelve los primeros `limit` huecos libres a partir de `start`.
+        
+        Returns:
+            Lista de dicts con technician_id, technician_name y start
+        """
+        if not self._ensure_loaded():
+            return []
+        count = self._slot_count(duration_minutes)
+        start = max(start or datetime.now(), datetime.now())
+        
+        with self._lock:
+            from_index = self.slot_index(start)
+            if from_index is None:
+                # Fuera de horario: empezar en el primer hueco del día siguiente
+                offset = (start.date() - self._base_date).days + (start.hour >= self.day_start)
+                from_index = max(offset, 0) * self.slots_per_day
+            if from_index >= self.total_slots:
+                return []
+            
+            candidates: Dict[str, int] = {}
+            for tech_id in self._region_technicians(region):
+                candidates[tech_id] = (self._free_mask(tech_id, count) >> from_index) << from_index
+            
+            results: List[Dict[str, Any]] = []
+            while len(results) < limit:
+                best_tech, best_index = None, None
+                for tech_id, fits in candidates.items():
+                    if not fits:
+                        continue
+                    index = (fits & -fits).bit_length() - 1
+                    if best_index is None or index < best_index:
+                        best_tech, best_index = tech_id, index
+                if best_tech is None:
+                    break
+                # Consumir este índice en todos los técnicos para no repetir hora
+                for tech_id in candidates:
+                    candidates[tech_id] &= ~(1 << best_index)
+                results.append({
+                    "technician_id": best_tech,
+                    "technician_name": self._technicians[best_tech].get("name"),
+                    "start": self.slot_start(best_index)
+                })
+            return results
+    
+    # Reserva
+    
+    def reserve(
+        self,
+        booking_data: Dict[str, Any],
+        region: Optional[str] = None,
+        start: Optional[datetime] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Reserva el primer técnico libre de la región en `start`.
+        
+        El hueco se aparta en memoria bajo el lock (otras reservas de este
+        proceso ya no lo ven libre) y se confirma en Firestore fuera del lock,
+        creando documentos de bloqueo por hueco: una reserva concurrente del
+        mismo hueco en otro proceso falla con `SlotTakenError` y se prueba el
+        siguiente técnico. Si la escritura falla por otro motivo, el hueco se
+        devuelve y el error se propaga.
+        
+        Returns:
+            booking_data con technician_id y scheduled_date asignados, o None
+            si no hay técnico libre en ese hueco
+        """
+        if not self._ensure_loaded():
+            return None
+        start = start or booking_data["scheduled_date"]
+        duration = booking_data.get("duration_minutes")
+        count = self._slot_count(duration)
+        tried = set()
+        
+        while True:
+            with self._lock:
+                first = self.slot_index(start)
+                if first is None:
+                    return None
+                start = self.slot_start(first)
+                mask = self._range_mask(first, count)
+                tech_id = next(
+                    (
+                        t for t in self._region_technicians(region)
+                        if t not in tried and self._is_free(t, start, duration)
+                    ),
+                    None
+                )
+                if tech_id is None:
+                    return None
+                tried.add(tech_id)
+                self._busy[tech_id] |= mask
+            
+            slot_keys = [self.slot_key(tech_id, i) for i in range(first, first + count)]
+            reserved = dict(booking_data, technician_id=tech_id, scheduled_date=start)
+            try:
+                self.db_service.reserve_service_slots(reserved, slot_keys)
+                return reserved
+            except SlotTakenError:
+                # Reservado en otro worker: queda ocupado, probar otro técnico
+                logger.warning(f"Hueco {slot_keys[0]} ya reservado en otro worker")
+            except Exception:
+                with self._lock:
+                    if tech_id in self._busy:
+                        self._busy[tech_id] &= ~mask
+                raise
@@ -0,0 +1,381 @@
+"""
+Circuit breaker por colección y modo degradado para Firestore.
+
+Cada colección tiene su `CircuitBreaker`. Se abre cuando, en la ventana
+reciente, fallan o van lentas demasiadas llamadas. Mientras está abierto las
+llamadas no llegan a Firestore:
+
+- Las lecturas se sirven de la última versión buena conocida
+  (`LastKnownGood`), que guarda cada resultado leído con éxito e incluye un
+  catálogo local de productos para responder búsquedas.
+- Las escrituras que se pueden aplazar se encolan (`DeferredWrites`) y se
+  reproducen en orden cuando el circuito vuelve a cerrarse. Las
+  transaccionales fallan al momento.
+
+Pasado `open_seconds`, una llamada de prueba decide si el circuito se cierra
+o sigue abierto. Las colecciones servidas en modo degradado durante el turno
+se anotan (`stale_collections`) para avisar al modelo de que los datos pueden
+estar desactualizados.
+"""
+
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from ..config import Config
+from .hedged_reads import BudgetExhausted
+from .single_flight import _copy_result, _read_key
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Colecciones servidas en modo degradado en el turno en curso
+_stale_reads: contextvars.ContextVar[Optional[Set[str]]] = contextvars.ContextVar(
+    "firestore_stale_reads", default=None
+)
+# Si la última lectura de este contexto falló o la rechazó el circuito
+_read_failed: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "firestore_read_failed", default=False
+)
+
+class CircuitOpenError(Exception):
+    """El circuito de la colección está abierto y la llamada no se intenta."""
+
+def reset_stale_reads() -> None:
+    """Empieza un turno sin colecciones degradadas."""
+    _stale_reads.set(set())
+
+def mark_stale(collection: str) -> None:
+    stale = _stale_reads.get()
+    if stale is not None:
+        stale.add(collection)
+
+def stale_collections() -> List[str]:
+    """Colecciones servidas desde datos locales o con escrituras aplazadas en este turno."""
+    return sorted(_stale_reads.get() or ())
+
+def mark_read_failed() -> None:
+    _read_failed.set(True)
+
+# Errores de la operación en sí (datos), que no indican un backend caído
+_DATA_ERRORS = {"AlreadyExists", "Conflict", "FailedPrecondition", "NotFound", "InvalidArgument"}
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Si un error cuenta para abrir el circuito."""
+    # BudgetExhausted se decide en local, sin llegar a Firestore
+    if isinstance(error, (ValueError, CircuitOpenError, BudgetExhausted)):
+        return False
+    return type(error).__name__ not in _DATA_ERRORS
+
+class CircuitBreaker:
+    """
+    Circuito de una colección, por tasa de errores o de llamadas lentas.
+
+    Args:
+        name: Colección
+        on_close: Se llama (en un hilo aparte) cuando el circuito se cierra
+    """
+
+    def __init__(self, name: str, on_close: Optional[Callable[[str], None]] = None):
+        self.name = name
+        self.on_close = on_close
+        self.window_seconds = Config.CIRCUIT_WINDOW_SECONDS
+        self.min_calls = Config.CIRCUIT_MIN_CALLS
+        self.failure_ratio = Config.CIRCUIT_FAILURE_RATIO
+        self.slow_call_seconds = Config.CIRCUIT_SLOW_CALL_SECONDS
+        self.slow_ratio = Config.CIRCUIT_SLOW_RATIO
+        self.open_seconds = Config.CIRCUIT_OPEN_SECONDS
+        self._lock = threading.Lock()
+        # (instante, falló, lenta)
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self.state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """
+        Si la llamada puede ir a Firestore (con el circuito medio abierto, solo
+        una de prueba).
+        """
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self.state = STATE_HALF_OPEN
+            if self.state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self) -> None:
+        """Devuelve el permiso de una llamada que no llegó a Firestore, sin anotarla."""
+        with self._lock:
+            if self.state == STATE_HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record(self, failed: bool, seconds: float, bulk: bool = False) -> None:
+        """
+        Anota el resultado de una llamada que se permitió.
+
+        Las lecturas en bloque (`bulk`) son lentas por diseño y no cuentan
+        como llamadas lentas, solo sus errores.
+        """
+        now = time.monotonic()
+        slow = not bulk and seconds >= self.slow_call_seconds
+        closed = False
+        with self._lock:
+            if self.state == STATE_HALF_OPEN:
+                self._probe_in_flight = False
+                if failed or slow:
+                    self._open(now)
+                else:
+                    self.state = STATE_CLOSED
+                    self._calls.clear()
+                    closed = True
+            elif self.state == STATE_CLOSED:
+                self._calls.append((now, failed, slow))
+                while self._calls and now - self._calls[0][0] > self.window_seconds:
+                    self._calls.popleft()
+                total = len(self._calls)
+                if total >= self.min_calls:
+                    failures = sum(1 for _, f, _ in self._calls if f)
+                    slows = sum(1 for _, _, s in self._calls if s)
+                    if failures / total >= self.failure_ratio or slows / total >= self.slow_ratio:
+                        self._open(now)
+        if closed:
+            logger.info(f"Circuito de {self.name} cerrado")
+            if self.on_close is not None:
+                threading.Thread(target=self.on_close, args=(self.name,), daemon=True).start()
+
+    def _open(self, now: float) -> None:
+        if self.state != STATE_OPEN:
+            logger.warning(f"Circuito de {self.name} abierto: Firestore falla o va lento")
+            self.trips += 1
+        self.state = STATE_OPEN
+        self._opened_at = now
+        self._calls.clear()
+
+    def is_closed(self) -> bool:
+        with self._lock:
+            return self.state == STATE_CLOSED
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "trips": self.trips, "rejected": self.rejected}
+
+class LastKnownGood:
+    """
+    Últimos resultados buenos de cada lectura, para servirlos con el circuito
+    abierto. Los productos leídos forman además un catálogo local en el que se
+    resuelven búsquedas y productos sueltos que no se leyeron con esa clave.
+    """
+
+    def __init__(self, max_entries: int = Config.DEGRADED_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._products: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.served = 0
+
+    def _put(self, store: OrderedDict, key: Hashable, value: Any) -> None:
+        store[key] = value
+        store.move_to_end(key)
+        if len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def remember(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._put(self._entries, key, value)
+
+    def remember_products(self, products: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            for product in products:
+                if product and product.get("id"):
+                    self._put(self._products, product["id"], product)
+
+    def patch(self, key: Hashable, fields: Dict[str, Any]) -> None:
+        """Aplica a una entrada cambios escritos mientras el circuito estaba abierto."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if isinstance(entry, dict):
+                self._entries[key] = {**entry, **fields}
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        with self._lock:
+            if key not in self._entries:
+                return False, None
+            self.served += 1
+            return True, self._entries[key]
+
+    def product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            product = self._products.get(product_id)
+            if product is not None:
+                self.served += 1
+            return product
+
+    def search_products(
+        self,
+        query: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        limit: int = 10
+    ) -> List[Dict[str, Any]]:
+        """Búsqueda sobre el catálogo local, con los mismos criterios que la de Firestore."""
+        query_lower = query.lower() if query else None
+        with self._lock:
+            products = list(self._products.values())
+        found = []
+        for product in products:
+            price = product.get("price") or 0
+            if min_price is not None and price < min_price:
+                continue
+            if max_price is not None and price > max_price:
+                continue
+            if filters and not all(
+                (product.get(field) or 0) > value[">"] if isinstance(value, dict) and ">" in value
+                else product.get(field) == value
+                for field, value in filters.items()
+            ):
+                continue
+            if query_lower and not (
+                query_lower in (product.get("name") or "").lower()
+                or query_lower in (product.get("description") or "").lower()
+            ):
+                continue
+            found.append(product)
+            if len(found) >= limit:
+                break
+        if found:
+            with self._lock:
+                self.served += 1
+        return found
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "products": len(self._products),
+                "served": self.served,
+            }
+
+class DeferredWrites:
+    """Escrituras aplazadas por colección, que se reproducen en orden al cerrarse el circuito."""
+
+    def __init__(self, max_pending: int = Config.DEGRADED_WRITE_QUEUE_MAX):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._queues: Dict[str, Deque[Tuple[str, Callable[[], Any]]]] = {}
+        self.deferred = 0
+        self.replayed = 0
+        self.failed_replays = 0
+
+    def defer(self, collection: str, op: str, write: Callable[[], Any]) -> None:
+        """
+        Encola una escritura.
+
+        Raises:
+            CircuitOpenError: Si la cola está llena
+        """
+        with self._lock:
+            if sum(len(queue) for queue in self._queues.values()) >= self.max_pending:
+                raise CircuitOpenError(f"{collection}: cola de escrituras aplazadas llena")
+            self._queues.setdefault(collection, deque()).append((op, write))
+            self.deferred += 1
+
+    def replay(self, collection: str) -> int:
+        """
+        Reproduce las escrituras aplazadas de una colección. Si una falla, se
+        detiene y la deja la primera de la cola para el siguiente intento.
+
+        Returns:
+            Escrituras reproducidas
+        """
+        replayed = 0
+        with self._replay_lock:
+            while True:
+                with self._lock:
+                    queue = self._queues.get(collection)
+                    if not queue:
+                        break
+                    op, write = queue[0]
+                try:
+                    write()
+                except Exception as e:
+                    logger.error(f"Error reproduciendo {op} aplazada en {collection}: {e}")
+                    with self._lock:
+                        self.failed_replays += 1
+                    break
+                with self._lock:
+                    queue.popleft()
+                    self.replayed += 1
+                replayed += 1
+        if replayed:
+            logger.info(f"Reproducidas {replayed} escrituras aplazadas en {collection}")
+        return replayed
+
+    def pending(self) -> Dict[str, int]:
+        with self._lock:
+            return {collection: len(queue) for collection, queue in self._queues.items() if queue}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "deferred": self.deferred,
+                "replayed": self.replayed,
+                "failed_replays": self.failed_replays,
+                "pending": sum(len(queue) for queue in self._queues.values()),
+            }
+
+def degradable(collection: str, fallback: Optional[str] = None) -> Callable:
+    """
+    Decora un método de lectura de `FirestoreService` para que, si la lectura
+    falla o el circuito la rechaza, devuelva la última versión buena conocida.
+
+    `fallback` es el nombre de un método de `LastKnownGood` que se prueba,
+    con los mismos argumentos, cuando no hay resultado guardado para esa
+    llamada exacta.
+    """
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.db:
+                return method(self, *args, **kwargs)
+            key = _read_key(method.__name__, args, kwargs)
+            token = _read_failed.set(False)
+            try:
+                result = method(self, *args, **kwargs)
+                failed = _read_failed.get()
+            finally:
+                _read_failed.reset(token)
+
+            store = self._last_known_good
+            if not failed and (result or self._breaker(collection).is_closed()):
+                if result:
+                    store.remember(key, result)
+                    if collection == "products":
+                        store.remember_products(result if isinstance(result, list) else [result])
+                return result
+
+            found, stale = store.get(key)
+            if not found and fallback is not None:
+                stale = getattr(store, fallback)(*args, **kwargs)
+                found = bool(stale)
+            if not found:
+                return result
+            mark_stale(collection)
+            return _copy_result(stale)
+        return wrapper
+    return decorator
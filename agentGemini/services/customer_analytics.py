@@ -0,0 +1,428 @@
+"""
+Job por lotes de analítica de clientes.
+
+Recalcula desde los pedidos el total de compras, el número de pedidos, la
+fecha del último pedido, los puntos y el nivel de lealtad de cada cliente, y
+corrige la deriva del contador `total_purchases` que `process_checkout`
+mantiene en línea con lectura-modificación-escritura.
+
+Los pedidos se leen por trozos, de un export local (JSON Lines o CSV, también
+comprimidos con gzip) o de Firestore con lecturas paginadas. Cada trozo se
+convierte en columnas de numpy y se agrega con operaciones vectorizadas
+(`bincount`, `maximum.at`), así que el coste por pedido es el de leerlo.
+
+Solo se agregan los pedidos anteriores a un corte fijado antes de leer (o al
+corte con el que se tomó el export). La corrección de cada cliente se escribe
+en una transacción que lee su contador junto con sus pedidos desde el corte y
+les suma lo agregado, así que una compra registrada mientras corre el job (o
+después del export) ni se descuenta ni se pisa: si cambia el cliente durante
+la transacción, Firestore la repite.
+"""
+
+import csv
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+ORDERS_COLLECTION = "orders"
+CUSTOMERS_COLLECTION = "customers"
+
+# Pedidos que no cuentan para el total de compras
+EXCLUDED_ORDER_STATUSES = {"cancelled", "refunded"}
+
+# Transacciones de corrección en paralelo
+WRITE_WORKERS = 16
+
+TIER_STANDARD = "standard"
+TIER_LOYAL = "loyal"
+
+@dataclass
+class OrderChunk:
+    """Trozo de pedidos en columnas."""
+    customer_ids: List[str]
+    totals: np.ndarray
+    created_at: np.ndarray  # segundos epoch, NaN si falta
+
+    def __len__(self) -> int:
+        return len(self.customer_ids)
+
+def _timestamp(value: Any) -> float:
+    if value is None or value == "":
+        return float("nan")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return float("nan")
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float("nan")
+
+def counts_for_totals(order: Dict[str, Any]) -> bool:
+    return bool(order.get("customer_id")) and order.get("status") not in EXCLUDED_ORDER_STATUSES
+
+def _to_chunk(orders: List[Dict[str, Any]], cutoff: Optional[datetime] = None) -> OrderChunk:
+    """Pedidos que cuentan, en columnas. Con `cutoff`, solo los anteriores al corte."""
+    kept = [order for order in orders if counts_for_totals(order)]
+    created_at = np.fromiter(
+        (_timestamp(order.get("created_at")) for order in kept), dtype=np.float64, count=len(kept)
+    )
+    customer_ids = [order["customer_id"] for order in kept]
+    totals = np.fromiter(
+        (float(order.get("total") or 0) for order in kept), dtype=np.float64, count=len(kept)
+    )
+    if cutoff is not None:
+        # Los pedidos sin fecha son anteriores a que se guardara created_at
+        before = ~(created_at >= cutoff.timestamp())
+        if not before.all():
+            customer_ids = [customer_id for customer_id, keep in zip(customer_ids, before) if keep]
+            totals, created_at = totals[before], created_at[before]
+    return OrderChunk(customer_ids=customer_ids, totals=totals, created_at=created_at)
+
+# Fuentes de pedidos
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, encoding="utf-8", newline="")
+
+def export_meta_path(path: str) -> str:
+    return path + ".meta.json"
+
+def read_export_cutoff(path: str) -> Optional[datetime]:
+    """
+    Corte con el que se tomó un export: `cutoff` (ISO 8601) en el fichero
+    `<export>.meta.json`. None si el export no lo indica.
+    """
+    meta_path = export_meta_path(path)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf-8") as f:
+        cutoff = json.load(f).get("cutoff")
+    if not cutoff:
+        return None
+    cutoff = datetime.fromisoformat(cutoff)
+    return cutoff if cutoff.tzinfo else cutoff.replace(tzinfo=timezone.utc)
+
+def write_export_cutoff(path: str, cutoff: datetime) -> None:
+    with open(export_meta_path(path), "w", encoding="utf-8") as f:
+        json.dump({"cutoff": cutoff.isoformat()}, f)
+
+def iter_export_chunks(
+    path: str,
+    chunk_size: int = 100_000,
+    cutoff: Optional[datetime] = None
+) -> Iterator[OrderChunk]:
+    """
+    Pedidos de un export local: JSON Lines (un pedido por línea) o CSV con
+    columnas customer_id, total, created_at y status. Con `cutoff`, solo los
+    anteriores al corte.
+    """
+    csv_format = path.endswith((".csv", ".csv.gz"))
+    with _open_text(path) as f:
+        rows: Iterable[Dict[str, Any]] = csv.DictReader(f) if csv_format else (
+            json.loads(line) for line in f if line.strip()
+        )
+        orders: List[Dict[str, Any]] = []
+        for order in rows:
+            orders.append(order)
+            if len(orders) >= chunk_size:
+                yield _to_chunk(orders, cutoff)
+                orders = []
+        if orders:
+            yield _to_chunk(orders, cutoff)
+
+def iter_firestore_chunks(db, cutoff: datetime, page_size: int = 5000) -> Iterator[OrderChunk]:
+    """
+    Pedidos de Firestore anteriores a `cutoff`, en páginas y trayendo solo los
+    campos necesarios.
+    """
+    query = db.collection(ORDERS_COLLECTION)\
+        .select(["customer_id", "total", "created_at", "status"])\
+        .order_by("__name__")\
+        .limit(page_size)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        if not page:
+            return
+        yield _to_chunk([doc.to_dict() for doc in page], cutoff)
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+# Agregación
+
+@dataclass
+class CustomerAggregates:
+    """Resultados por cliente, alineados por posición."""
+    customer_ids: List[str]
+    totals: np.ndarray
+    order_counts: np.ndarray
+    last_order_at: np.ndarray
+    loyalty_points: np.ndarray
+    loyal: np.ndarray
+
+    def tier(self, i: int) -> str:
+        return TIER_LOYAL if self.loyal[i] else TIER_STANDARD
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "customers": len(self.customer_ids),
+            "orders": int(self.order_counts.sum()),
+            "total_purchases": round(float(self.totals.sum()), 2),
+            "loyal_customers": int(self.loyal.sum()),
+        }
+
+class CustomerAggregator:
+    """
+    Acumula pedidos por cliente. Cada cliente recibe un código entero la
+    primera vez que aparece y los acumuladores son arrays indexados por código.
+    """
+
+    def __init__(self):
+        self._codes: Dict[str, int] = {}
+        self._totals = np.zeros(0, dtype=np.float64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._last = np.zeros(0, dtype=np.float64)
+        self.orders = 0
+
+    def _encode(self, customer_ids: List[str]) -> np.ndarray:
+        codes = self._codes
+        return np.fromiter(
+            (codes.setdefault(customer_id, len(codes)) for customer_id in customer_ids),
+            dtype=np.int64,
+            count=len(customer_ids)
+        )
+
+    def _grow(self, size: int) -> None:
+        if size <= len(self._totals):
+            return
+        extra = max(size, 2 * len(self._totals)) - len(self._totals)
+        self._totals = np.concatenate([self._totals, np.zeros(extra)])
+        self._counts = np.concatenate([self._counts, np.zeros(extra, dtype=np.int64)])
+        self._last = np.concatenate([self._last, np.full(extra, np.nan)])
+
+    def add(self, chunk: OrderChunk) -> None:
+        if not len(chunk):
+            return
+        codes = self._encode(chunk.customer_ids)
+        size = len(self._codes)
+        self._grow(size)
+        self._totals[:size] += np.bincount(codes, weights=chunk.totals, minlength=size)
+        self._counts[:size] += np.bincount(codes, minlength=size)
+        # fmax ignora los NaN de pedidos sin fecha
+        last = np.full(size, np.nan)
+        dated = ~np.isnan(chunk.created_at)
+        np.fmax.at(last, codes[dated], chunk.created_at[dated])
+        self._last[:size] = np.fmax(self._last[:size], last)
+        self.orders += len(chunk)
+
+    def result(self) -> CustomerAggregates:
+        size = len(self._codes)
+        totals = np.round(self._totals[:size], 2)
+        return CustomerAggregates(
+            customer_ids=list(self._codes),
+            totals=totals,
+            order_counts=self._counts[:size].copy(),
+            last_order_at=self._last[:size].copy(),
+            loyalty_points=np.floor(totals * Config.LOYALTY_POINTS_PER_EUR).astype(np.int64),
+            loyal=totals >= Config.LOYALTY_DISCOUNT_THRESHOLD,
+        )
+
+def aggregate(chunks: Iterable[OrderChunk]) -> CustomerAggregates:
+    aggregator = CustomerAggregator()
+    started = time.perf_counter()
+    for chunk in chunks:
+        aggregator.add(chunk)
+    elapsed = time.perf_counter() - started
+    rate = aggregator.orders / max(elapsed, 1e-9)
+    logger.info(f"{aggregator.orders} pedidos agregados en {elapsed:.1f}s ({rate:,.0f}/s)")
+    return aggregator.result()
+
+# Conciliación y escritura
+
+@dataclass
+class Reconciliation:
+    """
+    Diferencias entre lo agregado hasta el corte y los contadores en línea.
+    Las compras posteriores al corte también aparecen como diferencia, así que
+    `changed` marca candidatos: la corrección exacta se decide al escribir.
+    """
+    customer_ids: List[str]
+    expected: CustomerAggregates
+    current_totals: np.ndarray
+    drift: np.ndarray  # calculado - actual
+    changed: np.ndarray  # clientes candidatos a corregir
+
+    def report(self, top: int = 10) -> Dict[str, Any]:
+        drifted = np.abs(self.drift) > Config.ANALYTICS_DRIFT_TOLERANCE
+        order = np.argsort(-np.abs(self.drift))[:top]
+        return {
+            "customers": len(self.customer_ids),
+            "drifted": int(drifted.sum()),
+            "drift_abs_sum": round(float(np.abs(self.drift).sum()), 2),
+            "to_write": int(self.changed.sum()),
+            "top": [
+                {"customer_id": self.customer_ids[i], "drift": round(float(self.drift[i]), 2)}
+                for i in order if drifted[i]
+            ],
+        }
+
+def read_online_counters(db) -> Dict[str, Dict[str, Any]]:
+    """Contadores actuales de todos los clientes."""
+    fields = ["total_purchases", "order_count", "loyalty_points", "loyalty_tier"]
+    return {
+        doc.id: doc.to_dict()
+        for doc in db.collection(CUSTOMERS_COLLECTION).select(fields).stream()
+    }
+
+def reconcile(aggregates: CustomerAggregates, current: Dict[str, Dict[str, Any]]) -> Reconciliation:
+    """
+    Alinea lo calculado con los contadores actuales. Los clientes sin pedidos
+    se incluyen con totales a cero para corregir contadores inflados.
+    """
+    known = set(aggregates.customer_ids)
+    missing = [customer_id for customer_id in current if customer_id not in known]
+    n = len(missing)
+    expected = CustomerAggregates(
+        customer_ids=aggregates.customer_ids + missing,
+        totals=np.concatenate([aggregates.totals, np.zeros(n)]),
+        order_counts=np.concatenate([aggregates.order_counts, np.zeros(n, dtype=np.int64)]),
+        last_order_at=np.concatenate([aggregates.last_order_at, np.full(n, np.nan)]),
+        loyalty_points=np.concatenate([aggregates.loyalty_points, np.zeros(n, dtype=np.int64)]),
+        loyal=np.concatenate([aggregates.loyal, np.zeros(n, dtype=bool)]),
+    )
+    ids = expected.customer_ids
+    empty: Dict[str, Any] = {}
+    current_totals = np.fromiter(
+        (float(current.get(i, empty).get("total_purchases") or 0) for i in ids),
+        dtype=np.float64,
+        count=len(ids)
+    )
+    current_counts = np.fromiter(
+        (int(current.get(i, empty).get("order_count") or 0) for i in ids),
+        dtype=np.int64,
+        count=len(ids)
+    )
+    current_points = np.fromiter(
+        (int(current.get(i, empty).get("loyalty_points") or 0) for i in ids),
+        dtype=np.int64,
+        count=len(ids)
+    )
+    current_loyal = np.fromiter(
+        (current.get(i, empty).get("loyalty_tier") == TIER_LOYAL for i in ids),
+        dtype=bool,
+        count=len(ids)
+    )
+    exists = np.fromiter((i in current for i in ids), dtype=bool, count=len(ids))
+
+    drift = expected.totals - current_totals
+    changed = exists & (
+        (np.abs(drift) > Config.ANALYTICS_DRIFT_TOLERANCE)
+        | (expected.order_counts != current_counts)
+        | (expected.loyalty_points != current_points)
+        | (expected.loyal != current_loyal)
+    )
+    return Reconciliation(ids, expected, current_totals, drift, changed)
+
+def _recent_orders(db, customer_id: str, cutoff: datetime, transaction) -> List[Dict[str, Any]]:
+    """Pedidos del cliente desde el corte que cuentan para el total."""
+    query = db.collection(ORDERS_COLLECTION)\
+        .where("customer_id", "==", customer_id)\
+        .where("created_at", ">=", cutoff)\
+        .select(["customer_id", "total", "created_at", "status"])
+    orders = (doc.to_dict() for doc in query.get(transaction=transaction))
+    return [order for order in orders if counts_for_totals(order)]
+
+def corrected_counters(
+    expected: CustomerAggregates,
+    i: int,
+    recent: List[Dict[str, Any]],
+    current: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Campos que hay que corregir en un cliente: lo agregado hasta el corte más
+    sus pedidos desde el corte, frente a los contadores que tiene ahora.
+    """
+    recent_total = sum(float(order.get("total") or 0) for order in recent)
+    total = round(float(expected.totals[i]) + recent_total, 2)
+    last = expected.last_order_at[i]
+    for order in recent:
+        created_at = _timestamp(order.get("created_at"))
+        last = created_at if np.isnan(last) else np.fmax(last, created_at)
+    counters = {
+        "total_purchases": total,
+        "order_count": int(expected.order_counts[i]) + len(recent),
+        "last_order_at": None if np.isnan(last) else datetime.fromtimestamp(last, timezone.utc),
+        "loyalty_points": int(total * Config.LOYALTY_POINTS_PER_EUR),
+        "loyalty_tier": TIER_LOYAL if total >= Config.LOYALTY_DISCOUNT_THRESHOLD else TIER_STANDARD,
+    }
+    updates = {}
+    for field, value in counters.items():
+        if field == "total_purchases":
+            if abs(value - float(current.get(field) or 0)) > Config.ANALYTICS_DRIFT_TOLERANCE:
+                updates[field] = value
+        elif field != "last_order_at" and current.get(field) != value:
+            updates[field] = value
+    if updates:
+        updates["last_order_at"] = counters["last_order_at"]
+    return updates
+
+def write_back(db, reconciliation: Reconciliation, cutoff: datetime) -> int:
+    """
+    Corrige los clientes que cambian, cada uno en una transacción que lee su
+    contador y sus pedidos desde `cutoff` (necesita el índice compuesto
+    customer_id + created_at de orders).
+
+    Returns:
+        Número de clientes actualizados
+    """
+    from google.cloud import firestore
+
+    expected = reconciliation.expected
+    now = datetime.now(timezone.utc)
+
+    @firestore.transactional
+    def correct(transaction, i: int) -> bool:
+        customer_id = expected.customer_ids[i]
+        ref = db.collection(CUSTOMERS_COLLECTION).document(customer_id)
+        snapshot = ref.get(transaction=transaction)
+        if not snapshot.exists:
+            return False
+        recent = _recent_orders(db, customer_id, cutoff, transaction)
+        updates = corrected_counters(expected, i, recent, snapshot.to_dict() or {})
+        if not updates:
+            return False
+        updates["analytics_updated_at"] = now
+        transaction.update(ref, updates)
+        return True
+
+    def one(i: int) -> bool:
+        try:
+            return correct(db.transaction(), int(i))
+        except Exception as e:
+            logger.error(f"Error corrigiendo el cliente {expected.customer_ids[i]}: {e}")
+            return False
+
+    indices = np.flatnonzero(reconciliation.changed)
+    with ThreadPoolExecutor(WRITE_WORKERS) as pool:
+        updated = sum(pool.map(one, indices))
+    logger.info(f"Clientes actualizados: {updated} de {len(indices)} con diferencias")
+    return updated
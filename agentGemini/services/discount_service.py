@@ -0,0 +1,224 @@
+"""
+Servicio de validación y canje de códigos de descuento.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
+
+from ..config import Config
+from .firestore_service import FirestoreService
+
+logger = logging.getLogger(__name__)
+
+def _parse_datetime(value: Any) -> Optional[datetime]:
+    """Convierte un ISO string o timestamp de Firestore a datetime local sin zona."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value
+
+class DiscountService:
+    """
+    Valida y aplica códigos de descuento.
+    
+    Mantiene en memoria un índice de los códigos activos (código → cliente y
+    caducidad) que solo sirve de pista: los códigos del índice caducados, ya
+    usados o de otro cliente se rechazan sin consultar Firestore, pero un
+    código que no está en el índice (generado en otro worker o después del
+    último refresco) no se rechaza por ello. Todos los candidatos se leen en
+    una única lectura por lotes, que es la que decide.
+    """
+    
+    def __init__(self, db_service: FirestoreService):
+        self.db_service = db_service
+        self._lock = threading.Lock()
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._loaded_at: Optional[float] = None
+    
+    # Índice en memoria
+    
+    def refresh(self) -> None:
+        """
+        Recarga el índice de códigos activos desde Firestore.
+        
+        Si la lectura falla se conserva el índice anterior hasta el siguiente
+        refresco.
+        """
+        codes = self.db_service.get_active_discount_codes()
+        if codes is None:
+            logger.warning(
+                "No se pudo recargar el índice de códigos de descuento; se mantiene el anterior"
+            )
+            with self._lock:
+                self._loaded_at = time.monotonic()
+            return
+        
+        index = {}
+        now = datetime.now()
+        for data in codes:
+            entry = self._index_entry(data)
+            if entry["valid_until"] and entry["valid_until"] < now:
+                continue
+            index[data["code"]] = entry
+        
+        with self._lock:
+            # Conservar los códigos registrados localmente que Firestore aún no devuelve
+            for code, entry in self._index.items():
+                if code not in index and not entry.get("used"):
+                    index[code] = entry
+            self._index = index
+            self._loaded_at = time.monotonic()
+        
+        logger.info(f"Índice de códigos de descuento cargado: {len(index)} activos")
+    
+    def register(self, discount_data: Dict[str, Any]) -> None:
+        """Añade al índice un código recién generado."""
+        code = discount_data["code"]
+        with self._lock:
+            self._index[code] = self._index_entry(discount_data)
+    
+    def _ensure_fresh(self) -> None:
+        loaded_at = self._loaded_at
+        refresh_seconds = Config.DISCOUNT_INDEX_REFRESH_SECONDS
+        if loaded_at is None or time.monotonic() - loaded_at > refresh_seconds:
+            self.refresh()
+    
+    @staticmethod
+    def _index_entry(data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "customer_id": data.get("customer_id"),
+            "percentage": data.get("percentage"),
+            "type": data.get("type"),
+            "valid_until": _parse_datetime(data.get("valid_until")),
+            "used": data.get("used", False)
+        }
+    
+    def _lookup(self, code: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Busca un código en el índice. Devuelve (entrada, motivo de rechazo).
+        
+        Un código ausente del índice devuelve (None, None): no se sabe nada de
+        él y se confirma con la lectura por lotes.
+        """
+        with self._lock:
+            entry = self._index.get(code)
+            if entry is None:
+                return None, None
+            valid_until = entry["valid_until"]
+            if valid_until and valid_until < datetime.now():
+                del self._index[code]
+                return None, "Código caducado"
+            if entry["used"]:
+                return None, "Código ya utilizado"
+            return entry, None
+    
+    # Validación y aplicación
+    
+    def validate_codes(
+        self,
+        codes: List[str],
+        customer_id: Optional[str]
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Valida una lista de códigos para un cliente.
+        
+        Returns:
+            Tupla (códigos válidos con sus datos, códigos rechazados con motivo)
+        """
+        self._ensure_fresh()
+        
+        valid: List[Dict[str, Any]] = []
+        rejected: List[Dict[str, Any]] = []
+        candidates: List[str] = []
+        
+        for raw_code in dict.fromkeys(codes):
+            code = raw_code.strip().upper()
+            entry, reason = self._lookup(code)
+            if reason:
+                rejected.append({"code": raw_code, "reason": reason})
+            elif entry and entry["customer_id"] and entry["customer_id"] != customer_id:
+                rejected.append({"code": raw_code, "reason": "Código no asignado a este cliente"})
+            else:
+                candidates.append(code)
+        
+        if not candidates:
+            return valid, rejected
+        
+        # Una sola lectura por lotes para confirmar el estado real
+        if self.db_service.db:
+            stored = self.db_service.get_discount_codes(candidates)
+        else:
+            with self._lock:
+                stored = {
+                    code: dict(self._index[code], code=code)
+                    for code in candidates if code in self._index
+                }
+        
+        for code in candidates:
+            data = stored.get(code)
+            if not data:
+                rejected.append({"code": code, "reason": "Código no válido"})
+                continue
+            if data.get("used"):
+                with self._lock:
+                    self._index.pop(code, None)
+                rejected.append({"code": code, "reason": "Código ya utilizado"})
+                continue
+            if data.get("customer_id") and data["customer_id"] != customer_id:
+                rejected.append({"code": code, "reason": "Código no asignado a este cliente"})
+                continue
+            valid_until = _parse_datetime(data.get("valid_until"))
+            if valid_until and valid_until < datetime.now():
+                rejected.append({"code": code, "reason": "Código caducado"})
+                continue
+            valid.append({
+                "code": code,
+                "type": data.get("type"),
+                "percentage": float(data.get("percentage") or 0)
+            })
+        
+        return valid, rejected
+    
+    def select_code(
+        self,
+        codes: List[str],
+        customer_id: Optional[str]
+    ) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Elige el código a aplicar entre los del carrito.
+        
+        Los códigos no son acumulables: se elige el de mayor porcentaje.
+        
+        Returns:
+            Tupla (código elegido o None, códigos rechazados con motivo)
+        """
+        valid, rejected = self.validate_codes(codes, customer_id)
+        if not valid:
+            return None, rejected
+        
+        best = max(valid, key=lambda c: c["percentage"])
+        for other in valid:
+            if other is not best:
+                rejected.append(
+                    {"code": other["code"], "reason": "No acumulable con otras ofertas"}
+                )
+        return best, rejected
+    
+    def mark_used(self, codes: List[str]) -> None:
+        """Marca en el índice local los códigos canjeados tras el commit."""
+        with self._lock:
+            for code in codes:
+                entry = self._index.get(code)
+                if entry:
+                    entry["used"] = True
@@ -3,86 +3,297 @@ Servicio para interactuar con Firestore.
 """
 
 import logging
-from typing import Dict, Any, List, Optional
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional, TypeVar
 from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, firestore
 
 from ..config import Config
+from ..models import Customer, Product
+from .single_flight import SingleFlight, EarlyRefreshCache, coalesced_read, cached_read, _read_key
+from .hedged_reads import Attempt, BudgetExhausted, HedgedReader
+from .circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeferredWrites,
+    LastKnownGood,
+    degradable,
+    is_backend_failure,
+    mark_read_failed,
+    mark_stale,
+)
+from .identity_index import (
+    IDENTITY_FIELDS,
+    KIND_EMAIL,
+    KIND_PHONE,
+    IdentityIndex,
+    identity_fields,
+    normalize_identity,
+)
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+class SlotTakenError(Exception):
+    """Algún hueco de la reserva ya existe: lo ha ocupado otra reserva."""
+
+# Errores de Firestore al crear un documento que ya existe
+_CONFLICT_ERRORS = {"AlreadyExists", "Conflict"}
+
+# firebase_admin es lento de importar: se carga al conectar, no al importar el módulo
+firebase_admin = None
+credentials = None
+firestore = None
+
+def _import_firebase() -> None:
+    global firebase_admin, credentials, firestore
+    if firestore is None:
+        import firebase_admin as _firebase_admin
+        from firebase_admin import credentials as _credentials, firestore as _firestore
+        firebase_admin, credentials, firestore = _firebase_admin, _credentials, _firestore
+
+def ensure_firebase_app() -> None:
+    """Inicializa la app de Firebase con las credenciales por defecto, una sola vez."""
+    _import_firebase()
+    if not firebase_admin._apps:
+        cred = credentials.ApplicationDefault()
+        firebase_admin.initialize_app(cred, {
+            'projectId': Config.GOOGLE_CLOUD_PROJECT,
+        })
+
+def _validated(model_cls: type, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Valida un documento una sola vez, al leerlo, y lo marca como confiable: la
+    caché de lecturas guarda la versión marcada y las herramientas no revalidan.
+    """
+    try:
+        return model_cls.ensure_valid(data)
+    except ValueError as e:
+        logger.warning(f"Documento {data.get('id')} no cumple {model_cls.__name__}: {e}")
+        return data
+
 class FirestoreService:
     """
     Servicio para operaciones con Firestore.
+    
+    Cada colección tiene un circuit breaker. Con el circuito abierto las
+    lecturas devuelven la última versión buena conocida y las escrituras que
+    se pueden aplazar se encolan hasta que Firestore se recupere.
     """
     
     def __init__(self):
-        """Inicializa la conexión con Firestore."""
+        """Prepara el servicio; la conexión se abre en la primera operación."""
+        self._single_flight = SingleFlight()
+        self._read_cache = EarlyRefreshCache(
+            Config.CACHE_TTL_SECONDS,
+            beta=Config.CACHE_EARLY_REFRESH_BETA
+        )
+        self._identity_index = IdentityIndex()
+        self._reads = HedgedReader()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._last_known_good = LastKnownGood()
+        self._deferred_writes = DeferredWrites()
+        self._db = None
+        self._connected = False
+        self._connect_lock = threading.Lock()
+    
+    @property
+    def db(self):
+        """Cliente de Firestore, o None en desarrollo sin credenciales."""
+        if not self._connected:
+            with self._connect_lock:
+                if not self._connected:
+                    self._db = self._connect()
+                    self._connected = True
+        return self._db
+    
+    def _connect(self):
         try:
-            # Inicializar Firebase si no está ya inicializado
-            if not firebase_admin._apps:
-                cred = credentials.ApplicationDefault()
-                firebase_admin.initialize_app(cred, {
-                    'projectId': Config.GOOGLE_CLOUD_PROJECT,
-                })
-            
-            self.db = firestore.client(database=Config.FIRESTORE_DATABASE)
+            ensure_firebase_app()
+            db = firestore.client(database=Config.FIRESTORE_DATABASE)
             logger.info("Firestore inicializado correctamente")
+            return db
             
         except Exception as e:
             logger.error(f"Error inicializando Firestore: {e}")
             # En desarrollo, usar mock
-            self.db = None
+            return None
+    
+    # Circuit breaker y modo degradado
+    
+    def _breaker(self, collection: str) -> CircuitBreaker:
+        breaker = self._breakers.get(collection)
+        if breaker is None:
+            with self._connect_lock:
+                breaker = self._breakers.get(collection)
+                if breaker is None:
+                    breaker = self._breakers[collection] = CircuitBreaker(
+                        collection, self._deferred_writes.replay
+                    )
+        return breaker
+    
+    def _read(self, collection: str, op: str, fn: Callable[[Attempt], T], bulk: bool = False) -> T:
+        """
+        Lectura con plazo y hedging, si el circuito de la colección la permite.
+        
+        `bulk` marca las lecturas de muchos documentos, que no cuentan como
+        lentas para el circuito.
+        """
+        breaker = self._breaker(collection)
+        if not breaker.allow():
+            mark_read_failed()
+            raise CircuitOpenError(collection)
+        started = time.monotonic()
+        try:
+            result = self._reads.read(op, fn)
+        except BudgetExhausted:
+            # Rechazada en local: Firestore no llegó a recibirla
+            breaker.release()
+            mark_read_failed()
+            raise
+        except Exception as e:
+            breaker.record(is_backend_failure(e), time.monotonic() - started, bulk)
+            mark_read_failed()
+            raise
+        breaker.record(False, time.monotonic() - started, bulk)
+        return result
+    
+    def _write(
+        self,
+        collection: str,
+        op: str,
+        write: Callable[[], Any],
+        deferrable: bool = True
+    ) -> bool:
+        """
+        Escritura a través del circuito de la colección.
+        
+        Returns:
+            True si se escribió, False si se aplazó
+        
+        Raises:
+            CircuitOpenError: Si el circuito está abierto y no se puede aplazar
+        """
+        breaker = self._breaker(collection)
+        if not breaker.allow():
+            if not deferrable:
+                raise CircuitOpenError(collection)
+            self._deferred_writes.defer(collection, op, write)
+            mark_stale(collection)
+            return False
+        started = time.monotonic()
+        try:
+            write()
+        except Exception as e:
+            breaker.record(is_backend_failure(e), time.monotonic() - started)
+            raise
+        breaker.record(False, time.monotonic() - started)
+        return True
+    
+    def get_degraded_stats(self) -> Dict[str, Any]:
+        """Estado de los circuitos, lecturas servidas en local y escrituras aplazadas."""
+        return {
+            "circuits": {name: breaker.get_stats() for name, breaker in self._breakers.items()},
+            "last_known_good": self._last_known_good.get_stats(),
+            "deferred_writes": self._deferred_writes.get_stats()
+        }
     
     # Métodos para Clientes
     
+    @degradable('customers')
+    @coalesced_read
     def get_customer(self, customer_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene un cliente por ID."""
         if not self.db:
             return self._mock_customer(customer_id)
         
         try:
-            doc = self.db.collection('customers').document(customer_id).get()
+            ref = self.db.collection('customers').document(customer_id)
+            doc = self._read(
+                'customers', 'get_customer', lambda attempt: ref.get(timeout=attempt.timeout())
+            )
             if doc.exists:
                 data = doc.to_dict()
                 data['id'] = doc.id
-                return data
+                return _validated(Customer, data)
             return None
         except Exception as e:
             logger.error(f"Error obteniendo cliente {customer_id}: {e}")
             return None
     
     def get_customer_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        """Busca un cliente por email."""
+        """Busca un cliente por email (sin distinguir mayúsculas)."""
+        return self._resolve_customer(KIND_EMAIL, email)
+    
+    def get_customer_by_phone(self, phone: str) -> Optional[Dict[str, Any]]:
+        """Busca un cliente por teléfono, en cualquier formato habitual."""
+        return self._resolve_customer(KIND_PHONE, phone)
+    
+    def _resolve_customer(self, kind: str, value: str) -> Optional[Dict[str, Any]]:
+        """
+        Resuelve un identificador con el índice en memoria y solo consulta
+        Firestore si no está indexado.
+        """
+        normalized = normalize_identity(kind, value)
+        if normalized is None:
+            return None
+        
+        found, customer_id = self._identity_index.lookup(kind, normalized)
+        if found:
+            if customer_id is None:
+                return None
+            customer = self.get_customer(customer_id)
+            # El cliente pudo cambiar de email/teléfono desde otro worker
+            if customer and normalize_identity(kind, customer.get(kind)) == normalized:
+                return customer
+            self._identity_index.forget(kind, normalized)
+        
+        customer = self._query_customer_by_identity(kind, normalized)
+        self._identity_index.remember(kind, normalized, customer['id'] if customer else None)
+        return customer
+    
+    @degradable('customers')
+    @coalesced_read
+    def _query_customer_by_identity(self, kind: str, normalized: str) -> Optional[Dict[str, Any]]:
+        """
+        Consulta por el campo normalizado. Los clientes anteriores a estos
+        campos se completan con `scripts/backfill_identity_fields.py`.
+        """
         if not self.db:
-            return self._mock_customer_by_email(email)
+            return self._mock_customer_by_identity(kind, normalized)
         
         try:
-            customers = self.db.collection('customers')\
-                .where('email', '==', email)\
-                .limit(1)\
-                .get()
-            
-            for doc in customers:
+            query = self.db.collection('customers').where(
+                IDENTITY_FIELDS[kind], '==', normalized
+            ).limit(1)
+            docs = self._read(
+                'customers',
+                'query_customer_by_identity',
+                lambda attempt: query.get(timeout=attempt.timeout())
+            )
+            for doc in docs:
                 data = doc.to_dict()
                 data['id'] = doc.id
-                return data
-            
+                return _validated(Customer, data)
             return None
         except Exception as e:
-            logger.error(f"Error buscando cliente por email {email}: {e}")
+            logger.error(f"Error buscando cliente por {kind} {normalized}: {e}")
             return None
     
     def create_customer(self, customer_data: Dict[str, Any]) -> str:
         """Crea un nuevo cliente."""
+        customer_data.update(identity_fields(customer_data))
         if not self.db:
-            return f"cust_{datetime.now().timestamp()}"
+            customer_id = f"cust_{datetime.now().timestamp()}"
+            self._identity_index.remember_customer(customer_id, customer_data)
+            return customer_id
         
         try:
             doc_ref = self.db.collection('customers').document()
             customer_data['created_at'] = firestore.SERVER_TIMESTAMP
-            doc_ref.set(customer_data)
+            self._write('customers', 'create_customer', lambda: doc_ref.set(customer_data))
+            self._identity_index.remember_customer(doc_ref.id, customer_data)
             return doc_ref.id
         except Exception as e:
             logger.error(f"Error creando cliente: {e}")
@@ -90,34 +301,51 @@ class FirestoreService:
     
     def update_customer(self, customer_id: str, updates: Dict[str, Any]) -> None:
         """Actualiza un cliente."""
+        updates.update(identity_fields(updates))
         if not self.db:
+            self._identity_index.remember_customer(customer_id, updates)
             return
         
         try:
             updates['updated_at'] = firestore.SERVER_TIMESTAMP
-            self.db.collection('customers').document(customer_id).update(updates)
+            ref = self.db.collection('customers').document(customer_id)
+            if not self._write('customers', 'update_customer', lambda: ref.update(updates)):
+                # Que las lecturas degradadas vean ya los cambios aplazados
+                self._last_known_good.patch(
+                    _read_key('get_customer', (customer_id,), {}),
+                    {k: v for k, v in updates.items() if k != 'updated_at'}
+                )
+            self._identity_index.remember_customer(customer_id, updates)
         except Exception as e:
             logger.error(f"Error actualizando cliente {customer_id}: {e}")
             raise
     
     # Métodos para Productos
     
+    # El stock y el precio cambian fuera de este servicio: TTL corto en lugar del general
+    @degradable('products', fallback='product')
+    @cached_read(ttl_seconds=Config.PRODUCT_CACHE_TTL_SECONDS)
     def get_product(self, product_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene un producto por ID."""
         if not self.db:
             return self._mock_product(product_id)
         
         try:
-            doc = self.db.collection('products').document(product_id).get()
+            ref = self.db.collection('products').document(product_id)
+            doc = self._read(
+                'products', 'get_product', lambda attempt: ref.get(timeout=attempt.timeout())
+            )
             if doc.exists:
                 data = doc.to_dict()
                 data['id'] = doc.id
-                return data
+                return _validated(Product, data)
             return None
         except Exception as e:
             logger.error(f"Error obteniendo producto {product_id}: {e}")
             return None
     
+    @degradable('products', fallback='search_products')
+    @cached_read(ttl_seconds=Config.PRODUCT_CACHE_TTL_SECONDS)
     def search_products(
         self,
         query: Optional[str] = None,
@@ -151,7 +379,11 @@ class FirestoreService:
             collection = collection.limit(limit)
             
             # Ejecutar query
-            docs = collection.get()
+            docs = self._read(
+                'products',
+                'search_products',
+                lambda attempt: collection.get(timeout=attempt.timeout())
+            )
             
             products = []
             for doc in docs:
@@ -163,9 +395,9 @@ class FirestoreService:
                     query_lower = query.lower()
                     if (query_lower in data.get('name', '').lower() or
                         query_lower in data.get('description', '').lower()):
-                        products.append(data)
+                        products.append(_validated(Product, data))
                 else:
-                    products.append(data)
+                    products.append(_validated(Product, data))
             
             return products[:limit]
             
@@ -173,6 +405,25 @@ class FirestoreService:
             logger.error(f"Error buscando productos: {e}")
             return []
     
+    async def get_customer_async(self, customer_id: str) -> Optional[Dict[str, Any]]:
+        """Versión asyncio de `get_customer`, coalescida entre tareas."""
+        key = ("async", "get_customer", customer_id)
+        return await self._single_flight.do_async(key, lambda: self.get_customer(customer_id))
+    
+    async def get_product_async(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """Versión asyncio de `get_product`, coalescida entre tareas."""
+        key = ("async", "get_product", product_id)
+        return await self._single_flight.do_async(key, lambda: self.get_product(product_id))
+    
+    def get_read_stats(self) -> Dict[str, Any]:
+        """Métricas de coalescencia, caché de lecturas y lecturas duplicadas."""
+        return {
+            "single_flight": self._single_flight.get_stats(),
+            "read_cache": self._read_cache.get_stats(),
+            "identity_index": self._identity_index.get_stats(),
+            "hedged_reads": self._reads.get_stats()
+        }
+    
     # Métodos para Pedidos
     
     def create_order(self, order_data: Dict[str, Any]) -> str:
@@ -189,7 +440,7 @@ class FirestoreService:
                 order_data['id'] = doc_ref.id
             
             order_data['created_at'] = firestore.SERVER_TIMESTAMP
-            doc_ref.set(order_data)
+            self._write('orders', 'create_order', lambda: doc_ref.set(order_data))
             return doc_ref.id
         except Exception as e:
             logger.error(f"Error creando pedido: {e}")
@@ -211,12 +462,108 @@ class FirestoreService:
                 booking_data['id'] = doc_ref.id
             
             booking_data['created_at'] = firestore.SERVER_TIMESTAMP
-            doc_ref.set(booking_data)
+            self._write(
+                'service_bookings', 'create_service_booking', lambda: doc_ref.set(booking_data)
+            )
             return doc_ref.id
         except Exception as e:
             logger.error(f"Error creando reserva de servicio: {e}")
             raise
     
+    @degradable('service_bookings')
+    def get_service_bookings(self, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """Obtiene en bloque las reservas activas entre dos fechas."""
+        if not self.db:
+            return []
+        
+        try:
+            query = self.db.collection('service_bookings')\
+                .where('scheduled_date', '>=', start)\
+                .where('scheduled_date', '<', end)
+            docs = self._read(
+                'service_bookings',
+                'get_service_bookings',
+                lambda attempt: query.get(timeout=attempt.timeout()),
+                bulk=True
+            )
+            
+            bookings = []
+            for doc in docs:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                if data.get('status') != 'cancelled':
+                    bookings.append(data)
+            return bookings
+        except Exception as e:
+            logger.error(f"Error obteniendo reservas de servicio: {e}")
+            return []
+    
+    @degradable('technicians')
+    def get_technicians(self) -> List[Dict[str, Any]]:
+        """Obtiene los técnicos activos con sus regiones."""
+        if not self.db:
+            return self._mock_technicians()
+        
+        try:
+            query = self.db.collection('technicians').where('active', '==', True)
+            docs = self._read(
+                'technicians',
+                'get_technicians',
+                lambda attempt: query.get(timeout=attempt.timeout()),
+                bulk=True
+            )
+            technicians = []
+            for doc in docs:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                technicians.append(data)
+            return technicians
+        except Exception as e:
+            logger.error(f"Error obteniendo técnicos: {e}")
+            return []
+    
+    def reserve_service_slots(
+        self,
+        booking_data: Dict[str, Any],
+        slot_keys: List[str]
+    ) -> str:
+        """
+        Crea una reserva junto con sus documentos de hueco en un único batch.
+        
+        Los huecos se crean con `create`, que falla si ya existen, de modo que
+        dos procesos no pueden reservar el mismo hueco de un técnico.
+        
+        Raises:
+            SlotTakenError: Si algún hueco ya estaba reservado
+        """
+        if not self.db:
+            return booking_data.get('id', f"booking_{datetime.now().timestamp()}")
+        
+        try:
+            booking_id = booking_data.get('id')
+            if booking_id:
+                doc_ref = self.db.collection('service_bookings').document(booking_id)
+            else:
+                doc_ref = self.db.collection('service_bookings').document()
+                booking_data['id'] = doc_ref.id
+            
+            batch = self.db.batch()
+            for slot_key in slot_keys:
+                batch.create(
+                    self.db.collection('service_slots').document(slot_key),
+                    {'booking_id': doc_ref.id, 'created_at': firestore.SERVER_TIMESTAMP}
+                )
+            booking_data['created_at'] = firestore.SERVER_TIMESTAMP
+            batch.set(doc_ref, booking_data)
+            # Los huecos se comprueban al escribir: no se puede aplazar
+            self._write('service_slots', 'reserve_service_slots', batch.commit, deferrable=False)
+            return doc_ref.id
+        except Exception as e:
+            if type(e).__name__ in _CONFLICT_ERRORS:
+                raise SlotTakenError(slot_keys[0]) from e
+            logger.error(f"Error reservando huecos {slot_keys}: {e}")
+            raise
+    
     # Métodos para Códigos de Descuento
     
     def create_discount_code(self, discount_data: Dict[str, Any]) -> str:
@@ -228,12 +575,122 @@ class FirestoreService:
             code = discount_data.get('code')
             doc_ref = self.db.collection('discount_codes').document(code)
             discount_data['created_at'] = firestore.SERVER_TIMESTAMP
-            doc_ref.set(discount_data)
+            self._write(
+                'discount_codes', 'create_discount_code', lambda: doc_ref.set(discount_data)
+            )
             return code
         except Exception as e:
             logger.error(f"Error creando código de descuento: {e}")
             raise
     
+    @degradable('discount_codes')
+    def get_active_discount_codes(self) -> Optional[List[Dict[str, Any]]]:
+        """
+        Obtiene los códigos de descuento no usados (solo campos de índice), o
+        None si la lectura falla.
+        """
+        if not self.db:
+            return []
+        
+        try:
+            query = self.db.collection('discount_codes')\
+                .where('used', '==', False)\
+                .select(['customer_id', 'valid_until'])
+            docs = self._read(
+                'discount_codes',
+                'get_active_discount_codes',
+                lambda attempt: query.get(timeout=attempt.timeout()),
+                bulk=True
+            )
+            
+            codes = []
+            for doc in docs:
+                data = doc.to_dict()
+                data['code'] = doc.id
+                codes.append(data)
+            return codes
+        except Exception as e:
+            logger.error(f"Error obteniendo códigos de descuento activos: {e}")
+            return None
+    
+    @degradable('discount_codes')
+    def get_discount_codes(self, codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Obtiene varios códigos de descuento en una sola lectura por lotes."""
+        if not self.db or not codes:
+            return {}
+        
+        try:
+            refs = [self.db.collection('discount_codes').document(code) for code in codes]
+            result = {}
+            docs = self._read(
+                'discount_codes',
+                'get_discount_codes',
+                lambda attempt: list(self.db.get_all(refs, timeout=attempt.timeout()))
+            )
+            for doc in docs:
+                if doc.exists:
+                    data = doc.to_dict()
+                    data['code'] = doc.id
+                    result[doc.id] = data
+            return result
+        except Exception as e:
+            logger.error(f"Error obteniendo códigos de descuento {codes}: {e}")
+            return {}
+    
+    def create_order_with_redemptions(
+        self,
+        order_data: Dict[str, Any],
+        redeemed_codes: List[str]
+    ) -> str:
+        """
+        Crea un pedido y marca sus códigos de descuento como usados en una
+        única transacción. Falla si algún código ya fue usado.
+        """
+        if not redeemed_codes:
+            return self.create_order(order_data)
+        
+        if not self.db:
+            return order_data.get('id', f"order_{datetime.now().timestamp()}")
+        
+        try:
+            order_id = order_data.get('id')
+            if order_id:
+                order_ref = self.db.collection('orders').document(order_id)
+            else:
+                order_ref = self.db.collection('orders').document()
+                order_data['id'] = order_ref.id
+            code_refs = [
+                self.db.collection('discount_codes').document(code)
+                for code in redeemed_codes
+            ]
+            
+            @firestore.transactional
+            def _commit(transaction):
+                for snapshot in transaction.get_all(code_refs):
+                    if not snapshot.exists or snapshot.get('used'):
+                        raise ValueError(f"Código de descuento no disponible: {snapshot.id}")
+                
+                order_data['created_at'] = firestore.SERVER_TIMESTAMP
+                transaction.set(order_ref, order_data)
+                for ref in code_refs:
+                    transaction.update(ref, {
+                        'used': True,
+                        'used_at': firestore.SERVER_TIMESTAMP,
+                        'order_id': order_ref.id
+                    })
+            
+            # Los códigos se comprueban dentro de la transacción: no se puede aplazar
+            self._write(
+                'discount_codes',
+                'create_order_with_redemptions',
+                lambda: _commit(self.db.transaction()),
+                deferrable=False
+            )
+            return order_ref.id
+        except Exception as e:
+            logger.error(f"Error creando pedido con códigos {redeemed_codes}: {e}")
+            raise
+    
     # Métodos Mock para desarrollo
     
     def _mock_customer(self, customer_id: str) -> Dict[str, Any]:
@@ -251,12 +708,29 @@ class FirestoreService:
             "created_at": "2024-01-15T10:00:00"
         }
     
-    def _mock_customer_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        """Busca cliente mock por email."""
-        if email == "juan@example.com":
-            return self._mock_customer("cust_123")
+    def _mock_customer_by_identity(self, kind: str, normalized: str) -> Optional[Dict[str, Any]]:
+        """Busca cliente mock por email o teléfono normalizado."""
+        customer = self._mock_customer("cust_123")
+        if normalize_identity(kind, customer.get(kind)) == normalized:
+            return customer
         return None
     
+    def _mock_technicians(self) -> List[Dict[str, Any]]:
+        """Técnicos mock para desarrollo."""
+        return [
+            {
+                "id": "tech_andalucia_1",
+                "name": "Antonio Ruiz",
+                "regions": ["jaén", "córdoba", "granada"],
+            },
+            {"id": "tech_andalucia_2", "name": "Lucía Moreno", "regions": ["sevilla", "jaén"]},
+            {
+                "id": "tech_cataluna_1",
+                "name": "Jordi Puig",
+                "regions": ["lleida", "barcelona", "girona"],
+            }
+        ]
+    
     def _mock_product(self, product_id: str) -> Dict[str, Any]:
         """Producto mock para desarrollo."""
         products = {
@@ -306,4 +780,21 @@ class FirestoreService:
                 "price": 15000,
                 "stock": 5
             }
-        ]
\ No newline at end of file
+        ]
+
+_shared: Optional[FirestoreService] = None
+_shared_lock = threading.Lock()
+
+def shared_service() -> FirestoreService:
+    """
+    Servicio de Firestore del proceso (se crea en la primera llamada).
+
+    Todas las herramientas usan la misma instancia, de modo que comparten
+    conexión, cachés, circuit breakers y escrituras aplazadas.
+    """
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = FirestoreService()
+    return _shared
@@ -0,0 +1,302 @@
+"""
+Lecturas con plazo y lecturas duplicadas (hedging) para Firestore.
+
+Cada turno tiene un presupuesto de tiempo de backend (`start_turn_budget`)
+que solo consumen las lecturas: el tiempo del modelo y de las herramientas
+entre lectura y lectura no cuenta. Cada lectura recibe como plazo lo que sea
+menor entre su tiempo máximo por operación y lo que queda del presupuesto. El
+plazo se pasa a la RPC como `timeout`, así que una lectura lenta ya no
+bloquea el turno entero: agota su plazo y el método devuelve lo mismo que
+ante cualquier otro error. Solo cuando las lecturas del turno ya han gastado
+todo el presupuesto se rechazan las siguientes sin llegar a Firestore
+(`BudgetExhausted`).
+
+Si una lectura no ha respondido cuando pasa el p95 reciente de su operación,
+se lanza una segunda idéntica y gana la primera que responda. La perdedora se
+cancela: si aún no había empezado no llega a ejecutarse, y si está en curso se
+le avisa con `Attempt.cancelled` (las RPC reales terminan como tarde en su
+`timeout`). Para no duplicar la carga cuando todo el backend va lento, solo
+se permite duplicar una fracción de las lecturas de cada operación.
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Optional, TypeVar
+
+from ..config import Config
+
+T = TypeVar("T")
+
+class DeadlineExceeded(TimeoutError):
+    """La lectura no respondió dentro de su plazo."""
+
+class BudgetExhausted(DeadlineExceeded):
+    """Las lecturas del turno ya gastaron el presupuesto; no se llegó a leer."""
+
+class AttemptCancelled(Exception):
+    """Un intento se abandonó porque otro ya respondió."""
+
+class _TurnBudget:
+    """Segundos de lectura que le quedan al turno (compartido entre hilos)."""
+
+    __slots__ = ("remaining", "lock")
+
+    def __init__(self, seconds: float):
+        self.remaining = seconds
+        self.lock = threading.Lock()
+
+    def charge(self, seconds: float) -> None:
+        with self.lock:
+            self.remaining -= seconds
+
+# Presupuesto del turno en curso
+_turn_budget: contextvars.ContextVar[Optional[_TurnBudget]] = contextvars.ContextVar(
+    "firestore_turn_budget", default=None
+)
+
+def start_turn_budget(seconds: float = Config.FIRESTORE_TURN_BUDGET_SECONDS) -> None:
+    """Abre el presupuesto de tiempo de lectura del turno en este contexto."""
+    _turn_budget.set(_TurnBudget(seconds))
+
+def end_turn_budget() -> None:
+    _turn_budget.set(None)
+
+def turn_remaining() -> Optional[float]:
+    """Segundos de lectura que le quedan al turno, o None fuera de un turno."""
+    budget = _turn_budget.get()
+    return None if budget is None else budget.remaining
+
+def operation_deadline(timeout: float) -> float:
+    """Plazo de una operación: su tiempo máximo, recortado a lo que queda del turno."""
+    remaining = turn_remaining()
+    return time.monotonic() + (timeout if remaining is None else min(timeout, remaining))
+
+def charge_turn_budget(seconds: float) -> None:
+    """Descuenta del presupuesto del turno el tiempo pasado dentro de una lectura."""
+    budget = _turn_budget.get()
+    if budget is not None:
+        budget.charge(seconds)
+
+class Attempt:
+    """Un intento de lectura, con su plazo y su aviso de cancelación."""
+
+    __slots__ = ("deadline", "cancelled", "hedge")
+
+    def __init__(self, deadline: float, hedge: bool = False):
+        self.deadline = deadline
+        self.cancelled = threading.Event()
+        self.hedge = hedge
+
+    def timeout(self) -> float:
+        """Segundos hasta el plazo, para pasarlos como `timeout` a la RPC."""
+        return max(self.deadline - time.monotonic(), 0.001)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+class _OperationStats:
+    """Latencias recientes y contadores de una operación."""
+
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.errors = 0
+        self.deadline_exceeded = 0
+        self._p95: Optional[float] = None
+        self._since_sort = 0
+
+    def observe(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+        self._since_sort += 1
+        # Ordenar la ventana en cada lectura sería O(n log n) por llamada
+        if self._since_sort >= 20:
+            self._p95 = None
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < Config.FIRESTORE_HEDGE_MIN_SAMPLES:
+            return None
+        if self._p95 is None:
+            self._p95 = self.percentile(0.95)
+            self._since_sort = 0
+        return self._p95
+
+class HedgedReader:
+    """
+    Ejecuta lecturas con plazo y, si tardan más que su p95, con un duplicado.
+
+    `read(op, fn)` llama a `fn(attempt)` en el pool del lector y devuelve el
+    resultado del primer intento que responda. `fn` debe ser idempotente,
+    pasar `attempt.timeout()` a la RPC y, si puede, abandonar cuando se active
+    `attempt.cancelled`.
+
+    Args:
+        timeout: Tiempo máximo por operación (segundos)
+        hedging: Si se lanzan lecturas duplicadas
+        max_hedge_ratio: Fracción máxima de lecturas de una operación que se duplican
+        workers: Hilos del pool donde corren los intentos
+    """
+
+    def __init__(
+        self,
+        timeout: float = Config.FIRESTORE_READ_TIMEOUT_SECONDS,
+        hedging: bool = Config.FIRESTORE_HEDGE_ENABLED,
+        max_hedge_ratio: float = Config.FIRESTORE_HEDGE_MAX_RATIO,
+        workers: int = Config.FIRESTORE_HEDGE_WORKERS
+    ):
+        self.timeout = timeout
+        self.hedging = hedging
+        self.max_hedge_ratio = max_hedge_ratio
+        self._workers = workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _OperationStats] = {}
+
+    def _pool_executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        self._workers, thread_name_prefix="firestore-read"
+                    )
+        return self._pool
+
+    def _operation(self, op: str) -> _OperationStats:
+        """Estadísticas de la operación; se llama con `_lock` tomado."""
+        stats = self._stats.get(op)
+        if stats is None:
+            stats = self._stats[op] = _OperationStats(Config.FIRESTORE_HEDGE_WINDOW)
+        return stats
+
+    def hedge_delay(self, op: str) -> float:
+        """Espera antes de duplicar una lectura: el p95 reciente de la operación."""
+        with self._lock:
+            p95 = self._operation(op).p95()
+        if p95 is None:
+            return Config.FIRESTORE_HEDGE_INITIAL_DELAY_SECONDS
+        return max(p95, Config.FIRESTORE_HEDGE_MIN_DELAY_SECONDS)
+
+    def _may_hedge(self, stats: _OperationStats) -> bool:
+        return self.hedging and stats.hedges_fired < self.max_hedge_ratio * stats.calls + 1
+
+    def _run(self, op: str, fn: Callable[[Attempt], T], attempt: Attempt) -> T:
+        if attempt.cancelled.is_set():
+            raise AttemptCancelled(op)
+        started = time.monotonic()
+        result = fn(attempt)
+        # Los intentos abandonados que acaban respondiendo también cuentan para el p95
+        with self._lock:
+            self._operation(op).observe(time.monotonic() - started)
+        return result
+
+    def read(self, op: str, fn: Callable[[Attempt], T], timeout: Optional[float] = None) -> T:
+        """
+        Ejecuta una lectura con plazo y, si se retrasa, con un duplicado.
+
+        Raises:
+            BudgetExhausted: Si el turno ya no tiene presupuesto (no se lee)
+            DeadlineExceeded: Si ningún intento respondió dentro del plazo
+            Exception: El error del último intento si todos fallaron
+        """
+        started = time.monotonic()
+        deadline = operation_deadline(self.timeout if timeout is None else timeout)
+        with self._lock:
+            stats = self._operation(op)
+            stats.calls += 1
+        if deadline <= started:
+            with self._lock:
+                stats.deadline_exceeded += 1
+            raise BudgetExhausted(f"{op}: presupuesto del turno agotado")
+        try:
+            return self._read(op, fn, stats, deadline)
+        finally:
+            charge_turn_budget(time.monotonic() - started)
+
+    def _read(
+        self,
+        op: str,
+        fn: Callable[[Attempt], T],
+        stats: _OperationStats,
+        deadline: float
+    ) -> T:
+
+        pool = self._pool_executor()
+        attempts: Dict[Future, Attempt] = {}
+        primary = Attempt(deadline)
+        pending = {pool.submit(self._run, op, fn, primary)}
+        attempts.update(dict.fromkeys(pending, primary))
+        hedge_at = time.monotonic() + self.hedge_delay(op)
+        can_hedge = self.hedging and hedge_at < deadline
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                wake_at = min(hedge_at, deadline) if can_hedge else deadline
+                done, pending = wait(pending, timeout=wake_at - now, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if attempts[future].hedge:
+                            with self._lock:
+                                stats.hedges_won += 1
+                        return future.result()
+                    error = future.exception()
+                if can_hedge and pending and time.monotonic() >= hedge_at:
+                    # Un solo duplicado por lectura, y solo si queda cupo
+                    can_hedge = False
+                    with self._lock:
+                        fire = self._may_hedge(stats)
+                        if fire:
+                            stats.hedges_fired += 1
+                    if fire:
+                        hedge = Attempt(deadline, hedge=True)
+                        future = pool.submit(self._run, op, fn, hedge)
+                        attempts[future] = hedge
+                        pending.add(future)
+        finally:
+            for future, attempt in attempts.items():
+                attempt.cancel()
+                future.cancel()
+
+        failed = error is not None and not pending
+        with self._lock:
+            if failed:
+                stats.errors += 1
+            else:
+                stats.deadline_exceeded += 1
+        if failed:
+            raise error
+        raise DeadlineExceeded(f"{op}: sin respuesta en el plazo")
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Por operación: llamadas, duplicados lanzados y ganados, plazos agotados y latencias."""
+        with self._lock:
+            result = {}
+            for op, stats in self._stats.items():
+                p50, p95 = stats.percentile(0.5), stats.percentile(0.95)
+                result[op] = {
+                    "calls": stats.calls,
+                    "hedges_fired": stats.hedges_fired,
+                    "hedges_won": stats.hedges_won,
+                    "errors": stats.errors,
+                    "deadline_exceeded": stats.deadline_exceeded,
+                    "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                    "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                }
+            return result
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,180 @@
+"""
+Resolución de identidad de clientes por email y teléfono.
+
+Normaliza emails y teléfonos (E.164) y mantiene en memoria un índice acotado
+email/teléfono → customer_id, con caché negativa para los que no corresponden
+a ningún cliente. El índice se actualiza con las escrituras de clientes de
+este proceso, de modo que reconocer a un cliente que vuelve no necesita
+consultar Firestore.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+from ..config import Config
+
+KIND_EMAIL = "email"
+KIND_PHONE = "phone"
+
+# Campos normalizados que se guardan en el documento del cliente
+IDENTITY_FIELDS = {KIND_EMAIL: "email_normalized", KIND_PHONE: "phone_e164"}
+
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_PHONE_SEPARATORS_RE = re.compile(r"[\s\-.()/]")
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """Email en minúsculas y sin espacios, o None si no es válido."""
+    if not email:
+        return None
+    email = email.strip().lower()
+    return email if _EMAIL_RE.match(email) else None
+
+def normalize_phone(
+    phone: Optional[str],
+    default_country_code: str = Config.DEFAULT_PHONE_COUNTRY_CODE
+) -> Optional[str]:
+    """
+    Teléfono en formato E.164 (``+34600123456``), o None si no es válido.
+
+    Acepta separadores habituales, el prefijo internacional ``00`` y números
+    nacionales, a los que se antepone ``default_country_code``.
+    """
+    if not phone:
+        return None
+    phone = _PHONE_SEPARATORS_RE.sub("", phone.strip())
+    if phone.startswith("00"):
+        phone = "+" + phone[2:]
+    if phone.startswith("+"):
+        digits = phone[1:]
+    else:
+        digits = default_country_code + phone.lstrip("0")
+    if not digits.isdigit() or digits.startswith("0") or not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
+
+def normalize_identity(kind: str, value: Optional[str]) -> Optional[str]:
+    if kind == KIND_EMAIL:
+        return normalize_email(value)
+    if kind == KIND_PHONE:
+        return normalize_phone(value)
+    raise ValueError(f"Tipo de identificador desconocido: {kind}")
+
+def identity_fields(data: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Campos normalizados para los identificadores presentes en ``data``."""
+    return {
+        field: normalize_identity(kind, data.get(kind))
+        for kind, field in IDENTITY_FIELDS.items()
+        if kind in data
+    }
+
+def missing_identity_fields(data: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    """Campos normalizados de ``data`` que faltan o no coinciden con los guardados."""
+    return {
+        field: value
+        for field, value in identity_fields(data).items()
+        if data.get(field) != value
+    }
+
+class IdentityIndex:
+    """
+    Índice LRU (tipo, valor normalizado) → customer_id.
+
+    Las ausencias se guardan con un TTL corto (`negative_ttl_seconds`) porque
+    el cliente puede darse de alta en otro worker; los aciertos duran
+    `ttl_seconds` y quien los usa debe comprobar que el cliente sigue teniendo
+    ese identificador.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = Config.IDENTITY_INDEX_MAX_ENTRIES,
+        ttl_seconds: float = Config.IDENTITY_INDEX_TTL_SECONDS,
+        negative_ttl_seconds: float = Config.IDENTITY_NEGATIVE_TTL_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Optional[str], float]]" = OrderedDict()
+        self._by_customer: Dict[str, Set[Tuple[str, str]]] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def lookup(self, kind: str, value: str) -> Tuple[bool, Optional[str]]:
+        """
+        Busca un identificador ya normalizado.
+
+        Returns:
+            (encontrado en el índice, customer_id o None si se sabe que no existe)
+        """
+        key = (kind, value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            if entry[0] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, entry[0]
+
+    def remember(self, kind: str, value: str, customer_id: Optional[str]) -> None:
+        """Guarda el resultado de una búsqueda (None para una ausencia)."""
+        ttl = self.ttl_seconds if customer_id else self.negative_ttl_seconds
+        key = (kind, value)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (customer_id, time.monotonic() + ttl)
+            if customer_id:
+                self._by_customer.setdefault(customer_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def remember_customer(self, customer_id: str, data: Dict[str, Any]) -> None:
+        """
+        Indexa los identificadores de un cliente recién escrito. Sustituye los
+        que tuviera antes y las ausencias cacheadas de los nuevos.
+        """
+        normalized = identity_fields(data)
+        if not normalized:
+            return
+        with self._lock:
+            for key in list(self._by_customer.get(customer_id, ())):
+                if IDENTITY_FIELDS[key[0]] in normalized:
+                    self._drop(key)
+        for kind, field in IDENTITY_FIELDS.items():
+            if normalized.get(field):
+                self.remember(kind, normalized[field], customer_id)
+
+    def forget(self, kind: str, value: str) -> None:
+        with self._lock:
+            self._drop((kind, value))
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[0]:
+            keys = self._by_customer.get(entry[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_customer[entry[0]]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Entradas, aciertos, aciertos negativos y fallos."""
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,312 @@
+"""
+Cliente de streaming para llamadas directas al modelo con `google.genai`.
+
+`shared_client()` devuelve un único `genai.Client` por proceso, y con él un
+solo pool de conexiones, en lugar de crear un `Client(...)` en cada llamada.
+Si el proceso se bifurca (workers de uvicorn), el hijo crea el suyo, porque
+las conexiones abiertas no se pueden compartir entre procesos.
+
+`StreamingModelClient.stream()` devuelve un `ModelStream` que se recorre
+trozo a trozo. El texto se acumula en una lista y `text` guarda el texto ya
+unido: solo vuelve a unir cuando han llegado trozos desde la última consulta.
+Al terminar, cada llamada deja en `ModelStream.metrics` el tiempo hasta el
+primer token, los tokens por segundo y la latencia total. Una condición de
+parada (`stop`) corta la generación en cuanto se cumple: se cierra el stream
+HTTP y el modelo deja de generar.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# Caracteres por token para estimar tokens/s cuando la respuesta se corta
+# antes de que llegue el recuento del modelo
+CHARS_PER_TOKEN = 4
+
+_client = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+def shared_client():
+    """Cliente de `google.genai` del proceso (se crea en la primera llamada)."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                from google import genai
+                if Config.GOOGLE_GENAI_USE_VERTEXAI:
+                    _client = genai.Client(
+                        vertexai=True,
+                        project=Config.GOOGLE_CLOUD_PROJECT,
+                        location=Config.GOOGLE_CLOUD_LOCATION
+                    )
+                else:
+                    _client = genai.Client(api_key=Config.GEMINI_API_KEY)
+                _client_pid = os.getpid()
+    return _client
+
+def stop_on(*markers: str) -> Callable[[str], bool]:
+    """
+    Condición de parada que se cumple al aparecer cualquiera de `markers`,
+    aunque quede partido entre dos trozos. Solo guarda la cola del texto
+    necesaria para detectarlo.
+    """
+    keep = max(len(marker) for marker in markers) - 1
+    tail = ""
+
+    def stop(delta: str) -> bool:
+        nonlocal tail
+        window = tail + delta
+        tail = window[-keep:] if keep else ""
+        return any(marker in window for marker in markers)
+    return stop
+
+@dataclass
+class StreamMetrics:
+    """Métricas de una llamada en streaming."""
+    model: str
+    ttft_seconds: Optional[float] = None
+    total_seconds: float = 0.0
+    chunks: int = 0
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    tokens_estimated: bool = False
+    tokens_per_second: Optional[float] = None
+    cancelled: bool = False
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+class ModelStream:
+    """
+    Respuesta en streaming. Se recorre una vez y devuelve el texto nuevo de
+    cada trozo; `text`, `function_calls` y `metrics` están completos al
+    terminar el recorrido (o al cancelar).
+    """
+
+    def __init__(
+        self,
+        owner: "StreamingModelClient",
+        model: str,
+        stop: Optional[Callable[[str], bool]]
+    ):
+        self._owner = owner
+        self._stop = stop
+        self._parts: List[str] = []
+        # Texto ya unido y cuántos trozos incluye
+        self._text = ""
+        self._text_parts = 0
+        self._started = time.perf_counter()
+        self._source = None
+        self._cancel_requested = False
+        self.function_calls: List[Any] = []
+        self.metrics = StreamMetrics(model=model)
+        self.finished = False
+
+    @property
+    def text(self) -> str:
+        """Texto completo recibido hasta ahora (solo se unen los trozos nuevos)."""
+        if self._text_parts < len(self._parts):
+            self._text += "".join(self._parts[self._text_parts:])
+            self._text_parts = len(self._parts)
+        return self._text
+
+    def cancel(self) -> None:
+        """Corta la generación tras el trozo actual (se puede llamar desde otro hilo)."""
+        self._cancel_requested = True
+
+    def _on_chunk(self, chunk) -> Optional[str]:
+        """Procesa un trozo y devuelve su texto nuevo (None si no trae texto)."""
+        self.metrics.chunks += 1
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_token_count", None)
+            output_tokens = getattr(usage, "candidates_token_count", None)
+            self.metrics.prompt_tokens = prompt_tokens or self.metrics.prompt_tokens
+            self.metrics.output_tokens = output_tokens or self.metrics.output_tokens
+        self.function_calls.extend(getattr(chunk, "function_calls", None) or [])
+
+        candidates = getattr(chunk, "candidates", None) or []
+        content = candidates[0].content if candidates else None
+        delta = "".join(
+            part.text for part in (getattr(content, "parts", None) or [])
+            if getattr(part, "text", None) and not getattr(part, "thought", False)
+        )
+        if not delta:
+            return None
+        if self.metrics.ttft_seconds is None:
+            self.metrics.ttft_seconds = time.perf_counter() - self._started
+        self._parts.append(delta)
+        if self._stop is not None and self._stop(delta):
+            self._cancel_requested = True
+        return delta
+
+    def _finish(self, error: Optional[BaseException] = None) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        metrics = self.metrics
+        metrics.total_seconds = time.perf_counter() - self._started
+        metrics.cancelled = self._cancel_requested
+        metrics.error = repr(error) if error is not None else None
+        if metrics.output_tokens is None and self._parts:
+            metrics.output_tokens = max(1, len(self.text) // CHARS_PER_TOKEN)
+            metrics.tokens_estimated = True
+        # Velocidad de generación: desde el primer token, sin la espera inicial
+        if metrics.output_tokens and metrics.ttft_seconds is not None:
+            generating = metrics.total_seconds - metrics.ttft_seconds
+            if generating > 0:
+                metrics.tokens_per_second = metrics.output_tokens / generating
+        self._owner._record(metrics)
+
+    def __iter__(self) -> Iterator[str]:
+        source = self._source
+        try:
+            for chunk in source:
+                delta = self._on_chunk(chunk)
+                if delta is not None:
+                    yield delta
+                if self._cancel_requested:
+                    break
+        except GeneratorExit:
+            # Quien recorría el stream dejó de hacerlo: cuenta como corte
+            self._cancel_requested = True
+            self._finish()
+            raise
+        except BaseException as e:
+            self._finish(e)
+            raise
+        finally:
+            # Cerrar el iterador cierra la conexión y el modelo deja de generar
+            close = getattr(source, "close", None)
+            if callable(close):
+                close()
+        self._finish()
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        source = await self._source
+        try:
+            async for chunk in source:
+                delta = self._on_chunk(chunk)
+                if delta is not None:
+                    yield delta
+                if self._cancel_requested:
+                    break
+        except (GeneratorExit, asyncio.CancelledError):
+            self._cancel_requested = True
+            self._finish()
+            raise
+        except BaseException as e:
+            self._finish(e)
+            raise
+        finally:
+            aclose = getattr(source, "aclose", None)
+            if callable(aclose):
+                await aclose()
+        self._finish()
+
+class StreamingModelClient:
+    """
+    Llamadas en streaming al modelo con métricas por llamada.
+
+    Args:
+        client: Cliente de `google.genai` (por defecto el compartido del proceso)
+        model: Modelo por defecto
+    """
+
+    def __init__(self, client=None, model: str = Config.MODEL_NAME):
+        self._client = client
+        self.model = model
+        self._lock = threading.Lock()
+        self._recent: Deque[StreamMetrics] = deque(maxlen=Config.MODEL_METRICS_WINDOW)
+        self.calls = 0
+        self.cancelled = 0
+        self.errors = 0
+
+    @property
+    def client(self):
+        return self._client if self._client is not None else shared_client()
+
+    def stream(
+        self,
+        contents: Any,
+        config: Any = None,
+        model: Optional[str] = None,
+        stop: Optional[Callable[[str], bool]] = None
+    ) -> ModelStream:
+        """
+        Llamada en streaming (síncrona). Recorrer el resultado con `for`.
+
+        Args:
+            contents: Contenido de la petición, como en `generate_content`
+            config: `GenerateContentConfig`
+            model: Modelo, si no es el del cliente
+            stop: Recibe el texto nuevo de cada trozo; si devuelve True se
+                corta la generación (ver `stop_on`)
+        """
+        model = model or self.model
+        stream = ModelStream(self, model, stop)
+        stream._source = self.client.models.generate_content_stream(
+            model=model, contents=contents, config=config
+        )
+        return stream
+
+    def astream(
+        self,
+        contents: Any,
+        config: Any = None,
+        model: Optional[str] = None,
+        stop: Optional[Callable[[str], bool]] = None
+    ) -> ModelStream:
+        """Como `stream`, para recorrer con `async for`."""
+        model = model or self.model
+        stream = ModelStream(self, model, stop)
+        stream._source = self.client.aio.models.generate_content_stream(
+            model=model, contents=contents, config=config
+        )
+        return stream
+
+    def _record(self, metrics: StreamMetrics) -> None:
+        with self._lock:
+            self.calls += 1
+            self.cancelled += metrics.cancelled
+            self.errors += metrics.error is not None
+            self._recent.append(metrics)
+        logger.info(
+            f"Modelo {metrics.model}: primer token {metrics.ttft_seconds or 0:.3f}s, "
+            f"total {metrics.total_seconds:.3f}s, {metrics.tokens_per_second or 0:.1f} tokens/s"
+            + (" (cortado)" if metrics.cancelled else "")
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Llamadas, cortes, errores y p50/p95 de primer token y latencia total recientes."""
+        def pct(values: List[float], q: float) -> Optional[float]:
+            if not values:
+                return None
+            values = sorted(values)
+            return round(values[min(int(q * len(values)), len(values) - 1)], 3)
+
+        with self._lock:
+            recent = list(self._recent)
+            stats = {"calls": self.calls, "cancelled": self.cancelled, "errors": self.errors}
+        ttft = [m.ttft_seconds for m in recent if m.ttft_seconds is not None]
+        total = [m.total_seconds for m in recent]
+        speeds = [m.tokens_per_second for m in recent if m.tokens_per_second]
+        stats.update({
+            "ttft_p50_seconds": pct(ttft, 0.5),
+            "ttft_p95_seconds": pct(ttft, 0.95),
+            "total_p50_seconds": pct(total, 0.5),
+            "total_p95_seconds": pct(total, 0.95),
+            "tokens_per_second_mean": round(sum(speeds) / len(speeds), 1) if speeds else None,
+        })
+        return stats
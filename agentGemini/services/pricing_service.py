@@ -0,0 +1,108 @@
+"""
+Motor de precios para carritos y pedidos.
+"""
+
+import logging
+from typing import Dict, Any, List, Optional
+
+from ..config import Config
+from ..models import PriceQuote, QuoteLine
+
+logger = logging.getLogger(__name__)
+
+class PricingService:
+    """
+    Calcula presupuestos de carrito en una sola pasada.
+    
+    Líneas, descuento de lealtad o por código, recargo de financiación e IVA
+    se calculan recorriendo el carrito una vez.
+    """
+    
+    @staticmethod
+    def customer_tier(customer: Optional[Dict[str, Any]]) -> str:
+        """Nivel de precios del cliente."""
+        if not customer:
+            return "anonymous"
+        if customer.get("total_purchases", 0) >= Config.LOYALTY_DISCOUNT_THRESHOLD:
+            return "loyal"
+        return "standard"
+    
+    def quote(
+        self,
+        cart_data: Dict[str, Any],
+        customer: Optional[Dict[str, Any]] = None,
+        payment_method: Optional[str] = None,
+        discount_code: Optional[Dict[str, Any]] = None
+    ) -> PriceQuote:
+        """
+        Calcula el presupuesto de un carrito.
+        
+        Args:
+            cart_data: Carrito en formato de estado de sesión
+            customer: Datos del cliente (para el nivel de lealtad)
+            payment_method: Método de pago; "financing" aplica recargo
+            discount_code: Código ya validado ({"code", "percentage"})
+        
+        Returns:
+            PriceQuote con el desglose
+        """
+        items: List[Dict[str, Any]] = cart_data.get("items", [])
+        tier = self.customer_tier(customer)
+        currency = Config.DEFAULT_CURRENCY
+        if not items:
+            return PriceQuote(currency=currency, customer_tier=tier)
+        
+        # Descuentos no acumulables: se aplica el mayor entre lealtad y código
+        loyalty_pct = Config.LOYALTY_DISCOUNT_PERCENTAGE if tier == "loyal" else 0.0
+        code_pct = float(discount_code["percentage"]) if discount_code else 0.0
+        discount_pct = max(loyalty_pct, code_pct)
+        discount_reason = None
+        applied_code = None
+        if discount_pct and code_pct > loyalty_pct:
+            applied_code = discount_code["code"]
+            discount_reason = f"Código {applied_code} ({code_pct:g}%)"
+        elif discount_pct:
+            discount_reason = "Descuento cliente leal"
+        
+        lines = []
+        subtotal = 0.0
+        discounted_total = 0.0
+        financeable_total = 0.0
+        for item in items:
+            product = item["product"]
+            price = float(product.get("price", 0))
+            quantity = int(item.get("quantity", 1))
+            line_total = price * quantity
+            discounted = line_total * (1 - discount_pct / 100)
+            subtotal += line_total
+            discounted_total += discounted
+            if product.get("financing_available", True):
+                financeable_total += discounted
+            lines.append(QuoteLine(
+                product_id=product["id"],
+                name=product.get("name", ""),
+                quantity=quantity,
+                unit_price=price,
+                subtotal=round(line_total, 2)
+            ))
+        
+        discount_amount = subtotal - discounted_total
+        financing_surcharge = 0.0
+        if payment_method == "financing":
+            financing_surcharge = financeable_total * Config.FINANCING_SURCHARGE_PERCENTAGE / 100
+        
+        total = subtotal - discount_amount + financing_surcharge
+        tax_amount = total - total / (1 + Config.TAX_PERCENTAGE / 100)
+        
+        return PriceQuote(
+            lines=lines,
+            subtotal=round(subtotal, 2),
+            discount_amount=round(discount_amount, 2),
+            discount_reason=discount_reason,
+            applied_discount_code=applied_code,
+            financing_surcharge=round(financing_surcharge, 2),
+            tax_amount=round(tax_amount, 2),
+            total=round(total, 2),
+            currency=currency,
+            customer_tier=tier
+        )
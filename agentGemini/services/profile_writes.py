@@ -0,0 +1,164 @@
+"""
+Buffer de escrituras del perfil de cliente.
+
+El modelo actualiza el perfil cada vez que aprende algo (hectáreas, cultivos,
+maquinaria). En lugar de una escritura en Firestore por llamada, los cambios
+se acumulan por cliente campo a campo (el último valor de cada campo gana) y
+se escriben en una sola actualización al terminar el turno, al superar
+`max_fields` campos pendientes o `max_delay_seconds` desde el primer cambio
+sin escribir. Lo pendiente se escribe también al cerrar la sesión y al
+terminar el proceso.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from ..config import Config
+from .firestore_service import FirestoreService
+
+logger = logging.getLogger(__name__)
+
+class _Pending:
+    __slots__ = ("fields", "first_at")
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.first_at = time.monotonic()
+
+class ProfileWriteBuffer:
+    """
+    Acumula actualizaciones de perfil por cliente y las escribe juntas.
+
+    Args:
+        db_service: Servicio con `update_customer(customer_id, updates)`
+        max_fields: Campos pendientes que fuerzan la escritura
+        max_delay_seconds: Antigüedad máxima de un cambio sin escribir
+    """
+
+    def __init__(
+        self,
+        db_service: FirestoreService,
+        max_fields: int = Config.PROFILE_WRITE_MAX_FIELDS,
+        max_delay_seconds: float = Config.PROFILE_WRITE_MAX_DELAY_SECONDS
+    ):
+        self.db_service = db_service
+        self.max_fields = max_fields
+        self.max_delay_seconds = max_delay_seconds
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _Pending] = {}
+        self._sweeper: Optional[threading.Thread] = None
+        self._closed = False
+        self.staged = 0
+        self.writes = 0
+        self.failed_writes = 0
+        atexit.register(self.flush_all)
+
+    def stage(self, customer_id: str, updates: Dict[str, Any]) -> None:
+        """Acumula cambios del perfil; escribe ya si se supera algún umbral."""
+        if not updates:
+            return
+        with self._lock:
+            pending = self._pending.get(customer_id)
+            if pending is None:
+                pending = self._pending[customer_id] = _Pending()
+            pending.fields.update(updates)
+            self.staged += 1
+            due = len(pending.fields) >= self.max_fields or self._expired(pending)
+        self._ensure_sweeper()
+        if due:
+            self.flush(customer_id)
+
+    def pending(self, customer_id: str) -> Dict[str, Any]:
+        """Cambios aún sin escribir, para superponerlos al leer el perfil."""
+        with self._lock:
+            pending = self._pending.get(customer_id)
+            return dict(pending.fields) if pending else {}
+
+    def flush(self, customer_id: str) -> bool:
+        """
+        Escribe lo pendiente de un cliente en una sola actualización.
+
+        Si la escritura falla, los cambios vuelven al buffer (sin pisar los
+        que hayan llegado mientras tanto) para reintentarse después.
+
+        Returns:
+            True si no queda nada pendiente
+        """
+        with self._lock:
+            pending = self._pending.pop(customer_id, None)
+        if pending is None:
+            return True
+
+        try:
+            self.db_service.update_customer(customer_id, dict(pending.fields))
+        except Exception as e:
+            logger.error(f"Error escribiendo el perfil de {customer_id}, se reintentará: {e}")
+            with self._lock:
+                self.failed_writes += 1
+                current = self._pending.get(customer_id)
+                if current is None:
+                    self._pending[customer_id] = pending
+                else:
+                    current.fields = {**pending.fields, **current.fields}
+                    current.first_at = min(current.first_at, pending.first_at)
+            return False
+
+        with self._lock:
+            self.writes += 1
+        return True
+
+    def end_session(self, customer_id: str) -> bool:
+        """Escribe lo pendiente al cerrar la sesión del cliente."""
+        return self.flush(customer_id)
+
+    def flush_all(self) -> None:
+        """Escribe todo lo pendiente (al apagar el proceso)."""
+        with self._lock:
+            customer_ids = list(self._pending)
+        for customer_id in customer_ids:
+            self.flush(customer_id)
+
+    def close(self) -> None:
+        self._closed = True
+        self.flush_all()
+
+    # Umbral de tiempo
+
+    def _expired(self, pending: _Pending) -> bool:
+        return time.monotonic() - pending.first_at >= self.max_delay_seconds
+
+    def _ensure_sweeper(self) -> None:
+        if self._sweeper is None:
+            with self._lock:
+                if self._sweeper is None:
+                    self._sweeper = threading.Thread(
+                        target=self._sweep, name="profile-writes", daemon=True
+                    )
+                    self._sweeper.start()
+
+    def _sweep(self) -> None:
+        """Escribe los perfiles con cambios más antiguos que `max_delay_seconds`."""
+        interval = max(self.max_delay_seconds / 4, 0.05)
+        while not self._closed:
+            time.sleep(interval)
+            with self._lock:
+                due = [
+                    customer_id for customer_id, pending in self._pending.items()
+                    if self._expired(pending)
+                ]
+            for customer_id in due:
+                self.flush(customer_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cambios acumulados, escrituras realizadas y clientes pendientes."""
+        with self._lock:
+            return {
+                "staged_updates": self.staged,
+                "writes": self.writes,
+                "failed_writes": self.failed_writes,
+                "pending_customers": len(self._pending),
+                "updates_per_write": self.staged / self.writes if self.writes else 0.0
+            }
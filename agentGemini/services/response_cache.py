@@ -0,0 +1,220 @@
+"""
+Caché semántica de respuestas para preguntas frecuentes.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Protocol, Tuple
+
+import numpy as np
+from google.adk.models import LlmResponse
+from google.genai import types as genai_types
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+STATE_CACHE_QUERY = "temp:semantic_cache_query"
+
+class Embedder(Protocol):
+    """Cualquier objeto que convierta texto en un vector normalizado."""
+    
+    def embed(self, text: str) -> np.ndarray:
+        ...
+
+class HashingEmbedder:
+    """
+    Embedder local sin modelo: palabras y trigramas de caracteres proyectados
+    por hashing sobre un vector de dimensión fija y normalizado (L2).
+    
+    Suficiente para reconocer reformulaciones cercanas ("¿qué financiación
+    tenéis?" / "que financiacion teneis"). Se puede sustituir por un modelo de
+    embeddings real pasando otro `Embedder` a `SemanticResponseCache`.
+    """
+    
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+    
+    @staticmethod
+    def normalize(text: str) -> str:
+        text = unicodedata.normalize("NFKD", text.lower())
+        text = "".join(c for c in text if not unicodedata.combining(c))
+        return re.sub(r"[^\w\s]", " ", text).strip()
+    
+    def _features(self, text: str) -> List[str]:
+        words = self.normalize(text).split()
+        features = [f"w:{w}" for w in words]
+        for word in words:
+            padded = f" {word} "
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+    
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            h = int.from_bytes(digest, "little")
+            vector[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+class SemanticResponseCache:
+    """
+    Caché de respuestas del modelo indexada por similitud semántica.
+    
+    Las entradas se agrupan por (idioma, etapa del embudo). Una consulta es un
+    acierto si la similitud coseno con alguna pregunta guardada del mismo
+    ámbito supera el umbral. Solo se consultan y guardan primeros turnos sin
+    historial previo, ya que la clave es solo el mensaje del usuario y la misma
+    pregunta puede significar otra cosa a mitad de conversación ("¿y el
+    precio?"). Además, solo se guardan respuestas de texto generadas sin
+    herramientas en sesiones sin cliente identificado, para no servir nunca
+    respuestas personalizadas ni dependientes de datos. Las entradas caducan
+    por TTL y se desalojan por LRU.
+    """
+    
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        threshold: Optional[float] = None,
+        ttl_seconds: Optional[int] = None,
+        max_entries: Optional[int] = None
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold if threshold is not None else Config.SEMANTIC_CACHE_THRESHOLD
+        self.ttl_seconds = ttl_seconds or Config.SEMANTIC_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or Config.SEMANTIC_CACHE_MAX_ENTRIES
+        
+        self._lock = threading.Lock()
+        # clave -> (ámbito, vector, respuesta, expira_en)
+        self._entries: "OrderedDict[int, Tuple[Tuple[str, str], np.ndarray, str, float]]" = (
+            OrderedDict()
+        )
+        self._next_key = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.lookup_seconds = 0.0
+    
+    # Operaciones de caché
+    
+    def lookup(self, query: str, language: str, stage: str) -> Optional[str]:
+        """Devuelve la respuesta cacheada más parecida, o None."""
+        started = time.perf_counter()
+        vector = self.embedder.embed(query)
+        scope = (language, stage)
+        now = time.monotonic()
+        
+        with self._lock:
+            keys, vectors = [], []
+            for key, (entry_scope, entry_vector, _, expires_at) in list(self._entries.items()):
+                if expires_at < now:
+                    del self._entries[key]
+                elif entry_scope == scope:
+                    keys.append(key)
+                    vectors.append(entry_vector)
+            
+            response = None
+            if vectors:
+                similarities = np.stack(vectors) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    key = keys[best]
+                    self._entries.move_to_end(key)
+                    response = self._entries[key][2]
+            
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self.lookup_seconds += time.perf_counter() - started
+        return response
+    
+    def store(self, query: str, language: str, stage: str, response: str) -> None:
+        """Guarda una respuesta para una pregunta."""
+        vector = self.embedder.embed(query)
+        with self._lock:
+            self._entries[self._next_key] = (
+                (language, stage), vector, response, time.monotonic() + self.ttl_seconds
+            )
+            self._next_key += 1
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def clear(self) -> None:
+        """Vacía la caché."""
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Tasa de aciertos y latencia media de búsqueda."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "avg_lookup_ms": self.lookup_seconds / lookups * 1000 if lookups else 0.0
+            }
+    
+    # Callbacks del agente
+    
+    @staticmethod
+    def _scope(state) -> Tuple[str, str]:
+        return (
+            state.get("language") or Config.DEFAULT_LANGUAGE,
+            state.get("conversation_stage") or "greeting"
+        )
+    
+    def before_model_callback(self, callback_context, llm_request) -> Optional[LlmResponse]:
+        """Responde desde caché si la primera pregunta de la sesión ya se contestó antes."""
+        state = callback_context.state
+        state[STATE_CACHE_QUERY] = None
+        # Solo turnos sin contexto: el mensaje del usuario es todo el historial
+        if not llm_request.contents or len(llm_request.contents) > 1 or state.get("customer"):
+            return None
+        last = llm_request.contents[-1]
+        # Solo la primera llamada del turno, con el texto del usuario
+        if last.role != "user" or not last.parts or not last.parts[0].text:
+            return None
+        
+        query = last.parts[0].text
+        language, stage = self._scope(state)
+        cached = self.lookup(query, language, stage)
+        if cached is None:
+            state[STATE_CACHE_QUERY] = query
+            return None
+        
+        logger.info(f"Respuesta servida desde caché semántica ({language}/{stage})")
+        return LlmResponse(
+            content=genai_types.Content(role="model", parts=[genai_types.Part(text=cached)])
+        )
+    
+    def after_model_callback(self, callback_context, llm_response) -> None:
+        """Guarda la respuesta si no depende de herramientas ni del cliente."""
+        state = callback_context.state
+        query = state.get(STATE_CACHE_QUERY)
+        if not query or getattr(llm_response, "partial", False):
+            return None
+        state[STATE_CACHE_QUERY] = None
+        
+        content = llm_response.content
+        if not content or not content.parts or state.get("customer"):
+            return None
+        if any(part.function_call for part in content.parts):
+            # La respuesta usa herramientas: ni esta ni la final son cacheables
+            return None
+        text = "".join(part.text or "" for part in content.parts)
+        if text:
+            language, stage = self._scope(state)
+            self.store(query, language, stage, text)
+        return None
@@ -0,0 +1,364 @@
+"""
+Grabación de sesiones para reproducir turnos lentos sin servicios reales.
+
+`SessionRecorder` se engancha a los callbacks del agente y escribe, por
+sesión, un fichero JSON Lines de solo anexado con cada turno: mensaje del
+usuario y estado al empezar, cada llamada al modelo (respuesta, llamadas a
+herramientas, tokens y latencia), cada herramienta (argumentos, respuesta y
+duración) y cada llamada a los backends instrumentados con `BackendTap`
+(argumentos, resultado y latencia). Los tiempos son milisegundos desde el
+inicio del turno.
+
+`scripts/replay_session.py` vuelve a ejecutar las herramientas de una
+grabación contra un modelo y un Firestore simulados que devuelven lo grabado
+con su latencia, y desglosa el tiempo de cada turno.
+
+Las grabaciones no guardan datos personales: los campos de
+`Config.SESSION_RECORDING_REDACTED_FIELDS` (a cualquier profundidad del estado,
+los argumentos y las respuestas de herramientas y backends) y los emails y
+teléfonos que aparecen en los textos se sustituyen por un seudónimo estable
+(`<redactado:…>`). El mismo valor da siempre el mismo seudónimo, así que la
+reproducción sigue encontrando las llamadas grabadas a partir de los
+argumentos redactados.
+
+Formato de cada línea (claves cortas para que la grabación ocupe poco):
+    {"k": "turn", "t": 0, "text": ..., "state": {...}}
+    {"k": "model", "t": ..., "ms": ..., "text": ..., "calls": [...], "tokens": {...}}
+    {"k": "cached", "t": ...}
+    {"k": "tool", "t": ..., "ms": ..., "name": ..., "args": {...}, "resp": ...}
+    {"k": "backend", "t": ..., "ms": ..., "b": "firestore", "m": ...,
+     "args": [...], "kw": {...}, "res": ...}
+    {"k": "turn_end", "t": ..., "ms": ...}
+"""
+
+import contextvars
+import functools
+import hashlib
+import hmac
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from ..config import Config
+
+logger = logging.getLogger(__name__)
+
+# Grabación del turno en curso en este contexto (hilo o tarea asyncio)
+_current_turn: contextvars.ContextVar[Optional["_TurnRecording"]] = contextvars.ContextVar(
+    "session_recorder_turn", default=None
+)
+
+_REDACTED_FIELDS = frozenset(Config.SESSION_RECORDING_REDACTED_FIELDS)
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+# Secuencias de 9 o más dígitos, con espacios, puntos o guiones entre ellos
+# (no dentro de otra palabra ni de un seudónimo)
+_PHONE_RE = re.compile(r"(?<![\w:])\+?\d(?:[\s.-]?\d){8,}(?!\w)")
+# Clave del seudónimo: fija si se configura (grabaciones comparables entre
+# procesos) o aleatoria por proceso
+_REDACTION_KEY = (Config.SESSION_RECORDING_REDACTION_KEY or "").encode() or os.urandom(16)
+
+def _pseudonym(value: Any) -> str:
+    raw = json.dumps(value, sort_keys=True, default=str).encode()
+    return f"<redactado:{hmac.new(_REDACTION_KEY, raw, hashlib.sha256).hexdigest()[:12]}>"
+
+def redact(value: Any) -> Any:
+    """Copia de `value` sin datos personales, para escribirla en la grabación."""
+    if isinstance(value, dict):
+        return {
+            key: _pseudonym(item) if key in _REDACTED_FIELDS and item is not None else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        value = _EMAIL_RE.sub(lambda m: _pseudonym(m.group()), value)
+        return _PHONE_RE.sub(lambda m: _pseudonym(m.group()), value)
+    return value
+
+def _compact(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def _session_id(context) -> str:
+    """ID de la sesión desde un CallbackContext/ToolContext de ADK."""
+    session = getattr(context, "session", None) or getattr(
+        getattr(context, "_invocation_context", None), "session", None
+    )
+    if session is not None:
+        return session.id
+    return getattr(context, "invocation_id", None) or "unknown"
+
+def _state_dict(state) -> Dict[str, Any]:
+    to_dict = getattr(state, "to_dict", None)
+    return to_dict() if callable(to_dict) else dict(state or {})
+
+def _content_text(content) -> str:
+    parts = getattr(content, "parts", None) or []
+    return "".join(getattr(part, "text", None) or "" for part in parts)
+
+class _TurnRecording:
+    """Registros de un turno; se escriben al fichero de la sesión al terminar."""
+
+    def __init__(self, recorder: "SessionRecorder", session_id: str):
+        self.recorder = recorder
+        self.session_id = session_id
+        self.started = time.perf_counter()
+        self.records: List[Dict[str, Any]] = []
+        self.model_started: Optional[float] = None
+        self.tools_started: Dict[str, float] = {}
+        self.backend_depth = 0
+
+    def elapsed_ms(self, since: Optional[float] = None) -> float:
+        return round((time.perf_counter() - (since or self.started)) * 1000, 3)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.records.append(record)
+
+class SessionRecorder:
+    """
+    Graba las sesiones del agente a partir de sus callbacks.
+
+    Cada turno se acumula en memoria y se anexa al fichero de su sesión al
+    terminar, en una sola escritura. Solo se graba la fracción
+    `sample_rate` de las sesiones; la decisión sale de un hash del ID de
+    sesión, así que es la misma en cada turno (y en cualquier worker) sin
+    guardar nada por sesión.
+
+    Args:
+        directory: Carpeta de las grabaciones (una por sesión)
+        sample_rate: Fracción de sesiones que se graban
+    """
+
+    def __init__(
+        self,
+        directory: str = Config.SESSION_RECORDING_DIR,
+        sample_rate: float = Config.SESSION_RECORDING_SAMPLE_RATE
+    ):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self._turns: Dict[str, _TurnRecording] = {}
+        self._lock = threading.Lock()
+        self.turns_recorded = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, session_id: str) -> str:
+        safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in session_id)
+        return os.path.join(self.directory, f"{safe}.jsonl")
+
+    def sampled(self, session_id: str) -> bool:
+        digest = hashlib.blake2b(session_id.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2 ** 64 < self.sample_rate
+
+    def _turn(self, context) -> Optional[_TurnRecording]:
+        return self._turns.get(_session_id(context))
+
+    # Callbacks del agente
+
+    def before_agent(self, callback_context) -> None:
+        session_id = _session_id(callback_context)
+        if not self.sampled(session_id):
+            return None
+        with self._lock:
+            turn = self._turns[session_id] = _TurnRecording(self, session_id)
+        _current_turn.set(turn)
+        turn.add({
+            "k": "turn",
+            "t": 0,
+            "text": redact(_content_text(getattr(callback_context, "user_content", None))),
+            "state": redact(_state_dict(callback_context.state)),
+        })
+        return None
+
+    def after_agent(self, callback_context) -> None:
+        with self._lock:
+            turn = self._turns.pop(_session_id(callback_context), None)
+        if turn is None:
+            return None
+        _current_turn.set(None)
+        turn.add({"k": "turn_end", "t": turn.elapsed_ms(), "ms": turn.elapsed_ms()})
+        lines = "".join(_compact(record) + "\n" for record in turn.records)
+        with self._lock:
+            with open(self.path(turn.session_id), "a", encoding="utf-8") as f:
+                f.write(lines)
+            self.turns_recorded += 1
+        return None
+
+    def before_model(self, callback_context, llm_request, cached_response=None) -> None:
+        """Marca el inicio de la llamada al modelo (o que se sirvió desde caché)."""
+        turn = self._turn(callback_context)
+        if turn is None:
+            return None
+        if cached_response is not None:
+            turn.add({
+                "k": "cached",
+                "t": turn.elapsed_ms(),
+                "text": redact(_content_text(cached_response.content)),
+            })
+        else:
+            turn.model_started = time.perf_counter()
+        return None
+
+    def after_model(self, callback_context, llm_response) -> None:
+        turn = self._turn(callback_context)
+        if turn is None or turn.model_started is None or getattr(llm_response, "partial", False):
+            return None
+        parts = getattr(llm_response.content, "parts", None) or []
+        calls = [
+            {"name": part.function_call.name, "args": redact(dict(part.function_call.args or {}))}
+            for part in parts if getattr(part, "function_call", None)
+        ]
+        usage = getattr(llm_response, "usage_metadata", None)
+        started, turn.model_started = turn.model_started, None
+        turn.add({
+            "k": "model",
+            "t": round((started - turn.started) * 1000, 3),
+            "ms": turn.elapsed_ms(started),
+            "text": redact(_content_text(llm_response.content)),
+            "calls": calls,
+            "tokens": {
+                "prompt": getattr(usage, "prompt_token_count", None),
+                "output": getattr(usage, "candidates_token_count", None),
+            } if usage else None,
+        })
+        return None
+
+    def before_tool(self, tool, args: Dict[str, Any], tool_context) -> None:
+        turn = self._turn(tool_context)
+        if turn is not None:
+            key = getattr(tool_context, "function_call_id", None) or tool.name
+            turn.tools_started[key] = time.perf_counter()
+        return None
+
+    def after_tool(self, tool, args: Dict[str, Any], tool_context, tool_response) -> None:
+        turn = self._turn(tool_context)
+        if turn is None:
+            return None
+        key = getattr(tool_context, "function_call_id", None) or tool.name
+        started = turn.tools_started.pop(key, turn.started)
+        turn.add({
+            "k": "tool",
+            "t": round((started - turn.started) * 1000, 3),
+            "ms": turn.elapsed_ms(started),
+            "name": tool.name,
+            "args": redact(args),
+            "resp": redact(tool_response),
+        })
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "turns_recorded": self.turns_recorded,
+                "sample_rate": self.sample_rate,
+                "turns_in_progress": len(self._turns),
+            }
+
+class BackendTap:
+    """
+    Instrumenta los métodos públicos de una clase de backend (p. ej.
+    `FirestoreService`).
+
+    En modo grabación cada llamada de nivel superior (no las anidadas) se
+    anota en el turno en curso con sus argumentos, resultado y latencia. En
+    modo reproducción las llamadas no llegan al backend: devuelven el
+    resultado grabado para ese método y argumentos (comparados ya
+    redactados), en orden, y suman la latencia grabada al reloj de la
+    reproducción.
+    """
+
+    def __init__(self, cls: type, backend: str, methods: Optional[Iterable[str]] = None):
+        self.cls = cls
+        self.backend = backend
+        self.methods = list(methods) if methods is not None else [
+            name for name, value in vars(cls).items()
+            if not name.startswith("_") and inspect.isfunction(value)
+            and not inspect.iscoroutinefunction(value)
+        ]
+        self._originals: Dict[str, Callable] = {}
+        self._replay: Optional[Dict[Tuple[str, str], Deque[Dict[str, Any]]]] = None
+        self.replay_clock: Optional[Callable[[Dict[str, Any]], None]] = None
+        self.replay_misses: List[str] = []
+
+    @staticmethod
+    def _key(method: str, args: tuple, kwargs: Dict[str, Any]) -> Tuple[str, str]:
+        # Se redacta igual al grabar y al reproducir: la clave coincide aunque
+        # los argumentos de la reproducción sean los seudónimos grabados
+        return method, json.dumps(redact([list(args), kwargs]), sort_keys=True, default=str)
+
+    def _wrap(self, name: str, original: Callable) -> Callable:
+        tap = self
+
+        @functools.wraps(original)
+        def wrapper(instance, *args, **kwargs):
+            if tap._replay is not None:
+                return tap._replayed(name, args, kwargs)
+            turn = _current_turn.get()
+            if turn is None or turn.backend_depth:
+                return original(instance, *args, **kwargs)
+            turn.backend_depth += 1
+            started = time.perf_counter()
+            try:
+                result = original(instance, *args, **kwargs)
+            finally:
+                turn.backend_depth -= 1
+            turn.add({
+                "k": "backend",
+                "t": round((started - turn.started) * 1000, 3),
+                "ms": turn.elapsed_ms(started),
+                "b": tap.backend,
+                "m": name,
+                "args": redact(list(args)),
+                "kw": redact(kwargs),
+                "res": redact(result),
+            })
+            return result
+        return wrapper
+
+    def _replayed(self, name: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        queue = self._replay.get(self._key(name, args, kwargs))
+        if not queue:
+            # Sin grabación para estos argumentos: la herramienta cambió de comportamiento
+            self.replay_misses.append(f"{self.backend}.{name}")
+            return None
+        record = queue.popleft() if len(queue) > 1 else queue[0]
+        if self.replay_clock is not None:
+            self.replay_clock(record)
+        return record["res"]
+
+    def install(self) -> "BackendTap":
+        for name in self.methods:
+            original = vars(self.cls)[name]
+            self._originals[name] = original
+            setattr(self.cls, name, self._wrap(name, original))
+        return self
+
+    def uninstall(self) -> None:
+        for name, original in self._originals.items():
+            setattr(self.cls, name, original)
+        self._originals = {}
+
+    def load_replay(self, records: Iterable[Dict[str, Any]]) -> None:
+        """Pasa a modo reproducción con las llamadas grabadas de este backend."""
+        replay: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = defaultdict(deque)
+        for record in records:
+            if record.get("k") == "backend" and record.get("b") == self.backend:
+                replay[self._key(record["m"], tuple(record["args"]), record["kw"])].append(record)
+        self._replay = replay
+
+def read_recording(path: str) -> List[List[Dict[str, Any]]]:
+    """Lee una grabación y la devuelve agrupada por turnos."""
+    turns: List[List[Dict[str, Any]]] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["k"] == "turn" or not turns:
+                turns.append([])
+            turns[-1].append(record)
+    return turns
@@ -0,0 +1,242 @@
+"""
+Coalescencia de lecturas concurrentes (single-flight) y caché con refresco anticipado.
+"""
+
+import asyncio
+import functools
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+class _Call:
+    """Llamada en curso compartida por todos los que piden la misma clave."""
+    
+    __slots__ = ("event", "result", "error", "waiters")
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave en una sola ejecución.
+    
+    Funciona entre hilos (`do`) y entre tareas asyncio (`do_async`). En asyncio
+    las tareas del mismo bucle esperan una tarea compartida, y la ejecución real
+    pasa también por `do`, de modo que se coalescen con los hilos. La tarea
+    compartida no pertenece a ningún llamador: cancelar al primero que la pidió
+    no cancela la lectura de los demás.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._async_calls: Dict[Tuple[int, Hashable], "asyncio.Task"] = {}
+        self.requests = 0
+        self.executions = 0
+    
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Ejecuta `fn` o espera al resultado de la ejecución en curso para `key`."""
+        with self._lock:
+            self.requests += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        
+        if call.error is not None:
+            raise call.error
+        return call.result
+    
+    async def do_async(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Versión asyncio: `fn` es bloqueante y se ejecuta en un hilo."""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        
+        with self._lock:
+            task = self._async_calls.get(loop_key)
+            if task is None:
+                task = loop.create_task(asyncio.to_thread(self.do, key, fn))
+                self._async_calls[loop_key] = task
+                task.add_done_callback(lambda done: self._forget_async(loop_key, done))
+            else:
+                self.requests += 1
+        
+        # shield: un llamador cancelado deja de esperar, la lectura sigue
+        return await asyncio.shield(task)
+    
+    def _forget_async(self, loop_key: Tuple[int, Hashable], task: "asyncio.Task") -> None:
+        with self._lock:
+            if self._async_calls.get(loop_key) is task:
+                del self._async_calls[loop_key]
+        if not task.cancelled():
+            # Evitar el aviso de excepción no recuperada si ya nadie esperaba
+            task.exception()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Peticiones recibidas, ejecuciones reales y ratio de coalescencia."""
+        with self._lock:
+            coalesced = self.requests - self.executions
+            return {
+                "requests": self.requests,
+                "executions": self.executions,
+                "coalesced": coalesced,
+                "coalescing_ratio": coalesced / self.requests if self.requests else 0.0
+            }
+
+class EarlyRefreshCache:
+    """
+    Caché TTL con expiración anticipada probabilística.
+    
+    Cada lectura puede decidir refrescar antes de que la entrada caduque, con
+    una probabilidad que crece al acercarse el vencimiento y con el coste de la
+    última recarga. Así las recargas de una clave popular se reparten en el
+    tiempo en lugar de coincidir todas al expirar el TTL.
+    """
+    
+    def __init__(self, ttl_seconds: float, beta: float = 1.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.beta = beta
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[Any, float, float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.early_refreshes = 0
+    
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        single_flight: Optional[SingleFlight] = None,
+        ttl_seconds: Optional[float] = None
+    ) -> Any:
+        """Devuelve el valor cacheado o lo recarga con `loader` (TTL propio opcional)."""
+        ttl_seconds = ttl_seconds or self.ttl_seconds
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        
+        if entry is not None:
+            value, expires_at, delta = entry
+            jitter = -delta * self.beta * math.log(random.random() or 1e-12)
+            if now + jitter < expires_at:
+                with self._lock:
+                    self.hits += 1
+                return value
+            with self._lock:
+                if now < expires_at:
+                    self.early_refreshes += 1
+                else:
+                    self.misses += 1
+        else:
+            with self._lock:
+                self.misses += 1
+        
+        def _load():
+            started = time.monotonic()
+            value = loader()
+            finished = time.monotonic()
+            if not value:
+                # No cachear ausencias ni resultados vacíos por error
+                return value
+            with self._lock:
+                if len(self._entries) >= self.max_entries and key not in self._entries:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = (value, finished + ttl_seconds, finished - started)
+            return value
+        
+        if single_flight is not None:
+            return single_flight.do(("cache", key), _load)
+        return _load()
+    
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Elimina una clave o toda la caché."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Aciertos, fallos y refrescos anticipados."""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "early_refreshes": self.early_refreshes
+            }
+
+def _read_key(name: str, args: tuple, kwargs: Dict[str, Any]) -> str:
+    return json.dumps([name, args, kwargs], sort_keys=True, default=str)
+
+def _copy_result(result: Any) -> Any:
+    """Copia superficial para que cada llamador pueda modificar su resultado."""
+    # dict.copy conserva la marca de los datos ya validados (models._TrustedDict)
+    if isinstance(result, dict):
+        return result.copy()
+    if isinstance(result, list):
+        return [item.copy() if isinstance(item, dict) else item for item in result]
+    return result
+
+def coalesced_read(method: Callable) -> Callable:
+    """Decora un método de lectura para coalescer llamadas idénticas concurrentes."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = _read_key(method.__name__, args, kwargs)
+        return _copy_result(self._single_flight.do(key, lambda: method(self, *args, **kwargs)))
+    return wrapper
+
+def cached_read(
+    method: Optional[Callable] = None,
+    *,
+    ttl_seconds: Optional[float] = None
+) -> Callable:
+    """
+    Como `coalesced_read`, pero sirviendo además desde la caché de lecturas.
+    
+    Se usa como `@cached_read` o, para datos que cambian fuera de este
+    servicio, como `@cached_read(ttl_seconds=...)` con un TTL más corto.
+    """
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = _read_key(method.__name__, args, kwargs)
+            result = self._read_cache.get_or_load(
+                key,
+                lambda: method(self, *args, **kwargs),
+                self._single_flight,
+                ttl_seconds
+            )
+            return _copy_result(result)
+        return wrapper
+    
+    if method is not None:
+        return decorator(method)
+    return decorator
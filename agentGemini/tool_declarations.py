@@ -0,0 +1,152 @@
+"""
+Declaraciones compactas de las herramientas para las llamadas al modelo.
+
+ADK genera cada declaración a partir de la firma y del docstring completo de
+la herramienta, y esa prosa (Args, Returns, notas) se envía en cada llamada.
+Aquí cada herramienta tiene una declaración mínima escrita a mano: una
+descripción corta, los tipos, los valores permitidos como `enum` y los
+argumentos obligatorios. `compact_tools_before_model` sustituye en la petición
+las declaraciones generadas por estas; las herramientas sin declaración
+compacta se envían como las genera ADK.
+
+Las declaraciones son datos fijos, así que el payload es idéntico en todas las
+llamadas y su coste en tokens se comprueba con
+`scripts/tool_declarations_budget.py`.
+"""
+
+import json
+import logging
+from functools import lru_cache
+from typing import Any, Dict
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+
+# Valores aceptados por las herramientas de conversión
+PAYMENT_METHODS = ("transfer", "financing", "card")
+SERVICE_TYPES = ("demo", "installation", "maintenance", "training")
+DISCOUNT_TYPES = ("loyalty", "new_customer", "referral", "seasonal")
+
+_STRING = {"type": "STRING"}
+
+TOOL_DECLARATIONS: Dict[str, Dict[str, Any]] = {
+    "get_customer_profile": {
+        "name": "get_customer_profile",
+        "description": "Identifica al cliente y carga su perfil. Indica uno de los datos.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {
+                "customer_id": _STRING,
+                "email": _STRING,
+                "phone": _STRING,
+            },
+        },
+    },
+    "update_customer_profile": {
+        "name": "update_customer_profile",
+        "description": "Guarda datos del cliente identificado.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {
+                "updates": {
+                    "type": "OBJECT",
+                    "description": (
+                        "Campos: hectares, main_crops, current_machinery, location, sector..."
+                    ),
+                },
+            },
+            "required": ["updates"],
+        },
+    },
+    "process_checkout": {
+        "name": "process_checkout",
+        "description": "Crea el pedido con el carrito actual.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {
+                "payment_method": {"type": "STRING", "enum": list(PAYMENT_METHODS)},
+                "delivery_address": {"type": "OBJECT"},
+                "billing_info": {"type": "OBJECT"},
+                "special_instructions": _STRING,
+            },
+            "required": ["payment_method"],
+        },
+    },
+    "schedule_service": {
+        "name": "schedule_service",
+        "description": "Reserva un servicio técnico o una demostración.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {
+                "customer_id": _STRING,
+                "service_type": {"type": "STRING", "enum": list(SERVICE_TYPES)},
+                "preferred_date": {"type": "STRING", "description": "YYYY-MM-DD"},
+                "location": _STRING,
+                "product_id": _STRING,
+                "notes": _STRING,
+                "preferred_time": {"type": "STRING", "description": "HH:MM"},
+            },
+            "required": ["customer_id", "service_type", "preferred_date", "location"],
+        },
+    },
+    "generate_discount_code": {
+        "name": "generate_discount_code",
+        "description": "Genera un código de descuento para el cliente.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {
+                "customer_id": _STRING,
+                "discount_type": {"type": "STRING", "enum": list(DISCOUNT_TYPES)},
+                "reason": _STRING,
+            },
+            "required": ["customer_id"],
+        },
+    },
+    "request_additional_tools": {
+        "name": "request_additional_tools",
+        "description": "Pide todas las herramientas si la necesaria no está disponible.",
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {
+                "capability": {"type": "STRING", "description": "Qué necesitas hacer"},
+            },
+            "required": ["capability"],
+        },
+    },
+}
+
+def serialize(declaration: Dict[str, Any]) -> str:
+    """JSON canónico de una declaración (claves ordenadas, sin espacios)."""
+    return json.dumps(declaration, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+def declaration_tokens(declaration: Dict[str, Any]) -> int:
+    """Tokens aproximados de una declaración."""
+    return max(1, len(serialize(declaration)) // CHARS_PER_TOKEN)
+
+@lru_cache(maxsize=None)
+def _function_declaration(name: str):
+    # google.genai se carga con la primera llamada al modelo, no al importar
+    from google.genai import types
+    return types.FunctionDeclaration.model_validate(TOOL_DECLARATIONS[name])
+
+# Callback del agente
+
+def compact_tools_before_model(callback_context, llm_request) -> None:
+    """Sustituye en la petición las declaraciones generadas por las compactas."""
+    if not Config.COMPACT_TOOL_DECLARATIONS_ENABLED:
+        return None
+    if not llm_request.config or not llm_request.config.tools:
+        return None
+
+    for tool in llm_request.config.tools:
+        declarations = getattr(tool, "function_declarations", None)
+        if not declarations:
+            continue
+        tool.function_declarations = [
+            _function_declaration(d.name) if d.name in TOOL_DECLARATIONS else d
+            for d in declarations
+        ]
+    return None
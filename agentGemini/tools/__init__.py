@@ -1,47 +1,40 @@
 """
 Herramientas principales del agente.
-"""
-
-from .customer_tools import (
-    get_customer_profile,
-    update_customer_profile
-)
-
-from .catalog_tools import (
-    search_products,
-    get_product_details,
-    get_recommendations
-)
 
-from .cart_tools import (
-    add_to_cart,
-    remove_from_cart,
-    get_cart_summary
-)
+Los módulos de herramientas se registran aquí pero se importan al acceder a
+la primera herramienta de cada uno: importar el paquete no crea servicios ni
+abre conexiones.
+"""
 
-from .conversion_tools import (
-    process_checkout,
-    schedule_service,
-    generate_discount_code
-)
+import importlib
 
-__all__ = [
+_TOOL_MODULES = {
     # Customer tools
-    "get_customer_profile",
-    "update_customer_profile",
+    "get_customer_profile": ".customer_tools",
+    "update_customer_profile": ".customer_tools",
     
     # Catalog tools
-    "search_products",
-    "get_product_details",
-    "get_recommendations",
+    "search_products": ".catalog_tools",
+    "get_product_details": ".catalog_tools",
+    "get_recommendations": ".catalog_tools",
     
     # Cart tools
-    "add_to_cart",
-    "remove_from_cart",
-    "get_cart_summary",
+    "add_to_cart": ".cart_tools",
+    "remove_from_cart": ".cart_tools",
+    "get_cart_summary": ".cart_tools",
     
     # Conversion tools
-    "process_checkout",
-    "schedule_service",
-    "generate_discount_code"
-]
\ No newline at end of file
+    "process_checkout": ".conversion_tools",
+    "schedule_service": ".conversion_tools",
+    "generate_discount_code": ".conversion_tools"
+}
+
+__all__ = list(_TOOL_MODULES)
+
+def __getattr__(name):
+    module = _TOOL_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
@@ -4,18 +4,25 @@ Herramientas para conversión y cierre de ventas.
 
 import logging
 import uuid
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 
 from ..models import Cart, ServiceBooking
 from ..config import Config
-from ..services.firestore_service import FirestoreService
+from ..services.firestore_service import shared_service
 from ..services.email_service import EmailService
+from ..services.discount_service import DiscountService
+from ..services.pricing_service import PricingService
+from ..services.booking_calendar import BookingCalendar
+from ..tool_declarations import PAYMENT_METHODS, SERVICE_TYPES
 
 logger = logging.getLogger(__name__)
 
-db_service = FirestoreService()
+db_service = shared_service()
 email_service = EmailService()
+discount_service = DiscountService(db_service)
+pricing_service = PricingService()
+booking_calendar = BookingCalendar(db_service)
 
 def process_checkout(
     session_state: Dict[str, Any],
@@ -46,7 +53,9 @@ def process_checkout(
                 "message": "El carrito está vacío"
             }
         
-        cart = Cart(**cart_data)
+        # Solo se valida si no viene ya validado (marcado) del estado de sesión
+        cart_data = Cart.ensure_valid(cart_data)
+        discount_codes = cart_data.get("discount_codes", [])
         
         # Validar cliente
         customer = session_state.get("customer")
@@ -57,13 +66,28 @@ def process_checkout(
             }
         
         # Validar método de pago
-        valid_methods = ["transfer", "financing", "card"]
-        if payment_method not in valid_methods:
+        if payment_method not in PAYMENT_METHODS:
             return {
                 "status": "error",
-                "message": f"Método de pago inválido. Opciones: {', '.join(valid_methods)}"
+                "message": f"Método de pago inválido. Opciones: {', '.join(PAYMENT_METHODS)}"
             }
         
+        # Validar códigos de descuento y calcular el presupuesto
+        discount_code, rejected_codes = None, []
+        if discount_codes:
+            discount_code, rejected_codes = discount_service.select_code(
+                discount_codes,
+                customer.get("id")
+            )
+        
+        quote = pricing_service.quote(cart_data, customer, payment_method, discount_code)
+        if discount_code and not quote.applied_discount_code:
+            rejected_codes.append({
+                "code": discount_code["code"],
+                "reason": "El descuento de cliente leal es mayor"
+            })
+        redeemed_codes = [quote.applied_discount_code] if quote.applied_discount_code else []
+        
         # Crear pedido
         order_id = f"ORD-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
         
@@ -72,21 +96,14 @@ def process_checkout(
             "customer_id": customer.get("id"),
             "customer_name": customer.get("name"),
             "customer_email": customer.get("email"),
-            "items": [
-                {
-                    "product_id": item["product"]["id"],
-                    "name": item["product"]["name"],
-                    "quantity": item["quantity"],
-                    "unit_price": item["product"]["price"],
-                    "subtotal": item["product"]["price"] * item["quantity"]
-                }
-                for item in cart_data["items"]
-            ],
-            "subtotal": cart.subtotal,
-            "discount_codes": cart.discount_codes,
-            "discount_amount": 0,  # Calcular según códigos
-            "total": cart.subtotal,
-            "currency": Config.DEFAULT_CURRENCY,
+            "items": [line.model_dump() for line in quote.lines],
+            "subtotal": quote.subtotal,
+            "discount_codes": redeemed_codes,
+            "discount_amount": quote.discount_amount,
+            "financing_surcharge": quote.financing_surcharge,
+            "tax_amount": quote.tax_amount,
+            "total": quote.total,
+            "currency": quote.currency,
             "payment_method": payment_method,
             "delivery_address": delivery_address,
             "billing_info": billing_info,
@@ -94,16 +111,12 @@ def process_checkout(
             "status": "pending",
             "created_at": datetime.now().isoformat()
         }
+        if quote.discount_reason:
+            order_data["discount_reason"] = quote.discount_reason
         
-        # Aplicar descuento por lealtad si aplica
-        if customer.get("total_purchases", 0) >= Config.LOYALTY_DISCOUNT_THRESHOLD:
-            discount = order_data["subtotal"] * (Config.LOYALTY_DISCOUNT_PERCENTAGE / 100)
-            order_data["discount_amount"] = discount
-            order_data["total"] = order_data["subtotal"] - discount
-            order_data["discount_reason"] = "Descuento cliente leal"
-        
-        # Guardar pedido en Firestore
-        db_service.create_order(order_data)
+        # Guardar pedido y canjear códigos en la misma transacción
+        db_service.create_order_with_redemptions(order_data, redeemed_codes)
+        discount_service.mark_used(redeemed_codes)
         
         # Actualizar total de compras del cliente
         new_total = customer.get("total_purchases", 0) + order_data["total"]
@@ -120,7 +133,7 @@ def process_checkout(
             )
         
         # Limpiar carrito
-        session_state["cart"] = Cart().model_dump()
+        session_state["cart"] = Cart().to_trusted_dict()
         
         logger.info(f"Pedido creado: {order_id} para cliente {customer['id']}")
         
@@ -136,6 +149,7 @@ def process_checkout(
                     datetime.now() + timedelta(days=7)
                 ).strftime("%d/%m/%Y")
             },
+            "rejected_discount_codes": rejected_codes,
             "next_steps": _get_next_steps(payment_method)
         }
         
@@ -152,29 +166,30 @@ def schedule_service(
     preferred_date: str,
     location: str,
     product_id: Optional[str] = None,
-    notes: Optional[str] = None
+    notes: Optional[str] = None,
+    preferred_time: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Programa un servicio técnico o demostración.
     
     Args:
         customer_id: ID del cliente
-        service_type: Tipo de servicio (demo, installation, maintenance)
+        service_type: Tipo de servicio (demo, installation, maintenance, training)
         preferred_date: Fecha preferida (YYYY-MM-DD)
         location: Ubicación del servicio
         product_id: ID del producto relacionado
         notes: Notas adicionales
+        preferred_time: Hora preferida (HH:MM); si falta, la primera libre del día
         
     Returns:
         Dict con la confirmación de la cita
     """
     try:
         # Validar tipo de servicio
-        valid_services = ["demo", "installation", "maintenance", "training"]
-        if service_type not in valid_services:
+        if service_type not in SERVICE_TYPES:
             return {
                 "status": "error",
-                "message": f"Tipo de servicio inválido. Opciones: {', '.join(valid_services)}"
+                "message": f"Tipo de servicio inválido. Opciones: {', '.join(SERVICE_TYPES)}"
             }
         
         # Validar fecha
@@ -190,7 +205,10 @@ def schedule_service(
             if service_date > max_date:
                 return {
                     "status": "error",
-                    "message": f"Solo se pueden programar servicios hasta {Config.SERVICE_BOOKING_DAYS_AHEAD} días en adelante"
+                    "message": (
+                        "Solo se pueden programar servicios hasta "
+                        f"{Config.SERVICE_BOOKING_DAYS_AHEAD} días en adelante"
+                    )
                 }
         except ValueError:
             return {
@@ -198,14 +216,28 @@ def schedule_service(
                 "message": "Formato de fecha inválido. Use YYYY-MM-DD"
             }
         
-        # Verificar disponibilidad (simplificado)
-        # En producción, esto verificaría contra un calendario real
         if service_date.weekday() in [5, 6]:  # Sábado o domingo
             return {
                 "status": "error",
                 "message": "No hay servicio disponible los fines de semana"
             }
         
+        # Buscar hueco en el calendario de técnicos de la zona
+        if preferred_time:
+            try:
+                hour, minute = (int(part) for part in preferred_time.split(":"))
+                slot_start = service_date.replace(hour=hour, minute=minute)
+            except ValueError:
+                return {
+                    "status": "error",
+                    "message": "Formato de hora inválido. Use HH:MM"
+                }
+        else:
+            first_free = booking_calendar.find_free_slots(location, service_date, limit=1)
+            slot_start = first_free[0]["start"] if first_free else None
+            if slot_start and slot_start.date() != service_date.date():
+                slot_start = None
+        
         # Crear reserva
         booking_id = f"SVC-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6].upper()}"
         
@@ -214,15 +246,42 @@ def schedule_service(
             customer_id=customer_id,
             service_type=service_type,
             product_id=product_id,
-            scheduled_date=service_date,
+            scheduled_date=slot_start or service_date,
             duration_minutes=Config.SERVICE_DURATION_MINUTES,
             location=location,
+            region=location,
             notes=notes,
             status="scheduled"
         )
         
-        # Guardar en Firestore
-        db_service.create_service_booking(booking.model_dump())
+        # Sin técnicos de la zona en el calendario (o sin calendario cargado):
+        # la reserva se crea sin asignar y se asigna después
+        if not booking_calendar.technicians_for(location):
+            db_service.create_service_booking(booking.model_dump())
+            reserved = booking.model_dump()
+        # Reservar de forma atómica (evita dobles reservas del mismo técnico)
+        elif slot_start:
+            reserved = booking_calendar.reserve(booking.model_dump(), location, slot_start)
+        else:
+            reserved = None
+        
+        if not reserved:
+            alternatives = booking_calendar.find_free_slots(location, service_date, limit=3)
+            return {
+                "status": "error",
+                "message": "No hay técnicos disponibles en esa fecha y hora",
+                "available_slots": [
+                    {
+                        "date": slot["start"].strftime("%Y-%m-%d"),
+                        "time": slot["start"].strftime("%H:%M"),
+                        "technician": slot["technician_name"]
+                    }
+                    for slot in alternatives
+                ]
+            }
+        
+        booking = ServiceBooking(**reserved)
+        technician = booking_calendar.technician_name(booking.technician_id)
         
         # Obtener info del cliente para enviar confirmación
         customer = db_service.get_customer(customer_id)
@@ -250,11 +309,11 @@ def schedule_service(
             "booking_id": booking_id,
             "booking_details": {
                 "service": service_descriptions.get(service_type, service_type),
-                "date": service_date.strftime("%d/%m/%Y"),
-                "time": "Por confirmar",  # En producción, incluiría hora específica
+                "date": booking.scheduled_date.strftime("%d/%m/%Y"),
+                "time": booking.scheduled_date.strftime("%H:%M"),
                 "location": location,
                 "duration": f"{Config.SERVICE_DURATION_MINUTES} minutos",
-                "technician": "Por asignar"
+                "technician": technician or "Por asignar"
             },
             "next_steps": [
                 "Recibirás un email de confirmación",
@@ -280,7 +339,7 @@ def generate_discount_code(
     
     Args:
         customer_id: ID del cliente
-        discount_type: Tipo de descuento (loyalty, new_customer, referral)
+        discount_type: Tipo de descuento (loyalty, new_customer, referral, seasonal)
         reason: Razón del descuento
         
     Returns:
@@ -310,7 +369,10 @@ def generate_discount_code(
             if customer.get("total_purchases", 0) < Config.LOYALTY_DISCOUNT_THRESHOLD:
                 return {
                     "status": "error",
-                    "message": f"Se requieren compras por {Config.LOYALTY_DISCOUNT_THRESHOLD}€ para descuento de lealtad"
+                    "message": (
+                        f"Se requieren compras por {Config.LOYALTY_DISCOUNT_THRESHOLD}€ "
+                        "para descuento de lealtad"
+                    )
                 }
         
         elif discount_type == "new_customer":
@@ -324,6 +386,7 @@ def generate_discount_code(
         code = f"{discount_type.upper()}-{uuid.uuid4().hex[:8].upper()}"
         
         # Crear registro del descuento
+        valid_until = datetime.now() + timedelta(days=Config.DISCOUNT_CODE_VALIDITY_DAYS)
         discount_data = {
             "code": code,
             "customer_id": customer_id,
@@ -331,13 +394,14 @@ def generate_discount_code(
             "percentage": percentage,
             "reason": reason or f"Descuento {discount_type}",
             "valid_from": datetime.now().isoformat(),
-            "valid_until": (datetime.now() + timedelta(days=30)).isoformat(),
+            "valid_until": valid_until.isoformat(),
             "used": False,
             "created_at": datetime.now().isoformat()
         }
         
-        # Guardar en Firestore
+        # Guardar en Firestore y registrar en el índice de canje
         db_service.create_discount_code(discount_data)
+        discount_service.register(discount_data)
         
         logger.info(f"Código de descuento generado: {code} para cliente {customer_id}")
         
@@ -347,7 +411,7 @@ def generate_discount_code(
             "discount_code": {
                 "code": code,
                 "percentage": percentage,
-                "valid_until": (datetime.now() + timedelta(days=30)).strftime("%d/%m/%Y"),
+                "valid_until": valid_until.strftime("%d/%m/%Y"),
                 "conditions": _get_discount_conditions(discount_type)
             }
         }
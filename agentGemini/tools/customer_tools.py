@@ -0,0 +1,146 @@
+"""
+Herramientas de perfil de cliente.
+"""
+
+import logging
+from typing import Dict, Any, Optional
+
+from pydantic import ValidationError
+
+from ..models import Customer
+from ..services.firestore_service import shared_service
+from ..services.profile_writes import ProfileWriteBuffer
+
+logger = logging.getLogger(__name__)
+
+db_service = shared_service()
+profile_writes = ProfileWriteBuffer(db_service)
+
+# Campos del perfil que puede actualizar el agente
+PROFILE_FIELDS = {
+    "name",
+    "email",
+    "phone",
+    "company_name",
+    "customer_type",
+    "sector",
+    "location",
+    "hectares",
+    "main_crops",
+    "current_machinery",
+    "preferences",
+}
+
+def get_customer_profile(
+    session_state: Dict[str, Any],
+    customer_id: Optional[str] = None,
+    email: Optional[str] = None,
+    phone: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Identifica al cliente y carga su perfil en la sesión.
+
+    Args:
+        session_state: Estado de la sesión
+        customer_id: ID del cliente, si se conoce
+        email: Email del cliente
+        phone: Teléfono del cliente, en cualquier formato
+
+    Returns:
+        Dict con el perfil del cliente o not_found
+    """
+    try:
+        if customer_id:
+            customer = db_service.get_customer(customer_id)
+        elif email:
+            customer = db_service.get_customer_by_email(email)
+        elif phone:
+            customer = db_service.get_customer_by_phone(phone)
+        else:
+            return {
+                "status": "error",
+                "message": "Indica el ID, email o teléfono del cliente"
+            }
+
+        if not customer:
+            return {"status": "not_found", "message": "Cliente no encontrado"}
+
+        # Cambios de este turno que aún no se han escrito
+        pending = profile_writes.pending(customer["id"])
+        if pending:
+            customer = Customer.ensure_valid({**customer, **pending})
+
+        session_state["customer"] = customer
+        return {"status": "success", "customer": customer}
+
+    except Exception as e:
+        logger.error(f"Error obteniendo perfil de cliente: {e}")
+        return {
+            "status": "error",
+            "message": "Error al obtener el perfil del cliente"
+        }
+
+def update_customer_profile(
+    session_state: Dict[str, Any],
+    updates: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Actualiza el perfil del cliente con lo aprendido en la conversación.
+
+    El perfil de la sesión se actualiza al momento; la escritura en Firestore
+    se acumula y se hace una sola vez al final del turno.
+
+    Args:
+        session_state: Estado de la sesión con el cliente
+        updates: Campos a actualizar (hectares, main_crops, current_machinery...)
+
+    Returns:
+        Dict con los campos actualizados
+    """
+    customer = session_state.get("customer")
+    if not customer:
+        return {
+            "status": "error",
+            "message": "No hay un cliente identificado en la sesión"
+        }
+
+    ignored = sorted(set(updates) - PROFILE_FIELDS)
+    updates = {field: value for field, value in updates.items() if field in PROFILE_FIELDS}
+    if not updates:
+        return {
+            "status": "error",
+            "message": f"Campos no actualizables: {', '.join(ignored)}"
+        }
+
+    try:
+        validated = Customer.model_validate({**customer, **updates})
+    except ValidationError as e:
+        return {
+            "status": "error",
+            "message": f"Datos de perfil inválidos: {e.errors()[0]['msg']}"
+        }
+    # Los campos nuevos se guardan ya convertidos (hectáreas como número...)
+    updates = validated.model_dump(mode="json", include=set(updates))
+    updated = Customer.trusted({**customer, **updates})
+
+    session_state["customer"] = updated
+    profile_writes.stage(updated["id"], {field: updated[field] for field in updates})
+
+    return {
+        "status": "success",
+        "updated_fields": sorted(updates),
+        "ignored_fields": ignored
+    }
+
+def flush_profile_writes(callback_context) -> None:
+    """Callback de fin de turno: escribe los cambios de perfil acumulados."""
+    customer = callback_context.state.get("customer")
+    if customer:
+        profile_writes.flush(customer["id"])
+    return None
+
+def end_profile_session(session_state: Dict[str, Any]) -> None:
+    """Cierre de la sesión: escribe lo que quede pendiente del cliente."""
+    customer = session_state.get("customer")
+    if customer:
+        profile_writes.end_session(customer["id"])
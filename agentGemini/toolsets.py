@@ -0,0 +1,146 @@
+"""
+Selección dinámica de herramientas según la etapa del embudo.
+
+En cada llamada al modelo solo se envían las declaraciones de las herramientas
+útiles para `SessionState.conversation_stage`. Todas las herramientas siguen
+registradas en el agente, así que si el modelo llama a una que no estaba
+expuesta se ejecuta igualmente y el resto de la etapa usa el conjunto completo.
+"""
+
+import logging
+from typing import Dict, Any, List, Optional
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+STAGE_GREETING = "greeting"
+STAGE_DISCOVERY = "discovery"
+STAGE_PRESENTATION = "presentation"
+STAGE_CLOSING = "closing"
+
+STATE_STAGE = "conversation_stage"
+STATE_ESCALATED_STAGE = "toolset_escalated_stage"
+
+ESCALATION_TOOL = "request_additional_tools"
+
+STAGE_TOOLSETS: Dict[str, List[str]] = {
+    STAGE_GREETING: [
+        "get_customer_profile",
+        "update_customer_profile",
+        "search_products",
+    ],
+    STAGE_DISCOVERY: [
+        "get_customer_profile",
+        "update_customer_profile",
+        "search_products",
+        "get_recommendations",
+        "get_product_details",
+    ],
+    STAGE_PRESENTATION: [
+        "update_customer_profile",
+        "search_products",
+        "get_product_details",
+        "get_recommendations",
+        "add_to_cart",
+        "schedule_service",
+    ],
+    STAGE_CLOSING: [
+        "search_products",
+        "get_product_details",
+        "add_to_cart",
+        "remove_from_cart",
+        "get_cart_summary",
+        "process_checkout",
+        "schedule_service",
+        "generate_discount_code",
+    ],
+}
+
+# Etapa a la que pasa la conversación tras usar cada herramienta
+STAGE_AFTER_TOOL: Dict[str, str] = {
+    "get_customer_profile": STAGE_DISCOVERY,
+    "update_customer_profile": STAGE_DISCOVERY,
+    "search_products": STAGE_PRESENTATION,
+    "get_product_details": STAGE_PRESENTATION,
+    "get_recommendations": STAGE_PRESENTATION,
+    "add_to_cart": STAGE_CLOSING,
+    "remove_from_cart": STAGE_CLOSING,
+    "get_cart_summary": STAGE_CLOSING,
+    "generate_discount_code": STAGE_CLOSING,
+    "process_checkout": STAGE_DISCOVERY,
+}
+
+def tools_for_stage(stage: Optional[str], escalated: bool = False) -> Optional[List[str]]:
+    """
+    Nombres de herramientas expuestas en una etapa.
+    
+    Returns:
+        Lista de nombres, o None si deben exponerse todas
+    """
+    if escalated or not Config.DYNAMIC_TOOLSETS_ENABLED or stage not in STAGE_TOOLSETS:
+        return None
+    return STAGE_TOOLSETS[stage] + [ESCALATION_TOOL]
+
+def next_stage(current: Optional[str], tool_name: str) -> str:
+    """Etapa resultante tras ejecutar una herramienta."""
+    return STAGE_AFTER_TOOL.get(tool_name, current or STAGE_GREETING)
+
+def request_additional_tools(capability: str, tool_context=None) -> Dict[str, Any]:
+    """
+    Pide acceso a todas las herramientas si la necesaria no está disponible.
+    
+    Args:
+        capability: Qué necesitas hacer y no puedes con las herramientas actuales
+    
+    Returns:
+        Dict con la confirmación
+    """
+    if tool_context is not None:
+        tool_context.state[STATE_ESCALATED_STAGE] = tool_context.state.get(STATE_STAGE)
+    logger.info(f"Escalado de herramientas solicitado: {capability}")
+    return {
+        "status": "success",
+        "message": "Todas las herramientas están disponibles para esta etapa"
+    }
+
+# Callbacks del agente
+
+def _is_escalated(state: Dict[str, Any]) -> bool:
+    escalated_stage = state.get(STATE_ESCALATED_STAGE)
+    return escalated_stage is not None and escalated_stage == state.get(STATE_STAGE)
+
+def filter_tools_before_model(callback_context, llm_request) -> None:
+    """Deja en la petición al modelo solo las declaraciones de la etapa actual."""
+    state = callback_context.state
+    allowed = tools_for_stage(state.get(STATE_STAGE), _is_escalated(state))
+    if allowed is None or not llm_request.config or not llm_request.config.tools:
+        return None
+    
+    allowed_names = set(allowed)
+    tools = []
+    for tool in llm_request.config.tools:
+        declarations = getattr(tool, "function_declarations", None)
+        if not declarations:
+            tools.append(tool)
+            continue
+        tool.function_declarations = [d for d in declarations if d.name in allowed_names]
+        if tool.function_declarations:
+            tools.append(tool)
+    llm_request.config.tools = tools
+    return None
+
+def track_stage_after_tool(tool, args: Dict[str, Any], tool_context, tool_response) -> None:
+    """Avanza la etapa del embudo y escala si se usó una herramienta no expuesta."""
+    state = tool_context.state
+    stage = state.get(STATE_STAGE)
+    allowed = tools_for_stage(stage, _is_escalated(state))
+    
+    if allowed is not None and tool.name not in allowed:
+        logger.info(f"Herramienta fuera de la etapa '{stage}': {tool.name}; escalando")
+        state[STATE_ESCALATED_STAGE] = stage
+    
+    new_stage = next_stage(stage, tool.name)
+    if new_stage != stage:
+        state[STATE_STAGE] = new_stage
+    return None
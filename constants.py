@@ -22,4 +22,11 @@ STATE_SELECTED_CATEGORY = "selected_category_id"
 STATE_SELECTED_SUB_CATEGORY = "selected_sub_category_id"
 STATE_SELECTED_SUB_SUB_CATEGORY = "selected_sub_sub_category_id"
 STATE_SELECTED_PRODUCT_TYPE = "selected_product_type_id"
-STATE_SELECTED_PRODUCT = "selected_product_id"
\ No newline at end of file
+STATE_SELECTED_PRODUCT = "selected_product_id"
+# --- Subida de vídeos de clientes ---
+MEDIA_CHUNK_SIZE_BYTES = 4 * 1024 * 1024  # trozos pequeños para conexiones rurales
+MEDIA_MAX_UPLOAD_BYTES = 2 * 1024 * 1024 * 1024
+MEDIA_UPLOAD_TTL_SECONDS = 48 * 3600  # tiempo para reanudar una subida
+MEDIA_ALLOWED_CONTENT_TYPES = ["video/mp4", "video/quicktime", "video/3gpp", "video/webm"]
+MEDIA_PROCESSING_WORKERS = 2
+MEDIA_UPLOAD_BASE_URL = "/uploads"
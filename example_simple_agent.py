@@ -9,9 +9,11 @@ from typing import Dict, List, Any
 from google.genai import Client, types
 from dotenv import load_dotenv
 
-# Cargar variables de entorno
+# Cargar variables de entorno (antes de importar la configuración del agente)
 load_dotenv()
 
+from agentGemini.services.model_client import StreamingModelClient  # noqa: E402
+
 # Configuración
 MODEL_NAME = "gemini-2.0-flash"
 
@@ -65,8 +67,11 @@ def search_products(query: str, category: str = None) -> List[Dict[str, Any]]:
 def main():
     """Ejemplo de uso del cliente ADK con streaming."""
     
-    # Crear cliente
-    client = Client(api_key=os.getenv("GEMINI_API_KEY"))
+    # Cliente con API key, envuelto para obtener métricas de cada llamada
+    client = StreamingModelClient(
+        client=Client(api_key=os.getenv("GEMINI_API_KEY")),
+        model=MODEL_NAME
+    )
     
     # Definir las herramientas disponibles
     tools = [
@@ -124,25 +129,21 @@ def main():
                 for msg in messages
             ]
             
-            # Generar respuesta
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=contents,
-                config=config,
-                stream=True  # Habilitar streaming
-            )
-            
-            # Procesar la respuesta en streaming
-            full_response = ""
-            for chunk in response:
-                if chunk.text:
-                    print(chunk.text, end="", flush=True)
-                    full_response += chunk.text
+            # Generar respuesta en streaming
+            stream = client.stream(contents, config=config)
+            for text in stream:
+                print(text, end="", flush=True)
             
             print()  # Nueva línea al final
+            metrics = stream.metrics
+            print(
+                f"[primer token {metrics.ttft_seconds or 0:.2f}s, "
+                f"total {metrics.total_seconds:.2f}s, "
+                f"{metrics.tokens_per_second or 0:.0f} tokens/s]"
+            )
             
             # Añadir respuesta del asistente al historial
-            messages.append({"role": "model", "content": full_response})
+            messages.append({"role": "model", "content": stream.text})
             
         except Exception as e:
             print(f"\nError: {e}")
@@ -0,0 +1,108 @@
+"""
+Router determinista previo al modelo para entradas estructuradas del frontend.
+
+Cuando el mensaje del usuario contiene un ID explícito ("ID: cat_tractors",
+"ID: prod_trac_001") o un payload de botón en JSON, la herramienta que toca es
+obvia: se llama directamente y se devuelve la respuesta con su plantilla sin
+pasar por Gemini. El resto de mensajes siguen el camino normal del modelo.
+"""
+
+import json
+import logging
+import re
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from google.adk.models import LlmResponse
+from google.genai import types as genai_types
+
+logger = logging.getLogger(__name__)
+
+_ID_PATTERN = re.compile(r"\bID:\s*((?:cat|prod)_[\w-]+)", re.IGNORECASE)
+
+# (respuesta estructurada, cambios de estado) que devuelve un handler
+RouteResult = Tuple[Dict[str, Any], Dict[str, Any]]
+
+# action del payload de botón -> tipo de selección
+_BUTTON_ACTIONS = {
+    "select_category": "category",
+    "select_product": "product",
+}
+
+def parse_selection(text: str) -> Optional[Tuple[str, str]]:
+    """
+    Extrae una selección explícita del mensaje del usuario.
+
+    Returns:
+        Tupla (tipo, id) con tipo "category" o "product", o None
+    """
+    text = text.strip()
+    if text.startswith("{"):
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError:
+            payload = None
+        if isinstance(payload, dict):
+            kind = _BUTTON_ACTIONS.get(payload.get("action"))
+            if kind and payload.get("id"):
+                return kind, str(payload["id"])
+
+    match = _ID_PATTERN.search(text)
+    if not match:
+        return None
+    selected_id = match.group(1)
+    kind = "category" if selected_id.lower().startswith("cat_") else "product"
+    return kind, selected_id
+
+class FastPathRouter:
+    """
+    Resuelve selecciones explícitas sin llamar al modelo.
+
+    Cada handler recibe el ID seleccionado y devuelve la respuesta estructurada
+    (template_id, message, data, next_funnel_step) y los cambios de estado, o
+    None si no puede resolverla y debe decidir el modelo.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[str], Optional[RouteResult]]]):
+        self.handlers = handlers
+        self.hits = 0
+        self.misses = 0
+
+    def route(self, text: str) -> Optional[RouteResult]:
+        """Devuelve (respuesta, cambios de estado) o None."""
+        selection = parse_selection(text)
+        if not selection:
+            return None
+        kind, selected_id = selection
+        handler = self.handlers.get(kind)
+        return handler(selected_id) if handler else None
+
+    def before_model_callback(self, callback_context, llm_request) -> Optional[LlmResponse]:
+        """Callback de ADK: si hay atajo, responde sin llamar al modelo."""
+        if not llm_request.contents:
+            return None
+        last = llm_request.contents[-1]
+        # Solo al inicio del turno; tras una herramienta decide el modelo
+        if last.role != "user" or not last.parts or not last.parts[0].text:
+            return None
+
+        started = time.perf_counter()
+        routed = self.route(last.parts[0].text)
+        if routed is None:
+            self.misses += 1
+            return None
+
+        response, state_updates = routed
+        for key, value in state_updates.items():
+            callback_context.state[key] = value
+        self.hits += 1
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"Fast path {response.get('template_id')} resuelto en {elapsed_ms:.1f} ms")
+
+        return LlmResponse(
+            content=genai_types.Content(
+                role="model",
+                parts=[genai_types.Part(text=json.dumps(response, ensure_ascii=False))]
+            )
+        )
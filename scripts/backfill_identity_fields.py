@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Completa `email_normalized` y `phone_e164` en los clientes que no los tienen.
+
+La identificación por email o teléfono consulta solo los campos normalizados,
+así que los clientes creados antes de que existieran no se encuentran hasta
+pasar este job. Recorre `customers` por páginas y, con --write, escribe los
+campos que faltan o no coinciden en batches.
+
+Uso:
+    python scripts/backfill_identity_fields.py [--write] [--page-size 500]
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agentGemini.services.firestore_service import FirestoreService  # noqa: E402
+from agentGemini.services.identity_index import missing_identity_fields  # noqa: E402
+
+# Límite de operaciones de un batch de Firestore
+MAX_BATCH_WRITES = 500
+
+def iter_customer_pages(db, page_size: int):
+    """Clientes por páginas ordenadas por ID, para no cargar la colección entera."""
+    query = db.collection("customers").order_by("__name__").limit(page_size)
+    last = None
+    while True:
+        page = list((query.start_after(last) if last is not None else query).stream())
+        if not page:
+            return
+        yield page
+        last = page[-1]
+
+def run(args) -> int:
+    started = time.perf_counter()
+    db = FirestoreService().db
+    if db is None:
+        print("Sin conexión a Firestore")
+        return 1
+
+    scanned = pending = written = 0
+    for page in iter_customer_pages(db, args.page_size):
+        updates = []
+        for doc in page:
+            fields = missing_identity_fields(doc.to_dict())
+            if fields:
+                updates.append((doc.reference, fields))
+        scanned += len(page)
+        pending += len(updates)
+        if not args.write:
+            continue
+        for start in range(0, len(updates), MAX_BATCH_WRITES):
+            batch = db.batch()
+            for ref, fields in updates[start:start + MAX_BATCH_WRITES]:
+                batch.update(ref, fields)
+            batch.commit()
+        written += len(updates)
+
+    print(f"Clientes revisados: {scanned}, sin campos normalizados: {pending}, "
+          f"actualizados: {written}")
+    print(f"Tiempo total: {time.perf_counter() - started:.1f}s")
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--write", action="store_true", help="Escribir los campos normalizados")
+    parser.add_argument("--page-size", type=int, default=MAX_BATCH_WRITES)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
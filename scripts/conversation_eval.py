@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+Evaluación por lotes de conversaciones de venta: rondas con el modelo,
+llamadas a herramientas, tokens y latencia por escenario.
+
+Ejecuta en paralelo (asyncio) cientos de conversaciones guionizadas (saludo →
+categoría → producto → carrito → checkout) contra un modelo falso que sigue
+el guion, o contra las respuestas del modelo de sesiones grabadas
+(`--recordings`). La selección de herramientas por etapa, el escalado y el
+avance del embudo son los del agente (`agentGemini.toolsets`), así que un
+cambio ahí se refleja en las rondas y los tokens. Las herramientas son
+simuladas y no se usa la red.
+
+Los tokens del prompt de cada llamada suman la instrucción, las
+declaraciones de herramientas expuestas (las compactas de
+`agentGemini.tool_declarations` o, si no hay, las leídas del código fuente)
+y el historial del turno. La latencia es simulada y determinista (primer token +
+prefill + generación + herramientas), de modo que se puede comparar con una
+línea base: el script falla si algún escenario empeora más que la tolerancia.
+
+Uso:
+    python scripts/conversation_eval.py [--concurrency 64] [--recordings recordings/] [--update]
+"""
+
+import argparse
+import asyncio
+import ast
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agentGemini import tools as agent_tools  # noqa: E402
+from agentGemini.config import Config  # noqa: E402
+from agentGemini.prompts import MAIN_INSTRUCTION  # noqa: E402
+from agentGemini.services.session_recorder import read_recording  # noqa: E402
+from agentGemini.tool_declarations import TOOL_DECLARATIONS, declaration_tokens  # noqa: E402
+from agentGemini.toolsets import (  # noqa: E402
+    ESCALATION_TOOL,
+    STATE_STAGE,
+    filter_tools_before_model,
+    request_additional_tools,
+    track_stage_after_tool,
+)
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCENARIOS_FILE = os.path.join(os.path.dirname(__file__), "conversation_eval_scenarios.json")
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "conversation_eval_baseline.json")
+
+CHARS_PER_TOKEN = 4
+# Coste de una herramienta registrada cuyo código no se encuentra
+DEFAULT_DECLARATION_TOKENS = 120
+# Corta turnos en los que el modelo no llega a responder
+MAX_MODEL_CALLS_PER_TURN = 8
+
+# Latencia simulada
+MODEL_FIRST_TOKEN_MS = 350.0
+PREFILL_TOKENS_PER_SECOND = 4000.0
+DECODE_TOKENS_PER_SECOND = 90.0
+TOOL_LATENCY_MS = 80.0
+REPLY_TOKENS = 70
+
+# Métricas comparadas con la línea base
+METRICS = ("model_calls", "tool_calls", "prompt_tokens", "output_tokens", "latency_ms")
+
+def tokens(value: Any) -> int:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+# Declaraciones de herramientas
+
+def declaration_costs() -> Tuple[Dict[str, int], List[str]]:
+    """
+    Tokens de la declaración de cada herramienta registrada: la compacta si
+    está activada y, si no, la leída del código fuente sin importarlo (los
+    módulos de herramientas crean servicios).
+
+    Returns:
+        Coste por herramienta y herramientas cuyo código no se encontró
+    """
+    sources = glob.glob(os.path.join(ROOT, "agentGemini", "tools", "*.py"))
+    sources.append(os.path.join(ROOT, "agentGemini", "toolsets.py"))
+    wanted = set(agent_tools.__all__) | {ESCALATION_TOOL}
+    costs: Dict[str, int] = {}
+    for path in sources:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        for node in tree.body:
+            if isinstance(node, ast.FunctionDef) and node.name in wanted:
+                parameters = {
+                    arg.arg: ast.unparse(arg.annotation) if arg.annotation else "Any"
+                    for arg in node.args.args
+                    if arg.arg not in ("session_state", "tool_context")
+                }
+                declaration = {
+                    "name": node.name,
+                    "description": ast.get_docstring(node) or "",
+                    "parameters": parameters,
+                }
+                costs[node.name] = tokens(declaration)
+    if Config.COMPACT_TOOL_DECLARATIONS_ENABLED:
+        for name, declaration in TOOL_DECLARATIONS.items():
+            costs[name] = declaration_tokens(declaration)
+    missing = sorted(wanted - set(costs))
+    for name in missing:
+        costs[name] = DEFAULT_DECLARATION_TOKENS
+    return costs, missing
+
+def exposed_tools(state: Dict[str, Any], all_tools: List[str]) -> List[str]:
+    """Herramientas que el callback del agente deja en la petición al modelo."""
+    request = SimpleNamespace(config=SimpleNamespace(tools=[
+        SimpleNamespace(function_declarations=[SimpleNamespace(name=name) for name in all_tools])
+    ]))
+    filter_tools_before_model(SimpleNamespace(state=state), request)
+    return [d.name for tool in request.config.tools for d in tool.function_declarations]
+
+# Escenarios
+
+def _fill(value: Any, variables: Dict[str, str]) -> Any:
+    if isinstance(value, str):
+        return value.format(**variables)
+    if isinstance(value, list):
+        return [_fill(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: _fill(item, variables) for key, item in value.items()}
+    return value
+
+def load_scenarios(path: str, variants: Optional[int]) -> List[Dict[str, Any]]:
+    """Expande cada plantilla con `variants` combinaciones de valores."""
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    values = spec["values"]
+    count = variants if variants is not None else spec["variants"]
+    scenarios = []
+    for template in spec["scenarios"]:
+        for i in range(count):
+            # Cada lista avanza a su ritmo, así las combinaciones varían
+            variables = {
+                name: options[(i * (k + 1)) % len(options)]
+                for k, (name, options) in enumerate(values.items())
+            }
+            scenarios.append({
+                "name": template["name"],
+                "id": f"{template['name']}#{i}",
+                "turns": _fill(template["turns"], variables),
+            })
+    return scenarios
+
+def load_recordings(directory: str) -> List[Dict[str, Any]]:
+    """Una sesión grabada por escenario, con las respuestas del modelo grabadas."""
+    scenarios = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+        name = f"grabada:{os.path.basename(path)[:-len('.jsonl')]}"
+        turns = [
+            {
+                "user": records[0].get("text") or "",
+                "model": [r for r in records if r["k"] == "model"],
+                "tool_results": [r for r in records if r["k"] == "tool"],
+            }
+            for records in read_recording(path)
+        ]
+        scenarios.append({"name": name, "id": name, "turns": turns})
+    return scenarios
+
+# Modelos
+
+@dataclass
+class ModelReply:
+    calls: List[Tuple[str, Dict[str, Any]]]
+    output_tokens: int
+
+class ScriptedModel:
+    """
+    Modelo falso que sigue el guion del turno: llama una a una a las
+    herramientas previstas y después responde. Si la herramienta no está
+    expuesta en la etapa, primero pide el escalado, como haría el real.
+    """
+
+    def start_turn(self, turn: Dict[str, Any]) -> Dict[str, Any]:
+        return {"pending": [(name, args) for name, args in turn["tools"]]}
+
+    async def generate(self, plan: Dict[str, Any], exposed: List[str]) -> ModelReply:
+        pending = plan["pending"]
+        if not pending:
+            return ModelReply([], REPLY_TOKENS)
+        name, args = pending[0]
+        if name not in exposed and ESCALATION_TOOL in exposed:
+            return ModelReply([(ESCALATION_TOOL, {"capability": name})], tokens(name) + 10)
+        pending.pop(0)
+        return ModelReply([(name, args)], tokens(args) + 10)
+
+    def tool_result(self, plan: Dict[str, Any], name: str, args: Dict[str, Any]) -> Any:
+        return fake_tool_result(name, args)
+
+class RecordedModel:
+    """Devuelve en orden las respuestas del modelo grabadas en cada turno."""
+
+    def start_turn(self, turn: Dict[str, Any]) -> Dict[str, Any]:
+        return {"model": list(turn["model"]), "tool_results": list(turn["tool_results"])}
+
+    async def generate(self, plan: Dict[str, Any], exposed: List[str]) -> ModelReply:
+        if not plan["model"]:
+            return ModelReply([], REPLY_TOKENS)
+        record = plan["model"].pop(0)
+        calls = [(call["name"], call.get("args") or {}) for call in record.get("calls") or []]
+        output = (record.get("tokens") or {}).get("output")
+        if not output:
+            output = tokens(record.get("text") or "") + tokens(calls)
+        return ModelReply(calls, output)
+
+    def tool_result(self, plan: Dict[str, Any], name: str, args: Dict[str, Any]) -> Any:
+        for i, record in enumerate(plan["tool_results"]):
+            if record["name"] == name:
+                return plan["tool_results"].pop(i).get("resp")
+        return fake_tool_result(name, args)
+
+def fake_tool_result(name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Respuestas simuladas con el tamaño aproximado de las reales."""
+    if name == ESCALATION_TOOL:
+        return request_additional_tools(args.get("capability", ""))
+    if name == "search_products":
+        return {"status": "success", "products": [
+            {
+                "id": f"prod_{i}",
+                "name": f"{args.get('query', '')} modelo {i}",
+                "price": 10000 * (i + 1),
+                "stock": 3,
+            }
+            for i in range(5)
+        ]}
+    if name == "get_product_details":
+        return {"status": "success", "product": {
+            "id": args.get("product_id"), "name": "Producto", "price": 75000, "stock": 3,
+            "description": "Máquina de alta potencia para grandes explotaciones " * 3,
+            "specifications": {"potencia": "200 CV", "transmision": "PowerShift"},
+        }}
+    if name == "get_customer_profile":
+        return {"status": "success", "customer": {
+            "id": "cust_123", "name": "Juan Pérez", "email": args.get("email"),
+            "sector": "olivar", "hectares": 150, "total_purchases": 15000,
+        }}
+    return {"status": "success", "tool": name}
+
+# Ejecución
+
+@dataclass
+class ScenarioResult:
+    name: str
+    id: str
+    model_calls: int = 0
+    tool_calls: int = 0
+    escalations: int = 0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    latency_ms: float = 0.0
+    unfinished_turns: int = 0
+    tools: Dict[str, int] = field(default_factory=dict)
+
+async def run_scenario(
+    scenario: Dict[str, Any],
+    model,
+    costs: Dict[str, int],
+    time_scale: float
+) -> ScenarioResult:
+    result = ScenarioResult(scenario["name"], scenario["id"])
+    instruction_tokens = tokens(MAIN_INSTRUCTION)
+    all_tools = list(costs)
+    state: Dict[str, Any] = {STATE_STAGE: "greeting"}
+    history = 0
+
+    async def spend(ms: float) -> None:
+        result.latency_ms += ms
+        if time_scale:
+            await asyncio.sleep(ms / 1000 * time_scale)
+
+    for turn in scenario["turns"]:
+        history += tokens(turn["user"])
+        plan = model.start_turn(turn)
+        for _ in range(MAX_MODEL_CALLS_PER_TURN):
+            exposed = exposed_tools(state, all_tools)
+            prompt = instruction_tokens + sum(costs[name] for name in exposed) + history
+            reply = await model.generate(plan, exposed)
+            result.model_calls += 1
+            result.prompt_tokens += prompt
+            result.output_tokens += reply.output_tokens
+            history += reply.output_tokens
+            await spend(
+                MODEL_FIRST_TOKEN_MS
+                + prompt / PREFILL_TOKENS_PER_SECOND * 1000
+                + reply.output_tokens / DECODE_TOKENS_PER_SECOND * 1000
+            )
+            if not reply.calls:
+                break
+            for name, args in reply.calls:
+                response = model.tool_result(plan, name, args)
+                context = SimpleNamespace(state=state)
+                if name == ESCALATION_TOOL:
+                    request_additional_tools(args.get("capability", ""), context)
+                    result.escalations += 1
+                track_stage_after_tool(SimpleNamespace(name=name), args, context, response)
+                result.tool_calls += 1
+                result.tools[name] = result.tools.get(name, 0) + 1
+                history += tokens(response)
+            await spend(TOOL_LATENCY_MS)
+        else:
+            result.unfinished_turns += 1
+    return result
+
+async def run_all(
+    scenarios: List[Dict[str, Any]],
+    concurrency: int,
+    costs,
+    time_scale: float
+) -> List[ScenarioResult]:
+    semaphore = asyncio.Semaphore(concurrency)
+    scripted, recorded = ScriptedModel(), RecordedModel()
+
+    async def one(scenario):
+        async with semaphore:
+            model = recorded if "model" in scenario["turns"][0] else scripted
+            return await run_scenario(scenario, model, costs, time_scale)
+
+    return await asyncio.gather(*(one(scenario) for scenario in scenarios))
+
+# Informe y línea base
+
+def summarize(results: List[ScenarioResult]) -> Dict[str, Dict[str, float]]:
+    """Media de cada métrica por escenario."""
+    groups: Dict[str, List[ScenarioResult]] = {}
+    for result in results:
+        groups.setdefault(result.name, []).append(result)
+    return {
+        name: {
+            "runs": len(group),
+            **{
+                metric: round(statistics.fmean(getattr(r, metric) for r in group), 2)
+                for metric in METRICS
+            },
+            "latency_p95_ms": round(
+                sorted(r.latency_ms for r in group)[int(0.95 * (len(group) - 1))], 1
+            ),
+            "escalations": round(statistics.fmean(r.escalations for r in group), 2),
+            "unfinished_turns": sum(r.unfinished_turns for r in group),
+        }
+        for name, group in sorted(groups.items())
+    }
+
+def compare(
+    summary: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Any],
+    tolerance: float
+) -> List[str]:
+    regressions = []
+    for name, current in summary.items():
+        expected = baseline.get("scenarios", {}).get(name)
+        if expected is None:
+            print(f"  {name}: sin línea base")
+            continue
+        for metric in METRICS:
+            before, now = expected.get(metric), current[metric]
+            if before is None:
+                continue
+            change = (now - before) / before if before else 0.0
+            if change > tolerance:
+                regressions.append(f"{name}.{metric}: {before} → {now} ({change:+.1%})")
+            elif change < -tolerance:
+                print(f"  mejora {name}.{metric}: {before} → {now} ({change:+.1%})")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scenarios", default=SCENARIOS_FILE,
+                        help="Fichero de escenarios guionizados")
+    parser.add_argument("--variants", type=int,
+                        help="Variantes por escenario (por defecto, las del fichero)")
+    parser.add_argument("--recordings",
+                        help="Carpeta de sesiones grabadas que se evalúan también")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--time-scale", type=float, default=0.01,
+                        help="Fracción de la latencia simulada que se espera de verdad "
+                             "(0 para no esperar)")
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="Empeoramiento relativo permitido")
+    parser.add_argument("--json",
+                        help="Escribe los resultados de cada conversación en este fichero")
+    parser.add_argument("--update", action="store_true",
+                        help="Reescribe la línea base con lo medido")
+    args = parser.parse_args()
+
+    costs, missing = declaration_costs()
+    if missing:
+        print(f"Sin código fuente (se estiman {DEFAULT_DECLARATION_TOKENS} tokens): "
+              f"{', '.join(missing)}")
+    scenarios = load_scenarios(args.scenarios, args.variants)
+    if args.recordings:
+        scenarios += load_recordings(args.recordings)
+
+    started = time.perf_counter()
+    results = asyncio.run(run_all(scenarios, args.concurrency, costs, args.time_scale))
+    elapsed = time.perf_counter() - started
+    summary = summarize(results)
+
+    print(f"{'escenario':<26} {'n':>4} {'modelo':>7} {'herram.':>8} {'escal.':>7} "
+          f"{'prompt tok':>11} {'salida tok':>11} {'lat. ms':>9} {'p95 ms':>9}")
+    for name, s in summary.items():
+        print(f"{name[:26]:<26} {s['runs']:>4} {s['model_calls']:>7.2f} {s['tool_calls']:>8.2f} "
+              f"{s['escalations']:>7.2f} {s['prompt_tokens']:>11.0f} {s['output_tokens']:>11.0f} "
+              f"{s['latency_ms']:>9.0f} {s['latency_p95_ms']:>9.0f}")
+    print(f"{len(results)} conversaciones en {elapsed:.1f}s (concurrencia {args.concurrency})")
+    unfinished = sum(s["unfinished_turns"] for s in summary.values())
+    if unfinished:
+        print(f"Turnos sin respuesta tras {MAX_MODEL_CALLS_PER_TURN} llamadas al modelo: "
+              f"{unfinished}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in results], f, ensure_ascii=False, indent=1)
+
+    if args.update:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"scenarios": summary}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Línea base actualizada en {BASELINE_FILE}")
+        return 0
+
+    if not os.path.exists(BASELINE_FILE):
+        print("No hay línea base; créala con --update")
+        return 0
+    with open(BASELINE_FILE, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(summary, baseline, args.tolerance)
+    if regressions or unfinished:
+        for regression in regressions:
+            print(f"  REGRESIÓN {regression}")
+        return 1
+    print("Sin regresiones frente a la línea base")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
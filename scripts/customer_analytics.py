@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Job por lotes de analítica de clientes (totales, pedidos, recencia y lealtad).
+
+Lee los pedidos de un export local o de Firestore, agrega por cliente, compara
+con los contadores en línea y, con --write, corrige los clientes que difieren.
+
+Solo se agregan los pedidos anteriores al corte: el momento de empezar, al leer
+de Firestore, o el del export, que se guarda junto a él en
+`<export>.meta.json` ({"cutoff": "<ISO 8601>"}). Con --write y --export el
+export tiene que indicar su corte; si no, las compras posteriores al export se
+descontarían de los contadores.
+
+Uso:
+    python scripts/customer_analytics.py run --export orders.jsonl.gz [--write]
+    python scripts/customer_analytics.py run --firestore [--write]
+    python scripts/customer_analytics.py generate orders.jsonl.gz [--orders 2000000]
+"""
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agentGemini.services.customer_analytics import (  # noqa: E402
+    aggregate,
+    iter_export_chunks,
+    iter_firestore_chunks,
+    read_export_cutoff,
+    read_online_counters,
+    reconcile,
+    write_back,
+    write_export_cutoff,
+)
+from agentGemini.services.firestore_service import FirestoreService  # noqa: E402
+
+def generate(path: str, orders: int, customers: int) -> None:
+    """Export sintético en JSON Lines para medir el job."""
+    rng = random.Random(42)
+    start = datetime(2022, 1, 1)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt", encoding="utf-8") as f:
+        for i in range(orders):
+            f.write(json.dumps({
+                "id": f"order_{i}",
+                "customer_id": f"cust_{int(customers * rng.random() ** 3):06d}",
+                "total": round(rng.lognormvariate(8, 1.2), 2),
+                "created_at": (start + timedelta(minutes=rng.randrange(1_500_000))).isoformat(),
+                "status": "cancelled" if rng.random() < 0.02 else "pending",
+            }) + "\n")
+    write_export_cutoff(path, start + timedelta(minutes=1_500_000))
+    print(f"{orders} pedidos escritos en {path}")
+
+def run(args) -> int:
+    started = time.perf_counter()
+    if args.export:
+        cutoff = read_export_cutoff(args.export)
+        if cutoff is None and args.write:
+            print("El export no indica su corte (<export>.meta.json); no se puede usar con --write")
+            return 1
+    else:
+        # Fijado antes de leer: lo posterior se suma en la transacción de cada cliente
+        cutoff = datetime.now(timezone.utc)
+    db = FirestoreService().db if (args.firestore or args.write) else None
+    if args.export:
+        chunks = iter_export_chunks(args.export, args.chunk_size, cutoff)
+    elif db is not None:
+        chunks = iter_firestore_chunks(db, cutoff, args.page_size)
+    else:
+        print("Sin conexión a Firestore: indica --export")
+        return 1
+
+    aggregates = aggregate(chunks)
+    print(json.dumps(aggregates.summary()))
+    if db is None:
+        print(f"Tiempo total: {time.perf_counter() - started:.1f}s "
+              "(sin conciliar: no hay conexión a Firestore)")
+        return 0
+
+    reconciliation = reconcile(aggregates, read_online_counters(db))
+    print(json.dumps(reconciliation.report(), ensure_ascii=False, indent=2))
+    if args.write:
+        write_back(db, reconciliation, cutoff)
+    print(f"Tiempo total: {time.perf_counter() - started:.1f}s")
+    return 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser(
+        "run", help="Agrega los pedidos y concilia con los contadores"
+    )
+    run_parser.add_argument("--export",
+                            help="Export de pedidos (.jsonl, .csv, opcionalmente .gz)")
+    run_parser.add_argument("--firestore", action="store_true",
+                            help="Leer los pedidos de Firestore")
+    run_parser.add_argument("--write", action="store_true", help="Escribir las correcciones")
+    run_parser.add_argument("--chunk-size", type=int, default=100_000)
+    run_parser.add_argument("--page-size", type=int, default=5000)
+    generate_parser = subparsers.add_parser("generate", help="Genera un export sintético")
+    generate_parser.add_argument("path")
+    generate_parser.add_argument("--orders", type=int, default=2_000_000)
+    generate_parser.add_argument("--customers", type=int, default=100_000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "generate":
+        generate(args.path, args.orders, args.customers)
+        return 0
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga del gateway de streaming con miles de clientes simulados.
+
+Los clientes se conectan directamente a la app ASGI (sin red) contra un runner
+simulado que emite tokens con retardo, para medir el comportamiento del propio
+gateway: límite de turnos por worker, colas acotadas, fusión de tokens para
+clientes lentos, corte de clientes bloqueados y cancelación al desconectarse.
+
+Perfiles de cliente:
+    rápido      lee cada trozo en cuanto llega
+    lento       tarda --slow-read-ms en leer cada trozo
+    bloqueado   deja de leer tras el primer trozo (el gateway debe liberar su
+                turno) y se desconecta tras --stall-seconds
+    abandona    se desconecta a mitad de la respuesta (debe cancelarse el turno)
+
+Uso:
+    python scripts/gateway_load_test.py [--clients 2000] [--max-concurrent 256]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agentGemini.gateway import StreamingGateway, create_app  # noqa: E402
+
+# Runner y sesiones simulados
+
+def _part(text=None, function_call=None, function_response=None):
+    return SimpleNamespace(
+        text=text, function_call=function_call, function_response=function_response
+    )
+
+def _event(parts, partial=False, final=False):
+    return SimpleNamespace(
+        partial=partial,
+        content=SimpleNamespace(parts=parts),
+        is_final_response=lambda: final
+    )
+
+class FakeRunner:
+    """Emite una llamada a herramienta, `tokens` tokens y la respuesta final."""
+
+    def __init__(self, tokens: int, token_delay: float):
+        self.tokens = tokens
+        self.token_delay = token_delay
+        self.active = 0
+        self.peak_active = 0
+        self.cancelled = 0
+
+    async def run_async(self, user_id, session_id, new_message, **kwargs):
+        self.active += 1
+        self.peak_active = max(self.peak_active, self.active)
+        try:
+            call = SimpleNamespace(name="search_products", args={"query": new_message})
+            yield _event([_part(function_call=call)])
+            yield _event([_part(function_response=SimpleNamespace(name="search_products"))])
+            text = []
+            for i in range(self.tokens):
+                await asyncio.sleep(self.token_delay)
+                token = f"tok{i} "
+                text.append(token)
+                yield _event([_part(text=token)], partial=True)
+            yield _event([_part(text="".join(text))], final=True)
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+        finally:
+            self.active -= 1
+
+class FakeSessions:
+    def get_session(self, **kwargs):
+        return object()
+
+    def create_session(self, **kwargs):
+        return object()
+
+# Clientes ASGI
+
+async def run_client(app, client_id: int, profile: str, args) -> Dict[str, Any]:
+    body = json.dumps({"session_id": f"s{client_id}", "message": "tractor"}).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.3"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/v1/chat/sse",
+        "raw_path": b"/v1/chat/sse",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"authorization", f"Bearer u{client_id}".encode()),
+        ],
+        "client": ("127.0.0.1", 10000 + client_id),
+        "server": ("testserver", 80),
+    }
+    disconnected = asyncio.Event()
+    request_sent = False
+    started = time.monotonic()
+    result: Dict[str, Any] = {"profile": profile, "status": None, "ttfb": None, "events": Counter()}
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if disconnected.is_set():
+            raise OSError("Cliente desconectado")
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            return
+        chunk = message.get("body", b"")
+        if chunk and result["ttfb"] is None:
+            result["ttfb"] = time.monotonic() - started
+        for line in chunk.decode().splitlines():
+            if line.startswith("event: "):
+                result["events"][line[len("event: "):]] += 1
+        # La lectura lenta del cliente frena el envío (como un socket lleno)
+        if profile == "lento":
+            await asyncio.sleep(args.slow_read_ms / 1000)
+        elif profile == "bloqueado" and result["ttfb"] is not None:
+            await asyncio.sleep(args.stall_seconds)
+            disconnected.set()
+            raise OSError("Cliente bloqueado desconectado")
+        if not message.get("more_body", False):
+            disconnected.set()
+
+    app_task = asyncio.create_task(app(scope, receive, send))
+    if profile == "abandona":
+        await asyncio.sleep(random.uniform(0.05, args.tokens * args.token_delay))
+        disconnected.set()
+    try:
+        await asyncio.wait_for(app_task, timeout=args.client_timeout)
+    except asyncio.TimeoutError:
+        result["timed_out"] = True
+    except Exception:
+        pass
+    disconnected.set()
+    result["elapsed"] = time.monotonic() - started
+    return result
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def main_async(args) -> None:
+    runner = FakeRunner(args.tokens, args.token_delay)
+    gateway = StreamingGateway(
+        runner=runner,
+        session_service=FakeSessions(),
+        new_message=lambda text: text,
+        max_concurrent_runs=args.max_concurrent,
+        acquire_timeout=args.acquire_timeout,
+        queue_size=args.queue_size,
+        send_timeout=args.send_timeout,
+        heartbeat=5.0,
+    )
+    # El token simulado es el propio ID del usuario
+    app = create_app(gateway, authenticate=lambda token: token)
+
+    profiles = random.choices(
+        ["rápido", "lento", "bloqueado", "abandona"],
+        weights=[
+            1 - args.slow_fraction - args.stall_fraction - args.abandon_fraction,
+            args.slow_fraction,
+            args.stall_fraction,
+            args.abandon_fraction,
+        ],
+        k=args.clients,
+    )
+
+    started = time.monotonic()
+    tasks = []
+    for i, profile in enumerate(profiles):
+        tasks.append(asyncio.create_task(run_client(app, i, profile, args)))
+        # Llegadas escalonadas a lo largo de --ramp-seconds
+        await asyncio.sleep(args.ramp_seconds / args.clients)
+    results = await asyncio.gather(*tasks)
+    wall = time.monotonic() - started
+
+    print(f"{args.clients} clientes en {wall:.1f}s, máx. {args.max_concurrent} turnos por worker")
+    print(f"  pico de turnos en ejecución: {runner.peak_active}, "
+          f"turnos cancelados en el runner: {runner.cancelled}")
+    print(f"  gateway: {json.dumps(gateway.get_stats())}")
+    print(f"  memoria máxima: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    print(f"{'perfil':<10} {'n':>6} {'200':>6} {'503':>6} {'done':>6} {'error':>6} "
+          f"{'ttfb p50':>9} {'ttfb p95':>9} {'tiempo p95':>11}")
+    for profile in ["rápido", "lento", "bloqueado", "abandona"]:
+        group = [r for r in results if r["profile"] == profile]
+        if not group:
+            continue
+        ok = [r for r in group if r["status"] == 200]
+        ttfb = [r["ttfb"] for r in ok if r["ttfb"] is not None]
+        print(
+            f"{profile:<10} {len(group):>6} {len(ok):>6} "
+            f"{sum(r['status'] == 503 for r in group):>6} "
+            f"{sum(r['events']['done'] > 0 for r in group):>6} "
+            f"{sum(r['events']['error'] > 0 for r in group):>6} "
+            f"{percentile(ttfb, 0.5) * 1000:>7.0f}ms {percentile(ttfb, 0.95) * 1000:>7.0f}ms "
+            f"{percentile([r['elapsed'] for r in ok], 0.95):>10.1f}s"
+        )
+    leaked = gateway.active
+    if leaked:
+        print(f"ERROR: {leaked} turnos siguen activos tras la prueba")
+        sys.exit(1)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--max-concurrent", type=int, default=256)
+    parser.add_argument("--acquire-timeout", type=float, default=5.0)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--send-timeout", type=float, default=2.0)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--slow-read-ms", type=float, default=50)
+    parser.add_argument("--slow-fraction", type=float, default=0.3)
+    parser.add_argument("--stall-fraction", type=float, default=0.02)
+    parser.add_argument("--abandon-fraction", type=float, default=0.05)
+    parser.add_argument("--stall-seconds", type=float, default=10.0)
+    parser.add_argument("--ramp-seconds", type=float, default=5.0)
+    parser.add_argument("--client-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+    # Los cortes de clientes bloqueados son esperados: solo se muestran errores
+    logging.getLogger("agentGemini.gateway").setLevel(logging.ERROR)
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Latencia de las lecturas con y sin lecturas duplicadas (hedging) frente a un
+backend falso con cola de latencia inyectada.
+
+El backend responde en una latencia log-normal en torno a --median-ms, pero
+una fracción --tail-prob de las llamadas tarda --tail-ms (una RPC atascada).
+Se hacen --reads lecturas con --concurrency hilos, primero sin duplicados y
+después con ellos, y se comparan p50/p95/p99, plazos agotados, duplicados
+lanzados y ganados, y la carga extra sobre el backend. Los intentos perdedores
+atienden a `Attempt.cancelled`, así que también se ve cuántos se cancelan.
+
+Por último simula turnos de --turn-reads lecturas seguidas con el presupuesto
+de turno de la configuración y cuenta los turnos que lo superan.
+
+Uso:
+    python scripts/hedged_reads_benchmark.py [--reads 2000] [--tail-prob 0.03] [--tail-ms 1500]
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agentGemini.config import Config  # noqa: E402
+from agentGemini.services.hedged_reads import (  # noqa: E402
+    Attempt,
+    AttemptCancelled,
+    DeadlineExceeded,
+    HedgedReader,
+    end_turn_budget,
+    start_turn_budget,
+)
+
+class FakeBackend:
+    """Backend con latencia log-normal y una cola de llamadas atascadas."""
+
+    def __init__(self, median_ms: float, tail_prob: float, tail_ms: float, seed: int = 7):
+        self.median = median_ms / 1000
+        self.tail_prob = tail_prob
+        self.tail = tail_ms / 1000
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.started = 0
+        self.cancelled = 0
+
+    def latency(self) -> float:
+        with self._lock:
+            if self._rng.random() < self.tail_prob:
+                return self.tail
+            return self.median * math.exp(self._rng.gauss(0, 0.35))
+
+    def read(self, attempt: Attempt) -> Dict[str, str]:
+        with self._lock:
+            self.started += 1
+        latency = min(self.latency(), attempt.timeout())
+        if attempt.cancelled.wait(latency):
+            with self._lock:
+                self.cancelled += 1
+            raise AttemptCancelled("fake")
+        if latency >= attempt.timeout():
+            raise DeadlineExceeded("fake")
+        return {"id": "cust_123"}
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+def run(args, hedging: bool) -> Dict[str, float]:
+    backend = FakeBackend(args.median_ms, args.tail_prob, args.tail_ms)
+    reader = HedgedReader(hedging=hedging, workers=args.concurrency * 2)
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            reader.read("get_customer", backend.read)
+        except DeadlineExceeded:
+            pass
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(one, range(args.reads)))
+
+    turns_over = 0
+    for _ in range(args.turns):
+        start_turn_budget()
+        started = time.perf_counter()
+        for _ in range(args.turn_reads):
+            try:
+                reader.read("get_product", backend.read)
+            except DeadlineExceeded:
+                pass
+        end_turn_budget()
+        if time.perf_counter() - started > Config.FIRESTORE_TURN_BUDGET_SECONDS:
+            turns_over += 1
+
+    # Dejar que terminen los perdedores que aún esperan su cancelación
+    time.sleep(0.05)
+    reader.shutdown()
+    stats = reader.get_stats()["get_customer"]
+    return {
+        "p50": percentile(latencies, 0.5) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "max": max(latencies) * 1000,
+        # El backend falso también agota el plazo por su lado, como la RPC real
+        "deadline_exceeded": stats["deadline_exceeded"] + stats["errors"],
+        "hedges_fired": stats["hedges_fired"],
+        "hedges_won": stats["hedges_won"],
+        "extra_load": backend.started / (args.reads + args.turns * args.turn_reads) - 1,
+        "cancelled": backend.cancelled,
+        "turns_over": turns_over,
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--reads", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--median-ms", type=float, default=20.0)
+    parser.add_argument("--tail-prob", type=float, default=0.03)
+    parser.add_argument("--tail-ms", type=float, default=1500.0)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--turn-reads", type=int, default=8)
+    args = parser.parse_args()
+
+    print(
+        f"{args.reads} lecturas, {args.concurrency} hilos, mediana {args.median_ms:.0f} ms, "
+        f"{args.tail_prob:.0%} atascadas a {args.tail_ms:.0f} ms, "
+        f"plazo {Config.FIRESTORE_READ_TIMEOUT_SECONDS:.1f} s"
+    )
+    print(
+        f"{'modo':<14} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} {'plazos':>7} "
+        f"{'dupl.':>6} {'ganados':>8} {'carga':>7} {'cancel.':>8} {'turnos>presup.':>15}"
+    )
+    for hedging in (False, True):
+        r = run(args, hedging)
+        print(
+            f"{'con hedging' if hedging else 'sin hedging':<14} {r['p50']:>7.1f} {r['p95']:>7.1f} "
+            f"{r['p99']:>7.1f} {r['max']:>7.1f} {r['deadline_exceeded']:>7} {r['hedges_fired']:>6} "
+            f"{r['hedges_won']:>8} {r['extra_load']:>+7.1%} {r['cancelled']:>8} "
+            f"{r['turns_over']:>15}"
+        )
+    print("Latencias en ms; carga = intentos en el backend por lectura, sobre 1")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
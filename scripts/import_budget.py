@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Comprueba el tiempo de importación de AgentGemini frente a un presupuesto.
+
+Para cada módulo del presupuesto ejecuta `python -X importtime -c "import
+<módulo>"` en un proceso nuevo varias veces y toma la mediana del tiempo
+acumulado, descontando lo que el intérprete importa al arrancar. Falla si algún
+módulo supera su presupuesto o si carga alguna dependencia pesada prohibida
+(google.adk, firebase_admin, numpy...), que deben cargarse al usarse.
+`allowed_modules` exime a un módulo de algunas de ellas: el agente necesita
+ADK al importarse y tiene su propio presupuesto.
+
+Uso:
+    python scripts/import_budget.py [--runs 5] [--update]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Set, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), "import_budget.json")
+
+# Margen al regenerar el presupuesto con --update (relativo y mínimo absoluto,
+# para que los módulos muy ligeros no fallen por ruido)
+UPDATE_HEADROOM = 1.5
+UPDATE_MIN_SLACK_US = 5000
+
+def run_importtime(statement: str) -> List[Tuple[int, int, str]]:
+    """Devuelve (self_us, cumulative_us, nombre con sangría) de cada import."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONPATH": ROOT},
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Fallo al ejecutar {statement!r}:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        # Tras el separador va un espacio; la sangría adicional indica la profundidad
+        rows.append((int(self_us), int(cumulative_us), name[1:].rstrip()))
+    return rows
+
+def startup_modules() -> Set[str]:
+    return {name.strip() for _, _, name in run_importtime("pass")}
+
+def measure(module: str, startup: Set[str]) -> Tuple[int, List[Tuple[int, int, str]]]:
+    """Tiempo acumulado de importar `module`, sin los imports de arranque."""
+    rows = run_importtime(f"import {module}")
+    total = sum(
+        cumulative for _, cumulative, name in rows
+        if name.strip() not in startup and not name.startswith(" ")
+    )
+    return total, rows
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=5,
+                        help="Ejecuciones por módulo (se usa la mediana)")
+    parser.add_argument("--update", action="store_true",
+                        help="Reescribe el presupuesto con lo medido")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE, encoding="utf-8") as f:
+        budget = json.load(f)
+
+    startup = startup_modules()
+    forbidden = set(budget.get("forbidden_modules", []))
+    allowed = budget.get("allowed_modules", {})
+    failures = []
+    measured: Dict[str, int] = {}
+
+    print(f"{'módulo':<28} {'mediana':>10} {'presupuesto':>12}")
+    for module, budget_us in budget["modules"].items():
+        samples, rows = [], []
+        for _ in range(args.runs):
+            total, rows = measure(module, startup)
+            samples.append(total)
+        median_us = int(statistics.median(samples))
+        measured[module] = median_us
+
+        status = "ok" if median_us <= budget_us else "EXCEDIDO"
+        print(f"{module:<28} {median_us / 1000:>8.1f}ms {budget_us / 1000:>10.1f}ms  {status}")
+        if median_us > budget_us:
+            failures.append(module)
+            own_rows = [row for row in rows if row[2].strip() not in startup]
+            slowest = sorted(own_rows, key=lambda row: row[0], reverse=True)[:10]
+            for self_us, _, name in slowest:
+                print(f"    {self_us / 1000:>8.1f}ms  {name.strip()}")
+
+        loaded = {name.strip() for _, _, name in rows}
+        for heavy in sorted(forbidden - set(allowed.get(module, []))):
+            if any(name == heavy or name.startswith(heavy + ".") for name in loaded):
+                print(f"    {module} carga {heavy} al importarse")
+                failures.append(f"{module}:{heavy}")
+
+    if args.update:
+        budget["modules"] = {
+            module: int(max(value * UPDATE_HEADROOM, value + UPDATE_MIN_SLACK_US))
+            for module, value in measured.items()
+        }
+        with open(BUDGET_FILE, "w", encoding="utf-8") as f:
+            json.dump(budget, f, indent=2)
+            f.write("\n")
+        print(f"Presupuesto actualizado en {BUDGET_FILE}")
+        return 0
+
+    if failures:
+        print(f"Presupuesto de importación superado: {', '.join(failures)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Mide lo que cuesta por turno validar los modelos en los saltos internos.
+
+Compara revalidar el carrito y el cliente del estado de sesión en cada
+herramienta (`Cart(**data)`, `Customer(**data)`) con `ensure_valid` sobre
+datos ya validados y marcados (modelo y `SCHEMA_VERSION`), que no vuelve a
+construir nada. (Reconstruir con `model_construct` anidado no ahorra: con
+pydantic 2 la validación en pydantic-core es igual o más rápida.)
+
+Uso:
+    python scripts/model_benchmark.py [--items 5] [--hops 3] [--turns 2000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agentGemini.models import Cart, Customer, Product, SessionState  # noqa: E402
+
+def build_state(items: int) -> SessionState:
+    customer = Customer(
+        id="cust_001",
+        name="Juan García",
+        email="juan@example.com",
+        customer_type="empresa",
+        hectares=250,
+        main_crops=["trigo", "cebada", "girasol"],
+        current_machinery=["Tractor 6M", "Sembradora"],
+        total_purchases=45000,
+    )
+    state = SessionState(customer=customer, conversation_stage="closing")
+    for i in range(items):
+        product = Product(
+            id=f"prod_{i:03d}",
+            name=f"Producto {i}",
+            category="implementos",
+            brand="Marca",
+            description="Descripción larga del producto " * 5,
+            price=1500.0 + i * 250,
+            specifications={"potencia": "120 CV", "peso": "3500 kg", "anchura": "3 m"},
+            stock=3,
+        )
+        state.cart.add_item(product, quantity=1 + i % 3)
+    return state
+
+def time_per_turn(fn: Callable[[], None], turns: int) -> float:
+    fn()  # calentamiento
+    started = time.perf_counter()
+    for _ in range(turns):
+        fn()
+    return (time.perf_counter() - started) / turns * 1e6
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--items", type=int, default=5, help="Productos en el carrito")
+    parser.add_argument("--hops", type=int, default=3,
+                        help="Herramientas por turno que leen carrito y cliente")
+    parser.add_argument("--turns", type=int, default=2000, help="Turnos simulados")
+    args = parser.parse_args()
+
+    state = build_state(args.items)
+    cart = state.cart.model_dump(mode="json")
+    customer = state.customer.model_dump(mode="json")
+    cart_tagged, customer_tagged = state.cart.to_trusted_dict(), state.customer.to_trusted_dict()
+    assert Cart.ensure_valid(cart) == cart_tagged
+
+    def full_validation():
+        for _ in range(args.hops):
+            Cart(**cart)
+            Customer(**customer)
+
+    def trusted():
+        for _ in range(args.hops):
+            Cart.ensure_valid(cart_tagged)
+            Customer.ensure_valid(customer_tagged)
+
+    results: Dict[str, float] = {
+        "validación completa": time_per_turn(full_validation, args.turns),
+        "ensure_valid marcado": time_per_turn(trusted, args.turns),
+    }
+    first = time_per_turn(
+        lambda: (Cart.ensure_valid(cart), Customer.ensure_valid(customer)), args.turns
+    )
+
+    baseline = results["validación completa"]
+    print(f"{args.items} productos en el carrito, {args.hops} saltos por turno, "
+          f"{args.turns} turnos")
+    for name, us in results.items():
+        print(f"  {name:<22} {us:>8.1f} µs/turno  ({us / baseline:.0%})")
+    print(f"  ahorro                 {baseline - results['ensure_valid marcado']:>8.1f} µs/turno")
+    print(f"  validación inicial     {first:>8.1f} µs (una vez, al entrar el dato)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Reproduce una sesión grabada y desglosa el tiempo de cada turno.
+
+Las herramientas se ejecutan de verdad con los argumentos grabados, pero el
+modelo y Firestore son simulados: devuelven lo grabado y suman su latencia
+grabada al turno (o la esperan de verdad con --realtime). Así, un cambio en
+el código local (herramientas, servicios) que haga un turno más lento se ve
+como diferencia frente a lo grabado, sin servicios en vivo. Las herramientas
+que no se pueden importar se reproducen con su respuesta y duración grabadas.
+
+Uso:
+    python scripts/replay_session.py recordings/<sesión>.jsonl [--folded out.folded] [--realtime]
+
+El fichero --folded usa el formato de pilas plegadas (flamegraph.pl,
+speedscope) con microsegundos como valor.
+"""
+
+import argparse
+import copy
+import inspect
+import logging
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agentGemini import tools as agent_tools  # noqa: E402
+from agentGemini.services.firestore_service import FirestoreService  # noqa: E402
+from agentGemini.services.session_recorder import BackendTap, read_recording  # noqa: E402
+
+BAR_WIDTH = 40
+
+class Span:
+    """Tramo del turno con el tiempo grabado y el de la reproducción."""
+
+    def __init__(
+        self,
+        name: str,
+        recorded_ms: float,
+        replay_ms: float,
+        source: str = "",
+        children=None
+    ):
+        self.name = name
+        self.recorded_ms = recorded_ms
+        self.replay_ms = replay_ms
+        self.source = source
+        self.children: List["Span"] = children or []
+
+def resolve_tool(name: str) -> Optional[Callable]:
+    try:
+        return getattr(agent_tools, name)
+    except (AttributeError, ImportError) as e:
+        logging.getLogger(__name__).debug(f"Herramienta {name} no disponible: {e}")
+        return None
+
+def call_tool(fn: Callable, args: Dict[str, Any], state: Dict[str, Any]) -> Any:
+    kwargs = dict(args)
+    parameters = inspect.signature(fn).parameters
+    if "session_state" in parameters and "session_state" not in kwargs:
+        kwargs["session_state"] = state
+    if "tool_context" in parameters and "tool_context" not in kwargs:
+        kwargs["tool_context"] = None
+    return fn(**kwargs)
+
+def replay_turn(index: int, records: List[Dict[str, Any]], tap: BackendTap, realtime: bool) -> Span:
+    state = copy.deepcopy(records[0].get("state") or {})
+    backend_spans: List[Span] = []
+
+    def on_backend(record: Dict[str, Any]) -> None:
+        if realtime:
+            time.sleep(record["ms"] / 1000)
+        name = f"{record['b']}.{record['m']}"
+        backend_spans.append(Span(name, record["ms"], record["ms"], "simulado"))
+
+    tap.replay_clock = on_backend
+    spans: List[Span] = []
+    model_calls = 0
+    for record in records:
+        kind = record["k"]
+        if kind == "model":
+            model_calls += 1
+            if realtime:
+                time.sleep(record["ms"] / 1000)
+            spans.append(Span(f"modelo #{model_calls}", record["ms"], record["ms"], "simulado"))
+        elif kind == "cached":
+            spans.append(Span("caché semántica", 0.0, 0.0, "grabado"))
+        elif kind == "tool":
+            fn = resolve_tool(record["name"])
+            name = f"herramienta {record['name']}"
+            if fn is None:
+                spans.append(Span(name, record["ms"], record["ms"], "grabado"))
+                continue
+            started = time.perf_counter()
+            try:
+                call_tool(fn, record["args"], state)
+            except Exception as e:
+                logging.getLogger(__name__).warning(
+                    f"{record['name']} falló en la reproducción: {e}"
+                )
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            backend_ms = sum(span.replay_ms for span in backend_spans)
+            # Sin --realtime las latencias de backend no se han esperado: se suman
+            local_ms = elapsed_ms - backend_ms if realtime else elapsed_ms
+            children = list(backend_spans) + [Span("código local", None, local_ms, "medido")]
+            backend_spans.clear()
+            spans.append(Span(name, record["ms"], local_ms + backend_ms, "ejecutado", children))
+
+    # Fin de turno (after_agent): escritura acumulada del perfil, contra el backend simulado
+    customer_tools = sys.modules.get("agentGemini.tools.customer_tools")
+    if customer_tools is not None:
+        started = time.perf_counter()
+        customer_tools.profile_writes.flush_all()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        backend_ms = sum(span.replay_ms for span in backend_spans)
+        local_ms = elapsed_ms - backend_ms if realtime else elapsed_ms
+        if backend_spans:
+            children = list(backend_spans) + [Span("código local", None, local_ms, "medido")]
+            spans.append(
+                Span("fin de turno", backend_ms, local_ms + backend_ms, "ejecutado", children)
+            )
+        backend_spans.clear()
+
+    end = next((r for r in records if r["k"] == "turn_end"), None)
+    recorded_total = end["ms"] if end else sum(span.recorded_ms for span in spans)
+    other = max(recorded_total - sum(span.recorded_ms for span in spans), 0.0)
+    spans.append(Span("framework y callbacks", other, other, "grabado"))
+    text = (records[0].get("text") or "").replace("\n", " ")
+    return Span(
+        f"turno {index} «{text[:40]}»",
+        recorded_total,
+        sum(span.replay_ms for span in spans),
+        children=spans,
+    )
+
+def print_tree(turn: Span) -> None:
+    scale = max(turn.replay_ms, turn.recorded_ms, 1e-9)
+
+    def line(span: Span, depth: int) -> None:
+        bar = "█" * max(1, round(span.replay_ms / scale * BAR_WIDTH)) if span.replay_ms else ""
+        recorded = f"{span.recorded_ms:>9.1f}" if span.recorded_ms is not None else f"{'':>9}"
+        delta = ""
+        if span.recorded_ms is not None and span.recorded_ms > 0:
+            change = span.replay_ms - span.recorded_ms
+            delta = f"{change:+8.1f} ms" if abs(change) >= 0.05 else ""
+        label = ("  " * depth + span.name)[:48]
+        print(f"{label:<48} {recorded} {span.replay_ms:>9.1f} {delta:>11}  {span.source:<9} {bar}")
+        for child in span.children:
+            line(child, depth + 1)
+
+    line(turn, 0)
+    print()
+
+def folded_lines(turn: Span, index: int) -> List[str]:
+    lines = []
+
+    def walk(span: Span, stack: List[str]) -> None:
+        frame = f"turno_{index}" if not stack else span.name.replace(";", ",").replace(" ", "_")
+        path = stack + [frame]
+        own = span.replay_ms - sum(child.replay_ms for child in span.children)
+        if own > 0:
+            lines.append(f"{';'.join(path)} {round(own * 1000)}")
+        for child in span.children:
+            walk(child, path)
+
+    walk(turn, [])
+    return lines
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("recording", help="Fichero de grabación de una sesión")
+    parser.add_argument("--folded", help="Escribe las pilas plegadas en este fichero")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Esperar de verdad las latencias grabadas")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    turns = read_recording(args.recording)
+    tap = BackendTap(FirestoreService, "firestore").install()
+    tap.load_replay(record for turn in turns for record in turn)
+
+    print(f"{'tramo':<48} {'grabado':>9} {'replay':>9} {'diferencia':>11}  {'origen':<9}")
+    folded: List[str] = []
+    recorded_total = replay_total = 0.0
+    try:
+        for index, records in enumerate(turns, 1):
+            turn = replay_turn(index, records, tap, args.realtime)
+            print_tree(turn)
+            folded.extend(folded_lines(turn, index))
+            recorded_total += turn.recorded_ms
+            replay_total += turn.replay_ms
+    finally:
+        tap.uninstall()
+
+    print(f"{len(turns)} turnos: {recorded_total:.1f} ms grabados, "
+          f"{replay_total:.1f} ms en la reproducción")
+    if tap.replay_misses:
+        print("Llamadas a backend sin grabación (comportamiento distinto): "
+              f"{', '.join(sorted(set(tap.replay_misses)))}")
+    if args.folded:
+        with open(args.folded, "w", encoding="utf-8") as f:
+            f.write("\n".join(folded) + "\n")
+        print(f"Pilas plegadas escritas en {args.folded}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
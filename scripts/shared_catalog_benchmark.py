@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Memoria por worker del catálogo en el heap frente al catálogo compartido.
+
+Para cada tamaño de catálogo arranca N workers (procesos nuevos, como los de
+producción) que, o bien cargan su propia copia del catálogo como lista de
+dicts, o bien se adjuntan al catálogo publicado en memoria compartida y
+recorren todas sus columnas. Mide en cada worker la memoria privada y la PSS
+(`/proc/self/smaps_rollup`), descontando la de un worker vacío.
+
+Uso:
+    python scripts/shared_catalog_benchmark.py [--workers 4] [--sizes 10000 50000 200000]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared_libraries"))
+
+from shared_catalog import CatalogPublisher, SharedCatalog  # noqa: E402
+
+BENCH_SHM_NAME = f"agentgemini_catalog_bench_{os.getpid()}"
+
+def synthetic_rows(count: int) -> List[Dict[str, Any]]:
+    rng = random.Random(count)
+    return [
+        {
+            "id": f"prod_{i:07d}",
+            "name": f"Tractor modelo {rng.randint(100, 999)} serie {i}",
+            "categoria": f"cat_{i % 40}",
+            "product_type_id": f"tipo_{i % 300}",
+            "image_url": f"https://example.com/img/prod_{i:07d}.jpg",
+            "price": rng.uniform(5000, 250000),
+            "stock": rng.randint(0, 20),
+            "show": True,
+        }
+        for i in range(count)
+    ]
+
+def memory_mb() -> Dict[str, float]:
+    """Memoria privada, PSS y RSS del proceso actual en MB."""
+    values: Dict[str, float] = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+        "pss": values.get("Pss", 0),
+        "rss": values.get("Rss", 0),
+    }
+
+def worker(mode: str, size: int, name: str, results) -> None:
+    if mode == "heap":
+        catalog = synthetic_rows(size)
+        total = sum(row["price"] for row in catalog)
+        index = {row["id"]: row for row in catalog}
+        hits = sum(1 for i in range(0, size, 97) if f"prod_{i:07d}" in index)
+    elif mode == "compartido":
+        snapshot = SharedCatalog(name).snapshot()
+        total = sum(snapshot.columns["price"])
+        for column in snapshot.columns.values():
+            sum(column)  # toca todas las páginas de las columnas
+        hits = sum(1 for i in range(0, size, 97) if snapshot.find(f"prod_{i:07d}") is not None)
+    else:
+        total, hits = 0.0, 0
+    results.put((mode, size, memory_mb(), hits, total))
+
+def run_workers(ctx, mode: str, size: int, workers: int, name: str) -> List[Dict[str, float]]:
+    results = ctx.Queue()
+    processes = [
+        ctx.Process(target=worker, args=(mode, size, name, results)) for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    measured = [results.get()[2] for _ in processes]
+    for process in processes:
+        process.join()
+    return measured
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000, 200000])
+    args = parser.parse_args()
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        sys.exit("Se necesita Linux (/proc/self/smaps_rollup)")
+
+    ctx = mp.get_context("spawn")
+    empty = run_workers(ctx, "vacío", 0, 1, BENCH_SHM_NAME)[0]
+    print(f"{args.workers} workers; worker vacío: {empty['private']:.1f} MB privados")
+    print(f"{'productos':>10} {'modo':<11} {'segmento':>9} {'privada/worker':>15} "
+          f"{'pss/worker':>11} {'total workers':>14}")
+
+    publisher = CatalogPublisher(BENCH_SHM_NAME)
+    try:
+        for size in args.sizes:
+            started = time.perf_counter()
+            publisher.publish(synthetic_rows(size))
+            segment_mb = publisher.segment_size / 1024 / 1024
+            publish_s = time.perf_counter() - started
+            for mode in ["heap", "compartido"]:
+                measured = run_workers(ctx, mode, size, args.workers, BENCH_SHM_NAME)
+                private = max(m["private"] - empty["private"] for m in measured)
+                pss = max(m["pss"] - empty["pss"] for m in measured)
+                segment = f"{segment_mb:.1f} MB" if mode == "compartido" else "-"
+                print(
+                    f"{size:>10} {mode:<11} {segment:>9} {private:>12.1f} MB {pss:>8.1f} MB "
+                    f"{sum(m['pss'] - empty['pss'] for m in measured):>11.1f} MB"
+                )
+            print(f"{'':>10} publicación: {publish_s:.2f}s")
+    finally:
+        publisher.close()
+
+if __name__ == "__main__":
+    main()
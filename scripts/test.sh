@@ -25,4 +25,12 @@ mypy .
 echo "\n=== Ejecutando tests unitarios ==="
 pytest -v --cov=agentGemini --cov-report=term-missing
 
+# Tokens de las declaraciones de herramientas frente al presupuesto
+echo "\n=== Comprobando declaraciones de herramientas ==="
+python scripts/tool_declarations_budget.py
+
+# Rondas con el modelo y tokens por conversación frente a la línea base
+echo "\n=== Evaluando conversaciones ==="
+python scripts/conversation_eval.py
+
 echo "\n=== Tests completados ==="
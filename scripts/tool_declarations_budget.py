@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Comprueba el coste en tokens de las declaraciones de herramientas.
+
+Para cada herramienta registrada muestra los tokens de la declaración que
+genera ADK a partir del docstring completo y los de su declaración compacta
+(`agentGemini.tool_declarations`), y falla si:
+  - alguna declaración compacta o su total supera el presupuesto,
+  - una declaración compacta no coincide con la firma de la herramienta
+    (argumentos que sobran o faltan, u obligatorios distintos),
+  - hay declaraciones compactas de herramientas que no están registradas.
+
+Las firmas se leen del código fuente sin importarlo, porque los módulos de
+herramientas crean servicios al importarse.
+
+Uso:
+    python scripts/tool_declarations_budget.py [--update]
+"""
+
+import argparse
+import ast
+import glob
+import json
+import os
+import sys
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agentGemini import tools as agent_tools  # noqa: E402
+from agentGemini.tool_declarations import TOOL_DECLARATIONS, declaration_tokens  # noqa: E402
+from agentGemini.toolsets import ESCALATION_TOOL  # noqa: E402
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), "tool_declarations_budget.json")
+
+# Argumentos que inyecta ADK y no se declaran al modelo
+INJECTED_ARGS = ("session_state", "tool_context")
+
+SCHEMA_TYPES = {
+    "str": "STRING",
+    "int": "INTEGER",
+    "float": "NUMBER",
+    "bool": "BOOLEAN",
+    "Dict": "OBJECT",
+    "dict": "OBJECT",
+    "List": "ARRAY",
+    "list": "ARRAY",
+}
+
+# Margen al regenerar el presupuesto con --update (relativo y mínimo absoluto)
+UPDATE_HEADROOM = 1.1
+UPDATE_MIN_SLACK_TOKENS = 5
+
+def source_signatures(wanted: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Docstring y argumentos de cada herramienta, leídos del código fuente.
+
+    Returns:
+        {nombre: {"doc", "params": {arg: anotación}, "required": [args]}}
+    """
+    sources = glob.glob(os.path.join(ROOT, "agentGemini", "tools", "*.py"))
+    sources.append(os.path.join(ROOT, "agentGemini", "toolsets.py"))
+    signatures: Dict[str, Dict[str, Any]] = {}
+    for path in sources:
+        with open(path, encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+        for node in tree.body:
+            if not isinstance(node, ast.FunctionDef) or node.name not in wanted:
+                continue
+            args = node.args.args
+            defaults_from = len(args) - len(node.args.defaults)
+            params = {}
+            required = []
+            for i, arg in enumerate(args):
+                if arg.arg in INJECTED_ARGS:
+                    continue
+                params[arg.arg] = ast.unparse(arg.annotation) if arg.annotation else "Any"
+                if i < defaults_from:
+                    required.append(arg.arg)
+            signatures[node.name] = {
+                "doc": ast.get_docstring(node) or "",
+                "params": params,
+                "required": required,
+            }
+    return signatures
+
+def signature_errors(
+    name: str,
+    declaration: Dict[str, Any],
+    signature: Dict[str, Any]
+) -> List[str]:
+    """Diferencias entre una declaración compacta y la firma de la herramienta."""
+    errors = []
+    parameters = declaration.get("parameters", {})
+    declared = set(parameters.get("properties", {}))
+    params = set(signature["params"])
+    if declared - params:
+        errors.append(
+            f"{name}: declara argumentos que no existen: {', '.join(sorted(declared - params))}"
+        )
+    if params - declared:
+        errors.append(f"{name}: faltan argumentos: {', '.join(sorted(params - declared))}")
+    if sorted(parameters.get("required", [])) != sorted(signature["required"]):
+        errors.append(
+            f"{name}: obligatorios {sorted(parameters.get('required', []))}, "
+            f"la firma exige {sorted(signature['required'])}"
+        )
+    return errors
+
+def schema_type(annotation: str) -> str:
+    """Tipo del esquema para una anotación (`Optional[X]` se declara como X)."""
+    if annotation.startswith("Optional["):
+        annotation = annotation[len("Optional["):-1]
+    base = annotation.split("[", 1)[0]
+    return SCHEMA_TYPES.get(base, "STRING")
+
+def generated_tokens(name: str, signature: Dict[str, Any]) -> int:
+    """Tokens aproximados de la declaración que genera ADK desde el docstring."""
+    return declaration_tokens({
+        "name": name,
+        "description": signature["doc"],
+        "parameters": {
+            "type": "OBJECT",
+            "properties": {
+                arg: {"type": schema_type(annotation)}
+                for arg, annotation in signature["params"].items()
+            },
+            "required": signature["required"],
+        },
+    })
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--update", action="store_true",
+                        help="Reescribe el presupuesto con lo medido")
+    args = parser.parse_args()
+
+    registered = list(agent_tools.__all__) + [ESCALATION_TOOL]
+    signatures = source_signatures(registered)
+    failures: List[str] = []
+    measured: Dict[str, int] = {}
+
+    budget: Dict[str, Any] = {"tools": {}, "total": 0}
+    if os.path.exists(BUDGET_FILE):
+        with open(BUDGET_FILE, encoding="utf-8") as f:
+            budget = json.load(f)
+
+    unregistered = sorted(set(TOOL_DECLARATIONS) - set(registered))
+    if unregistered:
+        failures.append(f"declaraciones de herramientas no registradas: {', '.join(unregistered)}")
+
+    print(f"{'herramienta':<26} {'generada':>9} {'compacta':>9} {'presup.':>8}")
+    without_compact, without_source = [], []
+    generated_total = compact_generated_total = 0
+    for name in registered:
+        signature = signatures.get(name)
+        generated = generated_tokens(name, signature) if signature else None
+        declaration = TOOL_DECLARATIONS.get(name)
+        if declaration is None:
+            without_compact.append(name)
+            print(f"{name:<26} {generated if generated is not None else '?':>9} {'-':>9} {'-':>8}")
+            continue
+
+        compact = declaration_tokens(declaration)
+        measured[name] = compact
+        limit = budget["tools"].get(name)
+        status = ""
+        if limit is not None and compact > limit:
+            status = "  EXCEDIDO"
+            failures.append(f"{name}: {compact} tokens, presupuesto {limit}")
+        print(f"{name:<26} {generated if generated is not None else '?':>9} {compact:>9} "
+              f"{limit if limit is not None else '-':>8}{status}")
+
+        if signature is None:
+            without_source.append(name)
+            continue
+        failures.extend(signature_errors(name, declaration, signature))
+        generated_total += generated
+        compact_generated_total += compact
+
+    total = sum(measured.values())
+    print(f"{'total compactas':<26} {'':>9} {total:>9} {budget.get('total') or '-':>8}")
+    if generated_total:
+        saved = 1 - compact_generated_total / generated_total
+        print(f"Herramientas con código y declaración compacta: {generated_total} → "
+              f"{compact_generated_total} tokens ({saved:.0%} menos) "
+              f"en cada llamada que las expone")
+    if without_compact:
+        print("Sin declaración compacta (se envía la generada por ADK): "
+              f"{', '.join(without_compact)}")
+    if without_source:
+        print(f"Sin código fuente para comprobar la firma: {', '.join(without_source)}")
+
+    if args.update:
+        budget = {
+            "tools": {
+                name: max(int(tokens * UPDATE_HEADROOM), tokens + UPDATE_MIN_SLACK_TOKENS)
+                for name, tokens in measured.items()
+            },
+            "total": max(int(total * UPDATE_HEADROOM), total + UPDATE_MIN_SLACK_TOKENS),
+        }
+        with open(BUDGET_FILE, "w", encoding="utf-8") as f:
+            json.dump(budget, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Presupuesto actualizado en {BUDGET_FILE}")
+    elif budget.get("total") and total > budget["total"]:
+        failures.append(f"total: {total} tokens, presupuesto {budget['total']}")
+
+    if failures:
+        for failure in failures:
+            print(f"  FALLO {failure}")
+        return 1
+    print("Declaraciones dentro del presupuesto")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
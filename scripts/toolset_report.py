@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Compara el coste de declarar todas las herramientas frente a las de cada etapa.
+
+Recorre conversaciones de referencia, aplica las mismas transiciones de etapa
+que el agente (`agentGemini.toolsets`) y suma los tokens de declaraciones de
+herramientas enviados en cada llamada al modelo. La latencia es una estimación
+a partir del throughput de prefill indicado.
+
+Uso:
+    python scripts/toolset_report.py [--prefill-tps 4000]
+"""
+
+import argparse
+import os
+import sys
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agentGemini.toolsets import (  # noqa: E402
+    STAGE_GREETING,
+    next_stage,
+    tools_for_stage,
+)
+# Los costes se leen del código fuente, sin importar los módulos de herramientas
+from conversation_eval import DEFAULT_DECLARATION_TOKENS, declaration_costs  # noqa: E402
+
+# Herramientas llamadas en cada turno de usuario (cada llamada implica otra
+# ronda con el modelo antes de la respuesta final)
+BENCHMARK_CONVERSATIONS: Dict[str, List[List[str]]] = {
+    "compra_tractor": [
+        [],
+        ["get_customer_profile"],
+        ["update_customer_profile"],
+        ["search_products"],
+        ["get_product_details"],
+        ["add_to_cart"],
+        ["get_cart_summary"],
+        ["process_checkout"],
+    ],
+    "demo_cosechadora": [
+        [],
+        ["search_products"],
+        ["get_product_details"],
+        ["schedule_service"],
+        [],
+    ],
+    "cliente_leal_descuento": [
+        ["get_customer_profile"],
+        ["get_recommendations"],
+        ["add_to_cart"],
+        ["generate_discount_code"],
+        ["get_cart_summary", "process_checkout"],
+    ],
+    "consulta_sin_compra": [
+        [],
+        ["search_products"],
+        ["search_products"],
+        ["get_product_details"],
+        [],
+    ],
+}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--prefill-tps", type=float, default=4000.0,
+                        help="Tokens de prefill por segundo para estimar latencia")
+    args = parser.parse_args()
+
+    costs, missing = declaration_costs()
+    if missing:
+        print(f"Sin código fuente (se estiman {DEFAULT_DECLARATION_TOKENS} tokens): "
+              f"{', '.join(missing)}\n")
+    full_cost = sum(costs.values())
+
+    print(f"{'Conversación':<26}{'Llamadas':>10}{'Completo':>12}{'Por etapa':>12}"
+          f"{'Ahorro':>9}{'ms ahorrados':>14}{'Escalados':>11}")
+    total_full = total_staged = 0
+    for name, turns in BENCHMARK_CONVERSATIONS.items():
+        stage, escalated_stage = STAGE_GREETING, None
+        calls = full = staged = escalations = 0
+        for tools_called in turns:
+            # Una llamada por herramienta más la respuesta final
+            for step in range(len(tools_called) + 1):
+                allowed = tools_for_stage(stage, escalated_stage == stage)
+                calls += 1
+                full += full_cost
+                staged += full_cost if allowed is None else sum(costs.get(t, 0) for t in allowed)
+                if step < len(tools_called):
+                    tool = tools_called[step]
+                    if allowed is not None and tool not in allowed:
+                        escalated_stage = stage
+                        escalations += 1
+                    stage = next_stage(stage, tool)
+        saved_ms = (full - staged) / args.prefill_tps * 1000
+        print(f"{name:<26}{calls:>10}{full:>12}{staged:>12}{1 - staged / full:>9.0%}"
+              f"{saved_ms:>14.0f}{escalations:>11}")
+        total_full += full
+        total_staged += staged
+
+    print(f"\nTotal: {total_full} → {total_staged} tokens de declaraciones "
+          f"({1 - total_staged / total_full:.0%} menos)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
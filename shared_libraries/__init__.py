@@ -0,0 +1,20 @@
+from .category_tree import CategoryTree, CategoryTreeCache, firestore_category_loader
+from .product_view import ProductDetailView, build_product_view
+from .shared_catalog import (
+    CatalogPublisher,
+    CatalogSnapshot,
+    CatalogUnavailableError,
+    SharedCatalog,
+    firestore_catalog_loader,
+)
+from .media_upload import (
+    ChecksumMismatchError,
+    LocalFilesystemStorage,
+    MediaProcessor,
+    UploadError,
+    UploadManager,
+    UploadNotFoundError,
+    UploadSession,
+    check_upload_id,
+    default_upload_manager,
+)
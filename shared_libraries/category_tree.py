@@ -0,0 +1,240 @@
+"""
+Árbol de categorías materializado en memoria para la navegación del embudo.
+
+La jerarquía de selección (tipo de estado → estado → categoría → subcategoría →
+sub-subcategoría → tipo de producto) se carga una vez, con el número de
+productos por nodo, hijos indexados por ID, migas de pan precalculadas y
+atajos que saltan los niveles con una sola opción. Navegar el embudo no
+necesita lecturas de Firestore; el árbol se recarga en segundo plano cuando
+caduca y se sustituye de forma atómica.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..constants import (
+    STATE_SELECTED_TYPE_STATE,
+    STATE_SELECTED_STATE,
+    STATE_SELECTED_CATEGORY,
+    STATE_SELECTED_SUB_CATEGORY,
+    STATE_SELECTED_SUB_SUB_CATEGORY,
+    STATE_SELECTED_PRODUCT_TYPE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Clave de estado de sesión de cada nivel, de la raíz a las hojas
+LEVEL_STATE_KEYS = [
+    STATE_SELECTED_TYPE_STATE,
+    STATE_SELECTED_STATE,
+    STATE_SELECTED_CATEGORY,
+    STATE_SELECTED_SUB_CATEGORY,
+    STATE_SELECTED_SUB_SUB_CATEGORY,
+    STATE_SELECTED_PRODUCT_TYPE,
+]
+
+ROOT_ID = "__root__"
+
+class CategoryNode:
+    """Nodo del árbol de categorías."""
+
+    __slots__ = (
+        "id", "name", "level", "order", "parent", "children",
+        "product_count", "breadcrumb", "options",
+    )
+
+    def __init__(self, node_id: str, name: str, level: int, order: int = 0):
+        self.id = node_id
+        self.name = name
+        self.level = level
+        self.order = order
+        self.parent: Optional["CategoryNode"] = None
+        self.children: Dict[str, "CategoryNode"] = {}
+        self.product_count = 0
+        self.breadcrumb: Tuple[Tuple[str, str], ...] = ()
+        # Hijos con productos, ya ordenados (se calcula al construir el árbol)
+        self.options: Tuple["CategoryNode", ...] = ()
+
+    def to_option(self) -> Dict[str, Any]:
+        return {"id": self.id, "name": self.name, "product_count": self.product_count}
+
+class CategoryTree:
+    """Árbol inmutable; para actualizarlo se construye uno nuevo."""
+
+    def __init__(self, root: CategoryNode, nodes: Dict[str, CategoryNode]):
+        self.root = root
+        self.nodes = nodes
+
+    @classmethod
+    def build(
+        cls,
+        categories: Iterable[Dict[str, Any]],
+        product_counts: Dict[str, int]
+    ) -> "CategoryTree":
+        """
+        Construye el árbol a partir de documentos planos.
+
+        Args:
+            categories: Dicts con id, name, parent_id (None en el primer nivel)
+                y opcionalmente order
+            product_counts: Productos visibles por ID de nodo hoja
+        """
+        root = CategoryNode(ROOT_ID, "", -1)
+        nodes: Dict[str, CategoryNode] = {ROOT_ID: root}
+        parents: Dict[str, Optional[str]] = {}
+
+        for doc in categories:
+            node = CategoryNode(doc["id"], doc.get("name", doc["id"]), 0, doc.get("order", 0))
+            nodes[node.id] = node
+            parents[node.id] = doc.get("parent_id")
+
+        for node_id, parent_id in parents.items():
+            parent = nodes.get(parent_id) if parent_id else root
+            if parent is None:
+                logger.warning(f"Categoría {node_id} con padre inexistente {parent_id}")
+                parent = root
+            nodes[node_id].parent = parent
+            parent.children[node_id] = nodes[node_id]
+
+        # Niveles, migas de pan, recuento acumulado y opciones ordenadas en un
+        # recorrido en profundidad
+        def _walk(node: CategoryNode) -> int:
+            total = product_counts.get(node.id, 0)
+            for child in node.children.values():
+                child.level = node.level + 1
+                child.breadcrumb = node.breadcrumb + ((child.id, child.name),)
+                total += _walk(child)
+            node.product_count = total
+            node.options = tuple(sorted(
+                (child for child in node.children.values() if child.product_count > 0),
+                key=lambda n: (n.order, n.name)
+            ))
+            return total
+
+        _walk(root)
+        return cls(root, nodes)
+
+    def get(self, node_id: Optional[str]) -> Optional[CategoryNode]:
+        """Nodo por ID (la raíz si no se indica)."""
+        return self.nodes.get(node_id or ROOT_ID)
+
+    def children(self, node_id: Optional[str] = None) -> Tuple[CategoryNode, ...]:
+        """Hijos con productos de un nodo, ordenados."""
+        node = self.get(node_id)
+        return node.options if node is not None else ()
+
+    def options(self, node_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Opciones del siguiente nivel tras seleccionar ``node_id``.
+
+        Los niveles con una única opción se seleccionan automáticamente, así que
+        el usuario solo ve niveles donde realmente tiene que elegir.
+
+        Returns:
+            Dict con breadcrumb, level, options, is_leaf y state_updates (claves
+            de sesión de todos los niveles seleccionados, incluidos los saltados)
+        """
+        node = self.get(node_id)
+        if node is None:
+            return {"error": f"Categoría desconocida: {node_id}"}
+
+        options = node.options
+        while len(options) == 1:
+            node = options[0]
+            options = node.options
+
+        state_updates = {
+            LEVEL_STATE_KEYS[level]: selected_id
+            for level, (selected_id, _) in enumerate(node.breadcrumb)
+            if level < len(LEVEL_STATE_KEYS)
+        }
+        next_level = node.level + 1
+        return {
+            "breadcrumb": [{"id": i, "name": n} for i, n in node.breadcrumb],
+            "level": LEVEL_STATE_KEYS[next_level] if next_level < len(LEVEL_STATE_KEYS) else None,
+            "options": [child.to_option() for child in options],
+            "is_leaf": not options,
+            "state_updates": state_updates,
+        }
+
+class CategoryTreeCache:
+    """
+    Mantiene el árbol actualizado.
+
+    El primer acceso lo carga de forma síncrona; después, cuando caduca, se
+    sigue sirviendo el árbol actual mientras un hilo construye el siguiente.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Tuple[List[Dict[str, Any]], Dict[str, int]]],
+        ttl_seconds: float = 3600
+    ):
+        self.loader = loader
+        self.ttl_seconds = ttl_seconds
+        self._tree: Optional[CategoryTree] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _load(self) -> CategoryTree:
+        started = time.perf_counter()
+        categories, counts = self.loader()
+        tree = CategoryTree.build(categories, counts)
+        logger.info(
+            f"Árbol de categorías cargado: {len(tree.nodes) - 1} nodos "
+            f"en {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        return tree
+
+    def _refresh_in_background(self) -> None:
+        try:
+            tree = self._load()
+            with self._lock:
+                self._tree, self._loaded_at = tree, time.monotonic()
+        except Exception as e:
+            logger.error(f"Error recargando el árbol de categorías: {e}")
+        finally:
+            self._refreshing = False
+
+    def get(self) -> CategoryTree:
+        """Árbol actual; dispara la recarga en segundo plano si ha caducado."""
+        with self._lock:
+            if self._tree is None:
+                self._tree, self._loaded_at = self._load(), time.monotonic()
+            elif time.monotonic() - self._loaded_at > self.ttl_seconds and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh_in_background, daemon=True).start()
+            return self._tree
+
+def firestore_category_loader(
+    category_collection: str = "Categoria",
+    product_collection: str = "Tractor",
+    leaf_field: str = "product_type_id"
+) -> Callable[[], Tuple[List[Dict[str, Any]], Dict[str, int]]]:
+    """
+    Loader que lee categorías visibles y cuenta productos por tipo en dos
+    consultas, trayendo solo los campos necesarios.
+    """
+    def _load():
+        from google.cloud import firestore
+
+        db = firestore.Client()
+        categories = []
+        for doc in db.collection(category_collection).where("show", "==", True)\
+                .select(["name", "parent_id", "order"]).stream():
+            data = doc.to_dict()
+            data["id"] = doc.id
+            categories.append(data)
+
+        counts: Dict[str, int] = {}
+        for doc in db.collection(product_collection).where("show", "==", True)\
+                .select([leaf_field]).stream():
+            leaf_id = doc.to_dict().get(leaf_field)
+            if leaf_id:
+                counts[leaf_id] = counts.get(leaf_id, 0) + 1
+        return categories, counts
+
+    return _load
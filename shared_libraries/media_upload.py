@@ -0,0 +1,519 @@
+"""
+Subida reanudable por trozos de vídeos de clientes.
+
+Los clientes graban la maquinaria en el campo y suben vídeos grandes con
+conexiones inestables. El flujo es:
+
+1. `UploadManager.create_session` valida tamaño y tipo y devuelve la sesión
+   (ID, tamaño de trozo y número de trozos).
+2. El cliente envía cada trozo con su SHA-256 (`put_chunk`). Los trozos se
+   escriben en streaming al almacenamiento mientras se calcula el hash, sin
+   cargar el fichero en memoria. Reenviar un trozo ya recibido es inocuo.
+3. Tras un corte, `status` indica qué trozos faltan y la subida continúa.
+4. `complete` une los trozos en el objeto final y encola la generación de
+   miniatura y transcodificación en un pool de workers (`MediaProcessor`).
+
+Las sesiones se guardan en el propio almacenamiento, así que una subida se
+puede reanudar aunque el proceso se reinicie. `upload_api` expone estas
+operaciones por HTTP.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    Union,
+)
+
+from ..constants import (
+    MEDIA_ALLOWED_CONTENT_TYPES,
+    MEDIA_CHUNK_SIZE_BYTES,
+    MEDIA_MAX_UPLOAD_BYTES,
+    MEDIA_PROCESSING_WORKERS,
+    MEDIA_UPLOAD_TTL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de lectura al copiar en streaming
+COPY_BUFFER_BYTES = 256 * 1024
+
+STATUS_UPLOADING = "uploading"
+STATUS_PROCESSING = "processing"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+# Valor por defecto de `MediaProcessor(ffmpeg=...)`: buscar ffmpeg en el PATH
+FFMPEG_AUTO = "auto"
+
+ChunkSource = Union[bytes, BinaryIO, Iterable[bytes]]
+
+# Los IDs de subida los genera `create_session` (uuid4().hex)
+_UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+
+class UploadError(Exception):
+    """Error de subida atribuible al cliente (sesión, tamaño, tipo, trozo)."""
+
+class UploadNotFoundError(UploadError):
+    """La subida no existe o ha caducado."""
+
+class ChecksumMismatchError(UploadError):
+    """El SHA-256 del trozo recibido no coincide con el declarado."""
+
+def check_upload_id(upload_id: str) -> str:
+    """
+    Comprueba que un ID de subida tiene el formato generado.
+
+    El ID llega del cliente y forma parte de rutas y claves del almacenamiento:
+    cualquier otro valor ("../", separadores) se rechaza.
+
+    Raises:
+        UploadError: Si el ID no es válido
+    """
+    if not isinstance(upload_id, str) or not _UPLOAD_ID.fullmatch(upload_id):
+        raise UploadError(f"ID de subida no válido: {upload_id!r}")
+    return upload_id
+
+def _safe_filename(filename: str) -> str:
+    """Último componente del nombre; los vacíos o solo de puntos ("..") pasan a "video"."""
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    return name if name.strip(".") else "video"
+
+def _iter_source(source: ChunkSource) -> Iterable[bytes]:
+    if isinstance(source, (bytes, bytearray)):
+        yield bytes(source)
+    elif hasattr(source, "read"):
+        while True:
+            data = source.read(COPY_BUFFER_BYTES)
+            if not data:
+                break
+            yield data
+    else:
+        yield from source
+
+# Almacenamiento
+
+class StorageBackend(Protocol):
+    """Almacenamiento de trozos, objetos finales y metadatos de sesión."""
+
+    def write_chunk(
+        self,
+        upload_id: str,
+        index: int,
+        source: ChunkSource,
+        max_bytes: int
+    ) -> Tuple[int, str]:
+        """Escribe un trozo en streaming; devuelve (bytes, sha256)."""
+        ...
+
+    def delete_chunk(self, upload_id: str, index: int) -> None:
+        ...
+
+    def compose(self, upload_id: str, chunk_count: int, key: str) -> None:
+        """Une los trozos en el objeto `key` y borra los trozos."""
+        ...
+
+    def local_path(self, key: str) -> str:
+        """Ruta local del objeto para las herramientas de procesado."""
+        ...
+
+    def save_session(self, upload_id: str, data: Dict[str, Any]) -> None:
+        ...
+
+    def load_session(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    def delete_upload(self, upload_id: str) -> None:
+        """Borra los trozos y la sesión de una subida."""
+        ...
+
+class LocalFilesystemStorage:
+    """
+    Almacenamiento en disco local (desarrollo y tests).
+
+    Estructura bajo `root`: `parts/{upload_id}/{index:06d}`,
+    `sessions/{upload_id}.json` y `objects/{key}`.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        for folder in ("parts", "sessions", "objects"):
+            os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+
+    def _parts_dir(self, upload_id: str) -> str:
+        return os.path.join(self.root, "parts", check_upload_id(upload_id))
+
+    def _part_path(self, upload_id: str, index: int) -> str:
+        return os.path.join(self._parts_dir(upload_id), f"{int(index):06d}")
+
+    def _session_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, "sessions", f"{check_upload_id(upload_id)}.json")
+
+    def local_path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, "objects", key))
+        if not path.startswith(os.path.join(self.root, "objects") + os.sep):
+            raise UploadError(f"Clave de objeto no válida: {key}")
+        return path
+
+    def write_chunk(
+        self,
+        upload_id: str,
+        index: int,
+        source: ChunkSource,
+        max_bytes: int
+    ) -> Tuple[int, str]:
+        path = self._part_path(upload_id, index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for data in _iter_source(source):
+                    size += len(data)
+                    if size > max_bytes:
+                        raise UploadError(f"El trozo {index} supera {max_bytes} bytes")
+                    digest.update(data)
+                    f.write(data)
+            # Reemplazo atómico: un reintento concurrente nunca deja un trozo a medias
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return size, digest.hexdigest()
+
+    def delete_chunk(self, upload_id: str, index: int) -> None:
+        path = self._part_path(upload_id, index)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def compose(self, upload_id: str, chunk_count: int, key: str) -> None:
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as out:
+            for index in range(chunk_count):
+                with open(self._part_path(upload_id, index), "rb") as part:
+                    shutil.copyfileobj(part, out, COPY_BUFFER_BYTES)
+        shutil.rmtree(self._parts_dir(upload_id), ignore_errors=True)
+
+    def save_session(self, upload_id: str, data: Dict[str, Any]) -> None:
+        path = self._session_path(upload_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def load_session(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._session_path(upload_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def delete_upload(self, upload_id: str) -> None:
+        shutil.rmtree(self._parts_dir(upload_id), ignore_errors=True)
+        if os.path.exists(self._session_path(upload_id)):
+            os.remove(self._session_path(upload_id))
+
+# Sesiones
+
+@dataclass
+class UploadSession:
+    """Estado de una subida."""
+    upload_id: str
+    filename: str
+    content_type: str
+    total_size: int
+    chunk_size: int
+    expires_at: float
+    customer_id: Optional[str] = None
+    checksums: Dict[str, str] = field(default_factory=dict)  # índice -> sha256 recibido
+    status: str = STATUS_UPLOADING
+    object_key: Optional[str] = None
+    derivatives: Dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def chunk_count(self) -> int:
+        return max(1, -(-self.total_size // self.chunk_size))
+
+    def expected_chunk_size(self, index: int) -> int:
+        if index < self.chunk_count - 1:
+            return self.chunk_size
+        return self.total_size - self.chunk_size * (self.chunk_count - 1)
+
+    def missing_chunks(self) -> List[int]:
+        return [i for i in range(self.chunk_count) if str(i) not in self.checksums]
+
+    def to_status(self) -> Dict[str, Any]:
+        missing = self.missing_chunks()
+        return {
+            "upload_id": self.upload_id,
+            "status": self.status,
+            "chunk_size": self.chunk_size,
+            "chunk_count": self.chunk_count,
+            "received_chunks": self.chunk_count - len(missing),
+            "missing_chunks": missing,
+            "object_key": self.object_key,
+            "derivatives": self.derivatives,
+            "error": self.error,
+        }
+
+# Procesado
+
+class MediaProcessor:
+    """
+    Pool de workers que genera miniatura y versión transcodificada con ffmpeg.
+
+    Si ffmpeg no está instalado (o `ffmpeg=None`), el vídeo original queda
+    disponible y el procesado se marca como omitido. Los hilos se crean con el
+    primer vídeo.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        max_workers: int = MEDIA_PROCESSING_WORKERS,
+        ffmpeg: Optional[str] = FFMPEG_AUTO
+    ):
+        self.storage = storage
+        self.ffmpeg = shutil.which("ffmpeg") if ffmpeg == FFMPEG_AUTO else ffmpeg
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def _run(self, args: List[str]) -> None:
+        subprocess.run([self.ffmpeg, "-y", "-loglevel", "error", *args], check=True, timeout=1800)
+
+    def process(self, key: str) -> Dict[str, str]:
+        """Genera las derivadas de un vídeo; devuelve {tipo: clave}."""
+        if not self.ffmpeg:
+            logger.warning(f"ffmpeg no disponible; se omite el procesado de {key}")
+            return {}
+        source = self.storage.local_path(key)
+        base = os.path.splitext(key)[0]
+        thumbnail_key, transcode_key = f"{base}_thumb.jpg", f"{base}_720p.mp4"
+
+        self._run(["-ss", "1", "-i", source, "-frames:v", "1", "-vf", "scale=320:-2",
+                   self.storage.local_path(thumbnail_key)])
+        self._run(["-i", source, "-vf", "scale=-2:'min(720,ih)'",
+                   "-c:v", "libx264", "-preset", "veryfast", "-crf", "28",
+                   "-c:a", "aac", "-b:a", "96k", "-movflags", "+faststart",
+                   self.storage.local_path(transcode_key)])
+        return {"thumbnail": thumbnail_key, "transcode": transcode_key}
+
+    def submit(self, key: str) -> Future:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="media"
+                )
+        return self._executor.submit(self.process, key)
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+class UploadManager:
+    """
+    Sesiones de subida reanudable.
+
+    Args:
+        storage: Backend de almacenamiento
+        processor: Pool de procesado (por defecto uno sobre el mismo backend)
+        on_ready: Callback opcional con la sesión cuando termina el procesado
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        processor: Optional[MediaProcessor] = None,
+        chunk_size: int = MEDIA_CHUNK_SIZE_BYTES,
+        max_upload_bytes: int = MEDIA_MAX_UPLOAD_BYTES,
+        ttl_seconds: float = MEDIA_UPLOAD_TTL_SECONDS,
+        on_ready: Optional[Callable[[UploadSession], None]] = None
+    ):
+        self.storage = storage
+        self.processor = processor or MediaProcessor(storage)
+        self.chunk_size = chunk_size
+        self.max_upload_bytes = max_upload_bytes
+        self.ttl_seconds = ttl_seconds
+        self.on_ready = on_ready
+        # Un candado por subida en uso: los trozos de subidas distintas no se
+        # bloquean y el candado se descarta cuando nadie lo usa
+        self._locks: Dict[str, List[Any]] = {}  # upload_id -> [candado, usuarios]
+        self._locks_guard = threading.Lock()
+
+    @contextmanager
+    def _lock(self, upload_id: str) -> Iterator[None]:
+        with self._locks_guard:
+            entry = self._locks.get(upload_id)
+            if entry is None:
+                entry = self._locks[upload_id] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[upload_id]
+
+    def _save(self, session: UploadSession) -> None:
+        self.storage.save_session(session.upload_id, asdict(session))
+
+    def get_session(self, upload_id: str) -> UploadSession:
+        data = self.storage.load_session(check_upload_id(upload_id))
+        if data is None:
+            raise UploadNotFoundError(f"Subida no encontrada: {upload_id}")
+        session = UploadSession(**data)
+        if session.status == STATUS_UPLOADING and session.expires_at < time.time():
+            self.storage.delete_upload(upload_id)
+            raise UploadNotFoundError(f"La subida {upload_id} ha caducado")
+        return session
+
+    def create_session(
+        self,
+        filename: str,
+        total_size: int,
+        content_type: str,
+        customer_id: Optional[str] = None
+    ) -> UploadSession:
+        """Abre una sesión de subida tras validar tamaño y tipo."""
+        if content_type not in MEDIA_ALLOWED_CONTENT_TYPES:
+            raise UploadError(f"Tipo de archivo no admitido: {content_type}")
+        if total_size <= 0 or total_size > self.max_upload_bytes:
+            raise UploadError(
+                f"Tamaño no admitido: {total_size} bytes (máximo {self.max_upload_bytes})"
+            )
+
+        session = UploadSession(
+            upload_id=uuid.uuid4().hex,
+            filename=_safe_filename(filename),
+            content_type=content_type,
+            total_size=total_size,
+            chunk_size=self.chunk_size,
+            expires_at=time.time() + self.ttl_seconds,
+            customer_id=customer_id,
+        )
+        self._save(session)
+        logger.info(
+            f"Subida {session.upload_id} creada: {total_size} bytes en {session.chunk_count} trozos"
+        )
+        return session
+
+    def put_chunk(
+        self,
+        upload_id: str,
+        index: int,
+        source: ChunkSource,
+        sha256: str
+    ) -> Dict[str, Any]:
+        """
+        Recibe un trozo y verifica su SHA-256.
+
+        Raises:
+            ChecksumMismatchError: Si el hash no coincide (el trozo se descarta)
+            UploadError: Si la sesión no existe, ha caducado o el trozo no es válido
+        """
+        session = self.get_session(upload_id)
+        if session.status != STATUS_UPLOADING:
+            raise UploadError(f"La subida {upload_id} ya está completada")
+        if not 0 <= index < session.chunk_count:
+            raise UploadError(f"Índice de trozo fuera de rango: {index}")
+        sha256 = sha256.lower()
+        if session.checksums.get(str(index)) == sha256:
+            # Reintento de un trozo ya confirmado
+            return session.to_status()
+
+        expected = session.expected_chunk_size(index)
+        size, digest = self.storage.write_chunk(upload_id, index, source, expected)
+        if digest != sha256 or size != expected:
+            self.storage.delete_chunk(upload_id, index)
+            raise ChecksumMismatchError(
+                f"Trozo {index} corrupto: {size}/{expected} bytes, sha256 {digest} != {sha256}"
+            )
+
+        with self._lock(upload_id):
+            # Releer: otros trozos pueden haberse confirmado mientras se escribía
+            # este, y `complete` puede haber cerrado la subida
+            session = self.get_session(upload_id)
+            if session.status != STATUS_UPLOADING:
+                self.storage.delete_chunk(upload_id, index)
+                raise UploadError(f"La subida {upload_id} ya está completada")
+            session.checksums[str(index)] = digest
+            self._save(session)
+        return session.to_status()
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        """Estado de la subida, incluidos los trozos que faltan para reanudarla."""
+        return self.get_session(upload_id).to_status()
+
+    def complete(self, upload_id: str) -> Dict[str, Any]:
+        """Une los trozos y encola el procesado."""
+        with self._lock(upload_id):
+            session = self.get_session(upload_id)
+            if session.status != STATUS_UPLOADING:
+                return session.to_status()
+            missing = session.missing_chunks()
+            if missing:
+                raise UploadError(f"Faltan {len(missing)} trozos: {missing[:20]}")
+
+            prefix = session.customer_id or "anonymous"
+            session.object_key = f"{prefix}/{upload_id}/{session.filename}"
+            self.storage.compose(upload_id, session.chunk_count, session.object_key)
+            session.status = STATUS_PROCESSING
+            self._save(session)
+
+        future = self.processor.submit(session.object_key)
+        future.add_done_callback(lambda f: self._processed(upload_id, f))
+        return session.to_status()
+
+    def _processed(self, upload_id: str, future: Future) -> None:
+        with self._lock(upload_id):
+            session = self.get_session(upload_id)
+            try:
+                session.derivatives = future.result()
+                session.status = STATUS_READY
+            except Exception as e:
+                logger.error(f"Error procesando la subida {upload_id}: {e}")
+                # El original sigue disponible aunque falle el procesado
+                session.status = STATUS_FAILED
+                session.error = str(e)
+            self._save(session)
+        if self.on_ready:
+            self.on_ready(session)
+
+# Gestor del proceso, compartido por la herramienta del agente y la API HTTP
+_default_manager: Optional[UploadManager] = None
+_default_manager_lock = threading.Lock()
+
+def default_upload_manager() -> UploadManager:
+    """Gestor sobre `$MEDIA_STORAGE_DIR`; se crea con la primera subida, no al importar."""
+    global _default_manager
+    with _default_manager_lock:
+        if _default_manager is None:
+            storage_dir = os.getenv("MEDIA_STORAGE_DIR", "media_uploads")
+            _default_manager = UploadManager(LocalFilesystemStorage(storage_dir))
+        return _default_manager
@@ -0,0 +1,321 @@
+"""
+Vista desnormalizada de detalle de producto.
+
+El detalle que ve el modelo combina el documento del producto (`Tractor`) con
+sus argumentos de venta (`argumentosDeVenta`). En lugar de leer y combinar los
+dos documentos en cada turno, se guarda el resultado ya combinado y listo para
+el prompt en `vistaDetalleProducto/{product_id}`. La vista se actualiza al
+escribir (`refresh`) o con el job por lotes (`rebuild_all`), y cada documento
+guarda el hash de sus fuentes para poder comprobar la consistencia. La lectura
+nunca escribe: si falta la vista, el detalle se combina desde las fuentes y
+solo se guarda en la caché local.
+
+Uso:
+    python shared_libraries/product_view.py check [--sample N]
+    python shared_libraries/product_view.py rebuild
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_COLLECTION = "Tractor"
+ARGUMENTS_COLLECTION = "argumentosDeVenta"
+VIEW_COLLECTION = "vistaDetalleProducto"
+
+# Se incrementa al cambiar el formato de la vista: las vistas antiguas se tratan como obsoletas
+VIEW_SCHEMA_VERSION = 1
+
+# Campos del producto que llegan al prompt
+PRODUCT_FIELDS = [
+    "name",
+    "description_larga",
+    "images",
+    "price",
+    "caracteristicasTecnicas",
+    "categoria",
+    "show",
+]
+
+# Límite de escrituras por lote de Firestore
+BATCH_SIZE = 500
+
+def source_hash(product: Optional[Dict[str, Any]], arguments: Optional[Dict[str, Any]]) -> str:
+    """Hash estable de los documentos fuente de una vista."""
+    payload = json.dumps(
+        [VIEW_SCHEMA_VERSION, product or {}, arguments or {}],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def build_product_view(
+    product_id: str,
+    product: Dict[str, Any],
+    arguments: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Combina producto y argumentos de venta en el payload de detalle."""
+    details = {"id": product_id}
+    details.update({field: product[field] for field in PRODUCT_FIELDS if field in product})
+    details["argumentosDeVenta"] = arguments or {}
+    return {
+        "details": details,
+        "source_hash": source_hash(product, arguments),
+        "schema_version": VIEW_SCHEMA_VERSION,
+        "built_at": time.time(),
+    }
+
+class ProductDetailView:
+    """
+    Lectura y mantenimiento de la vista de detalle de producto.
+
+    `get` cuesta como mucho una lectura (ninguna si está en la caché local). Si
+    la vista no existe todavía, el detalle se combina desde las fuentes (una
+    lectura por lotes más) y se guarda solo en la caché local; la vista la
+    escriben `refresh` y `rebuild_all`. Los productos que no existen se
+    recuerdan durante `negative_ttl_seconds` para no repetir las lecturas.
+
+    Args:
+        db: Cliente de Firestore (se crea uno por defecto si no se indica)
+        cache_size: Vistas máximas en la caché local
+        cache_ttl_seconds: Vigencia de cada vista en la caché local
+        negative_ttl_seconds: Vigencia de un producto inexistente en la caché local
+    """
+
+    def __init__(
+        self,
+        db=None,
+        cache_size: int = 512,
+        cache_ttl_seconds: float = 600,
+        negative_ttl_seconds: float = 60
+    ):
+        self._db = db
+        self.cache_size = cache_size
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        # product_id -> (expira_en, detalle o None si el producto no existe)
+        self._cache: "OrderedDict[str, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.cache_hits = 0
+        self.rebuilds = 0
+
+    @property
+    def db(self):
+        if self._db is None:
+            from google.cloud import firestore
+            self._db = firestore.Client()
+        return self._db
+
+    # Caché local
+
+    def _cached(self, product_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(encontrado, detalle); un producto inexistente es (True, None)."""
+        with self._lock:
+            entry = self._cache.get(product_id)
+            if entry is None:
+                return False, None
+            expires_at, details = entry
+            if expires_at < time.monotonic():
+                del self._cache[product_id]
+                return False, None
+            self._cache.move_to_end(product_id)
+            self.cache_hits += 1
+            return True, details
+
+    def _remember(self, product_id: str, details: Optional[Dict[str, Any]]) -> None:
+        ttl = self.cache_ttl_seconds if details is not None else self.negative_ttl_seconds
+        with self._lock:
+            self._cache[product_id] = (time.monotonic() + ttl, details)
+            self._cache.move_to_end(product_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, product_id: Optional[str] = None) -> None:
+        """Descarta un producto (también si se recordaba como inexistente), o toda la caché."""
+        with self._lock:
+            if product_id is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(product_id, None)
+
+    # Lectura
+
+    def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Detalle de un producto listo para el prompt.
+
+        Returns:
+            Dict con los datos del producto y sus argumentos de venta, o None si
+            el producto no existe
+        """
+        found, details = self._cached(product_id)
+        if found:
+            return details
+
+        self.reads += 1
+        snapshot = self.db.collection(VIEW_COLLECTION).document(product_id).get()
+        view = snapshot.to_dict() if snapshot.exists else None
+        if view and view.get("schema_version") == VIEW_SCHEMA_VERSION:
+            details = view["details"]
+        else:
+            # Vista ausente u obsoleta: se combina en memoria, sin escribir en
+            # el camino de lectura (la escriben refresh y rebuild_all)
+            self.reads += 1
+            product, arguments = self._read_sources(product_id)
+            details = None
+            if product:
+                details = build_product_view(product_id, product, arguments)["details"]
+        self._remember(product_id, details)
+        return details
+
+    # Mantenimiento
+
+    def _read_sources(
+        self,
+        product_id: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        product_ref = self.db.collection(PRODUCT_COLLECTION).document(product_id)
+        arguments_ref = self.db.collection(ARGUMENTS_COLLECTION).document(product_id)
+        docs = {doc.reference.path: doc for doc in self.db.get_all([product_ref, arguments_ref])}
+        product = docs.get(product_ref.path)
+        arguments = docs.get(arguments_ref.path)
+        return (
+            product.to_dict() if product is not None and product.exists else None,
+            arguments.to_dict() if arguments is not None and arguments.exists else None,
+        )
+
+    def refresh(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Reconstruye la vista de un producto desde sus fuentes.
+
+        Debe llamarse tras escribir en `Tractor` o `argumentosDeVenta`. Si el
+        producto ya no existe, borra la vista.
+        """
+        product, arguments = self._read_sources(product_id)
+        view_ref = self.db.collection(VIEW_COLLECTION).document(product_id)
+        self.invalidate(product_id)
+        self.rebuilds += 1
+
+        if product is None:
+            view_ref.delete()
+            return None
+        view = build_product_view(product_id, product, arguments)
+        view_ref.set(view)
+        return view["details"]
+
+    def _stream_sources(self) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+        products = {
+            doc.id: doc.to_dict()
+            for doc in self.db.collection(PRODUCT_COLLECTION).stream()
+        }
+        arguments = {
+            doc.id: doc.to_dict()
+            for doc in self.db.collection(ARGUMENTS_COLLECTION).stream()
+        }
+        return products, arguments
+
+    def rebuild_all(self) -> Dict[str, int]:
+        """
+        Job por lotes: reconstruye todas las vistas y borra las huérfanas.
+
+        Returns:
+            Dict con el número de vistas escritas y borradas
+        """
+        products, arguments = self._stream_sources()
+        orphans = [
+            doc.id for doc in self.db.collection(VIEW_COLLECTION).select([]).stream()
+            if doc.id not in products
+        ]
+
+        writes: List[Callable[[Any], None]] = []
+        for product_id, product in products.items():
+            view = build_product_view(product_id, product, arguments.get(product_id))
+            ref = self.db.collection(VIEW_COLLECTION).document(product_id)
+            writes.append(lambda batch, ref=ref, view=view: batch.set(ref, view))
+        for product_id in orphans:
+            ref = self.db.collection(VIEW_COLLECTION).document(product_id)
+            writes.append(lambda batch, ref=ref: batch.delete(ref))
+
+        for start in range(0, len(writes), BATCH_SIZE):
+            batch = self.db.batch()
+            for write in writes[start:start + BATCH_SIZE]:
+                write(batch)
+            batch.commit()
+
+        self.invalidate()
+        logger.info(
+            f"Vistas de producto reconstruidas: {len(products)}, "
+            f"huérfanas borradas: {len(orphans)}"
+        )
+        return {"written": len(products), "deleted": len(orphans)}
+
+    def check_consistency(self, sample: Optional[int] = None) -> Dict[str, List[str]]:
+        """
+        Compara cada vista con sus fuentes actuales.
+
+        Args:
+            sample: Comprobar solo los primeros N productos
+
+        Returns:
+            Dict con los IDs de vistas que faltan, obsoletas y huérfanas
+        """
+        products, arguments = self._stream_sources()
+        views = {
+            doc.id: doc.to_dict()
+            for doc in self.db.collection(VIEW_COLLECTION).select(["source_hash"]).stream()
+        }
+
+        product_ids: Iterable[str] = sorted(products)
+        if sample is not None:
+            product_ids = list(product_ids)[:sample]
+
+        report: Dict[str, List[str]] = {"missing": [], "stale": [], "orphan": []}
+        for product_id in product_ids:
+            view = views.get(product_id)
+            if view is None:
+                report["missing"].append(product_id)
+            elif view.get("source_hash") != source_hash(
+                products[product_id], arguments.get(product_id)
+            ):
+                report["stale"].append(product_id)
+        report["orphan"] = sorted(set(views) - set(products))
+        return report
+
+    def get_stats(self) -> Dict[str, int]:
+        """Lecturas de Firestore, aciertos de caché y reconstrucciones."""
+        return {"reads": self.reads, "cache_hits": self.cache_hits, "rebuilds": self.rebuilds}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mantenimiento de la vista de detalle de producto")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    check = subparsers.add_parser(
+        "check", help="Comprueba que las vistas coinciden con sus fuentes"
+    )
+    check.add_argument("--sample", type=int, default=None, help="Comprobar solo N productos")
+    subparsers.add_parser("rebuild", help="Reconstruye todas las vistas")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    view = ProductDetailView()
+
+    if args.command == "rebuild":
+        print(json.dumps(view.rebuild_all()))
+        return 0
+
+    report = view.check_consistency(args.sample)
+    for kind, product_ids in report.items():
+        print(f"{kind}: {len(product_ids)}")
+        for product_id in product_ids:
+            print(f"  {product_id}")
+    return 1 if any(report.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
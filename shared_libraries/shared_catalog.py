@@ -0,0 +1,629 @@
+"""
+Catálogo de productos en memoria compartida entre los workers.
+
+En producción cada worker (`workers: 4` en adk.yaml) mantendría su propia copia
+del catálogo en el heap. En su lugar, un único proceso cargador lee el
+catálogo y lo publica en un segmento de memoria compartida con un formato
+columnar:
+
+- una columna tipada por campo (float64, int64, bool o índice de cadena),
+- una tabla de cadenas ordenada y sin duplicados, que guarda el texto una sola
+  vez y permite buscar por igualdad con una búsqueda binaria,
+- las filas ordenadas por ID, para localizar un producto sin índice aparte,
+- para las columnas de `CATALOG_INDEXES`, las filas ordenadas por su valor,
+  de modo que filtrar por categoría es una búsqueda binaria y no un recorrido.
+
+Los workers se adjuntan en solo lectura: las páginas son las del cargador, así
+que la memoria privada de cada worker no crece con el catálogo. Cada
+publicación crea una generación nueva (`<nombre>_<generación>`) y actualiza el
+segmento de control `<nombre>`; los workers cambian de generación en su
+siguiente acceso y la anterior se libera cuando ya nadie la usa. Si el
+cargador se reinicia y crea otro segmento de control, los workers lo detectan
+(cambia el inodo) y se adjuntan al nuevo.
+
+Uso:
+    python shared_libraries/shared_catalog.py serve [--interval 600]
+    python shared_libraries/shared_catalog.py inspect [product_id]
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import signal
+import struct
+import sys
+import threading
+import time
+from array import array
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CATALOG_SHM_NAME = os.getenv("CATALOG_SHM_NAME", "agentgemini_catalog")
+CATALOG_REFRESH_SECONDS = 600
+# Cada cuánto comprueba un worker si hay una generación nueva
+CATALOG_CHECK_INTERVAL_SECONDS = 1.0
+
+PRODUCT_COLLECTION = "Tractor"
+
+# Columnas del catálogo: (nombre, tipo)
+CATALOG_COLUMNS = [
+    ("id", "str"),
+    ("name", "str"),
+    ("categoria", "str"),
+    ("product_type_id", "str"),
+    ("image_url", "str"),
+    ("price", "f8"),
+    ("stock", "i8"),
+    ("show", "bool"),
+]
+# Columnas de cadena con orden publicado para `where_equals`
+CATALOG_INDEXES = ("categoria", "product_type_id")
+
+# Código de `array`/`memoryview.cast` de cada tipo de columna
+_TYPECODES = {"str": "i", "f8": "d", "i8": "q", "bool": "B"}
+_MISSING_STRING = -1
+
+_MAGIC = b"AGCAT001"
+# magic, generación, filas, longitud de los metadatos
+_HEADER = struct.Struct("<8sQQQ")
+_CONTROL = struct.Struct("<Q")
+_ALIGN = 8
+
+class CatalogUnavailableError(Exception):
+    """No hay ningún catálogo publicado con ese nombre."""
+
+def _posix_shm():
+    """
+    Módulo `_posixshmem` de CPython, importado solo al usarlo: no existe en
+    Windows, donde el catálogo compartido no está disponible.
+    """
+    try:
+        import _posixshmem
+    except ImportError:
+        raise CatalogUnavailableError("Memoria compartida POSIX no disponible en esta plataforma")
+    return _posixshmem
+
+def _open_readonly(name: str) -> int:
+    return _posix_shm().shm_open("/" + name, os.O_RDONLY, mode=0o600)
+
+def _unlink_segment(name: str) -> bool:
+    """Borra el segmento sin registrarlo en el resource_tracker; False si no existía."""
+    try:
+        _posix_shm().shm_unlink("/" + name)
+    except FileNotFoundError:
+        return False
+    return True
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+
+class _ReadOnlySegment:
+    """
+    Segmento de memoria compartida mapeado en solo lectura.
+
+    No usa `SharedMemory` para adjuntarse: en Python < 3.13 registraría el
+    segmento en el resource_tracker del worker, que lo borraría al terminar.
+    """
+
+    def __init__(self, name: str):
+        fd = _open_readonly(name)
+        try:
+            stat = os.fstat(fd)
+            self._mmap = mmap.mmap(fd, stat.st_size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        self.name = name
+        self.inode = (stat.st_dev, stat.st_ino)
+        self.buf = memoryview(self._mmap)
+
+    def close(self) -> None:
+        self.buf.release()
+        self._mmap.close()
+
+def _segment_inode(name: str) -> Optional[Tuple[int, int]]:
+    """Inodo del segmento publicado con ese nombre, o None si no existe."""
+    try:
+        fd = _open_readonly(name)
+    except FileNotFoundError:
+        return None
+    try:
+        stat = os.fstat(fd)
+        return (stat.st_dev, stat.st_ino)
+    finally:
+        os.close(fd)
+
+def _segment_name(name: str, generation: int) -> str:
+    return f"{name}_{generation}"
+
+def _order_block(column: str) -> str:
+    return f"__order_{column}__"
+
+# Codificación
+
+def _encode_column(kind: str, values: List[Any], strings: Dict[str, int]) -> bytes:
+    if kind == "str":
+        data = array("i", (strings[v] if v is not None else _MISSING_STRING for v in values))
+    elif kind == "f8":
+        data = array("d", (float(v) if v is not None else math.nan for v in values))
+    elif kind == "i8":
+        data = array("q", (int(v) if v is not None else 0 for v in values))
+    elif kind == "bool":
+        data = array("B", (1 if v else 0 for v in values))
+    else:
+        raise ValueError(f"Tipo de columna desconocido: {kind}")
+    return data.tobytes()
+
+def encode_catalog(
+    rows: Iterable[Dict[str, Any]],
+    generation: int,
+    columns: Sequence[Tuple[str, str]] = CATALOG_COLUMNS,
+    indexes: Sequence[str] = CATALOG_INDEXES
+) -> Tuple[bytes, List[Tuple[int, bytes]]]:
+    """
+    Codifica las filas en el formato del segmento.
+
+    Para cada columna de cadena de `indexes` se añade un bloque con los
+    números de fila ordenados por (índice de cadena, fila).
+
+    Returns:
+        (cabecera con metadatos, lista de (offset, bytes) de cada bloque)
+    """
+    rows = sorted((row for row in rows if row.get("id")), key=lambda row: row["id"])
+    string_values = {
+        row.get(name)
+        for row in rows
+        for name, kind in columns
+        if kind == "str" and row.get(name) is not None
+    }
+    string_list = sorted(str(value) for value in string_values)
+    strings = {value: i for i, value in enumerate(string_list)}
+
+    blocks: List[Tuple[str, bytes]] = []
+    kinds = dict(columns)
+    for name, kind in columns:
+        values = [row.get(name) for row in rows]
+        if kind == "str":
+            values = [str(v) if v is not None else None for v in values]
+        blocks.append((name, _encode_column(kind, values, strings)))
+    for name in indexes:
+        if kinds.get(name) != "str":
+            raise ValueError(f"Solo se indexan columnas de cadena: {name}")
+        codes = array("i", dict(blocks)[name])
+        order = array("i", sorted(range(len(rows)), key=lambda i: (codes[i], i)))
+        blocks.append((_order_block(name), order.tobytes()))
+
+    encoded = [value.encode("utf-8") for value in string_list]
+    offsets = array("Q", [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    blocks.append(("__string_offsets__", offsets.tobytes()))
+    blocks.append(("__string_data__", b"".join(encoded)))
+
+    # Offsets relativos al inicio de los datos, que empiezan tras los metadatos
+    meta: Dict[str, Any] = {"columns": [], "strings": len(string_list)}
+    offset = 0
+    for name, data in blocks:
+        meta["columns"].append([name, kinds.get(name, "raw"), offset, len(data)])
+        offset = _align(offset + len(data))
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    header = _HEADER.pack(_MAGIC, generation, len(rows), len(meta_bytes)) + meta_bytes
+
+    base = _align(len(header))
+    layout = [
+        (base + offset, data)
+        for (_, _, offset, _), (_, data) in zip(meta["columns"], blocks)
+    ]
+    return header, layout
+
+# Lectura
+
+class CatalogSnapshot:
+    """
+    Una generación del catálogo adjuntada en solo lectura.
+
+    Es inmutable: quien la obtiene puede seguir usándola aunque se publique
+    otra generación. El segmento se cierra cuando se libera la última
+    referencia.
+    """
+
+    def __init__(self, shm: _ReadOnlySegment):
+        self._shm = shm
+        self._views: List[memoryview] = []
+        magic, generation, row_count, meta_len = _HEADER.unpack_from(shm.buf, 0)
+        if magic != _MAGIC:
+            shm.close()
+            raise CatalogUnavailableError(f"Segmento {shm.name} sin catálogo válido")
+        self.generation = generation
+        self.row_count = row_count
+        meta = json.loads(bytes(shm.buf[_HEADER.size:_HEADER.size + meta_len]))
+        base = _align(_HEADER.size + meta_len)
+
+        self.columns: Dict[str, memoryview] = {}
+        self.kinds: Dict[str, str] = {}
+        # Columna -> filas ordenadas por su valor
+        self._orders: Dict[str, memoryview] = {}
+        for name, kind, offset, length in meta["columns"]:
+            view = shm.buf[base + offset:base + offset + length]
+            if kind in _TYPECODES:
+                view = view.cast(_TYPECODES[kind])
+                self.kinds[name] = kind
+            elif name == "__string_offsets__":
+                view = view.cast("Q")
+            elif name.startswith("__order_"):
+                view = view.cast("i")
+                self._orders[name[len("__order_"):-2]] = view
+                self._views.append(view)
+                continue
+            self._views.append(view)
+            self.columns[name] = view
+        self._string_offsets = self.columns.pop("__string_offsets__")
+        self._string_data = self.columns.pop("__string_data__")
+        self.string_count = meta["strings"]
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def __del__(self):
+        self.close()
+
+    def close(self) -> None:
+        for view in self._views:
+            view.release()
+        self._views = []
+        self.columns = {}
+        self._orders = {}
+        try:
+            self._shm.close()
+        except (BufferError, OSError):
+            pass
+
+    # Tabla de cadenas
+
+    def string(self, index: int) -> Optional[str]:
+        if index == _MISSING_STRING:
+            return None
+        start, end = self._string_offsets[index], self._string_offsets[index + 1]
+        return bytes(self._string_data[start:end]).decode("utf-8")
+
+    def string_index(self, value: str) -> Optional[int]:
+        """Índice de una cadena en la tabla (ordenada), o None si no está."""
+        lo, hi = 0, self.string_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.string(mid) < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.string_count and self.string(lo) == value:
+            return lo
+        return None
+
+    # Filas
+
+    def value(self, column: str, row: int) -> Any:
+        kind = self.kinds[column]
+        raw = self.columns[column][row]
+        if kind == "str":
+            return self.string(raw)
+        if kind == "f8":
+            return None if math.isnan(raw) else raw
+        if kind == "bool":
+            return bool(raw)
+        return raw
+
+    def row(self, index: int) -> Dict[str, Any]:
+        return {column: self.value(column, index) for column in self.kinds}
+
+    def find(self, product_id: str) -> Optional[int]:
+        """Fila de un producto: las filas están ordenadas por ID."""
+        index = self.string_index(product_id)
+        if index is None:
+            return None
+        ids = self.columns["id"]
+        row = bisect.bisect_left(ids, index)
+        if row < self.row_count and ids[row] == index:
+            return row
+        return None
+
+    def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        row = self.find(product_id)
+        return self.row(row) if row is not None else None
+
+    def where_equals(self, column: str, value: Any) -> List[int]:
+        """
+        Filas cuyo valor en ``column`` es ``value``, en orden de fila.
+
+        Con orden publicado para la columna es una búsqueda binaria; si no,
+        un recorrido de la columna.
+        """
+        if self.kinds[column] == "str":
+            value = self.string_index(value)
+            if value is None:
+                return []
+        values = self.columns[column]
+        order = self._orders.get(column)
+        if order is not None:
+            lo = bisect.bisect_left(order, value, key=values.__getitem__)
+            hi = bisect.bisect_right(order, value, lo=lo, key=values.__getitem__)
+            return order[lo:hi].tolist()
+        return [i for i in range(self.row_count) if values[i] == value]
+
+class SharedCatalog:
+    """
+    Acceso de un worker al catálogo publicado.
+
+    Se adjunta en el primer uso y, como mucho cada `check_interval` segundos,
+    comprueba el segmento de control para pasar a la generación nueva.
+
+    Args:
+        name: Nombre del catálogo publicado
+        check_interval: Segundos entre comprobaciones de generación
+    """
+
+    def __init__(
+        self,
+        name: str = CATALOG_SHM_NAME,
+        check_interval: float = CATALOG_CHECK_INTERVAL_SECONDS
+    ):
+        self.name = name
+        self.check_interval = check_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._control: Optional[_ReadOnlySegment] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.swaps = 0
+
+    def _published_generation(self) -> int:
+        # Un cargador reiniciado crea otro segmento de control con el mismo
+        # nombre: el mapeado antiguo ya no se actualiza y hay que reabrirlo
+        inode = _segment_inode(self.name)
+        if self._control is not None and self._control.inode != inode:
+            self._control.close()
+            self._control = None
+        if inode is None:
+            raise CatalogUnavailableError(f"No hay catálogo publicado en {self.name}")
+        if self._control is None:
+            try:
+                self._control = _ReadOnlySegment(self.name)
+            except FileNotFoundError:
+                raise CatalogUnavailableError(f"No hay catálogo publicado en {self.name}")
+        return _CONTROL.unpack_from(self._control.buf, 0)[0]
+
+    def snapshot(self) -> CatalogSnapshot:
+        """
+        Generación actual del catálogo.
+
+        Raises:
+            CatalogUnavailableError: Si el cargador no ha publicado ninguna
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                generation = self._published_generation()
+            except CatalogUnavailableError:
+                # Cargador parado o reiniciándose: se sigue con la generación actual
+                if self._snapshot is None:
+                    raise
+                return self._snapshot
+            if self._snapshot is None or self._snapshot.generation != generation:
+                try:
+                    shm = _ReadOnlySegment(_segment_name(self.name, generation))
+                except FileNotFoundError:
+                    # Generación retirada entre la lectura del control y el
+                    # adjuntado: se sigue con la actual hasta la próxima comprobación
+                    if self._snapshot is None:
+                        raise CatalogUnavailableError(
+                            f"Generación {generation} de {self.name} no disponible"
+                        )
+                    return self._snapshot
+                # La generación anterior se cierra al soltarse su última referencia
+                self._snapshot = CatalogSnapshot(shm)
+                self.swaps += 1
+                logger.info(
+                    f"Catálogo {self.name}: generación {generation}, "
+                    f"{len(self._snapshot)} productos"
+                )
+            return self._snapshot
+
+    def available(self) -> bool:
+        try:
+            self.snapshot()
+            return True
+        except CatalogUnavailableError:
+            return False
+
+    def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        return self.snapshot().get(product_id)
+
+    def where_equals(self, column: str, value: Any) -> List[Dict[str, Any]]:
+        snapshot = self.snapshot()
+        return [snapshot.row(i) for i in snapshot.where_equals(column, value)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "name": self.name,
+            "generation": snapshot.generation if snapshot else None,
+            "products": len(snapshot) if snapshot else 0,
+            "swaps": self.swaps,
+        }
+
+# Publicación
+
+class CatalogPublisher:
+    """
+    Publica generaciones del catálogo desde el proceso cargador.
+
+    Conserva la generación anterior a la publicada para que los workers que
+    están cambiando puedan adjuntarse; las más antiguas se retiran (los
+    workers que aún las tengan abiertas las siguen leyendo hasta soltarlas).
+    """
+
+    def __init__(
+        self,
+        name: str = CATALOG_SHM_NAME,
+        columns: Sequence[Tuple[str, str]] = CATALOG_COLUMNS,
+        indexes: Sequence[str] = CATALOG_INDEXES
+    ):
+        self.name = name
+        self.columns = columns
+        self.indexes = indexes
+        self.generation = 0
+        self.segment_size = 0
+        self._segments: Dict[int, shared_memory.SharedMemory] = {}
+        try:
+            self._control = shared_memory.SharedMemory(name=name, create=True, size=_CONTROL.size)
+        except FileExistsError:
+            # Cargador anterior terminado sin limpiar: se continúa su numeración
+            self._control = shared_memory.SharedMemory(name=name)
+            self.generation = _CONTROL.unpack_from(self._control.buf, 0)[0]
+            self._adopt_stale_generations()
+
+    def _adopt_stale_generations(self) -> None:
+        """
+        Recupera las generaciones que dejó el cargador anterior.
+
+        La publicada y la previa se adoptan (los workers pueden estar
+        adjuntándose a ellas) y se retiran con la siguiente publicación; las
+        más antiguas, que quedaron si el cargador murió entre publicar y
+        retirar, se borran ya. Como solo se conservan las dos últimas, las
+        huérfanas son las inmediatamente anteriores: se borran hacia atrás
+        hasta el primer hueco.
+        """
+        for generation in (self.generation - 1, self.generation):
+            if generation < 1:
+                continue
+            try:
+                self._segments[generation] = shared_memory.SharedMemory(
+                    name=_segment_name(self.name, generation)
+                )
+            except FileNotFoundError:
+                pass
+        generation = self.generation - 2
+        while generation >= 1 and _unlink_segment(_segment_name(self.name, generation)):
+            logger.info(f"Catálogo {self.name}: borrada la generación huérfana {generation}")
+            generation -= 1
+
+    def publish(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Publica una generación nueva y devuelve su número."""
+        generation = self.generation + 1
+        header, layout = encode_catalog(rows, generation, self.columns, self.indexes)
+        size = max(_align(layout[-1][0] + len(layout[-1][1])), _ALIGN)
+        shm = shared_memory.SharedMemory(
+            name=_segment_name(self.name, generation), create=True, size=size
+        )
+        shm.buf[:len(header)] = header
+        for offset, data in layout:
+            shm.buf[offset:offset + len(data)] = data
+
+        # El segmento está completo antes de anunciarlo
+        _CONTROL.pack_into(self._control.buf, 0, generation)
+        self._segments[generation] = shm
+        self.generation = generation
+        self.segment_size = size
+
+        for old in [g for g in self._segments if g < generation - 1]:
+            self._retire(old)
+        logger.info(
+            f"Catálogo {self.name}: publicada la generación {generation} ({size / 1e6:.1f} MB)"
+        )
+        return generation
+
+    def _retire(self, generation: int) -> None:
+        shm = self._segments.pop(generation)
+        shm.close()
+        shm.unlink()
+
+    def close(self) -> None:
+        """Retira todas las generaciones y el segmento de control."""
+        for generation in list(self._segments):
+            self._retire(generation)
+        self._control.close()
+        try:
+            self._control.unlink()
+        except FileNotFoundError:
+            pass
+
+def firestore_catalog_loader(
+    product_collection: str = PRODUCT_COLLECTION
+) -> Callable[[], List[Dict[str, Any]]]:
+    """Loader que lee los productos visibles trayendo solo las columnas del catálogo."""
+    def _load():
+        from google.cloud import firestore
+
+        db = firestore.Client()
+        fields = ["name", "categoria", "product_type_id", "images", "price", "stock", "show"]
+        rows = []
+        query = db.collection(product_collection).where("show", "==", True).select(fields)
+        for doc in query.stream():
+            data = doc.to_dict()
+            images = data.get("images") or []
+            data["id"] = doc.id
+            data["image_url"] = images[0] if images else None
+            rows.append(data)
+        return rows
+
+    return _load
+
+def serve(
+    publisher: CatalogPublisher,
+    loader: Callable[[], List[Dict[str, Any]]],
+    interval: float
+) -> None:
+    """Publica el catálogo cada `interval` segundos hasta recibir SIGTERM/SIGINT."""
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    try:
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                rows = loader()
+                publisher.publish(rows)
+                elapsed = time.perf_counter() - started
+                logger.info(f"{len(rows)} productos cargados en {elapsed:.1f}s")
+            except Exception as e:
+                # Los workers siguen con la última generación publicada
+                logger.error(f"Error cargando el catálogo: {e}")
+            stop.wait(interval)
+    finally:
+        publisher.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Catálogo de productos en memoria compartida")
+    parser.add_argument("--name", default=CATALOG_SHM_NAME)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve_parser = subparsers.add_parser("serve", help="Carga y publica el catálogo periódicamente")
+    serve_parser.add_argument("--interval", type=float, default=CATALOG_REFRESH_SECONDS)
+    inspect_parser = subparsers.add_parser("inspect", help="Muestra la generación publicada")
+    inspect_parser.add_argument("product_id", nargs="?")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "serve":
+        serve(CatalogPublisher(args.name), firestore_catalog_loader(), args.interval)
+        return 0
+
+    catalog = SharedCatalog(args.name)
+    try:
+        snapshot = catalog.snapshot()
+    except CatalogUnavailableError as e:
+        print(e)
+        return 1
+    print(json.dumps(catalog.get_stats()))
+    if args.product_id:
+        print(json.dumps(snapshot.get(args.product_id), ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+API HTTP de la subida reanudable de vídeos (`media_upload`).
+
+Rutas bajo `MEDIA_UPLOAD_BASE_URL`, que es la `upload_url` que la herramienta
+del agente devuelve al cliente:
+
+- ``GET {upload_url}``: estado de la subida y trozos que faltan
+- ``PUT {upload_url}/chunks/{índice}``: un trozo, con su SHA-256 en la
+  cabecera ``X-Chunk-SHA256``
+- ``POST {upload_url}/complete``: une los trozos y encola el procesado
+
+El ID de subida es aleatorio (128 bits) y solo lo conoce el cliente que pidió
+la subida, así que hace de credencial de la URL. Las operaciones del gestor
+escriben en disco y se ejecutan fuera del bucle de eventos.
+
+Uso:
+    uvicorn <paquete>.shared_libraries.upload_api:app
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Request
+
+from ..constants import MEDIA_UPLOAD_BASE_URL
+from .media_upload import (
+    ChecksumMismatchError,
+    UploadError,
+    UploadManager,
+    UploadNotFoundError,
+    default_upload_manager,
+)
+
+def _http_error(error: UploadError) -> HTTPException:
+    if isinstance(error, UploadNotFoundError):
+        return HTTPException(status_code=404, detail=str(error))
+    if isinstance(error, ChecksumMismatchError):
+        # El cliente debe reenviar el trozo
+        return HTTPException(status_code=422, detail=str(error))
+    return HTTPException(status_code=400, detail=str(error))
+
+async def _call(fn: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+    try:
+        return await asyncio.to_thread(fn, *args)
+    except UploadError as e:
+        raise _http_error(e)
+
+async def _read_body(request: Request, max_bytes: int) -> bytes:
+    """Cuerpo del trozo, cortando en cuanto supera el tamaño de trozo."""
+    if int(request.headers.get("content-length") or 0) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"El trozo supera {max_bytes} bytes")
+    body = bytearray()
+    async for data in request.stream():
+        body += data
+        if len(body) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"El trozo supera {max_bytes} bytes")
+    return bytes(body)
+
+def create_upload_router(
+    get_manager: Callable[[], UploadManager] = default_upload_manager,
+    prefix: str = MEDIA_UPLOAD_BASE_URL
+) -> APIRouter:
+    """
+    Rutas de subida, para montarlas en cualquier app FastAPI.
+
+    Args:
+        get_manager: Devuelve el gestor de subidas (se llama en cada petición)
+        prefix: Ruta base; debe coincidir con la `upload_url` de la herramienta
+    """
+    router = APIRouter(prefix=prefix)
+
+    @router.get("/{upload_id}")
+    async def upload_status(upload_id: str) -> Dict[str, Any]:
+        return await _call(get_manager().status, upload_id)
+
+    @router.put("/{upload_id}/chunks/{index}")
+    async def put_chunk(
+        upload_id: str,
+        index: int,
+        request: Request,
+        x_chunk_sha256: Optional[str] = Header(None)
+    ) -> Dict[str, Any]:
+        if not x_chunk_sha256:
+            raise HTTPException(status_code=400, detail="Falta la cabecera X-Chunk-SHA256")
+        manager = get_manager()
+        data = await _read_body(request, manager.chunk_size)
+        return await _call(manager.put_chunk, upload_id, index, data, x_chunk_sha256)
+
+    @router.post("/{upload_id}/complete")
+    async def complete(upload_id: str) -> Dict[str, Any]:
+        return await _call(get_manager().complete, upload_id)
+
+    return router
+
+def create_upload_app(get_manager: Callable[[], UploadManager] = default_upload_manager) -> FastAPI:
+    """App ASGI solo con las rutas de subida."""
+    app = FastAPI(title="Subida de vídeos")
+    app.include_router(create_upload_router(get_manager))
+    return app
+
+app = create_upload_app()
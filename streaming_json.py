@@ -0,0 +1,233 @@
+"""
+Parser JSON incremental para las respuestas estructuradas del agente.
+
+El modelo devuelve un objeto JSON (template_id, message, data,
+next_funnel_step) que llega troceado cuando se usa streaming. En lugar de
+esperar al texto completo, el parser consume los trozos según llegan y emite
+cada campo de primer nivel en cuanto su valor está completo, de modo que el
+frontend puede elegir la plantilla mientras el resto sigue generándose.
+
+Tolera texto antes del objeto (p. ej. una valla ```json) y después de cerrarlo,
+y lanza `StreamingJSONError` en el primer carácter inválido, sin esperar al
+final de la respuesta.
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_BEFORE = "before"
+_KEY_OR_END = "key_or_end"
+_KEY = "key"
+_IN_KEY = "in_key"
+_COLON = "colon"
+_VALUE = "value"
+_IN_VALUE = "in_value"
+_COMMA_OR_END = "comma_or_end"
+_DONE = "done"
+
+_CLOSING = {"}": "{", "]": "["}
+_SCALAR_START = set("-0123456789tfn")
+_SCALAR_END = set(",}] \t\r\n")
+
+class StreamingJSONError(ValueError):
+    """La respuesta del modelo no es un objeto JSON válido."""
+
+class StreamingJSONParser:
+    """
+    Parser incremental del objeto JSON de primer nivel de una respuesta.
+
+    Args:
+        fields: Campos que se emiten al completarse (None para todos). Todos
+            los campos se guardan igualmente en `result`.
+    """
+
+    def __init__(self, fields: Optional[Iterable[str]] = None):
+        self.fields = set(fields) if fields is not None else None
+        self.result: Dict[str, Any] = {}
+        self.trailing_text = ""
+        self._buf = ""
+        self._pos = 0
+        self._phase = _BEFORE
+        self._token_start = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+
+    @property
+    def done(self) -> bool:
+        """True cuando el objeto de primer nivel se ha cerrado."""
+        return self._phase == _DONE
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Consume un trozo de texto.
+
+        Returns:
+            Lista de (campo, valor) completados con este trozo
+
+        Raises:
+            StreamingJSONError: En el primer carácter que invalida el objeto
+        """
+        if self._phase == _DONE:
+            self.trailing_text += chunk
+            return []
+
+        self._buf += chunk
+        completed: List[Tuple[str, Any]] = []
+        while self._pos < len(self._buf) and self._phase != _DONE:
+            if not self._step(completed):
+                break
+        if self._phase == _DONE:
+            self.trailing_text += self._buf[self._pos:]
+        return completed
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Termina el stream y devuelve el objeto completo.
+
+        Raises:
+            StreamingJSONError: Si no había objeto o quedó sin cerrar
+        """
+        if self._phase == _BEFORE:
+            raise StreamingJSONError("La respuesta no contiene un objeto JSON")
+        if self._phase != _DONE:
+            raise StreamingJSONError(f"Respuesta JSON incompleta (campo pendiente: {self._key})")
+        return self.result
+
+    # Máquina de estados
+
+    def _fail(self, expected: str) -> None:
+        context = self._buf[max(0, self._pos - 20):self._pos + 20]
+        raise StreamingJSONError(f"{expected} en la posición {self._pos}: {context!r}")
+
+    def _loads(self, text: str) -> Any:
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            self._pos = self._token_start + e.pos
+            self._fail(f"JSON inválido ({e.msg})")
+
+    def _step(self, completed: List[Tuple[str, Any]]) -> bool:
+        """Avanza un paso; devuelve False si hacen falta más datos."""
+        buf, phase = self._buf, self._phase
+
+        if phase == _BEFORE:
+            start = buf.find("{", self._pos)
+            if start < 0:
+                self._pos = len(buf)
+                return False
+            self._pos = start + 1
+            self._phase = _KEY_OR_END
+            return True
+
+        if phase == _IN_KEY:
+            if not self._scan_string():
+                return False
+            self._key = self._loads(buf[self._token_start:self._pos])
+            self._phase = _COLON
+            return True
+
+        if phase == _IN_VALUE:
+            if not self._scan_value():
+                return False
+            value = self._loads(buf[self._token_start:self._pos])
+            self.result[self._key] = value
+            if self.fields is None or self._key in self.fields:
+                completed.append((self._key, value))
+            self._phase = _COMMA_OR_END
+            return True
+
+        ch = buf[self._pos]
+        if ch.isspace():
+            self._pos += 1
+            return True
+
+        if phase in (_KEY_OR_END, _KEY):
+            if ch == '"':
+                self._token_start = self._pos
+                self._pos += 1
+                self._phase = _IN_KEY
+                return True
+            if ch == "}" and phase == _KEY_OR_END:
+                self._pos += 1
+                self._phase = _DONE
+                return True
+            self._fail("Se esperaba una clave")
+
+        if phase == _COLON:
+            if ch != ":":
+                self._fail("Se esperaba ':'")
+            self._pos += 1
+            self._phase = _VALUE
+            return True
+
+        if phase == _VALUE:
+            if ch not in '"{[' and ch not in _SCALAR_START:
+                self._fail("Se esperaba un valor")
+            self._token_start = self._pos
+            self._stack = []
+            self._in_string = False
+            self._escape = False
+            self._phase = _IN_VALUE
+            return True
+
+        # _COMMA_OR_END
+        if ch == ",":
+            self._pos += 1
+            self._phase = _KEY
+            return True
+        if ch == "}":
+            self._pos += 1
+            self._phase = _DONE
+            return True
+        self._fail("Se esperaba ',' o '}'")
+
+    def _scan_string(self) -> bool:
+        """Avanza hasta cerrar la cadena de una clave."""
+        buf = self._buf
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+            self._pos += 1
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                return True
+        return False
+
+    def _scan_value(self) -> bool:
+        """Avanza hasta el final del valor en curso."""
+        buf = self._buf
+        if buf[self._token_start] in _SCALAR_START:
+            # Números, true, false y null terminan en un delimitador
+            while self._pos < len(buf):
+                if buf[self._pos] in _SCALAR_END:
+                    return True
+                self._pos += 1
+            return False
+
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+            self._pos += 1
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if not self._stack:
+                        return True
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append(ch)
+            elif ch in "}]":
+                if not self._stack or self._stack.pop() != _CLOSING[ch]:
+                    self._pos -= 1
+                    self._fail(f"Cierre '{ch}' sin apertura correspondiente")
+                if not self._stack:
+                    return True
+        return False
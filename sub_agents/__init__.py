@@ -0,0 +1,3 @@
+from .orchestrator import ParallelTurnOrchestrator, background_snapshot_callback
+from .pain_point import pain_point_agent
+from .user_profile import user_profile_agent
@@ -0,0 +1,248 @@
+"""
+Orquestación de sub-agentes en paralelo dentro de un turno.
+
+El agente de primer plano (navegación del embudo) responde al usuario mientras
+los sub-agentes de segundo plano (perfil, puntos de dolor) procesan el mismo
+mensaje en sesiones efímeras. Sus resultados (`output_key`) se fusionan en el
+estado de la sesión principal al terminar, como un evento con `state_delta`.
+El siguiente turno no espera a esa fusión: el agente de primer plano lee el
+último resultado ya fusionado (`background_snapshot_callback`), de modo que
+el trabajo de perfilado nunca está en el camino crítico. Las fusiones de una
+sesión se aplican en orden y nunca mientras hay un turno en curso.
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import time
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+logger = logging.getLogger(__name__)
+
+ORCHESTRATOR_AUTHOR = "ParallelTurnOrchestrator"
+
+def merge_state_deltas(deltas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fusiona los deltas de los sub-agentes; las listas se unen sin duplicados."""
+    merged: Dict[str, Any] = {}
+    for delta in deltas:
+        for key, value in delta.items():
+            current = merged.get(key)
+            if isinstance(current, list) and isinstance(value, list):
+                merged[key] = current + [v for v in value if v not in current]
+            elif isinstance(current, dict) and isinstance(value, dict):
+                merged[key] = {**current, **value}
+            else:
+                merged[key] = value
+    return merged
+
+def background_snapshot_callback(background: List[BaseAgent]) -> Callable:
+    """
+    Callback `before_model` que añade a la instrucción el último resultado
+    fusionado de los sub-agentes de segundo plano (sus `output_key`).
+    """
+    keys = [agent.output_key for agent in background if agent.output_key]
+
+    def before_model_callback(callback_context, llm_request) -> None:
+        state = callback_context.state
+        lines = [
+            f"{key}: {json.dumps(state.get(key), ensure_ascii=False, default=str)}"
+            for key in keys if state.get(key)
+        ]
+        if lines:
+            llm_request.append_instructions([
+                "Último análisis del cliente (segundo plano, puede no incluir este mensaje):",
+                *lines,
+            ])
+        return None
+
+    return before_model_callback
+
+class ParallelTurnOrchestrator:
+    """
+    Ejecuta un agente de primer plano y varios de segundo plano por turno.
+
+    Args:
+        foreground: Agente cuya respuesta ve el usuario
+        background: Agentes independientes que enriquecen el estado
+        app_name: Nombre de la app en el servicio de sesiones
+        session_service: Servicio de sesiones de la conversación principal
+        background_timeout: Segundos máximos que se espera a los sub-agentes
+    """
+
+    def __init__(
+        self,
+        foreground: BaseAgent,
+        background: List[BaseAgent],
+        app_name: str,
+        session_service,
+        background_timeout: float = 30.0
+    ):
+        self.app_name = app_name
+        self.session_service = session_service
+        self.background = background
+        self.background_timeout = background_timeout
+        self.runner = Runner(agent=foreground, app_name=app_name, session_service=session_service)
+
+        # Cada sub-agente usa su propio servicio efímero: no escribe en la sesión principal
+        self._background_sessions = InMemorySessionService()
+        self._background_runners = {
+            agent.name: Runner(
+                agent=agent,
+                app_name=f"{app_name}_{agent.name}",
+                session_service=self._background_sessions
+            )
+            for agent in background
+        }
+        # Última fusión pendiente y turno en curso de cada sesión
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._idle: Dict[str, asyncio.Event] = {}
+        self.last_turn_stats: Dict[str, float] = {}
+
+    async def run_turn(
+        self,
+        user_id: str,
+        session_id: str,
+        new_message,
+        run_config=None
+    ) -> AsyncGenerator[Event, None]:
+        """
+        Ejecuta un turno y emite los eventos del agente de primer plano.
+
+        No espera a los sub-agentes del turno anterior: se usa el estado con
+        la última fusión completada.
+        """
+        idle = self._idle.setdefault(session_id, asyncio.Event())
+        idle.clear()
+
+        session = self.session_service.get_session(
+            app_name=self.app_name, user_id=user_id, session_id=session_id
+        )
+        state_snapshot = copy.deepcopy(dict(session.state))
+
+        started = time.perf_counter()
+        background_tasks = [
+            asyncio.create_task(self._run_background(agent, user_id, state_snapshot, new_message))
+            for agent in self.background
+        ]
+
+        try:
+            async for event in self.runner.run_async(
+                user_id=user_id, session_id=session_id, new_message=new_message,
+                **({"run_config": run_config} if run_config else {})
+            ):
+                yield event
+        finally:
+            self.last_turn_stats = {"foreground_ms": (time.perf_counter() - started) * 1000}
+            idle.set()
+            self._pending[session_id] = asyncio.create_task(
+                self._merge_background(
+                    user_id, session_id, background_tasks, started, self._pending.get(session_id)
+                )
+            )
+
+    async def wait_for_background(self, session_id: str) -> None:
+        """Espera a que se fusionen los resultados pendientes de una sesión."""
+        pending = self._pending.get(session_id)
+        if pending is not None:
+            await pending
+
+    async def _run_background(
+        self,
+        agent: BaseAgent,
+        user_id: str,
+        state: Dict[str, Any],
+        new_message
+    ) -> Dict[str, Any]:
+        """Ejecuta un sub-agente en una sesión efímera y devuelve su delta de estado."""
+        runner = self._background_runners[agent.name]
+        session = self._background_sessions.create_session(
+            app_name=runner.app_name, user_id=user_id, state=copy.deepcopy(state)
+        )
+        delta: Dict[str, Any] = {}
+        try:
+            async for event in runner.run_async(
+                user_id=user_id, session_id=session.id, new_message=new_message
+            ):
+                if event.actions and event.actions.state_delta:
+                    delta.update(event.actions.state_delta)
+        finally:
+            self._background_sessions.delete_session(
+                app_name=runner.app_name, user_id=user_id, session_id=session.id
+            )
+        return delta
+
+    async def _merge_background(
+        self,
+        user_id: str,
+        session_id: str,
+        tasks: List[asyncio.Task],
+        started: float,
+        previous: Optional[asyncio.Task] = None
+    ) -> None:
+        try:
+            await self._merge_when_idle(user_id, session_id, tasks, started, previous)
+        finally:
+            if self._pending.get(session_id) is asyncio.current_task():
+                del self._pending[session_id]
+                idle = self._idle.get(session_id)
+                if idle is not None and idle.is_set():
+                    del self._idle[session_id]
+
+    async def _merge_when_idle(
+        self,
+        user_id: str,
+        session_id: str,
+        tasks: List[asyncio.Task],
+        started: float,
+        previous: Optional[asyncio.Task]
+    ) -> None:
+        done, pending = await asyncio.wait(tasks, timeout=self.background_timeout)
+        for task in pending:
+            task.cancel()
+        if previous is not None:
+            # Las fusiones de una sesión se aplican en el orden de los turnos
+            await asyncio.gather(previous, return_exceptions=True)
+
+        deltas = []
+        for agent, task in zip(self.background, tasks):
+            if task in pending:
+                logger.warning(f"Sub-agente {agent.name} cancelado por timeout")
+            elif task.exception() is not None:
+                logger.error(f"Error en sub-agente {agent.name}: {task.exception()}")
+            else:
+                # Las claves temp: no se persisten
+                deltas.append({k: v for k, v in task.result().items() if not k.startswith("temp:")})
+
+        self.last_turn_stats["background_ms"] = (time.perf_counter() - started) * 1000
+        merged = merge_state_deltas(deltas)
+        if not merged:
+            return
+
+        # No escribir en la sesión mientras el primer plano ejecuta un turno
+        idle = self._idle.get(session_id)
+        while idle is not None and not idle.is_set():
+            await idle.wait()
+        session = self.session_service.get_session(
+            app_name=self.app_name, user_id=user_id, session_id=session_id
+        )
+        event = Event(
+            author=ORCHESTRATOR_AUTHOR,
+            invocation_id=f"merge-{int(time.time() * 1000)}",
+            actions=EventActions(state_delta=merged)
+        )
+        self.session_service.append_event(session, event)
+        logger.info(
+            f"Estado fusionado de {len(deltas)} sub-agentes: {sorted(merged)} "
+            f"(primer plano {self.last_turn_stats['foreground_ms']:.0f} ms, "
+            f"segundo plano {self.last_turn_stats['background_ms']:.0f} ms)"
+        )
+
+    def get_stats(self) -> Optional[Dict[str, float]]:
+        """Tiempos del último turno: lo que ve el usuario y el trabajo en segundo plano."""
+        return dict(self.last_turn_stats) or None
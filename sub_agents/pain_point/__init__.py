@@ -0,0 +1 @@
+from .agent import pain_point_agent
@@ -0,0 +1,13 @@
+from google.adk.agents import LlmAgent
+
+from ...prompt import pain_point
+
+GEMINI_MODEL = "gemini-2.0-flash"
+
+# Extrae puntos de dolor en segundo plano; quedan en session.state["pain_points"]
+pain_point_agent = LlmAgent(
+    name="PainPointAgent",
+    model=GEMINI_MODEL,
+    instruction=pain_point,
+    output_key="pain_points",
+)
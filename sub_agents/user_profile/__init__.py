@@ -0,0 +1 @@
+from .agent import user_profile_agent
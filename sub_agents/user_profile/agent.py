@@ -0,0 +1,18 @@
+from google.adk.agents import LlmAgent
+
+from ...prompt import user_profile
+from ...tools import herramientas_produccion_agroasesoria
+
+GEMINI_MODEL = "gemini-2.0-flash"
+
+# Enriquece el perfil en segundo plano; su resumen queda en session.state["profile_insights"]
+user_profile_agent = LlmAgent(
+    name="UserProfileAgent",
+    model=GEMINI_MODEL,
+    instruction=user_profile,
+    tools=[
+        herramientas_produccion_agroasesoria.get_or_create_user_profile_from_firestore_tool,
+        herramientas_produccion_agroasesoria.update_user_profile_in_firestore_tool,
+    ],
+    output_key="profile_insights",
+)
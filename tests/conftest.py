@@ -0,0 +1,13 @@
+import os
+import sys
+import types
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+sys.path.insert(0, ROOT)
+
+# El paquete raíz importa el agente de ADK al cargarse: para probar
+# shared_libraries se registra como `repo` sin ejecutar su __init__
+_repo = types.ModuleType("repo")
+_repo.__path__ = [ROOT]
+sys.modules.setdefault("repo", _repo)
@@ -0,0 +1,136 @@
+"""Tests del calendario de técnicos ante cargas vacías y ubicaciones en texto libre."""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from agentGemini.services.booking_calendar import BookingCalendar
+from agentGemini.services.firestore_service import SlotTakenError
+
+TECHNICIANS = [
+    {"id": "tech_jaen", "name": "Antonio Ruiz", "regions": ["jaén", "córdoba"]},
+    {"id": "tech_lleida", "name": "Jordi Puig", "regions": ["lleida"]},
+]
+JAEN_TEAM = TECHNICIANS + [{"id": "tech_jaen_2", "name": "Lucía Mena", "regions": ["jaén"]}]
+
+class FakeDb:
+    def __init__(self, technicians):
+        self.technicians = technicians
+        self.technician_reads = 0
+        self.reserved = []
+        self.bookings = []
+        self.failures = {}  # technician_id -> excepción al reservar
+
+    def get_technicians(self):
+        self.technician_reads += 1
+        return list(self.technicians)
+
+    def get_service_bookings(self, start, end):
+        return list(self.bookings)
+
+    def reserve_service_slots(self, booking_data, slot_keys):
+        error = self.failures.get(booking_data["technician_id"])
+        if error:
+            raise error
+        self.reserved.append(slot_keys)
+        return booking_data.get("id")
+
+def next_weekday_at(hour):
+    day = datetime.now() + timedelta(days=1)
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    return day.replace(hour=hour, minute=0, second=0, microsecond=0)
+
+def test_empty_load_is_not_cached():
+    db = FakeDb([])
+    calendar = BookingCalendar(db)
+    assert calendar.technicians_for("jaén") == []
+    service = {"id": "SVC-1", "duration_minutes": 60}
+    assert calendar.reserve(service, "jaén", next_weekday_at(10)) is None
+
+    # Cuando vuelve a haber técnicos, se cargan en el siguiente reintento
+    db.technicians = TECHNICIANS
+    calendar._retry_at = 0
+    assert calendar.technicians_for("jaén") == ["tech_jaen"]
+
+def test_empty_load_is_retried_after_interval():
+    db = FakeDb([])
+    calendar = BookingCalendar(db)
+    calendar.technicians_for("jaén")
+    calendar.technicians_for("jaén")
+    assert db.technician_reads == 1
+
+def test_free_text_location_matches_region_words():
+    calendar = BookingCalendar(FakeDb(TECHNICIANS))
+    assert calendar.technicians_for("Finca Los Olivos, Jaén (Andalucía)") == ["tech_jaen"]
+    assert calendar.technicians_for("Lleida") == ["tech_lleida"]
+
+def test_unknown_region_gets_no_technician():
+    calendar = BookingCalendar(FakeDb(TECHNICIANS))
+    assert calendar.technicians_for("Badajoz") == []
+    # "jaen" no es una palabra de "jaenillo"
+    assert calendar.technicians_for("Cortijo Jaenillo") == []
+    assert calendar.find_free_slots("Badajoz", limit=1) == []
+    service = {"id": "SVC-1", "duration_minutes": 60}
+    assert calendar.reserve(service, "Badajoz", next_weekday_at(10)) is None
+
+def test_reserve_assigns_technician_of_the_region():
+    db = FakeDb(TECHNICIANS)
+    calendar = BookingCalendar(db)
+    service = {"id": "SVC-1", "duration_minutes": 60}
+    reserved = calendar.reserve(service, "Córdoba capital", next_weekday_at(10))
+    assert reserved["technician_id"] == "tech_jaen"
+    assert db.reserved
+
+def test_slot_taken_elsewhere_falls_back_to_next_technician():
+    db = FakeDb(JAEN_TEAM)
+    db.failures["tech_jaen"] = SlotTakenError("tech_jaen")
+    calendar = BookingCalendar(db)
+    start = next_weekday_at(10)
+    reserved = calendar.reserve({"id": "SVC-1", "duration_minutes": 60}, "jaén", start)
+    assert reserved["technician_id"] == "tech_jaen_2"
+    # El hueco ocupado en otro worker ya no se ofrece
+    assert not calendar.is_free("tech_jaen", start, 60)
+
+def test_transient_error_does_not_hide_the_slot():
+    db = FakeDb(JAEN_TEAM)
+    db.failures["tech_jaen"] = TimeoutError("deadline")
+    calendar = BookingCalendar(db)
+    start = next_weekday_at(10)
+    with pytest.raises(TimeoutError):
+        calendar.reserve({"id": "SVC-1", "duration_minutes": 60}, "jaén", start)
+    assert calendar.is_free("tech_jaen", start, 60)
+
+def test_commit_runs_outside_the_lock():
+    db = FakeDb(TECHNICIANS)
+    calendar = BookingCalendar(db)
+    lock_free = []
+
+    def reserve_service_slots(booking_data, slot_keys):
+        # Otro hilo del worker puede consultar el calendario mientras tanto
+        def probe():
+            acquired = calendar._lock.acquire(timeout=1)
+            lock_free.append(acquired)
+            if acquired:
+                calendar._lock.release()
+
+        thread = threading.Thread(target=probe)
+        thread.start()
+        thread.join()
+        return booking_data["id"]
+
+    db.reserve_service_slots = reserve_service_slots
+    assert calendar.reserve({"id": "SVC-1", "duration_minutes": 60}, "jaén", next_weekday_at(10))
+    assert lock_free == [True]
+
+def test_bookings_from_other_workers_are_seen_after_refresh():
+    db = FakeDb(TECHNICIANS)
+    calendar = BookingCalendar(db)
+    start = next_weekday_at(10)
+    assert calendar.is_free("tech_jaen", start, 60)
+    db.bookings.append(
+        {"technician_id": "tech_jaen", "scheduled_date": start, "duration_minutes": 60}
+    )
+    calendar._refresh_at = 0
+    assert not calendar.is_free("tech_jaen", start, 60)
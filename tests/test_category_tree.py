@@ -0,0 +1,87 @@
+"""Tests del árbol de categorías en memoria y de su recarga."""
+
+import time
+
+from repo.shared_libraries.category_tree import LEVEL_STATE_KEYS, CategoryTree, CategoryTreeCache
+
+CATEGORIES = [
+    {"id": "nuevo", "name": "Nuevo"},
+    {"id": "usado", "name": "Usado"},
+    {"id": "tractores", "name": "Tractores", "parent_id": "nuevo", "order": 2},
+    {"id": "cosechadoras", "name": "Cosechadoras", "parent_id": "nuevo", "order": 1},
+    {"id": "forestal", "name": "Forestal", "parent_id": "nuevo", "order": 3},
+    {"id": "tractores_usados", "name": "Tractores", "parent_id": "usado"},
+    {"id": "huerfana", "name": "Huérfana", "parent_id": "no_existe"},
+]
+COUNTS = {"tractores": 3, "cosechadoras": 2, "tractores_usados": 1, "huerfana": 1}
+
+def build():
+    return CategoryTree.build(CATEGORIES, COUNTS)
+
+def test_counts_and_breadcrumbs():
+    tree = build()
+    assert tree.get("nuevo").product_count == 5
+    assert tree.get("tractores").breadcrumb == (("nuevo", "Nuevo"), ("tractores", "Tractores"))
+    assert tree.get("tractores").level == 1
+    # Un padre inexistente cuelga de la raíz
+    assert tree.get("huerfana").parent is tree.root
+
+def test_children_are_sorted_and_empty_categories_pruned():
+    tree = build()
+    assert [node.id for node in tree.children("nuevo")] == ["cosechadoras", "tractores"]
+    # El mismo resultado precalculado en cada consulta
+    assert tree.children("nuevo") is tree.children("nuevo")
+    assert tree.children("no_existe") == ()
+
+def test_single_option_levels_are_skipped():
+    options = build().options("usado")
+    assert options["is_leaf"]
+    assert options["breadcrumb"][-1] == {"id": "tractores_usados", "name": "Tractores"}
+    assert options["state_updates"] == {
+        LEVEL_STATE_KEYS[0]: "usado",
+        LEVEL_STATE_KEYS[1]: "tractores_usados",
+    }
+
+def test_unknown_node():
+    assert "error" in build().options("no_existe")
+
+def test_expired_tree_is_served_while_refreshing():
+    loads = []
+
+    def loader():
+        loads.append(len(loads))
+        if len(loads) == 1:
+            return CATEGORIES, COUNTS
+        return CATEGORIES, {**COUNTS, "forestal": 4}
+
+    cache = CategoryTreeCache(loader, ttl_seconds=0)
+    first = cache.get()
+    time.sleep(0.01)
+    # Caducado: se sirve el actual y se recarga en segundo plano
+    assert cache.get() is first
+    for _ in range(100):
+        if cache.get() is not first:
+            break
+        time.sleep(0.01)
+    children = cache.get().children("nuevo")
+    assert [node.id for node in children] == ["cosechadoras", "tractores", "forestal"]
+
+def test_failed_refresh_keeps_the_current_tree():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("Firestore no disponible")
+        return CATEGORIES, COUNTS
+
+    cache = CategoryTreeCache(loader, ttl_seconds=0)
+    first = cache.get()
+    time.sleep(0.01)
+    cache.get()
+    for _ in range(100):
+        if not cache._refreshing:
+            break
+        time.sleep(0.01)
+    assert cache.get() is first
+    assert len(calls) >= 2
@@ -0,0 +1,43 @@
+"""Tests de los circuitos por colección."""
+
+from agentGemini.services.circuit_breaker import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    is_backend_failure,
+)
+from agentGemini.services.hedged_reads import BudgetExhausted, DeadlineExceeded
+
+def make_breaker():
+    breaker = CircuitBreaker("customers")
+    breaker.min_calls = 4
+    breaker.slow_call_seconds = 1.0
+    breaker.open_seconds = 0
+    return breaker
+
+def test_budget_exhaustion_is_not_a_backend_failure():
+    assert not is_backend_failure(BudgetExhausted("get_customer"))
+    assert is_backend_failure(DeadlineExceeded("get_customer"))
+
+def test_slow_bulk_reads_do_not_open_the_circuit():
+    breaker = make_breaker()
+    for _ in range(10):
+        breaker.record(False, 5.0, bulk=True)
+    assert breaker.state == STATE_CLOSED
+
+def test_slow_reads_open_the_circuit():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(False, 5.0)
+    assert breaker.state == STATE_OPEN
+
+def test_release_frees_the_half_open_probe():
+    breaker = make_breaker()
+    for _ in range(4):
+        breaker.record(True, 0.01)
+    assert breaker.allow()
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.allow()
+    breaker.release()
+    assert breaker.allow()
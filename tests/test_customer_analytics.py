@@ -0,0 +1,48 @@
+"""Tests de la conciliación de totales de clientes con corte."""
+
+from datetime import datetime, timedelta, timezone
+
+from agentGemini.services.customer_analytics import (
+    aggregate,
+    corrected_counters,
+    _to_chunk,
+)
+
+CUTOFF = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+def order(customer_id, total, created_at, status="pending"):
+    return {
+        "customer_id": customer_id,
+        "total": total,
+        "created_at": created_at.isoformat(),
+        "status": status,
+    }
+
+def test_orders_after_cutoff_are_not_aggregated():
+    chunk = _to_chunk([
+        order("cust_1", 100, CUTOFF - timedelta(days=1)),
+        order("cust_1", 50, CUTOFF + timedelta(minutes=1)),
+        order("cust_1", 70, CUTOFF - timedelta(days=2), status="cancelled"),
+    ], CUTOFF)
+    assert chunk.customer_ids == ["cust_1"]
+    assert chunk.totals.tolist() == [100]
+
+def test_purchase_after_cutoff_is_kept():
+    before = aggregate([_to_chunk([order("cust_1", 100, CUTOFF - timedelta(days=1))], CUTOFF)])
+    recent = [order("cust_1", 50, CUTOFF + timedelta(minutes=1))]
+    # El contador en línea ya incluye la compra posterior al corte
+    current = {
+        "total_purchases": 150, "order_count": 2, "loyalty_points": 15, "loyalty_tier": "standard"
+    }
+    assert corrected_counters(before, 0, recent, current) == {}
+
+def test_drift_is_corrected_including_recent_orders():
+    before = aggregate([_to_chunk([order("cust_1", 100, CUTOFF - timedelta(days=1))], CUTOFF)])
+    recent = [order("cust_1", 50, CUTOFF + timedelta(minutes=1))]
+    current = {
+        "total_purchases": 400, "order_count": 2, "loyalty_points": 40, "loyalty_tier": "standard"
+    }
+    updates = corrected_counters(before, 0, recent, current)
+    assert updates["total_purchases"] == 150
+    assert updates["loyalty_points"] == 15
+    assert updates["last_order_at"] == CUTOFF + timedelta(minutes=1)
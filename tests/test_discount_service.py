@@ -0,0 +1,66 @@
+"""Tests del índice de códigos de descuento como pista."""
+
+from datetime import datetime, timedelta
+
+from agentGemini.services.discount_service import DiscountService
+
+def code(code, customer_id="cust_1", used=False, days=30, percentage=10):
+    return {
+        "code": code,
+        "customer_id": customer_id,
+        "used": used,
+        "percentage": percentage,
+        "type": "loyalty",
+        "valid_until": (datetime.now() + timedelta(days=days)).isoformat(),
+    }
+
+class FakeDb:
+    db = True
+
+    def __init__(self, codes):
+        self.codes = {c["code"]: c for c in codes}
+        self.active_fails = False
+        self.batch_reads = []
+
+    def get_active_discount_codes(self):
+        if self.active_fails:
+            return None
+        return [dict(c) for c in self.codes.values() if not c["used"]]
+
+    def get_discount_codes(self, codes):
+        self.batch_reads.append(list(codes))
+        return {c: dict(self.codes[c]) for c in codes if c in self.codes}
+
+def test_code_missing_from_index_is_read_from_store():
+    db = FakeDb([code("AGRO-OLD")])
+    service = DiscountService(db)
+    service.refresh()
+    # Generado en otro worker después del refresco
+    db.codes["AGRO-NEW"] = code("AGRO-NEW")
+    valid, rejected = service.validate_codes(["AGRO-NEW"], "cust_1")
+    assert [c["code"] for c in valid] == ["AGRO-NEW"]
+    assert rejected == []
+    assert db.batch_reads == [["AGRO-NEW"]]
+
+def test_unknown_code_and_other_customer_are_rejected_by_store():
+    db = FakeDb([code("AGRO-OTHER", customer_id="cust_2")])
+    service = DiscountService(db)
+    db.active_fails = True
+    valid, rejected = service.validate_codes(["NOPE", "AGRO-OTHER"], "cust_1")
+    assert valid == []
+    assert {r["code"]: r["reason"] for r in rejected} == {
+        "NOPE": "Código no válido",
+        "AGRO-OTHER": "Código no asignado a este cliente",
+    }
+
+def test_failed_refresh_keeps_previous_index():
+    db = FakeDb([code("AGRO-USED")])
+    service = DiscountService(db)
+    service.refresh()
+    service.mark_used(["AGRO-USED"])
+    db.active_fails = True
+    service.refresh()
+    valid, rejected = service.validate_codes(["AGRO-USED"], "cust_1")
+    # El índice anterior sigue rechazando sin lectura
+    assert rejected == [{"code": "AGRO-USED", "reason": "Código ya utilizado"}]
+    assert db.batch_reads == []
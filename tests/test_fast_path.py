@@ -0,0 +1,67 @@
+"""Tests del router determinista previo al modelo."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+from repo.fast_path import FastPathRouter, parse_selection  # noqa: E402
+
+@pytest.mark.parametrize("text, expected", [
+    ("ID: cat_tractors", ("category", "cat_tractors")),
+    ("Quiero ver este, id:prod_trac-001 por favor", ("product", "prod_trac-001")),
+    ('{"action": "select_product", "id": "prod_001"}', ("product", "prod_001")),
+    ('{"action": "select_category", "id": 7}', ("category", "7")),
+    # Un payload de botón desconocido aún puede llevar un ID en el texto
+    ('{"action": "open_chat", "note": "ID: cat_forestal"}', ("category", "cat_forestal")),
+    ("¿Tenéis tractores?", None),
+    ("ID: usr_001", None),
+    ('{"action": "select_product"', None),
+])
+def test_parse_selection(text, expected):
+    assert parse_selection(text) == expected
+
+def category_handler(category_id):
+    if category_id == "cat_vacia":
+        return None
+    response = {"template_id": "category_list", "message": "Elige", "data": {"id": category_id}}
+    return response, {"selected_category": category_id}
+
+def router():
+    return FastPathRouter({"category": category_handler})
+
+def context(state=None):
+    return SimpleNamespace(state=dict(state or {}))
+
+def request(*messages):
+    contents = [
+        SimpleNamespace(role=role, parts=[SimpleNamespace(text=text)]) for role, text in messages
+    ]
+    return SimpleNamespace(contents=contents)
+
+def test_selection_is_answered_without_the_model():
+    r, ctx = router(), context({"language": "es"})
+    result = r.before_model_callback(ctx, request(("user", "ID: cat_tractors")))
+    assert json.loads(result.content.parts[0].text)["data"] == {"id": "cat_tractors"}
+    assert result.content.role == "model"
+    assert ctx.state == {"language": "es", "selected_category": "cat_tractors"}
+    assert (r.hits, r.misses) == (1, 0)
+
+def test_unhandled_selections_go_to_the_model():
+    r, ctx = router(), context()
+    # Sin handler para productos y handler que no puede resolverla
+    assert r.before_model_callback(ctx, request(("user", "ID: prod_001"))) is None
+    assert r.before_model_callback(ctx, request(("user", "ID: cat_vacia"))) is None
+    assert r.before_model_callback(ctx, request(("user", "Hola"))) is None
+    assert ctx.state == {}
+    assert (r.hits, r.misses) == (0, 3)
+
+def test_only_the_start_of_the_turn_is_routed():
+    r, ctx = router(), context()
+    after_tool = request(("user", "ID: cat_tractors"), ("tool", "ID: cat_tractors"))
+    assert r.before_model_callback(ctx, after_tool) is None
+    assert r.before_model_callback(ctx, request(("user", None))) is None
+    assert r.before_model_callback(ctx, SimpleNamespace(contents=[])) is None
+    assert (r.hits, r.misses) == (0, 0)
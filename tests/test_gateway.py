@@ -0,0 +1,135 @@
+"""Tests de la autenticación del gateway de streaming."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from agentGemini.gateway import AuthError, StreamingGateway, bearer_token, create_app
+
+class FakeRunner:
+    def __init__(self):
+        self.calls = []
+
+    async def run_async(self, user_id, session_id, new_message, **kwargs):
+        self.calls.append((user_id, session_id))
+        part = SimpleNamespace(text="hola", function_call=None, function_response=None)
+        content = SimpleNamespace(parts=[part])
+        yield SimpleNamespace(content=content, partial=False, is_final_response=lambda: True)
+
+class FakeSessions:
+    def __init__(self):
+        self.created = []
+
+    def get_session(self, **kwargs):
+        return None
+
+    def create_session(self, **kwargs):
+        self.created.append(kwargs)
+
+def authenticate(token):
+    if token != "token-ana":
+        raise AuthError("Token no válido")
+    return "uid_ana"
+
+def post_sse(app, body, headers=()):
+    raw = json.dumps(body).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/v1/chat/sse",
+        "raw_path": b"/v1/chat/sse",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), *headers],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    sent = []
+    requests = [{"type": "http.request", "body": raw, "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # El cliente sigue conectado hasta que termina la respuesta
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+    text = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body").decode()
+    return status, text
+
+def make_app():
+    runner = FakeRunner()
+    sessions = FakeSessions()
+    gateway = StreamingGateway(
+        runner=runner, session_service=sessions, new_message=lambda text: text
+    )
+    return create_app(gateway, authenticate=authenticate), runner, sessions
+
+def test_bearer_token():
+    assert bearer_token("Bearer abc") == "abc"
+    assert bearer_token("Basic abc") is None
+    assert bearer_token(None) is None
+
+def test_request_without_valid_token_is_rejected():
+    app, runner, _ = make_app()
+    status, _ = post_sse(app, {"session_id": "s1", "message": "hola"})
+    assert status == 401
+    status, _ = post_sse(
+        app, {"session_id": "s1", "message": "hola"}, [(b"authorization", b"Bearer otro")]
+    )
+    assert status == 401
+    assert runner.calls == []
+
+def test_session_is_bound_to_token_principal():
+    app, runner, sessions = make_app()
+    status, text = post_sse(
+        app,
+        {"user_id": "uid_victima", "session_id": "s1", "message": "hola"},
+        [(b"authorization", b"Bearer token-ana")],
+    )
+    assert status == 200
+    assert "event: final" in text
+    assert runner.calls == [("uid_ana", "s1")]
+    assert sessions.created[0]["user_id"] == "uid_ana"
+
+def test_end_session_passes_state_to_hook():
+    ended = []
+    sessions = FakeSessions()
+    sessions.get_session = lambda **kwargs: SimpleNamespace(state={"customer": {"id": "cust_1"}})
+    gateway = StreamingGateway(
+        runner=FakeRunner(),
+        session_service=sessions,
+        new_message=lambda text: text,
+        on_session_end=ended.append,
+    )
+    asyncio.run(gateway.end_session("uid_ana", "s1"))
+    assert ended == [{"customer": {"id": "cust_1"}}]
+
+def test_turn_cancelled_before_starting_frees_its_slot():
+    gateway = StreamingGateway(
+        runner=FakeRunner(),
+        session_service=FakeSessions(),
+        new_message=lambda text: text,
+        max_concurrent_runs=1,
+        acquire_timeout=0.1,
+    )
+
+    async def scenario():
+        turn = await gateway.start_turn("uid_ana", "s1", "hola")
+        # El cliente se desconecta antes de que la tarea llegue a ejecutarse
+        await turn.cancel()
+        messages = [message async for message in turn.messages()]
+        assert messages == [{"type": "error", "message": "cancelled"}]
+        second = await gateway.start_turn("uid_ana", "s1", "hola")
+        assert [m["type"] async for m in second.messages()][-1] == "done"
+
+    asyncio.run(scenario())
+    assert gateway.active == 0
+    assert gateway.stats["cancelled"] == 1
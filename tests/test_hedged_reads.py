@@ -0,0 +1,113 @@
+"""Tests de las lecturas con plazo y duplicadas frente a un backend con cola de latencia."""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from agentGemini.services.hedged_reads import (
+    AttemptCancelled,
+    BudgetExhausted,
+    DeadlineExceeded,
+    HedgedReader,
+    end_turn_budget,
+    start_turn_budget,
+    turn_remaining,
+)
+
+class FakeBackend:
+    """Responde en `fast` segundos salvo una fracción `tail_prob` que tarda `tail`."""
+
+    def __init__(self, fast=0.005, tail=0.5, tail_prob=0.0, seed=3):
+        self.fast = fast
+        self.tail = tail
+        self.tail_prob = tail_prob
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.started = 0
+        self.cancelled = 0
+
+    def read(self, attempt):
+        with self._lock:
+            self.started += 1
+            latency = self.tail if self._rng.random() < self.tail_prob else self.fast
+        timeout = attempt.timeout()
+        if attempt.cancelled.wait(min(latency, timeout)):
+            with self._lock:
+                self.cancelled += 1
+            raise AttemptCancelled("fake")
+        if latency >= timeout:
+            raise DeadlineExceeded("fake")
+        return {"id": "cust_123"}
+
+@pytest.fixture
+def reader():
+    reader = HedgedReader(timeout=1.0, hedging=True, max_hedge_ratio=0.2, workers=16)
+    yield reader
+    reader.shutdown()
+
+@pytest.fixture(autouse=True)
+def no_turn_budget():
+    end_turn_budget()
+    yield
+    end_turn_budget()
+
+def timed_reads(reader, backend, count, threads=8):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        started = time.monotonic()
+        reader.read("get_customer", backend.read)
+        with lock:
+            latencies.append(time.monotonic() - started)
+
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(one, range(count)))
+    return sorted(latencies)
+
+def test_hedging_cuts_tail_latency(reader):
+    backend = FakeBackend(tail_prob=0.05)
+    latencies = timed_reads(reader, backend, 400)
+    p99 = latencies[int(0.99 * len(latencies))]
+    # Sin duplicados el p99 sería la cola de 0.5 s
+    assert p99 < 0.25
+    stats = reader.get_stats()["get_customer"]
+    assert stats["hedges_won"] > 0
+    assert stats["hedges_fired"] <= 0.2 * stats["calls"] + 1
+
+def test_losing_attempt_is_cancelled(reader):
+    backend = FakeBackend(tail_prob=0.05)
+    timed_reads(reader, backend, 200)
+    time.sleep(0.05)
+    assert backend.cancelled > 0
+
+def test_read_without_hedging_stops_at_timeout():
+    reader = HedgedReader(timeout=0.1, hedging=False, workers=2)
+    try:
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            reader.read("get_customer", FakeBackend(fast=1.0).read)
+        assert time.monotonic() - started < 0.3
+    finally:
+        reader.shutdown()
+
+def test_time_outside_reads_does_not_use_turn_budget(reader):
+    start_turn_budget(0.1)
+    # Tiempo del modelo entre lecturas: no cuenta para el presupuesto
+    time.sleep(0.15)
+    assert reader.read("get_customer", FakeBackend().read) == {"id": "cust_123"}
+    assert 0.05 < turn_remaining() <= 0.1
+
+def test_exhausted_budget_rejects_without_reading(reader):
+    backend = FakeBackend(fast=0.08)
+    start_turn_budget(0.1)
+    reader.read("get_customer", backend.read)
+    with pytest.raises(DeadlineExceeded):
+        reader.read("get_customer", backend.read)
+    started = backend.started
+    with pytest.raises(BudgetExhausted):
+        reader.read("get_customer", backend.read)
+    assert backend.started == started
@@ -0,0 +1,18 @@
+"""Tests de la normalización de identificadores de clientes."""
+
+from agentGemini.services.identity_index import missing_identity_fields, normalize_phone
+
+def test_phone_is_normalized_to_e164():
+    assert normalize_phone("600 12-34-56") == "+34600123456"
+    assert normalize_phone("0034 600123456") == "+34600123456"
+    assert normalize_phone("12") is None
+
+def test_backfill_only_writes_missing_or_stale_fields():
+    legacy = {"email": " Ana@Campo.ES", "phone": "600123456"}
+    assert missing_identity_fields(legacy) == {
+        "email_normalized": "ana@campo.es",
+        "phone_e164": "+34600123456",
+    }
+    current = {**legacy, "email_normalized": "ana@campo.es", "phone_e164": "+34600123456"}
+    assert missing_identity_fields(current) == {}
+    assert missing_identity_fields({"email": "no-es-un-email"}) == {}
@@ -0,0 +1,153 @@
+"""Tests de la subida reanudable sobre el almacenamiento local y su API HTTP."""
+
+import asyncio
+import hashlib
+import json
+
+import pytest
+
+from repo.shared_libraries.media_upload import (
+    ChecksumMismatchError,
+    LocalFilesystemStorage,
+    MediaProcessor,
+    UploadError,
+    UploadManager,
+)
+from repo.shared_libraries.upload_api import create_upload_app
+
+CHUNK = 8
+
+@pytest.fixture
+def storage(tmp_path):
+    return LocalFilesystemStorage(str(tmp_path / "media"))
+
+@pytest.fixture
+def manager(storage):
+    manager = UploadManager(storage, MediaProcessor(storage, ffmpeg=None), chunk_size=CHUNK)
+    yield manager
+    manager.processor.shutdown()
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+@pytest.mark.parametrize("upload_id", ["../sessions/x", "..", "abc/../../etc", "A" * 32, "0" * 31])
+def test_upload_id_outside_generated_format_is_rejected(manager, storage, upload_id):
+    with pytest.raises(UploadError):
+        manager.status(upload_id)
+    with pytest.raises(UploadError):
+        manager.put_chunk(upload_id, 0, b"x", sha(b"x"))
+    with pytest.raises(UploadError):
+        storage.delete_upload(upload_id)
+
+def test_resumed_upload_completes(manager, storage):
+    data = b"0123456789abcdefXYZ"
+    session = manager.create_session("campo.mp4", len(data), "video/mp4", "cust_1")
+    chunks = [data[i:i + CHUNK] for i in range(0, len(data), CHUNK)]
+
+    manager.put_chunk(session.upload_id, 0, chunks[0], sha(chunks[0]))
+    # Corte de conexión: el estado indica qué falta
+    assert manager.status(session.upload_id)["missing_chunks"] == [1, 2]
+    with pytest.raises(ChecksumMismatchError):
+        manager.put_chunk(session.upload_id, 1, b"corrupto", sha(chunks[1]))
+    for index in (1, 2):
+        manager.put_chunk(session.upload_id, index, chunks[index], sha(chunks[index]))
+
+    status = manager.complete(session.upload_id)
+    with open(storage.local_path(status["object_key"]), "rb") as f:
+        assert f.read() == data
+    manager.processor.shutdown()
+    assert manager.status(session.upload_id)["status"] == "ready"
+    # Los candados por subida no se acumulan
+    assert manager._locks == {}
+
+def test_processor_threads_start_with_first_video(storage):
+    processor = MediaProcessor(storage, ffmpeg=None)
+    assert processor._executor is None
+    processor.shutdown()
+
+@pytest.mark.parametrize("filename", ["..", ".", "", "videos/../..", "C:\\fotos\\..", "campo.mp4"])
+def test_object_key_stays_inside_the_upload(manager, storage, filename):
+    data = b"x" * CHUNK
+    session = manager.create_session(filename, len(data), "video/mp4", "cust_1")
+    assert session.filename not in ("", ".", "..")
+    manager.put_chunk(session.upload_id, 0, data, sha(data))
+    key = manager.complete(session.upload_id)["object_key"]
+    assert key.startswith(f"cust_1/{session.upload_id}/")
+    assert key != f"cust_1/{session.upload_id}/.."
+
+def test_chunk_after_complete_is_rejected(manager, storage):
+    data = b"x" * CHUNK
+    session = manager.create_session("campo.mp4", len(data), "video/mp4")
+    upload_id = session.upload_id
+    real_write = storage.write_chunk
+
+    def write_then_complete(*args):
+        # `complete` termina mientras se escribe un reenvío del trozo
+        result = real_write(*args)
+        manager.complete(upload_id)
+        return result
+
+    manager.put_chunk(upload_id, 0, data, sha(data))
+    storage.write_chunk = write_then_complete
+    other = b"y" * CHUNK
+    with pytest.raises(UploadError):
+        manager.put_chunk(upload_id, 0, other, sha(other))
+    assert manager.status(upload_id)["status"] != "uploading"
+
+def http(app, method, path, body=b"", headers=()):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-length", str(len(body)).encode()), *headers],
+        "client": ("127.0.0.1", 1234),
+        "server": ("testserver", 80),
+    }
+    sent = []
+    requests = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    status = next(m["status"] for m in sent if m["type"] == "http.response.start")
+    payload = b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+    return status, json.loads(payload)
+
+def test_resumable_upload_over_http(manager, storage):
+    app = create_upload_app(lambda: manager)
+    data = b"0123456789abcdefXYZ"
+    session = manager.create_session("campo.mp4", len(data), "video/mp4", "cust_1")
+    url = f"/uploads/{session.upload_id}"
+    chunks = [data[i:i + CHUNK] for i in range(0, len(data), CHUNK)]
+
+    def put(index, body, digest):
+        headers = [(b"x-chunk-sha256", digest.encode())]
+        return http(app, "PUT", f"{url}/chunks/{index}", body, headers)
+
+    assert put(0, chunks[0], sha(chunks[0]))[0] == 200
+    status, body = http(app, "GET", url)
+    assert status == 200 and body["missing_chunks"] == [1, 2]
+    assert put(1, b"corrupto", sha(chunks[1]))[0] == 422
+    assert put(1, b"x" * (CHUNK + 1), sha(chunks[1]))[0] == 413
+    assert http(app, "POST", f"{url}/complete")[0] == 400
+    for index in (1, 2):
+        assert put(index, chunks[index], sha(chunks[index]))[0] == 200
+
+    status, body = http(app, "POST", f"{url}/complete")
+    assert status == 200
+    with open(storage.local_path(body["object_key"]), "rb") as f:
+        assert f.read() == data
+    assert http(app, "GET", "/uploads/" + "0" * 32)[0] == 404
+    assert http(app, "GET", "/uploads/..%2Fx")[0] in (400, 404)
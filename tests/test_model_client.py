@@ -0,0 +1,197 @@
+"""Tests del cliente de streaming del modelo."""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from agentGemini.services import model_client
+from agentGemini.services.model_client import StreamingModelClient, stop_on
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+def chunk(text=None, output_tokens=None):
+    parts = [SimpleNamespace(text=text)] if text is not None else []
+    usage = None
+    if output_tokens:
+        usage = SimpleNamespace(prompt_token_count=10, candidates_token_count=output_tokens)
+    return SimpleNamespace(
+        candidates=[SimpleNamespace(content=SimpleNamespace(parts=parts))],
+        usage_metadata=usage,
+        function_calls=None,
+    )
+
+class Source:
+    """Stream del SDK: entrega trozos, avanza el reloj y anota si se cerró."""
+
+    def __init__(self, chunks, clock=None, step=0.0):
+        self.chunks = list(chunks)
+        self.clock = clock
+        self.step = step
+        self.consumed = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed or self.consumed == len(self.chunks):
+            raise StopIteration
+        if self.clock is not None:
+            self.clock.now += self.step
+        self.consumed += 1
+        return self.chunks[self.consumed - 1]
+
+    def close(self):
+        self.closed = True
+
+class AsyncSource(Source):
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        await asyncio.sleep(0)
+        try:
+            return self.__next__()
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def aclose(self):
+        self.closed = True
+
+def client_for(source):
+    async def open_async(**kwargs):
+        return source
+
+    models = SimpleNamespace(generate_content_stream=lambda **kwargs: source)
+    aio = SimpleNamespace(models=SimpleNamespace(generate_content_stream=open_async))
+    return StreamingModelClient(client=SimpleNamespace(models=models, aio=aio), model="gemini-test")
+
+def test_stop_on_marker_split_across_chunks():
+    stop = stop_on("</respuesta>", "FIN")
+    assert not stop("texto </res")
+    assert not stop("pues")
+    assert stop("ta> y más")
+
+    stop = stop_on("FIN")
+    assert [stop(delta) for delta in ("F", "I", "N")] == [False, False, True]
+    # Solo guarda la cola necesaria
+    assert not stop_on("FIN")("F" * 10_000)
+
+def test_stop_condition_closes_the_source():
+    source = Source([chunk("Hola. </res"), chunk("puesta>"), chunk("no debe leerse")])
+    stream = client_for(source).stream("hola", stop=stop_on("</respuesta>"))
+    assert list(stream) == ["Hola. </res", "puesta>"]
+    assert source.closed
+    assert source.consumed == 2
+    assert stream.text == "Hola. </respuesta>"
+    assert stream.metrics.cancelled
+
+def test_consumer_that_stops_iterating_closes_the_source():
+    source = Source([chunk("uno"), chunk("dos"), chunk("tres")])
+    client = client_for(source)
+    stream = client.stream("hola")
+    for delta in stream:
+        break
+    assert source.closed
+    assert stream.finished and stream.metrics.cancelled
+    assert client.get_stats()["cancelled"] == 1
+
+def test_cancel_from_another_thread_stops_after_the_current_chunk():
+    source = Source([chunk("uno"), chunk("dos"), chunk("tres")])
+    stream = client_for(source).stream("hola")
+    received = []
+    for delta in stream:
+        received.append(delta)
+        stream.cancel()
+    assert received == ["uno"]
+    assert source.closed
+
+def test_cancelled_task_closes_the_async_source():
+    source = AsyncSource([chunk(str(i)) for i in range(1000)])
+    client = client_for(source)
+
+    async def scenario():
+        stream = client.astream("hola")
+        received = []
+
+        async def consume():
+            async for delta in stream:
+                received.append(delta)
+
+        task = asyncio.create_task(consume())
+        while len(received) < 3:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return stream
+
+    stream = asyncio.run(scenario())
+    assert source.closed
+    assert stream.metrics.cancelled
+    assert source.consumed < 1000
+
+def test_ttft_and_reported_tokens(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_client.time, "perf_counter", clock)
+    # Un trozo sin texto antes del primero que lo trae
+    chunks = [chunk(), chunk("Hola"), chunk(" mundo"), chunk(output_tokens=20)]
+    source = Source(chunks, clock, step=0.5)
+    client = client_for(source)
+    stream = client.stream("hola")
+    assert list(stream) == ["Hola", " mundo"]
+
+    metrics = stream.metrics
+    assert metrics.ttft_seconds == pytest.approx(1.0)
+    assert metrics.total_seconds == pytest.approx(2.0)
+    assert (metrics.prompt_tokens, metrics.output_tokens) == (10, 20)
+    assert not metrics.tokens_estimated
+    # Desde el primer token: 20 tokens en 1 s
+    assert metrics.tokens_per_second == pytest.approx(20.0)
+    assert metrics.chunks == 4 and not metrics.cancelled
+
+    stats = client.get_stats()
+    assert stats["calls"] == 1
+    assert stats["ttft_p50_seconds"] == pytest.approx(1.0)
+    assert stats["tokens_per_second_mean"] == pytest.approx(20.0)
+
+def test_tokens_are_estimated_when_the_stream_is_cut(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(model_client.time, "perf_counter", clock)
+    source = Source([chunk("a" * 40), chunk("FIN"), chunk(output_tokens=99)], clock, step=1.0)
+    stream = client_for(source).stream("hola", stop=stop_on("FIN"))
+    list(stream)
+    assert stream.metrics.tokens_estimated
+    assert stream.metrics.output_tokens == len("a" * 40 + "FIN") // model_client.CHARS_PER_TOKEN
+    assert stream.metrics.tokens_per_second == pytest.approx(10.0)
+
+def test_errors_are_recorded():
+    class Failing(Source):
+        def __next__(self):
+            raise ConnectionError("conexión cerrada")
+
+    source = Failing([])
+    client = client_for(source)
+    stream = client.stream("hola")
+    with pytest.raises(ConnectionError):
+        list(stream)
+    assert source.closed
+    assert "ConnectionError" in stream.metrics.error
+    assert client.get_stats()["errors"] == 1
+
+def test_text_is_joined_only_when_new_parts_arrive():
+    source = Source([chunk("uno "), chunk("dos")])
+    stream = client_for(source).stream("hola")
+    iterator = iter(stream)
+    next(iterator)
+    assert stream.text is stream.text == "uno "
+    next(iterator)
+    assert stream.text == "uno dos"
+    list(iterator)
+    assert stream.text is stream.text
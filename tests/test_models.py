@@ -0,0 +1,64 @@
+"""Tests de la marca de datos ya validados."""
+
+import copy
+import json
+import pickle
+from datetime import datetime, timezone
+
+import pytest
+from pydantic import ValidationError
+
+from agentGemini.models import Cart, Customer, Product, is_trusted
+
+def customer():
+    return Customer(id="cust_001", name="Juan García", email="juan@example.com").to_trusted_dict()
+
+def cart():
+    cart = Cart()
+    cart.add_item(Product(
+        id="prod_001", name="Arado", category="implementos", brand="Marca", description="Arado",
+        price=1500.0, stock=2
+    ))
+    return cart.to_trusted_dict()
+
+def test_tag_identifies_the_model():
+    data = customer()
+    assert Customer.ensure_valid(data) is data
+    with pytest.raises(ValidationError):
+        Cart.ensure_valid({**data, "items": "no es una lista"})
+    assert not is_trusted(data, Cart)
+
+def test_stored_document_is_returned_as_is():
+    created_at = datetime(2026, 1, 5, tzinfo=timezone.utc)
+    document = {
+        "id": "cust_001",
+        "name": "Juan García",
+        "email_normalized": "juan@example.com",
+        "order_count": 3,
+        "created_at": created_at,
+    }
+    data = Customer.ensure_valid(document)
+    assert data == document
+    assert data["created_at"] is created_at
+    assert "loyalty_points" not in data
+    assert is_trusted(data, Customer)
+
+def test_changed_copy_is_validated_again():
+    data = cart()
+    changed = {**data, "items": "no es una lista"}
+    assert not is_trusted(changed, Cart)
+    with pytest.raises(ValidationError):
+        Cart.ensure_valid(changed)
+
+def test_tag_is_not_part_of_the_data():
+    data = customer()
+    assert all(not key.startswith("_") for key in data)
+    assert "schema" not in json.dumps(data)
+    assert type(pickle.loads(pickle.dumps(data))) is dict
+
+def test_copies():
+    data = cart()
+    assert is_trusted(data.copy(), Cart)
+    assert is_trusted(copy.copy(data), Cart)
+    # La copia profunda puede cambiarse por dentro: vuelve a validarse
+    assert not is_trusted(copy.deepcopy(data), Cart)
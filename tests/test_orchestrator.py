@@ -0,0 +1,224 @@
+"""Tests de la fusión de los sub-agentes de segundo plano en la sesión."""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+# Se importa el módulo suelto: el paquete sub_agents construye los agentes LLM
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "sub_agents"))
+
+import orchestrator  # noqa: E402
+from orchestrator import (  # noqa: E402
+    ORCHESTRATOR_AUTHOR,
+    ParallelTurnOrchestrator,
+    background_snapshot_callback,
+    merge_state_deltas,
+)
+
+class FakeSessions:
+    """Servicio de sesiones en memoria que aplica los `state_delta`."""
+
+    def __init__(self):
+        self.sessions = {}
+        self.events = []
+
+    def create_session(self, app_name, user_id, state=None, session_id=None):
+        session_id = session_id or f"s{len(self.sessions)}"
+        session = SimpleNamespace(id=session_id, state=dict(state or {}))
+        self.sessions[session.id] = session
+        return session
+
+    def get_session(self, app_name, user_id, session_id):
+        return self.sessions[session_id]
+
+    def delete_session(self, app_name, user_id, session_id):
+        del self.sessions[session_id]
+
+    def append_event(self, session, event):
+        self.events.append(event)
+        session.state.update(event.actions.state_delta)
+
+class FakeRunner:
+    """Runner que delega en `agent.run(message, state)`."""
+
+    def __init__(self, agent, app_name, session_service):
+        self.agent = agent
+        self.app_name = app_name
+        self.session_service = session_service
+
+    async def run_async(self, user_id, session_id, new_message, **kwargs):
+        session = self.session_service.get_session(
+            app_name=self.app_name, user_id=user_id, session_id=session_id
+        )
+        async for event in self.agent.run(new_message, session.state):
+            yield event
+
+def delta_event(**delta):
+    return SimpleNamespace(actions=SimpleNamespace(state_delta=delta))
+
+class Agent:
+    def __init__(self, name, output_key=None, run=None):
+        self.name = name
+        self.output_key = output_key
+        self.run = run
+
+async def answer(message, state):
+    yield SimpleNamespace(text=f"respuesta a {message}", actions=None)
+
+@pytest.fixture
+def make(monkeypatch):
+    monkeypatch.setattr(orchestrator, "Runner", FakeRunner)
+    monkeypatch.setattr(orchestrator, "InMemorySessionService", FakeSessions)
+
+    def make(background, foreground=None, **kwargs):
+        sessions = FakeSessions()
+        sessions.create_session("app", "u1", {"interests": ["tractores"]}, session_id="main")
+        orch = ParallelTurnOrchestrator(
+            foreground or Agent("embudo", run=answer), background, "app", sessions, **kwargs
+        )
+        return orch, sessions
+    return make
+
+async def run_turn(orch, message):
+    return [event async for event in orch.run_turn("u1", "main", message)]
+
+def test_merge_state_deltas():
+    merged = merge_state_deltas([
+        {"interests": ["tractores"], "profile": {"sector": "cereal"}, "score": 1},
+        {"interests": ["tractores", "riego"], "profile": {"hectares": 80}, "score": 2},
+    ])
+    assert merged == {
+        "interests": ["tractores", "riego"],
+        "profile": {"sector": "cereal", "hectares": 80},
+        "score": 2,
+    }
+
+def test_background_results_are_merged_through_state_delta(make):
+    async def profile(message, state):
+        # Recibe una copia del estado al empezar el turno
+        assert state["interests"] == ["tractores"]
+        state["interests"].append("no debe llegar a la sesión")
+        yield delta_event(profile={"sector": "cereal"}, **{"temp:draft": "x"})
+        yield delta_event(interests=["riego"])
+
+    async def pain_points(message, state):
+        yield delta_event(pain_points=["averías"], interests=["cosechadoras"])
+
+    orch, sessions = make([
+        Agent("perfil", "profile", profile),
+        Agent("dolor", "pain_points", pain_points),
+    ])
+
+    async def scenario():
+        events = await run_turn(orch, "hola")
+        assert [event.text for event in events] == ["respuesta a hola"]
+        await orch.wait_for_background("main")
+
+    asyncio.run(scenario())
+    [event] = sessions.events
+    assert event.author == ORCHESTRATOR_AUTHOR
+    assert event.actions.state_delta == {
+        "profile": {"sector": "cereal"},
+        "interests": ["riego", "cosechadoras"],
+        "pain_points": ["averías"],
+    }
+    assert sessions.sessions["main"].state["interests"] == ["riego", "cosechadoras"]
+    # Las sesiones efímeras de los sub-agentes se borran
+    assert orch._background_sessions.sessions == {}
+    assert orch._pending == {} and orch._idle == {}
+
+def test_merge_waits_for_the_turn_in_progress(make):
+    async def scenario():
+        release_background = asyncio.Event()
+        release_turn = asyncio.Event()
+        turns = []
+
+        async def slow_profile(message, state):
+            await release_background.wait()
+            yield delta_event(profile={"turn": message})
+
+        async def foreground(message, state):
+            turns.append(message)
+            if message == "segundo":
+                await release_turn.wait()
+            yield SimpleNamespace(text=message, actions=None)
+
+        orch, sessions = make(
+            [Agent("perfil", "profile", slow_profile)], Agent("embudo", run=foreground)
+        )
+        await run_turn(orch, "primero")
+
+        second = asyncio.create_task(run_turn(orch, "segundo"))
+        while turns != ["primero", "segundo"]:
+            await asyncio.sleep(0)
+        release_background.set()
+        await asyncio.sleep(0.05)
+        # El primer plano sigue en el segundo turno: nada se ha escrito
+        assert sessions.events == []
+
+        release_turn.set()
+        await second
+        await orch.wait_for_background("main")
+        return sessions
+
+    sessions = asyncio.run(scenario())
+    # Las fusiones se aplican en el orden de los turnos
+    assert [event.actions.state_delta for event in sessions.events] == [
+        {"profile": {"turn": "primero"}},
+        {"profile": {"turn": "segundo"}},
+    ]
+    assert sessions.sessions["main"].state["profile"] == {"turn": "segundo"}
+
+def test_slow_and_failed_sub_agents_are_left_out(make):
+    async def hangs(message, state):
+        await asyncio.sleep(3600)
+        yield delta_event(never=True)
+
+    async def fails(message, state):
+        raise RuntimeError("modelo no disponible")
+        yield
+
+    async def works(message, state):
+        yield delta_event(pain_points=["precio"])
+
+    orch, sessions = make(
+        [Agent("lento", run=hangs), Agent("roto", run=fails), Agent("bien", run=works)],
+        background_timeout=0.05,
+    )
+
+    async def scenario():
+        await run_turn(orch, "hola")
+        await orch.wait_for_background("main")
+
+    asyncio.run(scenario())
+    assert [event.actions.state_delta for event in sessions.events] == [{"pain_points": ["precio"]}]
+    assert "background_ms" in orch.get_stats()
+
+def test_nothing_is_appended_without_results(make):
+    async def nothing(message, state):
+        yield delta_event(**{"temp:scratch": 1})
+
+    orch, sessions = make([Agent("perfil", run=nothing)])
+
+    async def scenario():
+        await run_turn(orch, "hola")
+        await orch.wait_for_background("main")
+
+    asyncio.run(scenario())
+    assert sessions.events == []
+
+def test_snapshot_callback_adds_the_last_merged_results():
+    callback = background_snapshot_callback([Agent("perfil", "profile"), Agent("sin_clave")])
+    instructions = []
+    request = SimpleNamespace(append_instructions=instructions.extend)
+
+    callback(SimpleNamespace(state={}), request)
+    assert instructions == []
+
+    callback(SimpleNamespace(state={"profile": {"sector": "viñedo"}}), request)
+    assert instructions[1] == 'profile: {"sector": "viñedo"}'
@@ -0,0 +1,39 @@
+"""Tests del cálculo de presupuestos de carrito."""
+
+from agentGemini.config import Config
+from agentGemini.services.pricing_service import PricingService
+
+def cart(*lines):
+    return {"items": [
+        {
+            "product": {
+                "id": product_id,
+                "name": product_id,
+                "price": price,
+                "financing_available": financeable,
+            },
+            "quantity": quantity,
+        }
+        for product_id, price, quantity, financeable in lines
+    ]}
+
+def test_empty_cart():
+    quote = PricingService().quote({"items": []})
+    assert quote.total == 0
+    assert quote.lines == []
+
+def test_best_discount_and_financing_surcharge():
+    customer = {"total_purchases": Config.LOYALTY_DISCOUNT_THRESHOLD}
+    code = {"code": "AGRO50", "percentage": 50}
+    quote = PricingService().quote(
+        cart(("prod_1", 1000, 2, True), ("prod_2", 500, 1, False)),
+        customer,
+        payment_method="financing",
+        discount_code=code,
+    )
+    assert quote.subtotal == 2500
+    assert quote.discount_amount == 1250
+    assert quote.applied_discount_code == "AGRO50"
+    # Solo la línea financiable lleva recargo
+    assert quote.financing_surcharge == round(1000 * Config.FINANCING_SURCHARGE_PERCENTAGE / 100, 2)
+    assert [line.subtotal for line in quote.lines] == [2000, 500]
@@ -0,0 +1,86 @@
+"""Tests del camino de lectura de la vista de detalle de producto."""
+
+from repo.shared_libraries.product_view import (
+    ARGUMENTS_COLLECTION,
+    PRODUCT_COLLECTION,
+    VIEW_COLLECTION,
+    ProductDetailView,
+)
+
+class FakeSnapshot:
+    def __init__(self, path, data):
+        self.reference = FakeRef(None, path)
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return self._data
+
+class FakeRef:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def get(self):
+        self.db.reads += 1
+        return FakeSnapshot(self.path, self.db.docs.get(self.path))
+
+    def set(self, data):
+        self.db.writes += 1
+        self.db.docs[self.path] = data
+
+    def delete(self):
+        self.db.writes += 1
+        self.db.docs.pop(self.path, None)
+
+class FakeCollection:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return FakeRef(self.db, f"{self.name}/{doc_id}")
+
+class FakeDb:
+    """Firestore en memoria que cuenta lecturas y escrituras."""
+
+    def __init__(self, docs=None):
+        self.docs = dict(docs or {})
+        self.reads = 0
+        self.writes = 0
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def get_all(self, refs):
+        self.reads += len(refs)
+        return [FakeSnapshot(ref.path, self.docs.get(ref.path)) for ref in refs]
+
+def test_unknown_product_is_read_once_and_never_written():
+    db = FakeDb()
+    views = ProductDetailView(db=db)
+    assert views.get("prod_missing") is None
+    reads = db.reads
+    assert views.get("prod_missing") is None
+    assert db.reads == reads
+    assert db.writes == 0
+
+def test_missing_view_is_built_without_writing():
+    db = FakeDb({
+        f"{PRODUCT_COLLECTION}/prod_1": {"name": "Tractor 1"},
+        f"{ARGUMENTS_COLLECTION}/prod_1": {"propuestaUnicaDeValor": "Potente"},
+    })
+    views = ProductDetailView(db=db)
+    details = views.get("prod_1")
+    assert details["name"] == "Tractor 1"
+    assert details["argumentosDeVenta"] == {"propuestaUnicaDeValor": "Potente"}
+    assert db.writes == 0
+    assert f"{VIEW_COLLECTION}/prod_1" not in db.docs
+
+def test_refresh_clears_a_remembered_missing_product():
+    db = FakeDb()
+    views = ProductDetailView(db=db)
+    assert views.get("prod_1") is None
+    db.docs[f"{PRODUCT_COLLECTION}/prod_1"] = {"name": "Tractor 1"}
+    views.refresh("prod_1")
+    assert views.get("prod_1")["name"] == "Tractor 1"
@@ -0,0 +1,142 @@
+"""Tests de la caché semántica de respuestas."""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("google.adk")
+
+from agentGemini.services import response_cache  # noqa: E402
+from agentGemini.services.response_cache import (  # noqa: E402
+    STATE_CACHE_QUERY,
+    SemanticResponseCache,
+)
+
+class StubEmbedder:
+    """Vectores fijos por pregunta: la similitud de cada par es conocida."""
+
+    VECTORS = {
+        "¿qué financiación tenéis?": [1.0, 0.0, 0.0],
+        "que financiacion teneis": [0.96, 0.28, 0.0],
+        "¿tenéis tractores usados?": [0.6, 0.8, 0.0],
+        "¿horario de la tienda?": [0.0, 0.0, 1.0],
+    }
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed(self, text):
+        self.calls += 1
+        return np.array(self.VECTORS.get(text, [0.0, 1.0, 0.0]), dtype=np.float32)
+
+def cache(**kwargs):
+    return SemanticResponseCache(embedder=StubEmbedder(), threshold=0.9, **kwargs)
+
+def context(**state):
+    return SimpleNamespace(state=dict(state))
+
+def request(*texts):
+    contents = [SimpleNamespace(role="user", parts=[SimpleNamespace(text=text)]) for text in texts]
+    return SimpleNamespace(contents=contents)
+
+def response(text=None, function_call=None, partial=False):
+    part = SimpleNamespace(text=text, function_call=function_call)
+    return SimpleNamespace(content=SimpleNamespace(parts=[part]), partial=partial)
+
+def answer(cache, ctx, text, reply):
+    """Turno completo: consulta la caché y, si falla, guarda la respuesta del modelo."""
+    cached = cache.before_model_callback(ctx, request(text))
+    if cached is None:
+        cache.after_model_callback(ctx, response(reply))
+    return cached
+
+def test_threshold_hits_and_misses():
+    c = cache()
+    c.store("¿qué financiación tenéis?", "es", "greeting", "Financiamos hasta 60 meses")
+    assert c.lookup("que financiacion teneis", "es", "greeting") == "Financiamos hasta 60 meses"
+    # Similitud 0.6, por debajo del umbral
+    assert c.lookup("¿tenéis tractores usados?", "es", "greeting") is None
+    assert c.lookup("¿horario de la tienda?", "es", "greeting") is None
+    stats = c.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+def test_entries_are_scoped_by_language_and_stage():
+    c = cache()
+    c.store("¿qué financiación tenéis?", "es", "greeting", "Financiamos hasta 60 meses")
+    assert c.lookup("¿qué financiación tenéis?", "en", "greeting") is None
+    assert c.lookup("¿qué financiación tenéis?", "es", "consideration") is None
+    assert c.lookup("¿qué financiación tenéis?", "es", "greeting") is not None
+
+def test_callbacks_serve_a_stored_first_turn():
+    c = cache()
+    reply = "Financiamos hasta 60 meses"
+    assert answer(c, context(language="es"), "¿qué financiación tenéis?", reply) is None
+    ctx = context(language="es")
+    cached = c.before_model_callback(ctx, request("que financiacion teneis"))
+    assert cached.content.parts[0].text == "Financiamos hasta 60 meses"
+    assert ctx.state[STATE_CACHE_QUERY] is None
+
+def test_only_first_turn_is_looked_up():
+    c = cache()
+    c.store("¿qué financiación tenéis?", "es", "greeting", "Financiamos hasta 60 meses")
+    ctx = context()
+    # Con historial la misma pregunta puede significar otra cosa
+    assert c.before_model_callback(ctx, request("Hola", "¿qué financiación tenéis?")) is None
+    assert ctx.state[STATE_CACHE_QUERY] is None
+    # Ni la llamada al modelo que sigue a una herramienta
+    tool_content = SimpleNamespace(role="tool", parts=[SimpleNamespace(text=None)])
+    followup = SimpleNamespace(contents=[tool_content])
+    assert c.before_model_callback(ctx, followup) is None
+    assert c.get_stats()["hits"] == 0
+
+def test_tool_call_responses_are_not_stored():
+    c = cache()
+    ctx = context()
+    assert c.before_model_callback(ctx, request("¿tenéis tractores usados?")) is None
+    c.after_model_callback(ctx, response(function_call=SimpleNamespace(name="search_products")))
+    assert c.get_stats()["stores"] == 0
+    # La respuesta final del turno ya no tiene pregunta pendiente
+    c.after_model_callback(ctx, response("Tenemos 12 tractores usados"))
+    assert c.get_stats()["stores"] == 0
+
+def test_personalized_responses_are_neither_served_nor_stored():
+    c = cache()
+    customer = {"id": "cust_001"}
+    answer(c, context(customer=customer), "¿qué financiación tenéis?", "Juan, para ti 0%")
+    assert c.get_stats()["stores"] == 0
+
+    c.store("¿qué financiación tenéis?", "es", "greeting", "Financiamos hasta 60 meses")
+    ctx = context(customer=customer)
+    assert c.before_model_callback(ctx, request("¿qué financiación tenéis?")) is None
+
+def test_partial_responses_wait_for_the_final_one():
+    c = cache()
+    ctx = context()
+    c.before_model_callback(ctx, request("¿horario de la tienda?"))
+    c.after_model_callback(ctx, response("De 9", partial=True))
+    assert c.get_stats()["stores"] == 0
+    c.after_model_callback(ctx, response("De 9 a 18"))
+    assert c.lookup("¿horario de la tienda?", "es", "greeting") == "De 9 a 18"
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    c = cache(ttl_seconds=60)
+    c.store("¿qué financiación tenéis?", "es", "greeting", "Financiamos hasta 60 meses")
+    now[0] += 59
+    assert c.lookup("¿qué financiación tenéis?", "es", "greeting") is not None
+    now[0] += 2
+    assert c.lookup("¿qué financiación tenéis?", "es", "greeting") is None
+    assert c.get_stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    c = cache(max_entries=2)
+    c.store("¿qué financiación tenéis?", "es", "greeting", "financiación")
+    c.store("¿horario de la tienda?", "es", "greeting", "horario")
+    # Un acierto renueva la entrada
+    assert c.lookup("¿qué financiación tenéis?", "es", "greeting") == "financiación"
+    c.store("¿tenéis tractores usados?", "es", "greeting", "usados")
+    assert c.lookup("¿horario de la tienda?", "es", "greeting") is None
+    assert c.lookup("¿qué financiación tenéis?", "es", "greeting") == "financiación"
+    assert c.get_stats()["entries"] == 2
@@ -0,0 +1,90 @@
+"""Tests de la grabación de sesiones y de su reproducción."""
+
+import json
+from types import SimpleNamespace
+
+from agentGemini.services.session_recorder import BackendTap, SessionRecorder, read_recording
+
+class FakeBackend:
+    def __init__(self):
+        self.calls = []
+
+    def get_customer_by_email(self, email):
+        self.calls.append(email)
+        return {"id": "cust_001", "name": "Juan García", "email": email, "location": "Lleida"}
+
+def context(session_id, text="", state=None):
+    content = SimpleNamespace(parts=[SimpleNamespace(text=text)])
+    return SimpleNamespace(
+        session=SimpleNamespace(id=session_id),
+        state=state if state is not None else {},
+        user_content=content,
+        function_call_id="call_1",
+    )
+
+def record_turn(recorder, backend, session_id="sesion_1"):
+    text = "Soy juan@example.com, llamadme al 600 123 456"
+    ctx = context(session_id, text, {"customer_id": "cust_001", "phone": "600123456"})
+    tool = SimpleNamespace(name="identify_customer")
+    recorder.before_agent(ctx)
+    args = {"email": "juan@example.com"}
+    recorder.before_tool(tool, args, ctx)
+    customer = backend.get_customer_by_email("juan@example.com")
+    recorder.after_tool(tool, args, ctx, {"customer": customer})
+    recorder.after_agent(ctx)
+
+def test_turn_round_trip_without_personal_data(tmp_path):
+    tap = BackendTap(FakeBackend, "firestore").install()
+    try:
+        recorder = SessionRecorder(directory=str(tmp_path), sample_rate=1.0)
+        record_turn(recorder, FakeBackend())
+    finally:
+        tap.uninstall()
+
+    path = recorder.path("sesion_1")
+    raw = open(path, encoding="utf-8").read()
+    for personal in ("juan@example.com", "600 123 456", "600123456", "Juan García", "Lleida"):
+        assert personal not in raw
+
+    [turn] = read_recording(path)
+    assert [record["k"] for record in turn] == ["turn", "backend", "tool", "turn_end"]
+    tool = turn[2]
+    assert tool["resp"]["customer"]["id"] == "cust_001"
+    assert tool["args"]["email"].startswith("<redactado:")
+
+    # La reproducción con los argumentos grabados (redactados) encuentra la llamada
+    replay = BackendTap(FakeBackend, "firestore").install()
+    try:
+        replay.load_replay(turn)
+        backend = FakeBackend()
+        result = backend.get_customer_by_email(tool["args"]["email"])
+    finally:
+        replay.uninstall()
+    assert backend.calls == []
+    assert result == turn[1]["res"]
+    assert replay.replay_misses == []
+
+def test_sampling_is_stable_per_session_and_keeps_no_state(tmp_path):
+    recorder = SessionRecorder(directory=str(tmp_path), sample_rate=0.5)
+    decisions = {f"s{i}": recorder.sampled(f"s{i}") for i in range(200)}
+    assert all(recorder.sampled(session_id) == sampled for session_id, sampled in decisions.items())
+    assert 50 < sum(decisions.values()) < 150
+
+    for session_id in decisions:
+        ctx = context(session_id)
+        recorder.before_agent(ctx)
+        recorder.after_agent(ctx)
+    assert recorder.get_stats()["turns_in_progress"] == 0
+    assert recorder.turns_recorded == sum(decisions.values())
+
+def test_unsampled_sessions_are_not_recorded(tmp_path):
+    recorder = SessionRecorder(directory=str(tmp_path), sample_rate=0.0)
+    record_turn(recorder, FakeBackend())
+    assert recorder.turns_recorded == 0
+    assert not list(tmp_path.iterdir())
+
+def test_records_are_compact_json(tmp_path):
+    recorder = SessionRecorder(directory=str(tmp_path), sample_rate=1.0)
+    record_turn(recorder, FakeBackend())
+    with open(recorder.path("sesion_1"), encoding="utf-8") as f:
+        assert all(json.loads(line)["k"] for line in f)
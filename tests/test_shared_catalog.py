@@ -0,0 +1,81 @@
+"""Tests del catálogo en memoria compartida."""
+
+import os
+import sys
+from multiprocessing import shared_memory
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "shared_libraries"))
+
+from shared_catalog import CatalogPublisher, SharedCatalog, _segment_inode  # noqa: E402
+
+ROWS = [
+    {
+        "id": f"prod_{i:03d}",
+        "name": f"Tractor {i}",
+        "categoria": f"cat_{i % 3}",
+        "price": 1000.0 * i,
+        "show": True,
+    }
+    for i in range(30)
+]
+
+@pytest.fixture
+def name():
+    return f"agentgemini_catalog_test_{os.getpid()}"
+
+def test_where_equals_uses_published_order(name):
+    publisher = CatalogPublisher(name)
+    try:
+        publisher.publish(ROWS)
+        snapshot = SharedCatalog(name).snapshot()
+        for category in ("cat_0", "cat_1", "cat_2", "cat_x"):
+            scan = [i for i in range(len(snapshot)) if snapshot.value("categoria", i) == category]
+            assert snapshot.where_equals("categoria", category) == scan
+        assert "categoria" in snapshot._orders
+    finally:
+        publisher.close()
+
+def test_worker_follows_restarted_loader(name):
+    catalog = SharedCatalog(name, check_interval=0)
+    publisher = CatalogPublisher(name)
+    publisher.publish(ROWS)
+    publisher.publish(ROWS)
+    assert catalog.get("prod_001")["name"] == "Tractor 1"
+
+    # Parada limpia: el worker sigue con la última generación
+    publisher.close()
+    assert catalog.get("prod_001")["name"] == "Tractor 1"
+
+    # El cargador nuevo crea otro segmento de control y empieza en la generación 1
+    publisher = CatalogPublisher(name)
+    try:
+        publisher.publish([dict(row, name=f"Nuevo {row['id']}") for row in ROWS])
+        assert catalog.get("prod_001")["name"] == "Nuevo prod_001"
+        assert catalog.get_stats()["generation"] == 1
+    finally:
+        publisher.close()
+
+def test_restarted_loader_cleans_up_stale_generations(name):
+    crashed = CatalogPublisher(name)
+    for _ in range(3):
+        crashed.publish(ROWS)
+    # Murió entre publicar la generación 3 y retirar la 1
+    orphan = shared_memory.SharedMemory(name=f"{name}_1", create=True, size=8)
+    orphan.close()
+    for shm in [crashed._control, *crashed._segments.values()]:
+        shm.close()
+
+    catalog = SharedCatalog(name, check_interval=0)
+    publisher = CatalogPublisher(name)
+    try:
+        assert _segment_inode(f"{name}_1") is None
+        assert sorted(publisher._segments) == [2, 3]
+        # La generación publicada sigue disponible hasta la siguiente
+        assert catalog.get("prod_001")["name"] == "Tractor 1"
+        assert publisher.publish(ROWS) == 4
+        assert _segment_inode(f"{name}_2") is None
+    finally:
+        publisher.close()
+    assert all(_segment_inode(f"{name}_{generation}") is None for generation in range(1, 5))
@@ -0,0 +1,61 @@
+"""Tests de la coalescencia de lecturas y de la caché con TTL por lectura."""
+
+import asyncio
+import threading
+import time
+
+from agentGemini.services.single_flight import EarlyRefreshCache, SingleFlight
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def read():
+        calls.append(1)
+        release.wait(1)
+        return {"id": "prod_1"}
+
+    async def main():
+        leader = asyncio.create_task(flight.do_async("prod_1", read))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.do_async("prod_1", read))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        await asyncio.sleep(0.01)
+        release.set()
+        return await follower, leader.cancelled()
+
+    result, cancelled = asyncio.run(main())
+    assert result == {"id": "prod_1"}
+    assert cancelled
+    assert len(calls) == 1
+
+def test_failed_read_reaches_every_waiter():
+    flight = SingleFlight()
+
+    def read():
+        time.sleep(0.02)
+        raise RuntimeError("backend")
+
+    async def main():
+        return await asyncio.gather(
+            flight.do_async("k", read), flight.do_async("k", read), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.get_stats()["executions"] == 1
+
+def test_read_ttl_overrides_cache_ttl():
+    cache = EarlyRefreshCache(ttl_seconds=3600, beta=0)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {"stock": len(loads)}
+
+    assert cache.get_or_load("p", load, ttl_seconds=0.05) == {"stock": 1}
+    assert cache.get_or_load("p", load, ttl_seconds=0.05) == {"stock": 1}
+    time.sleep(0.06)
+    assert cache.get_or_load("p", load, ttl_seconds=0.05) == {"stock": 2}
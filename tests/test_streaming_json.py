@@ -0,0 +1,101 @@
+"""Tests del parser JSON incremental de las respuestas estructuradas."""
+
+import json
+
+import pytest
+
+from repo.streaming_json import StreamingJSONError, StreamingJSONParser
+
+RESPONSE = {
+    "template_id": "product_card",
+    "message": "Precio: 1.500 € \"IVA incl.\" \\ ñandú é 🚜\nsiguiente línea",
+    "data": {"items": [{"id": "prod_001", "price": 1500.5, "tags": ["a}", "b]"]}], "empty": {}},
+    "count": -12,
+    "visible": True,
+    "discount": None,
+    "ratio": 1e-3,
+    "next_funnel_step": "consideracion",
+}
+# Con \uXXXX para que las secuencias de escape también se partan
+TEXT = "```json\n" + json.dumps(RESPONSE, ensure_ascii=True) + "\n```"
+
+def feed_all(chunks, fields=None):
+    parser = StreamingJSONParser(fields)
+    completed = []
+    for chunk in chunks:
+        completed += parser.feed(chunk)
+    return parser, completed
+
+def test_every_split_point():
+    for split in range(len(TEXT) + 1):
+        parser, completed = feed_all([TEXT[:split], TEXT[split:]])
+        assert parser.close() == RESPONSE, split
+        assert [key for key, _ in completed] == list(RESPONSE)
+
+def test_one_character_at_a_time():
+    parser, completed = feed_all(TEXT)
+    assert dict(completed) == RESPONSE
+    assert parser.trailing_text == "\n```"
+
+def test_escapes_split_across_chunks():
+    text = '{"message": "a\\"b\\\\c\\u00f1d\\ud83d\\ude9c"}'
+    expected = json.loads(text)
+    for split in range(len(text) + 1):
+        for second in range(split, len(text) + 1):
+            parser, _ = feed_all([text[:split], text[split:second], text[second:]])
+            assert parser.close() == expected, (split, second)
+
+def test_escaped_quote_in_key():
+    parser, completed = feed_all(['{"a\\', '"b": 1}'])
+    assert completed == [('a"b', 1)]
+
+def test_fields_are_emitted_as_soon_as_complete():
+    parser = StreamingJSONParser(fields={"template_id"})
+    assert parser.feed('{"template_id": "product_ca') == []
+    assert parser.feed('rd", "message": "Hola"') == [("template_id", "product_card")]
+    assert not parser.done
+    assert parser.feed("}") == []
+    # Los campos no pedidos también quedan en el resultado
+    assert parser.close() == {"template_id": "product_card", "message": "Hola"}
+
+def test_scalar_is_completed_by_its_delimiter():
+    parser = StreamingJSONParser()
+    assert parser.feed('{"count": 12') == []
+    assert parser.feed("3") == []
+    assert parser.feed(",") == [("count", 123)]
+
+def test_trailing_text_after_the_object():
+    parser, completed = feed_all(['{"a": 1} y', " algo más", ' {"b": 2}'])
+    assert parser.done
+    assert completed == [("a", 1)]
+    assert parser.trailing_text == ' y algo más {"b": 2}'
+    assert parser.close() == {"a": 1}
+
+@pytest.mark.parametrize("chunks", [
+    ['{"a" 1'],
+    ['{a: 1}'],
+    ['{"a": ', "x"],
+    ['{"a": 1 "b": 2}'],
+    ['{"a": [1}'],
+    ['{"a": tru', "e]"],
+    ['{"a": 1]'],
+    ['{"a": tr', 'ue_x,'],
+])
+def test_errors_are_raised_on_the_first_invalid_chunk(chunks):
+    parser = StreamingJSONParser()
+    for chunk in chunks[:-1]:
+        parser.feed(chunk)
+    with pytest.raises(StreamingJSONError):
+        parser.feed(chunks[-1])
+
+def test_error_is_raised_before_the_rest_arrives():
+    parser = StreamingJSONParser()
+    with pytest.raises(StreamingJSONError):
+        parser.feed('{"a": 1, 2')
+
+@pytest.mark.parametrize("text", ["", "sin objeto", '{"a": 1', '{"a": "sin cerrar}'])
+def test_close_without_complete_object(text):
+    parser = StreamingJSONParser()
+    parser.feed(text)
+    with pytest.raises(StreamingJSONError):
+        parser.close()